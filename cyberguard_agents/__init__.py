@@ -3,5 +3,17 @@ CyberGuard — Sistema Multi-Agente de Ciberseguridad.
 
 ADK busca una variable llamada `root_agent` en el __init__.py o agent.py
 del directorio del agente. Este es el punto de entrada para toda interaccion.
+
+root_agent se resuelve en el primer acceso: importar solo una herramienta
+(cyberguard_agents.tools.*) o metrics no carga ADK, LiteLLM ni los modelos.
 """
-from .agent import root_agent
+__all__ = ["root_agent"]
+
+
+def __getattr__(name):
+    if name == "root_agent":
+        from .agent import root_agent
+
+        globals()["root_agent"] = root_agent
+        return root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
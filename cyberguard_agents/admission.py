@@ -0,0 +1,261 @@
+"""
+Control de admision de las llamadas al LLM.
+
+Cada llamada de un agente al modelo (FailoverLlm en models.py) pasa por una
+compuerta global antes de salir hacia el proveedor:
+
+- limite de concurrencia: como maximo N llamadas en vuelo a la vez,
+- token bucket: no mas llamadas por segundo que la cuota del proveedor,
+- cola acotada: las llamadas que no entran esperan su turno en orden; si la
+  cola esta llena o la espera supera su plazo, la llamada se rechaza con
+  AdmissionRejected (HTTP 503 con Retry-After) en lugar de amontonarse.
+
+Si el proveedor igual responde 429 o un error transitorio (5xx, timeout,
+conexion), la llamada se reintenta con backoff exponencial y jitter completo,
+respetando Retry-After cuando el proveedor lo envia.
+
+Cada consulta de /chat tiene un presupuesto de espera (request_budget()): los
+segundos que puede pasar en la cola de admision y en backoff sumados. El tiempo
+de trabajo real (el modelo generando, un escaneo de nmap) no lo consume. Si un
+reintento no cabe en lo que queda del presupuesto, se entrega el error.
+
+Configuracion por variables de entorno:
+    CYBERGUARD_LLM_CONCURRENCY     Llamadas al LLM simultaneas (default 8)
+    CYBERGUARD_LLM_RATE            Llamadas por segundo de la cuota del proveedor; 0 sin limite (default 0)
+    CYBERGUARD_LLM_BURST           Rafaga maxima del token bucket (default: max(1, rate))
+    CYBERGUARD_LLM_QUEUE           Llamadas que pueden esperar turno; con la cola llena se rechaza (default 64)
+    CYBERGUARD_LLM_QUEUE_TIMEOUT   Segundos maximos de espera en la cola por llamada (default 30)
+    CYBERGUARD_LLM_MAX_RETRIES     Reintentos por llamada ante 429 o errores transitorios (default 3)
+    CYBERGUARD_LLM_BACKOFF_BASE    Espera base del backoff en segundos (default 0.5)
+    CYBERGUARD_LLM_BACKOFF_MAX     Espera maxima de un reintento sin Retry-After (default 20)
+    CYBERGUARD_CHAT_WAIT_BUDGET    Segundos de espera (cola + backoff) por consulta (default 60)
+"""
+import asyncio
+import contextvars
+import math
+import os
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from cyberguard_agents import metrics
+from cyberguard_agents.tools.throttle import AsyncTokenBucket
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_QUEUE = 64
+DEFAULT_QUEUE_TIMEOUT = 30.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 20.0
+DEFAULT_WAIT_BUDGET = 60.0
+# 408 timeout, 429 rate limit, 5xx y 529 (proveedor sobrecargado)
+RETRY_STATUS = frozenset({408, 429, 500, 502, 503, 504, 529})
+
+_budget: contextvars.ContextVar["RequestBudget | None"] = contextvars.ContextVar("cyberguard_budget", default=None)
+_gate: "AdmissionGate | None" = None
+_gate_loop = None
+
+
+class AdmissionRejected(Exception):
+    """La llamada al LLM no se admitio: cola llena o plazo de espera vencido."""
+
+    status_code = 503
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Llamada al modelo rechazada por saturacion ({reason})")
+
+
+class RequestBudget:
+    """Segundos que una consulta puede pasar esperando (cola de admision y backoff)."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.spent = 0.0
+
+    def remaining(self) -> float:
+        return max(0.0, self.seconds - self.spent)
+
+    def spend(self, seconds: float) -> None:
+        self.spent += max(0.0, seconds)
+
+
+@contextmanager
+def request_budget(seconds: float | None = None):
+    """Fija el presupuesto de espera de la consulta en curso (lo heredan sus tareas)."""
+    if seconds is None:
+        seconds = float(os.getenv("CYBERGUARD_CHAT_WAIT_BUDGET", DEFAULT_WAIT_BUDGET))
+    budget = RequestBudget(seconds)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def current_budget() -> RequestBudget | None:
+    return _budget.get()
+
+
+class AdmissionGate:
+    """Semaforo de concurrencia + token bucket con una cola de espera acotada."""
+
+    def __init__(self, concurrency: int, rate: float = 0.0, burst: float | None = None,
+                 max_queue: int = DEFAULT_QUEUE, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._bucket = AsyncTokenBucket(rate, burst if burst is not None else max(1.0, rate)) if rate > 0 else None
+        self.waiting = 0
+        self.in_flight = 0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionGate":
+        burst = os.getenv("CYBERGUARD_LLM_BURST")
+        return cls(
+            concurrency=int(os.getenv("CYBERGUARD_LLM_CONCURRENCY", DEFAULT_CONCURRENCY)),
+            rate=float(os.getenv("CYBERGUARD_LLM_RATE", "0")),
+            burst=float(burst) if burst else None,
+            max_queue=int(os.getenv("CYBERGUARD_LLM_QUEUE", DEFAULT_QUEUE)),
+            queue_timeout=float(os.getenv("CYBERGUARD_LLM_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT)),
+        )
+
+    def _retry_after(self) -> float:
+        """Estimacion de cuando vale la pena volver a intentar, para el cliente."""
+        per_call = 1 / self.rate if self.rate > 0 else 1.0
+        return float(max(1, math.ceil(per_call * (self.waiting + 1) / self.concurrency)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        metrics.increment("llm_admission_rejected_total", reason=reason)
+        return AdmissionRejected(reason, self._retry_after())
+
+    async def _acquire(self) -> None:
+        await self._semaphore.acquire()
+        try:
+            if self._bucket is not None:
+                await self._bucket.acquire()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def acquire(self) -> float:
+        """Espera turno; retorna los segundos esperados o lanza AdmissionRejected."""
+        budget = _budget.get()
+        timeout = self.queue_timeout if budget is None else min(self.queue_timeout, budget.remaining())
+        if self.waiting >= self.max_queue and self._semaphore.locked():
+            raise self._reject("queue_full")
+        started = time.monotonic()
+        self.waiting += 1
+        metrics.set_gauge("llm_queue_depth", self.waiting)
+        try:
+            await asyncio.wait_for(self._acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("deadline") from None
+        finally:
+            self.waiting -= 1
+            metrics.set_gauge("llm_queue_depth", self.waiting)
+        waited = time.monotonic() - started
+        if budget is not None:
+            budget.spend(waited)
+        self.in_flight += 1
+        metrics.set_gauge("llm_in_flight", self.in_flight)
+        metrics.observe("llm_admission_wait_seconds", waited)
+        return waited
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        metrics.set_gauge("llm_in_flight", self.in_flight)
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "rate_per_second": self.rate or None,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+        }
+
+
+def get_gate() -> AdmissionGate:
+    """Compuerta del event loop actual; se crea con la configuracion vigente."""
+    global _gate, _gate_loop
+    loop = asyncio.get_running_loop()
+    if _gate is None or _gate_loop is not loop:
+        _gate = AdmissionGate.from_env()
+        _gate_loop = loop
+    return _gate
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Ocupa un lugar de la compuerta mientras dura la llamada al modelo."""
+    gate = get_gate()
+    await gate.acquire()
+    try:
+        yield
+    finally:
+        gate.release()
+
+
+def admission_stats() -> dict:
+    """Estado de la compuerta, para GET /stats."""
+    if _gate is None:
+        return {}
+    return {
+        **_gate.stats(),
+        "rejected": {reason: metrics.value("llm_admission_rejected_total", reason=reason)
+                     for reason in ("queue_full", "deadline")},
+    }
+
+
+def retry_after(error: Exception) -> float | None:
+    """Segundos de Retry-After del error (rechazo de admision o respuesta del proveedor)."""
+    if isinstance(getattr(error, "retry_after", None), (int, float)):
+        return float(error.retry_after)
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value is None:
+        extra = getattr(error, "litellm_response_headers", None) or {}
+        value = extra.get("retry-after") if hasattr(extra, "get") else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        # Retry-After tambien puede ser una fecha HTTP; en ese caso se usa el backoff propio
+        return None
+
+
+def retryable(error: Exception) -> bool:
+    if isinstance(error, AdmissionRejected):
+        return False
+    return getattr(error, "status_code", None) in RETRY_STATUS or isinstance(
+        error, (asyncio.TimeoutError, TimeoutError, ConnectionError)
+    )
+
+
+def backoff_delay(error: Exception, attempt: int) -> float | None:
+    """
+    Espera antes del reintento numero `attempt` (desde 0), o None si no se reintenta:
+    error no transitorio, reintentos agotados o espera que no cabe en el presupuesto.
+    """
+    if not retryable(error) or attempt >= int(os.getenv("CYBERGUARD_LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES)):
+        return None
+    base = float(os.getenv("CYBERGUARD_LLM_BACKOFF_BASE", DEFAULT_BACKOFF_BASE))
+    cap = float(os.getenv("CYBERGUARD_LLM_BACKOFF_MAX", DEFAULT_BACKOFF_MAX))
+    # Jitter completo: reparte los reintentos de las consultas que fallaron juntas
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    delay = max(delay, retry_after(error) or 0.0)
+    budget = _budget.get()
+    if budget is not None and delay > budget.remaining():
+        return None
+    return delay
+
+
+async def backoff(delay: float) -> None:
+    budget = _budget.get()
+    if budget is not None:
+        budget.spend(delay)
+    await asyncio.sleep(delay)
@@ -4,24 +4,17 @@ Coordinator Agent — Orquesta el sistema multi-agente CyberGuard.
 Usa sub_agents para delegar consultas al especialista correcto.
 El LLM lee las `description` de cada sub-agente y decide a cual delegar.
 """
-import os
 from google.adk.agents import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
 
 from cyberguard_agents.cis_advisor import cis_agent
 from cyberguard_agents.port_scanner import port_scanner_agent
 from cyberguard_agents.incident_responder import incident_responder_agent
 from cyberguard_agents.recon import recon_agent
-
-MODEL = LiteLlm(
-    model="openrouter/google/gemini-2.5-flash",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    api_base="https://openrouter.ai/api/v1",
-)
+from cyberguard_agents.models import get_model
 
 root_agent = LlmAgent(
     name="cyberguard_coordinator",
-    model=MODEL,
+    model=get_model("coordinator"),
     description="Coordinador principal del sistema CyberGuard.",
     instruction="""Eres CyberGuard, un coordinador de ciberseguridad.
 
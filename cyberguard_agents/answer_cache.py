@@ -0,0 +1,167 @@
+"""
+Cache de respuestas para consultas de conocimiento estatico.
+
+Preguntas como "playbook de ransomware", "controles CIS de SSH para Linux" o
+"que es HSTS" dependen solo de los catalogos (CIS_BENCHMARKS,
+INCIDENT_PLAYBOOKS, runbooks del directorio) y de los prompts de los agentes,
+pero cada una cuesta dos o mas llamadas al LLM. La respuesta se guarda con una
+clave formada por:
+
+- el texto normalizado del mensaje (sin acentos, mayusculas, signos, stopwords,
+  palabras de relleno ni plurales simples: "Cual es el playbook de ransomware?"
+  y "playbooks ransomware" coinciden). Los numeros e identificadores con puntos
+  o guiones (5.2.1, CVE-2024-3094) y las negaciones ("no", "sin") se conservan
+  tal cual, para que "control CIS 5.2.1" y "control CIS 5.2.2" o "que es HSTS"
+  y "que no es HSTS" no compartan respuesta,
+- un hash de version de los catalogos y de los prompts, modelos y herramientas
+  de los agentes: si cambia cualquiera, las entradas anteriores dejan de usarse.
+
+Solo se guardan respuestas de corridas que no usaron herramientas en vivo
+(escaneos, consultas DNS/WHOIS, run_cis_check, analisis de archivos): una
+respuesta que incluye el resultado de un escaneo nunca se reutiliza. Solo se
+consulta en sesiones nuevas, porque en una conversacion en curso la misma
+pregunta puede depender de los mensajes anteriores.
+
+Configuracion por variables de entorno:
+    CYBERGUARD_ANSWER_CACHE       1 habilita el cache, 0 lo desactiva (default: 1)
+    CYBERGUARD_ANSWER_CACHE_SIZE  Maximo de respuestas guardadas (default 1000)
+    CYBERGUARD_ANSWER_CACHE_TTL   Segundos de validez de una respuesta (default 86400)
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+from cyberguard_agents import metrics
+from cyberguard_agents.tools.cis_tools import CIS_BENCHMARKS
+from cyberguard_agents.tools.incident_tools import INCIDENT_PLAYBOOKS, normalize_text
+from cyberguard_agents.tools.playbook_index import playbook_dir, playbook_signature, tokenize
+
+DEFAULT_SIZE = 1000
+DEFAULT_TTL = 24 * 3600
+# Herramientas que solo leen catalogos locales; cualquier otra cuenta como herramienta en vivo
+STATIC_TOOLS = frozenset({
+    "check_cis_benchmark",
+    "get_hardening_checklist",
+    "classify_incident",
+    "get_incident_playbook",
+    "find_playbooks",
+    "transfer_to_agent",
+})
+# Palabras de relleno de una pregunta que no cambian la respuesta ("cual es", "dame", "muestrame")
+FILLER = frozenset(tokenize(
+    "cual cuales como donde cuando que quien dame dime muestrame explica explicame necesito quiero "
+    "podrias puedes favor hola what which how show give tell me please need want"
+))
+
+# Numeros e identificadores (5.2.1, cve-2024-3094, sha256, 1.1.1.1) o palabras sueltas
+_QUERY_TOKEN = re.compile(r"[a-z0-9ñ]+(?:[.\-_:/][a-z0-9ñ]+)*")
+# Cambian el sentido de la pregunta, aunque para buscar playbooks sean stopwords
+NEGATIONS = frozenset("no ni nunca sin sino excepto salvo not without never except".split())
+
+
+def query_terms(message: str) -> list[str]:
+    """
+    Terminos de la clave del cache. Las palabras se normalizan como en el indice
+    de playbooks; los identificadores, los numeros y las negaciones se conservan.
+    """
+    terms = []
+    for token in _QUERY_TOKEN.findall(normalize_text(message)):
+        if token in NEGATIONS or not token.isalpha():
+            terms.append(token)
+        else:
+            terms.extend(tokenize(token))
+    return terms
+
+
+def normalize_query(message: str) -> str:
+    return " ".join(term for term in query_terms(message) if term not in FILLER)
+
+
+def _agent_fingerprint(agent) -> list:
+    model = getattr(agent, "model", None)
+    return [
+        agent.name,
+        getattr(agent, "instruction", None) if isinstance(getattr(agent, "instruction", None), str) else None,
+        getattr(model, "model", model) if not isinstance(model, str) else model,
+        sorted(getattr(t, "__name__", getattr(t, "name", str(t))) for t in getattr(agent, "tools", None) or []),
+        [_agent_fingerprint(sub) for sub in getattr(agent, "sub_agents", None) or []],
+    ]
+
+
+def catalog_version(agent=None) -> str:
+    """Hash de los catalogos locales y de la configuracion de los agentes."""
+    payload = json.dumps(
+        [CIS_BENCHMARKS, INCIDENT_PLAYBOOKS, playbook_signature(playbook_dir()),
+         _agent_fingerprint(agent) if agent is not None else None],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def uses_live_tools(tool_names: Iterable[str]) -> bool:
+    return any(name not in STATIC_TOOLS for name in tool_names)
+
+
+class AnswerCache:
+    """LRU con TTL de respuestas por (version de catalogo, mensaje normalizado)."""
+
+    def __init__(self, max_entries: int | None = None, ttl: float | None = None):
+        self.max_entries = int(max_entries if max_entries is not None
+                               else os.getenv("CYBERGUARD_ANSWER_CACHE_SIZE", DEFAULT_SIZE))
+        self.ttl = float(ttl if ttl is not None else os.getenv("CYBERGUARD_ANSWER_CACHE_TTL", DEFAULT_TTL))
+        self._entries: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, message: str, version: str) -> tuple | None:
+        """Clave del mensaje, o None si el cache esta desactivado o el mensaje no tiene terminos."""
+        if not cache_enabled():
+            return None
+        query = normalize_query(message)
+        return (version, query) if query else None
+
+    def get(self, key: tuple) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.increment("answer_cache_requests_total", result="hit" if entry else "miss")
+        return dict(entry[1]) if entry else None
+
+    def put(self, key: tuple, answer: dict, tool_names: Iterable[str] = ()) -> bool:
+        """Guarda la respuesta si la corrida no uso herramientas en vivo. Retorna si se guardo."""
+        if uses_live_tools(tool_names):
+            metrics.increment("answer_cache_skipped_total", reason="live_tools")
+            return False
+        with self._lock:
+            self._entries[key] = (time.monotonic(), dict(answer))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        metrics.increment("answer_cache_stores_total")
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        hits = metrics.value("answer_cache_requests_total", result="hit")
+        misses = metrics.value("answer_cache_requests_total", result="miss")
+        return {
+            "entries": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
+
+def cache_enabled() -> bool:
+    return os.getenv("CYBERGUARD_ANSWER_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
@@ -0,0 +1,126 @@
+"""
+Traduce los eventos de un Runner de ADK a eventos Server-Sent Events para /chat/stream.
+
+Tipos de evento emitidos (el campo data es JSON):
+    start       session_id y agente elegido por el pre-router (se envia antes de llamar al LLM)
+    delegation  el coordinador transfiere la conversacion a un especialista
+    tool_start  un agente llama a una herramienta (nombre y argumentos)
+    tool_end    la herramienta termino (duracion en ms y status del resultado)
+    delta       texto parcial del modelo
+    message     texto completo de un turno del modelo
+    final       respuesta final (mismo contenido que /chat)
+    error       error del agente (status 429, 503 o 500, igual que /chat; retry_after en segundos)
+"""
+import json
+import math
+import time
+from typing import AsyncIterator
+
+from cyberguard_agents import admission, metrics
+
+NO_RESPONSE = "No se pudo generar una respuesta. Intenta reformular tu consulta."
+MAX_ARG_CHARS = 500
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def retry_seconds(error: Exception) -> int:
+    """Segundos sugeridos al cliente antes de reintentar (Retry-After del error o 30)."""
+    wait = admission.retry_after(error)
+    return max(1, math.ceil(wait)) if wait is not None else 30
+
+
+def agent_error(error: Exception) -> tuple[int, str]:
+    """Codigo HTTP y mensaje para un error del runner (compartido con /chat)."""
+    error_msg = str(error)
+    if isinstance(error, admission.AdmissionRejected):
+        metrics.increment("chat_errors_total", status=503, error=type(error).__name__)
+        return 503, (f"Servidor ocupado: demasiadas consultas esperando al modelo. "
+                     f"Intenta de nuevo en {retry_seconds(error)} segundos.")
+    # Las excepciones de LiteLLM traen status_code; el texto cubre las de Gemini
+    if getattr(error, "status_code", None) == 429 or "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
+        metrics.increment("chat_errors_total", status=429, error=type(error).__name__)
+        return 429, f"Rate limit exceeded. Espera {retry_seconds(error)} segundos e intenta de nuevo."
+    metrics.increment("chat_errors_total", status=500, error=type(error).__name__)
+    return 500, f"Error del agente: {error_msg[:200]}"
+
+
+def _short_args(args: dict | None) -> dict:
+    text = json.dumps(args or {}, ensure_ascii=False, default=str)
+    if len(text) <= MAX_ARG_CHARS:
+        return args or {}
+    return {"truncated": text[:MAX_ARG_CHARS]}
+
+
+async def iter_chat_events(
+    runner,
+    user_id: str,
+    session_id: str,
+    new_message,
+    agent_name: str,
+    run_config=None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Ejecuta el runner y produce (tipo, datos) por cada hito de la corrida.
+    Siempre termina con un evento final o error.
+    """
+    started = time.perf_counter()
+    pending_tools: dict[str, tuple[str, float]] = {}
+    final_response = ""
+    try:
+        async for event in runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=new_message,
+            run_config=run_config,
+        ):
+            author = event.author or agent_name
+            if event.actions and event.actions.transfer_to_agent:
+                yield "delegation", {"from": author, "to": event.actions.transfer_to_agent}
+
+            for call in event.get_function_calls():
+                call_id = call.id or call.name
+                pending_tools[call_id] = (call.name, time.perf_counter())
+                yield "tool_start", {"agent": author, "tool": call.name, "id": call_id,
+                                     "args": _short_args(call.args)}
+
+            for response in event.get_function_responses():
+                call_id = response.id or response.name
+                name, tool_started = pending_tools.pop(call_id, (response.name, None))
+                result = response.response or {}
+                yield "tool_end", {
+                    "agent": author,
+                    "tool": name,
+                    "id": call_id,
+                    "duration_ms": round((time.perf_counter() - tool_started) * 1000, 1)
+                    if tool_started is not None else None,
+                    "status": result.get("status") if isinstance(result, dict) else None,
+                }
+
+            if not (event.content and event.content.parts):
+                continue
+            text = "".join(part.text for part in event.content.parts if part.text and not part.thought)
+            if not text:
+                continue
+            agent_name = author
+            if event.partial:
+                yield "delta", {"agent": author, "text": text}
+            else:
+                final_response = text
+                yield "message", {"agent": author, "text": text}
+    except Exception as e:
+        status, message = agent_error(e)
+        data = {"status": status, "error": message}
+        if status in (429, 503):
+            data["retry_after"] = retry_seconds(e)
+        yield "error", data
+        return
+
+    yield "final", {
+        "response": final_response or NO_RESPONSE,
+        "session_id": session_id,
+        "agent_name": agent_name,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -1 +1,11 @@
-from .agent import cis_agent
+__all__ = ["cis_agent"]
+
+
+def __getattr__(name):
+    # El agente (y con el ADK y LiteLLM) se construye en el primer acceso
+    if name == "cis_agent":
+        from .agent import cis_agent
+
+        globals()["cis_agent"] = cis_agent
+        return cis_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,25 +3,19 @@ CIS Benchmark Advisor Agent.
 
 Usa OpenRouter via LiteLLM para acceder a modelos LLM.
 """
-import os
 from google.adk.agents import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
 
 from cyberguard_agents.tools.cis_tools import (
     check_cis_benchmark,
     get_hardening_checklist,
     run_cis_check,
 )
-
-MODEL = LiteLlm(
-    model="openrouter/google/gemini-2.5-flash",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    api_base="https://openrouter.ai/api/v1",
-)
+from cyberguard_agents.tools.executor import offload_tools
+from cyberguard_agents.models import get_model
 
 cis_agent = LlmAgent(
     name="cis_benchmark_advisor",
-    model=MODEL,
+    model=get_model("cis_advisor"),
     description=(
         "Especialista en CIS Benchmarks para Linux y Windows. "
         "Consulta controles especificos, proporciona checklists de hardening, "
@@ -55,5 +49,5 @@ Reglas:
 - Se conciso pero completo en las remediaciones.
 - Incluye siempre el comando de verificacion cuando sea relevante.
 """,
-    tools=[check_cis_benchmark, get_hardening_checklist, run_cis_check],
+    tools=offload_tools([check_cis_benchmark, get_hardening_checklist, run_cis_check]),
 )
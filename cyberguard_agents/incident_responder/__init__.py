@@ -1 +1,11 @@
-from .agent import incident_responder_agent
+__all__ = ["incident_responder_agent"]
+
+
+def __getattr__(name):
+    # El agente (y con el ADK y LiteLLM) se construye en el primer acceso
+    if name == "incident_responder_agent":
+        from .agent import incident_responder_agent
+
+        globals()["incident_responder_agent"] = incident_responder_agent
+        return incident_responder_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,22 +1,22 @@
 """Incident Responder Agent — Clasificacion y respuesta a incidentes."""
-import os
 from google.adk.agents import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
 
+from cyberguard_agents.tools.alert_pipeline import summarize_alert_export
+from cyberguard_agents.tools.correlation import correlate_alerts
 from cyberguard_agents.tools.incident_tools import (
     classify_incident,
     get_incident_playbook,
 )
-
-MODEL = LiteLlm(
-    model="openrouter/google/gemini-2.5-flash",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    api_base="https://openrouter.ai/api/v1",
-)
+from cyberguard_agents.tools.ioc_tools import match_iocs
+from cyberguard_agents.tools.log_tools import analyze_auth_logs
+from cyberguard_agents.tools.pcap_tools import analyze_pcap
+from cyberguard_agents.tools.playbook_index import find_playbooks
+from cyberguard_agents.tools.executor import offload_tools
+from cyberguard_agents.models import get_model
 
 incident_responder_agent = LlmAgent(
     name="incident_responder",
-    model=MODEL,
+    model=get_model("incident_responder"),
     description=(
         "Especialista en respuesta a incidentes de ciberseguridad. "
         "Clasifica incidentes de seguridad (ransomware, phishing, data breach, DDoS), "
@@ -32,10 +32,42 @@ Tu rol es:
 Reglas:
 - SIEMPRE clasifica el incidente primero usando classify_incident.
 - Luego obten el playbook correspondiente con get_incident_playbook.
+- Si classify_incident retorna related_types (incidente mixto, por ejemplo phishing que
+  termino en ransomware), menciona los tipos relacionados y consulta tambien sus playbooks
+  cuando aporten pasos distintos.
+- Si el incidente no encaja en ransomware, phishing, data_breach o ddos (por ejemplo cuenta
+  comprometida, malware en un endpoint, webshell o amenaza interna), o si classify_incident no
+  es concluyente, usa find_playbooks con la descripcion del incidente: retorna los runbooks mas
+  relevantes con solo los pasos que aplican. Usa get_incident_playbook con el playbook_id
+  solo si el usuario necesita el runbook completo.
+- Si el usuario tiene un export de alertas del SIEM (archivo JSONL o CSV con muchas alertas),
+  usa summarize_alert_export con la ruta del archivo; prioriza los tipos criticos y mas
+  frecuentes del resumen y obten sus playbooks.
+- Si el usuario quiere saber cuantos incidentes reales hay detras de muchas alertas, usa
+  correlate_alerts: agrupa las alertas por indicadores compartidos y ya incluye un playbook
+  por tipo de incidente (no hace falta llamar get_incident_playbook para esos tipos).
+- Si el usuario tiene indicadores de compromiso (IPs, rangos, dominios, hashes) y logs
+  locales, usa match_iocs para verificar si aparecen; reporta archivo, offset y linea de los
+  hits y usa los resultados para concretar los pasos de contencion.
+- Si el usuario tiene logs de autenticacion (auth.log, secure, logs de VPN en JSON), usa
+  analyze_auth_logs para detectar fuerza bruta, password spraying, accesos exitosos desde IPs
+  atacantes y viajes imposibles; usa la linea de tiempo para reconstruir el incidente.
+- En incidentes DDoS, si el usuario tiene una captura de trafico (pcap/pcapng), usa
+  analyze_pcap para documentar IPs de origen, objetivos y el vector del ataque (SYN flood,
+  amplificacion, fragmentos) antes de recomendar filtros.
 - Presenta los pasos en orden de prioridad: primero acciones inmediatas.
 - Si el incidente es critico, enfatiza la urgencia.
 - Responde en español.
 - Adapta el nivel tecnico segun las preguntas del usuario.
 """,
-    tools=[classify_incident, get_incident_playbook],
+    tools=offload_tools([
+        classify_incident,
+        get_incident_playbook,
+        find_playbooks,
+        summarize_alert_export,
+        correlate_alerts,
+        match_iocs,
+        analyze_auth_logs,
+        analyze_pcap,
+    ]),
 )
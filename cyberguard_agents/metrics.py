@@ -0,0 +1,136 @@
+"""
+Contadores, gauges e histogramas del proceso para observar el comportamiento del servidor.
+
+Las series se identifican por nombre y etiquetas:
+
+    metrics.increment("router_decisions_total", route="port_scanner", reason="fast_path")
+    metrics.set_gauge("sessions_resident", 12)
+    metrics.observe("tool_call_seconds", 3.2, tool="scan_ports")
+    metrics.snapshot()
+    # {"router_decisions_total": {"reason=fast_path,route=port_scanner": 1}, "sessions_resident": {"": 12}, ...}
+
+render_prometheus() produce el formato de texto de Prometheus que sirve GET /metrics.
+"""
+import bisect
+import math
+import threading
+from collections import Counter
+
+PREFIX = "cyberguard_"
+# Limites en segundos: de una consulta DNS cacheada a un escaneo de vulnerabilidades
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+_counters: Counter = Counter()
+_gauges: dict[tuple, float] = {}
+# (nombre, etiquetas) -> [conteos por bucket (el ultimo es +Inf), suma, total]
+_histograms: dict[tuple, list] = {}
+_buckets: dict[str, tuple] = {}
+_lock = threading.Lock()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def increment(name: str, amount: float = 1, **labels) -> None:
+    with _lock:
+        _counters[_key(name, labels)] += amount
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, amount: float, buckets: tuple = LATENCY_BUCKETS, **labels) -> None:
+    """Registra una observacion en un histograma; los buckets se fijan en la primera."""
+    key = _key(name, labels)
+    with _lock:
+        bounds = _buckets.setdefault(name, tuple(buckets))
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [[0] * (len(bounds) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(bounds, amount)] += 1
+        series[1] += amount
+        series[2] += 1
+
+
+def histogram(name: str, **labels) -> dict:
+    """Total y suma de las observaciones de un histograma."""
+    with _lock:
+        series = _histograms.get(_key(name, labels))
+        return {"count": series[2], "sum": series[1]} if series else {"count": 0, "sum": 0.0}
+
+
+def value(name: str, **labels) -> float:
+    key = _key(name, labels)
+    with _lock:
+        return _gauges[key] if key in _gauges else _counters.get(key, 0)
+
+
+def snapshot() -> dict:
+    """Todas las series agrupadas por nombre; los histogramas como total y suma."""
+    with _lock:
+        items = list(_counters.items()) + list(_gauges.items())
+        items += [(key, {"count": series[2], "sum": round(series[1], 6)}) for key, series in _histograms.items()]
+    result: dict[str, dict] = {}
+    for (name, labels), count in sorted(items, key=lambda item: item[0]):
+        label_text = ",".join(f"{k}={v}" for k, v in labels)
+        result.setdefault(name, {})[label_text] = count
+    return result
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in (*labels, *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render_prometheus() -> str:
+    """Todas las series en el formato de texto de Prometheus (version 0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((key, [list(series[0]), series[1], series[2]]) for key, series in _histograms.items())
+        buckets = dict(_buckets)
+
+    lines = []
+    declared = set()
+
+    def declare(name: str, kind: str) -> None:
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for kind, items in (("counter", counters), ("gauge", gauges)):
+        for (name, labels), amount in items:
+            declare(name, kind)
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {_number(amount)}")
+    for (name, labels), (counts, total, count) in histograms:
+        declare(name, "histogram")
+        cumulative = 0
+        for bound, bucket_count in zip((*buckets[name], math.inf), counts):
+            cumulative += bucket_count
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, (('le', _number(bound)),))} {cumulative}")
+        lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_number(total)}")
+        lines.append(f"{PREFIX}{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+        _buckets.clear()
@@ -0,0 +1,376 @@
+"""
+Registro de modelos compartidos por los agentes.
+
+Cada agente pide su modelo por rol con get_model("coordinator"),
+get_model("port_scanner"), etc. El rol elige un nivel:
+
+- fast: el coordinador, que solo enruta, y el asesor CIS, que sobre todo
+  consulta catalogos; usan un modelo mas chico y rapido,
+- strong: los especialistas que interpretan escaneos, logs y reconocimiento.
+
+El modelo de cada rol se puede fijar con CYBERGUARD_MODEL_<ROL>. Todos los roles
+reciben un FailoverLlm: el modelo principal mas alternos. Por cada modelo se
+lleva una ventana movil de latencia (hasta la primera respuesta) y errores; si
+el p95 o la tasa de error del principal superan el umbral, las llamadas pasan
+al siguiente modelo sano hasta que la ventana se renueva. Un error antes de la
+primera respuesta se reintenta de inmediato con el alterno; si todos fallan con
+un error transitorio (429, 5xx), se reintenta con backoff. Cada intento pasa
+antes por la compuerta de admision (admission.py).
+
+Los LiteLlm se comparten por modelo y todos envian sus peticiones por un solo
+cliente HTTP con pool de conexiones keep-alive (HTTP/2 si esta h2). Asi la
+conexion TCP+TLS con el proveedor se abre una vez y la reutilizan el
+coordinador y los especialistas.
+
+El lifespan de FastAPI (ver main.py) llama a warmup_models() al arrancar para
+abrir esa conexion (DNS + TCP + TLS) antes de la primera consulta, y a
+close_llm_client() al apagar.
+
+Los modelos se configuran por variables de entorno; cualquier endpoint
+compatible con la API de OpenAI sirve (OpenRouter, vLLM, un servidor local de
+pruebas). Un modelo puede llevar su propio endpoint con 'modelo@url', por
+ejemplo 'hosted_vllm/llama-3.1-8b@http://10.0.0.5:8000/v1':
+    CYBERGUARD_MODEL                 Modelo del nivel strong (default openrouter/google/gemini-2.5-flash)
+    CYBERGUARD_MODEL_FAST            Modelo del nivel fast (default openrouter/google/gemini-2.5-flash-lite)
+    CYBERGUARD_MODEL_<ROL>           Modelo de un rol: COORDINATOR, PORT_SCANNER, RECON, CIS_ADVISOR,
+                                     INCIDENT_RESPONDER
+    CYBERGUARD_MODEL_FALLBACKS       Alternos separados por coma (default: el modelo del otro nivel)
+    CYBERGUARD_MODEL_MAX_P95         Latencia p95 maxima en segundos antes de conmutar (default 20)
+    CYBERGUARD_MODEL_MAX_ERROR_RATE  Tasa de error maxima antes de conmutar (default 0.5)
+    CYBERGUARD_MODEL_MIN_SAMPLES     Llamadas minimas en la ventana para evaluar un modelo (default 5)
+    CYBERGUARD_MODEL_HEALTH_WINDOW   Segundos de la ventana movil (default 300)
+    CYBERGUARD_MODEL_API_BASE        URL base por defecto de la API (default https://openrouter.ai/api/v1)
+    CYBERGUARD_MODEL_API_KEY         API key (default: OPENROUTER_API_KEY)
+    CYBERGUARD_MODEL_WARMUP          0 desactiva el calentamiento al arrancar (default 1)
+    CYBERGUARD_LLM_MAX_CONNECTIONS   Conexiones maximas del pool (default 20)
+    CYBERGUARD_LLM_MAX_KEEPALIVE     Conexiones keep-alive que se conservan (default 10)
+    CYBERGUARD_LLM_KEEPALIVE_EXPIRY  Segundos que vive una conexion ociosa (default 120)
+    CYBERGUARD_LLM_TIMEOUT           Timeout de cada peticion al modelo en segundos (default 120)
+"""
+import asyncio
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.lite_llm import LiteLlm, LiteLLMClient
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from cyberguard_agents import admission, metrics
+
+DEFAULT_MODEL = "openrouter/google/gemini-2.5-flash"
+DEFAULT_FAST_MODEL = "openrouter/google/gemini-2.5-flash-lite"
+DEFAULT_API_BASE = "https://openrouter.ai/api/v1"
+WARMUP_TIMEOUT = 5.0
+# Proveedores que LiteLLM atiende con el SDK de OpenAI: esperan un cliente openai.AsyncOpenAI
+# y no el cliente HTTP de LiteLLM, asi que usan el pool propio de LiteLLM.
+OPENAI_SDK_PROVIDERS = frozenset({"openai", "azure", "azure_ai", "text-completion-openai"})
+
+ROLE_TIERS = {
+    "coordinator": "fast",
+    "cis_advisor": "fast",
+    "port_scanner": "strong",
+    "recon": "strong",
+    "incident_responder": "strong",
+}
+DEFAULT_MAX_P95 = 20.0
+DEFAULT_MAX_ERROR_RATE = 0.5
+DEFAULT_MIN_SAMPLES = 5
+DEFAULT_HEALTH_WINDOW = 300.0
+
+logger = logging.getLogger(__name__)
+
+# (modelo, api_base, api_key) -> (instancia compartida, model_config con el que se creo)
+_models: dict[tuple, tuple[LiteLlm, dict[str, Any]]] = {}
+# modelos del rol -> FailoverLlm compartido
+_roles: dict[tuple, "FailoverLlm"] = {}
+_health: dict[str, "ModelHealth"] = {}
+_health_lock = threading.Lock()
+# event loop -> cliente HTTP de LiteLLM
+_clients: dict = {}
+
+
+def model_config(model: str | None = None) -> dict[str, Any]:
+    """Argumentos de LiteLlm para 'modelo' o 'modelo@url'; sin modelo usa CYBERGUARD_MODEL."""
+    spec = model or os.getenv("CYBERGUARD_MODEL", DEFAULT_MODEL)
+    name, _, api_base = spec.rpartition("@")
+    if not name or not api_base.startswith(("http://", "https://")):
+        name, api_base = spec, None
+    return {
+        "model": name.strip(),
+        "api_base": api_base or os.getenv("CYBERGUARD_MODEL_API_BASE", DEFAULT_API_BASE),
+        "api_key": os.getenv("CYBERGUARD_MODEL_API_KEY") or os.getenv("OPENROUTER_API_KEY"),
+    }
+
+
+def tier_model(tier: str) -> str:
+    if tier == "fast":
+        return os.getenv("CYBERGUARD_MODEL_FAST", DEFAULT_FAST_MODEL)
+    return os.getenv("CYBERGUARD_MODEL", DEFAULT_MODEL)
+
+
+def role_models(role: str) -> list[str]:
+    """Modelo principal del rol seguido de sus alternos, sin repetidos."""
+    tier = ROLE_TIERS.get(role, "strong")
+    primary = os.getenv(f"CYBERGUARD_MODEL_{role.upper()}") or tier_model(tier)
+    fallbacks = os.getenv("CYBERGUARD_MODEL_FALLBACKS")
+    if fallbacks is None:
+        alternates = [tier_model("strong" if tier == "fast" else "fast")]
+    else:
+        alternates = [item.strip() for item in fallbacks.split(",") if item.strip()]
+    return list(dict.fromkeys([primary, *alternates]))
+
+
+def get_llm_client():
+    """
+    Retorna el cliente HTTP de LiteLLM compartido, creandolo si no existe.
+
+    Igual que el cliente de http_client.py, queda ligado al event loop en el que
+    se creo y cada loop usa el suyo: uno no reemplaza al de otro loop vivo.
+    """
+    import httpx
+    from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+
+    from cyberguard_agents.tools.http_client import _http2_available
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.client.is_closed:
+        if client is None:
+            _forget_closed_loops()
+        transport = httpx.AsyncHTTPTransport(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("CYBERGUARD_LLM_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("CYBERGUARD_LLM_MAX_KEEPALIVE", "10")),
+                keepalive_expiry=float(os.getenv("CYBERGUARD_LLM_KEEPALIVE_EXPIRY", "120")),
+            ),
+        )
+        client = _clients[loop] = AsyncHTTPHandler(
+            timeout=float(os.getenv("CYBERGUARD_LLM_TIMEOUT", "120")),
+            transport=transport,
+            client_alias="cyberguard-llm",
+        )
+    return client
+
+
+def _forget_closed_loops() -> None:
+    """Suelta los clientes de loops que ya terminaron (ya no se pueden cerrar con aclose)."""
+    for loop in [loop for loop in list(_clients) if loop.is_closed()]:
+        _clients.pop(loop, None)
+
+
+@functools.lru_cache(maxsize=64)
+def _provider(model: str, custom_llm_provider: str | None) -> str:
+    import litellm
+
+    try:
+        return litellm.get_llm_provider(model, custom_llm_provider=custom_llm_provider)[1]
+    except Exception:
+        return custom_llm_provider or ""
+
+
+class PooledLiteLLMClient(LiteLLMClient):
+    """Cliente de ADK que envia todas las llamadas a LiteLLM por el pool compartido."""
+
+    async def acompletion(self, model, messages, tools, **kwargs):
+        if _provider(model, kwargs.get("custom_llm_provider")) not in OPENAI_SDK_PROVIDERS:
+            kwargs.setdefault("client", get_llm_client())
+        return await super().acompletion(model=model, messages=messages, tools=tools, **kwargs)
+
+
+_llm_client = PooledLiteLLMClient()
+
+
+def get_litellm(model: str | None = None) -> LiteLlm:
+    """Instancia compartida de LiteLlm para 'modelo' o 'modelo@url'."""
+    config = model_config(model)
+    key = (config["model"], config["api_base"], config["api_key"])
+    entry = _models.get(key)
+    if entry is None:
+        entry = _models[key] = (LiteLlm(**config, llm_client=_llm_client), config)
+    return entry[0]
+
+
+def get_model(role: str) -> "FailoverLlm":
+    """Modelo del rol: el principal configurado con conmutacion automatica a sus alternos."""
+    specs = tuple(role_models(role))
+    instance = _roles.get(specs)
+    if instance is None:
+        candidates = [get_litellm(spec) for spec in specs]
+        instance = _roles[specs] = FailoverLlm(model=candidates[0].model, candidates=candidates)
+    return instance
+
+
+def registered_models() -> list[LiteLlm]:
+    return [instance for instance, _ in _models.values()]
+
+
+class ModelHealth:
+    """Latencias y errores de un modelo en una ventana movil de tiempo."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self._samples: deque[tuple[float, float, bool]] = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, ok))
+
+    def summary(self) -> dict:
+        window = float(os.getenv("CYBERGUARD_MODEL_HEALTH_WINDOW", DEFAULT_HEALTH_WINDOW))
+        cutoff = time.monotonic() - window
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            samples = list(self._samples)
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+        errors = sum(1 for *_, ok in samples if not ok)
+        p95 = latencies[math.ceil(0.95 * len(latencies)) - 1] if latencies else 0.0
+        return {
+            "calls": len(samples),
+            "errors": errors,
+            "error_rate": round(errors / len(samples), 3) if samples else 0.0,
+            "p95_seconds": round(p95, 3),
+        }
+
+    def healthy(self) -> bool:
+        stats = self.summary()
+        if stats["calls"] < int(os.getenv("CYBERGUARD_MODEL_MIN_SAMPLES", DEFAULT_MIN_SAMPLES)):
+            return True
+        return (
+            stats["p95_seconds"] <= float(os.getenv("CYBERGUARD_MODEL_MAX_P95", DEFAULT_MAX_P95))
+            and stats["error_rate"] <= float(os.getenv("CYBERGUARD_MODEL_MAX_ERROR_RATE", DEFAULT_MAX_ERROR_RATE))
+        )
+
+
+def health_for(model: str) -> ModelHealth:
+    with _health_lock:
+        health = _health.get(model)
+        if health is None:
+            health = _health[model] = ModelHealth(model)
+        return health
+
+
+def model_health() -> dict[str, dict]:
+    """Estado de cada modelo usado, para GET /stats."""
+    with _health_lock:
+        items = list(_health.items())
+    return {model: {**health.summary(), "healthy": health.healthy()} for model, health in items}
+
+
+class FailoverLlm(BaseLlm):
+    """Modelo principal con alternos; conmuta cuando el principal esta lento o fallando."""
+
+    candidates: list[BaseLlm]
+
+    @property
+    def capabilities(self):
+        return self.candidates[0].capabilities
+
+    def ordered_candidates(self) -> list[BaseLlm]:
+        """Los modelos sanos primero, en el orden configurado; los demas como ultimo recurso."""
+        return sorted(self.candidates, key=lambda c: not health_for(c.model).healthy())
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        primary = self.candidates[0].model
+        attempt = 0
+        while True:
+            last_error = None
+            for candidate in self.ordered_candidates():
+                if candidate.model != primary:
+                    reason = "error" if last_error is not None else "unhealthy"
+                    metrics.increment("llm_failovers_total", model=candidate.model, reason=reason)
+                    logger.warning("Conmutando de %s a %s (%s)", primary, candidate.model, reason)
+                health = health_for(candidate.model)
+                request = llm_request.model_copy(update={"model": candidate.model})
+                answered = False
+                # ADK ejecuta herramientas y sub-agentes (transfer_to_agent) mientras este generador
+                # espera en el yield de la respuesta completa; esas respuestas se entregan despues de
+                # liberar el lugar de admision para no retenerlo durante un escaneo o un especialista.
+                complete = []
+                # Se fija antes de pedir el lugar: si entrar a la compuerta falla, el except lo usa
+                started = time.monotonic()
+                try:
+                    async with admission.llm_slot():
+                        started = time.monotonic()
+                        async for response in candidate.generate_content_async(request, stream=stream):
+                            if not answered:
+                                answered = True
+                                health.record(time.monotonic() - started, ok=True)
+                            if response.partial:
+                                yield response
+                            else:
+                                complete.append(response)
+                except admission.AdmissionRejected:
+                    raise
+                except Exception as e:
+                    metrics.increment("llm_calls_total", model=candidate.model, outcome="error")
+                    # Con la respuesta ya empezada no se puede cambiar de modelo a mitad de camino
+                    if answered:
+                        raise
+                    health.record(time.monotonic() - started, ok=False)
+                    last_error = e
+                    continue
+                if not answered:
+                    health.record(time.monotonic() - started, ok=True)
+                metrics.increment("llm_calls_total", model=candidate.model, outcome="ok")
+                for response in complete:
+                    yield response
+                return
+            # Fallaron todos los modelos: si el error es transitorio (429, 5xx), se espera y se reintenta
+            delay = admission.backoff_delay(last_error, attempt)
+            if delay is None:
+                raise last_error
+            metrics.increment("llm_retries_total", model=primary,
+                              reason=str(getattr(last_error, "status_code", None) or type(last_error).__name__))
+            logger.warning("Reintentando %s en %.1fs (intento %d): %s", primary, delay, attempt + 1, last_error)
+            await admission.backoff(delay)
+            attempt += 1
+
+
+async def warmup_models(timeout: float = WARMUP_TIMEOUT) -> dict[str, str]:
+    """
+    Abre la conexion con cada endpoint registrado pidiendo GET {api_base}/models.
+
+    Nunca falla: un proveedor caido o sin red no debe impedir que arranque el
+    servidor. Retorna {api_base: "ok" | "HTTP <codigo>" | "error: ..."}.
+    """
+    if os.getenv("CYBERGUARD_MODEL_WARMUP", "1").strip().lower() in ("0", "false", "no", "off"):
+        return {}
+    endpoints = {}
+    for _, config in _models.values():
+        base = (config["api_base"] or "").rstrip("/")
+        if base:
+            endpoints[base] = config["api_key"]
+
+    async def warm(base: str, api_key: str | None) -> str:
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else None
+        try:
+            response = await asyncio.wait_for(
+                get_llm_client().client.get(f"{base}/models", headers=headers), timeout
+            )
+        except Exception as e:
+            logger.warning("No se pudo calentar la conexion con %s: %s", base, e)
+            return f"error: {type(e).__name__}"
+        return "ok" if response.is_success else f"HTTP {response.status_code}"
+
+    results = await asyncio.gather(*(warm(base, key) for base, key in endpoints.items()))
+    return dict(zip(endpoints, results))
+
+
+async def close_llm_client() -> None:
+    """Cierra el pool de conexiones con los proveedores de modelos del event loop actual."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None and not client.client.is_closed:
+        await client.client.aclose()
+    _forget_closed_loops()
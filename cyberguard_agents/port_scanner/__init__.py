@@ -1 +1,11 @@
-from .agent import port_scanner_agent
+__all__ = ["port_scanner_agent"]
+
+
+def __getattr__(name):
+    # El agente (y con el ADK y LiteLLM) se construye en el primer acceso
+    if name == "port_scanner_agent":
+        from .agent import port_scanner_agent
+
+        globals()["port_scanner_agent"] = port_scanner_agent
+        return port_scanner_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,14 @@
 """Port Scanner Agent — Escaneo y analisis de puertos y vulnerabilidades."""
-import os
 from google.adk.agents import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
 
 from cyberguard_agents.tools.scanner_tools import scan_ports, scan_vulnerabilities
-
-MODEL = LiteLlm(
-    model="openrouter/google/gemini-2.5-flash",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    api_base="https://openrouter.ai/api/v1",
-)
+from cyberguard_agents.tools.tls_tools import check_tls
+from cyberguard_agents.tools.executor import offload_tools
+from cyberguard_agents.models import get_model
 
 port_scanner_agent = LlmAgent(
     name="port_scanner",
-    model=MODEL,
+    model=get_model("port_scanner"),
     description=(
         "Especialista en escaneo y analisis de puertos de red y deteccion de vulnerabilidades. "
         "Escanea hosts con nmap, identifica servicios expuestos, evalua riesgos "
@@ -30,6 +25,7 @@ Tu rol es:
 Herramientas disponibles:
 - scan_ports: Escaneo de puertos con deteccion de version de servicios (-sV).
 - scan_vulnerabilities: Escaneo de vulnerabilidades con scripts NSE (--script vuln).
+- check_tls: Inspeccion TLS de un puerto (protocolos, certificado, cifrados debiles).
 
 Formato de respuesta:
 - Al inicio, muestra el comando nmap ejecutado (campo nmap_command del resultado).
@@ -41,10 +37,11 @@ Formato de respuesta:
 Reglas:
 - Siempre usa scan_ports primero para obtener una vista general.
 - Si el usuario pide analisis de vulnerabilidades, usa scan_vulnerabilities.
+- Si hay puertos TLS abiertos (443, 8443, 993, 995) y el usuario quiere detalle, usa check_tls.
 - Prioriza hallazgos por nivel de riesgo (critical > high > medium > low).
 - Sugiere acciones concretas para cada hallazgo.
 - Si nmap no esta instalado, informa al usuario como instalarlo.
 - Responde en español.
 """,
-    tools=[scan_ports, scan_vulnerabilities],
+    tools=offload_tools([scan_ports, scan_vulnerabilities, check_tls]),
 )
@@ -0,0 +1,244 @@
+"""
+Perfilado opcional de consultas individuales de /chat.
+
+Con CYBERGUARD_PROFILING=1, una consulta se perfila si trae la cabecera
+`X-CyberGuard-Profile` o el parametro `?profile=` con uno de estos modos:
+
+- sampling (o 1): un hilo toma muestras de la pila cada pocos milisegundos con
+  sys._current_frames(). Casi no agrega costo; produce pilas colapsadas
+  (formato de flamegraph.pl / speedscope).
+- cprofile: perfilador determinista (cProfile) en el hilo del event loop y en
+  los hilos del pool que ejecutan herramientas de la consulta. Mide cada llamada
+  pero agrega costo; produce un archivo pstats (snakeviz, pstats.Stats). Solo
+  una consulta a la vez; si hay otra en curso, se usa sampling. Desde Python
+  3.12 cProfile usa sys.monitoring, que es global al proceso: un solo perfilador
+  ve todos los hilos (tambien los de otras consultas) y no se puede activar uno
+  por hilo. Si otra herramienta de perfilado ya esta activa, se usa sampling.
+
+Se muestrean el hilo del event loop y los hilos del pool de herramientas
+mientras ejecutan una herramienta de la consulta perfilada (executor.py los
+registra con thread_scope()). En el hilo del event loop tambien aparece el
+trabajo de otras consultas concurrentes.
+
+Los perfiles terminados quedan en un buffer circular y se descargan desde
+GET /admin/profiles/{id}. Si CYBERGUARD_PROFILING_TOKEN esta definido, tanto
+perfilar como descargar requieren la cabecera `X-CyberGuard-Profile-Token`.
+
+Configuracion por variables de entorno:
+    CYBERGUARD_PROFILING              1 habilita el perfilado por consulta (default 0)
+    CYBERGUARD_PROFILING_TOKEN        Token requerido para perfilar y descargar perfiles
+    CYBERGUARD_PROFILE_BUFFER         Perfiles que se conservan (default 20)
+    CYBERGUARD_PROFILE_INTERVAL_MS    Intervalo de muestreo en milisegundos (default 5)
+"""
+import cProfile
+import contextvars
+import hmac
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+DEFAULT_BUFFER = 20
+DEFAULT_INTERVAL_MS = 5
+MODES = {"1": "sampling", "true": "sampling", "sampling": "sampling",
+         "cprofile": "cprofile", "deterministic": "cprofile"}
+# Pilas mas profundas se recortan por la raiz
+MAX_STACK_DEPTH = 128
+# Antes de 3.12 cProfile solo mide el hilo en el que se activa
+PER_THREAD_CPROFILE = sys.version_info < (3, 12)
+
+_current: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("cyberguard_profile", default=None)
+_cprofile_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    return os.getenv("CYBERGUARD_PROFILING", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def authorized(token: str | None) -> bool:
+    """True si no hay token configurado o si el token recibido coincide."""
+    expected = os.getenv("CYBERGUARD_PROFILING_TOKEN")
+    return not expected or (token is not None and hmac.compare_digest(token, expected))
+
+
+def requested_mode(header: str | None, query: str | None, token: str | None) -> str | None:
+    """Modo de perfilado pedido por la consulta, o None si no se pidio o no esta permitido."""
+    value = (header or query or "").strip().lower()
+    if not value or not profiling_enabled() or not authorized(token):
+        return None
+    return MODES.get(value)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class Profile:
+    """Perfil de una consulta: pilas muestreadas o estadisticas de cProfile."""
+
+    def __init__(self, mode: str, label: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.label = label
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        # id de hilo -> rol ("loop" o "tool:<nombre>")
+        self.threads: dict[int, str] = {}
+        self.cprofiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def sample(self, frames: dict) -> None:
+        with self._lock:
+            threads = list(self.threads.items())
+        for thread_id, role in threads:
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(role)
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stats(self) -> pstats.Stats | None:
+        if not self.cprofiles:
+            return None
+        stats = pstats.Stats(self.cprofiles[0])
+        for extra in self.cprofiles[1:]:
+            stats.add(extra)
+        return stats
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "label": self.label,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "formats": ["collapsed"] if self.mode == "sampling" else ["pstats", "text"],
+        }
+
+    def render(self, fmt: str) -> tuple[bytes, str, str]:
+        """Contenido, media type y nombre de archivo del perfil en el formato pedido."""
+        if fmt == "collapsed" and self.mode == "sampling":
+            text = "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+            return text.encode(), "text/plain; charset=utf-8", f"profile-{self.id}.collapsed"
+        stats = self.stats()
+        if stats is not None and fmt == "pstats":
+            # Mismo contenido que pstats.Stats.dump_stats()
+            return marshal.dumps(stats.stats), "application/octet-stream", f"profile-{self.id}.pstats"
+        if stats is not None and fmt == "text":
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats("cumulative").print_stats(60)
+            return buffer.getvalue().encode(), "text/plain; charset=utf-8", f"profile-{self.id}.txt"
+        raise ValueError(f"Formato '{fmt}' no disponible para un perfil {self.mode}")
+
+
+class ProfileStore:
+    """Buffer circular de perfiles terminados."""
+
+    def __init__(self, size: int | None = None):
+        size = size if size is not None else int(os.getenv("CYBERGUARD_PROFILE_BUFFER", DEFAULT_BUFFER))
+        self._profiles: deque[Profile] = deque(maxlen=max(1, size))
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get(self, profile_id: str) -> Profile | None:
+        with self._lock:
+            return next((p for p in self._profiles if p.id == profile_id), None)
+
+    def list(self) -> list[dict]:
+        with self._lock:
+            return [p.summary() for p in reversed(self._profiles)]
+
+
+store = ProfileStore()
+
+
+def _sampler(profile: Profile, stop: threading.Event, interval: float) -> None:
+    while not stop.wait(interval):
+        profile.sample(sys._current_frames())
+
+
+@asynccontextmanager
+async def profile_request(mode: str, label: str):
+    """Perfila el bloque (el manejo de una consulta) y guarda el perfil en el buffer."""
+    loop_profiler = None
+    if mode == "cprofile":
+        mode = "sampling"
+        if _cprofile_lock.acquire(blocking=False):
+            loop_profiler = cProfile.Profile()
+            try:
+                loop_profiler.enable()
+                mode = "cprofile"
+            except ValueError:
+                # Otra herramienta de perfilado (depurador, coverage) ocupa sys.monitoring
+                loop_profiler = None
+                _cprofile_lock.release()
+    profile = Profile(mode, label)
+    profile.threads[threading.get_ident()] = "loop"
+    token = _current.set(profile)
+    started = time.perf_counter()
+    stop = threading.Event()
+    sampler = None
+    if mode == "sampling":
+        interval = float(os.getenv("CYBERGUARD_PROFILE_INTERVAL_MS", DEFAULT_INTERVAL_MS)) / 1000
+        sampler = threading.Thread(target=_sampler, args=(profile, stop, interval),
+                                   name="cyberguard-profiler", daemon=True)
+        sampler.start()
+    try:
+        yield profile
+    finally:
+        if loop_profiler is not None:
+            loop_profiler.disable()
+            profile.cprofiles.append(loop_profiler)
+            _cprofile_lock.release()
+        if sampler is not None:
+            stop.set()
+            sampler.join()
+        _current.reset(token)
+        profile.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        store.add(profile)
+
+
+@contextmanager
+def thread_scope(role: str):
+    """Incluye el hilo actual en el perfil de la consulta en curso mientras dura el bloque."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    with profile._lock:
+        profile.threads[thread_id] = role
+    thread_profiler = None
+    # Desde 3.12 el perfilador del event loop ya mide este hilo
+    if profile.mode == "cprofile" and PER_THREAD_CPROFILE:
+        thread_profiler = cProfile.Profile()
+        thread_profiler.enable()
+    try:
+        yield
+    finally:
+        if thread_profiler is not None:
+            thread_profiler.disable()
+            with profile._lock:
+                profile.cprofiles.append(thread_profiler)
+        with profile._lock:
+            profile.threads.pop(thread_id, None)
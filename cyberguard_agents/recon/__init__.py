@@ -1 +1,11 @@
-from .agent import recon_agent
+__all__ = ["recon_agent"]
+
+
+def __getattr__(name):
+    # El agente (y con el ADK y LiteLLM) se construye en el primer acceso
+    if name == "recon_agent":
+        from .agent import recon_agent
+
+        globals()["recon_agent"] = recon_agent
+        return recon_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
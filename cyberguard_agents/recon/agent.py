@@ -1,28 +1,26 @@
 """Recon Agent — Reconocimiento de dominios, DNS, WHOIS y headers HTTP."""
-import os
 from google.adk.agents import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
 
 from cyberguard_agents.tools.recon_tools import (
     dns_lookup,
     whois_lookup,
     check_http_headers,
 )
-
-MODEL = LiteLlm(
-    model="openrouter/google/gemini-2.5-flash",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    api_base="https://openrouter.ai/api/v1",
-)
+from cyberguard_agents.tools.bulk_recon import bulk_recon
+from cyberguard_agents.tools.subdomain_tools import enumerate_subdomains
+from cyberguard_agents.tools.tls_tools import check_tls
+from cyberguard_agents.tools.email_tools import analyze_email_security
+from cyberguard_agents.tools.executor import offload_tools
+from cyberguard_agents.models import get_model
 
 recon_agent = LlmAgent(
     name="recon_specialist",
-    model=MODEL,
+    model=get_model("recon"),
     description=(
         "Especialista en reconocimiento y recopilacion de informacion (OSINT). "
         "Realiza consultas DNS, WHOIS y analisis de headers de seguridad HTTP. "
         "Util para investigar dominios, verificar configuracion DNS y evaluar "
-        "la seguridad de headers de sitios web."
+        "la seguridad de headers de sitios web, tambien sobre listas de dominios."
     ),
     instruction="""Eres un especialista en reconocimiento y recopilacion de informacion (OSINT).
 
@@ -30,11 +28,19 @@ Tu rol es:
 1. Realizar consultas DNS para obtener registros A, MX, NS y TXT de dominios.
 2. Obtener informacion WHOIS de dominios e IPs (registrante, fechas, name servers).
 3. Analizar headers de seguridad HTTP de sitios web.
+4. Auditar listas de varios dominios en una sola operacion.
+5. Descubrir subdominios de un dominio por diccionario.
+6. Inspeccionar la configuracion TLS y el certificado de un servidor.
+7. Evaluar la seguridad de correo de un dominio (SPF, DMARC, DKIM, MTA-STS).
 
 Herramientas disponibles:
 - dns_lookup: Consulta registros DNS (A, MX, NS, TXT).
 - whois_lookup: Consulta WHOIS de dominio/IP.
 - check_http_headers: Analiza headers de seguridad HTTP (HSTS, CSP, X-Frame-Options, etc.).
+- bulk_recon: DNS, WHOIS y headers para una lista de dominios (maximo 100 por llamada).
+- enumerate_subdomains: Descubre subdominios por diccionario, filtrando DNS comodin.
+- check_tls: Versiones TLS, certificado (expiracion, SAN, confianza) y cifrados debiles.
+- analyze_email_security: Veredicto SPF/DMARC/DKIM/MTA-STS con grado y problemas.
 
 Formato de respuesta:
 - Indica la herramienta utilizada y los parametros (ej: "dns_lookup(domain='example.com')").
@@ -45,10 +51,23 @@ Formato de respuesta:
 Reglas:
 - Usa las herramientas apropiadas segun la consulta del usuario.
 - Para una investigacion completa de un dominio, usa dns_lookup y whois_lookup juntos.
-- Para evaluacion de seguridad web, usa check_http_headers.
+- Para preguntas de SPF, DKIM, DMARC o suplantacion de correo, usa analyze_email_security
+  (no interpretes los TXT de dns_lookup a mano).
+- Para evaluacion de seguridad web, usa check_http_headers. Revisa redirect_chain: un salto
+  intermedio sin HSTS (worst_grade_in_chain) es un hallazgo aunque la pagina final este bien.
+- Si el usuario da varios dominios, usa bulk_recon en una sola llamada en lugar de repetir herramientas.
+- Para mas de 100 dominios, indica que use el endpoint POST /recon/bulk (o /recon/bulk/upload con un archivo).
 - Explica los hallazgos en terminos comprensibles.
 - Si encuentras configuraciones inseguras, da recomendaciones claras.
 - Responde en español.
 """,
-    tools=[dns_lookup, whois_lookup, check_http_headers],
+    tools=offload_tools([
+        dns_lookup,
+        whois_lookup,
+        check_http_headers,
+        bulk_recon,
+        enumerate_subdomains,
+        check_tls,
+        analyze_email_security,
+    ]),
 )
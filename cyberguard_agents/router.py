@@ -0,0 +1,171 @@
+"""
+Pre-router determinista para /chat.
+
+Antes de pasar el mensaje al coordinador (una llamada al LLM solo para elegir
+especialista), se puntua el mensaje con patrones de intencion por agente y con
+las entidades que contiene (IP, dominio, URL, id de control CIS, indicadores de
+incidente del clasificador). Si un especialista gana con claridad el mensaje se
+envia directo a el; si la consulta es ambigua, general o no menciona un objetivo
+concreto, decide el coordinador como siempre.
+
+Configuracion por variables de entorno:
+    CYBERGUARD_FAST_ROUTER              1 habilita el pre-router, 0 lo desactiva (default: 1)
+    CYBERGUARD_ROUTER_MIN_CONFIDENCE    Confianza minima para saltar al especialista (default: 0.75)
+"""
+import os
+import re
+from dataclasses import dataclass, field
+
+from cyberguard_agents.tools.incident_tools import get_classifier, normalize_text
+
+PORT_SCANNER = "port_scanner"
+RECON = "recon_specialist"
+CIS_ADVISOR = "cis_benchmark_advisor"
+INCIDENT_RESPONDER = "incident_responder"
+
+# Puntaje minimo del ganador: por debajo la consulta se considera general
+MIN_SCORE = 3.0
+DEFAULT_MIN_CONFIDENCE = 0.75
+
+_IPV4 = re.compile(r"(?<![\w.])(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)(?:/\d{1,2})?(?![\w.])")
+_URL = re.compile(r"\bhttps?://[^\s'\"<>]+", re.IGNORECASE)
+_DOMAIN = re.compile(r"(?<![\w@.-])(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,24}(?![\w.-]*\w)")
+_CIS_ID = re.compile(r"(?<![\w.])\d{1,2}(?:\.\d{1,2}){1,3}(?![\w.])")
+_OS = re.compile(r"\b(linux|ubuntu|debian|rhel|red hat|centos|rocky|windows(?: server)?)\b")
+# Extensiones de archivo que el patron de dominio confundiria con un TLD
+_FILE_SUFFIXES = frozenset("""
+    log txt csv json jsonl gz zip pcap pcapng exe dll doc docx xls xlsx pdf sh ps1 py conf yaml yml
+    locked encrypted evtx
+""".split())
+
+# (patron, peso) por agente; los patrones se aplican al texto normalizado (sin acentos)
+INTENT_PATTERNS = {
+    PORT_SCANNER: [
+        (r"\bescane\w*|\bscan\w*", 3.0),
+        (r"\bnmap\b", 3.0),
+        (r"\bpuertos?\b|\bports?\b", 2.0),
+        (r"\bvulnerabilidad\w*|\bvulns?\b|\bcve\b", 1.0),
+        (r"\bservicios? expuestos?\b", 2.0),
+    ],
+    RECON: [
+        (r"\bdns\b|\bregistros? (?:a|mx|ns|txt)\b", 3.0),
+        (r"\bwhois\b", 3.0),
+        (r"\bheaders?\b|\bcabeceras?\b", 2.5),
+        (r"\bsubdominios?\b", 3.0),
+        (r"\btls\b|\bssl\b|\bcertificados?\b", 2.0),
+        (r"\bspf\b|\bdmarc\b|\bdkim\b|\bmta-sts\b", 3.0),
+        (r"\breconocimiento\b|\bosint\b", 2.0),
+        (r"\bdominios?\b", 1.0),
+    ],
+    CIS_ADVISOR: [
+        (r"\bcis\b", 3.0),
+        (r"\bbenchmarks?\b", 2.5),
+        (r"\bhardening\b|\bbastionado\b", 2.5),
+        (r"\bcontrol(?:es)?\b", 1.0),
+        (r"\bchecklist\b", 1.0),
+    ],
+    INCIDENT_RESPONDER: [
+        (r"\bincidentes?\b", 2.0),
+        (r"\bplaybooks?\b|\brunbooks?\b", 2.5),
+        (r"\bcomprometid\w*|\bhackead\w*|\bnos atacan\b|\bataque en curso\b", 2.0),
+        (r"\biocs?\b|\bindicadores de compromiso\b", 3.0),
+        (r"\bpcap(?:ng)?\b|\bcaptura de trafico\b", 3.0),
+        (r"\bauth\.log\b|\blogs? de (?:autenticacion|acceso|vpn)\b", 2.5),
+        (r"\balertas?\b|\bsiem\b", 1.5),
+    ],
+}
+# Agentes que solo se eligen directo si el mensaje incluye un objetivo concreto
+REQUIRED_ENTITIES = {
+    PORT_SCANNER: ("ips", "domains", "urls"),
+    RECON: ("ips", "domains", "urls"),
+    CIS_ADVISOR: ("cis_ids", "os"),
+}
+ENTITY_BONUS = 2.0
+
+_COMPILED = {
+    agent: [(re.compile(pattern), weight) for pattern, weight in patterns]
+    for agent, patterns in INTENT_PATTERNS.items()
+}
+
+
+@dataclass
+class RouteDecision:
+    """Resultado del pre-router. agent es None cuando decide el coordinador."""
+
+    agent: str | None
+    confidence: float
+    reason: str
+    scores: dict[str, float] = field(default_factory=dict)
+    entities: dict[str, list[str]] = field(default_factory=dict)
+
+
+def extract_entities(message: str) -> dict[str, list[str]]:
+    """IPs (o CIDR), URLs, dominios, ids de control CIS y sistemas operativos mencionados en el mensaje."""
+    text = message.lower()
+    urls = _URL.findall(text)
+    without_urls = _URL.sub(" ", text)
+    ips = _IPV4.findall(without_urls)
+    without_ips = _IPV4.sub(" ", without_urls)
+    domains = [d for d in _DOMAIN.findall(without_ips) if d.rsplit(".", 1)[1] not in _FILE_SUFFIXES]
+    cis_ids = _CIS_ID.findall(without_ips)
+    os_names = _OS.findall(text)
+    return {
+        key: values
+        for key, values in (("ips", ips), ("urls", urls), ("domains", domains), ("cis_ids", cis_ids),
+                            ("os", os_names))
+        if values
+    }
+
+
+def score_message(message: str, entities: dict | None = None) -> dict[str, float]:
+    """Puntaje de intencion por agente."""
+    text = normalize_text(message)
+    entities = extract_entities(message) if entities is None else entities
+    scores = {}
+    for agent, patterns in _COMPILED.items():
+        score = sum(weight for pattern, weight in patterns if pattern.search(text))
+        required = REQUIRED_ENTITIES.get(agent)
+        if required:
+            if not any(entities.get(kind) for kind in required):
+                # Sin objetivo es una pregunta conceptual: que responda el coordinador
+                score = min(score, MIN_SCORE - 0.5)
+            elif score:
+                score += ENTITY_BONUS
+        scores[agent] = score
+
+    ranked = get_classifier().score(message)
+    if ranked:
+        scores[INCIDENT_RESPONDER] += ranked[0]["score"]
+    return scores
+
+
+def router_enabled() -> bool:
+    return os.getenv("CYBERGUARD_FAST_ROUTER", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def min_confidence() -> float:
+    try:
+        return float(os.getenv("CYBERGUARD_ROUTER_MIN_CONFIDENCE", DEFAULT_MIN_CONFIDENCE))
+    except ValueError:
+        return DEFAULT_MIN_CONFIDENCE
+
+
+def route_message(message: str, threshold: float | None = None) -> RouteDecision:
+    """
+    Decide si el mensaje puede ir directo a un especialista.
+    La confianza es la fraccion del puntaje del ganador sobre la suma del ganador y el segundo.
+    """
+    if not router_enabled():
+        return RouteDecision(None, 0.0, "disabled")
+    threshold = min_confidence() if threshold is None else threshold
+    entities = extract_entities(message)
+    scores = score_message(message, entities)
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    (best, top), (_, second) = ranked[0], ranked[1]
+    scores = {agent: round(score, 2) for agent, score in scores.items() if score}
+    if top < MIN_SCORE:
+        return RouteDecision(None, 0.0, "low_score", scores, entities)
+    confidence = round(top / (top + second), 2)
+    if confidence < threshold:
+        return RouteDecision(None, confidence, "ambiguous", scores, entities)
+    return RouteDecision(best, confidence, "fast_path", scores, entities)
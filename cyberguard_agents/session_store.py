@@ -0,0 +1,344 @@
+"""
+Servicio de sesiones acotado en memoria con desborde a SQLite.
+
+InMemorySessionService guarda todas las sesiones (con cada resultado de
+herramienta, incluidos escaneos nmap grandes) hasta que alguien llama a
+DELETE /sessions, asi que la memoria crece sin limite. BoundedSessionService
+mantiene residentes solo las sesiones calientes:
+
+- Las sesiones se ordenan por ultimo acceso (LRU). Cuando se supera el maximo de
+  sesiones residentes o el presupuesto de memoria, o una sesion pasa mas de
+  idle_ttl sin usarse, se serializa a SQLite y se libera de memoria.
+- Al volver a pedirla (get_session o append_event) se rehidrata desde SQLite.
+- El tamanio de cada sesion se estima por el largo de su JSON.
+- SQLite corre en hilos, nunca en el event loop.
+
+El estado de app y de usuario (prefijos app: y user:) sigue en memoria: es chico
+y compartido entre sesiones.
+
+Configuracion por variables de entorno:
+    CYBERGUARD_SESSION_DB            Ruta del archivo SQLite (default ~/.cache/cyberguard/sessions.sqlite3)
+    CYBERGUARD_SESSION_MAX_RESIDENT  Maximo de sesiones en memoria (default 1000)
+    CYBERGUARD_SESSION_MAX_MB        Presupuesto de memoria de las sesiones residentes en MB (default 256)
+    CYBERGUARD_SESSION_IDLE_TTL      Segundos sin uso antes de bajar una sesion a SQLite (default 1800)
+    CYBERGUARD_SESSION_RETENTION     Dias que se conserva una sesion en SQLite (default 7)
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+from cyberguard_agents import metrics
+
+DEFAULT_DB_PATH = Path.home() / ".cache" / "cyberguard" / "sessions.sqlite3"
+DEFAULT_MAX_RESIDENT = 1000
+DEFAULT_MAX_MB = 256
+DEFAULT_IDLE_TTL = 1800
+DEFAULT_RETENTION_DAYS = 7
+
+SessionKey = tuple[str, str, str]
+
+
+class SessionSpillStore:
+    """Sesiones serializadas en SQLite. Seguro para usar desde varios hilos."""
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path or os.getenv("CYBERGUARD_SESSION_DB") or DEFAULT_DB_PATH).expanduser()
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " app_name TEXT NOT NULL,"
+                " user_id TEXT NOT NULL,"
+                " session_id TEXT NOT NULL,"
+                " last_update_time REAL NOT NULL,"
+                " state TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " PRIMARY KEY (app_name, user_id, session_id))"
+            )
+
+    def save(self, session: Session, payload: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                (session.app_name, session.user_id, session.id, session.last_update_time,
+                 json.dumps(session.state, default=str), payload),
+            )
+
+    def load(self, key: SessionKey) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+            ).fetchone()
+        return row[0] if row else None
+
+    def exists(self, key: SessionKey) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+            ).fetchone() is not None
+
+    def delete(self, key: SessionKey) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+
+    def list(self, app_name: str, user_id: str | None = None) -> list[tuple]:
+        """(user_id, session_id, last_update_time, state) sin cargar los eventos."""
+        query = "SELECT user_id, session_id, last_update_time, state FROM sessions WHERE app_name = ?"
+        params: tuple = (app_name,)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params += (user_id,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [(uid, sid, ts, json.loads(state)) for uid, sid, ts, state in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def purge_older_than(self, seconds: float) -> int:
+        """Elimina las sesiones sin actividad en los ultimos `seconds`. Retorna cuantas se borraron."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM sessions WHERE last_update_time < ?", (time.time() - seconds,)
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _Resident:
+    __slots__ = ("size", "last_access", "version")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.last_access = time.monotonic()
+        self.version = 0
+
+
+class BoundedSessionService(InMemorySessionService):
+    """InMemorySessionService con LRU, TTL de inactividad y presupuesto de memoria sobre SQLite."""
+
+    def __init__(
+        self,
+        store: SessionSpillStore | None = None,
+        max_resident: int | None = None,
+        max_bytes: int | None = None,
+        idle_ttl: float | None = None,
+        retention_days: float | None = None,
+    ):
+        super().__init__()
+        self.store = store or SessionSpillStore()
+        self.max_resident = int(max_resident if max_resident is not None
+                                else os.getenv("CYBERGUARD_SESSION_MAX_RESIDENT", DEFAULT_MAX_RESIDENT))
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else float(os.getenv("CYBERGUARD_SESSION_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.idle_ttl = float(idle_ttl if idle_ttl is not None
+                              else os.getenv("CYBERGUARD_SESSION_IDLE_TTL", DEFAULT_IDLE_TTL))
+        self._resident: OrderedDict[SessionKey, _Resident] = OrderedDict()
+        self._resident_bytes = 0
+        self._evict_lock = asyncio.Lock()
+        retention_days = float(retention_days if retention_days is not None
+                               else os.getenv("CYBERGUARD_SESSION_RETENTION", DEFAULT_RETENTION_DAYS))
+        if retention_days > 0:
+            self.store.purge_older_than(retention_days * 86400)
+
+    # ── Residencia ──────────────────────────
+
+    def _stored(self, key: SessionKey) -> Session | None:
+        app_name, user_id, session_id = key
+        return self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+
+    def _track(self, key: SessionKey, size: int) -> None:
+        entry = self._resident.get(key)
+        if entry is None:
+            self._resident[key] = _Resident(size)
+            self._resident_bytes += size
+        else:
+            self._resident_bytes += size - entry.size
+            entry.size = size
+            entry.version += 1
+        self._touch(key)
+
+    def _touch(self, key: SessionKey) -> None:
+        entry = self._resident.get(key)
+        if entry is not None:
+            entry.last_access = time.monotonic()
+            self._resident.move_to_end(key)
+
+    def _forget(self, key: SessionKey) -> None:
+        entry = self._resident.pop(key, None)
+        if entry is not None:
+            self._resident_bytes -= entry.size
+        app_name, user_id, session_id = key
+        users = self.sessions.get(app_name, {})
+        users.get(user_id, {}).pop(session_id, None)
+        if user_id in users and not users[user_id]:
+            del users[user_id]
+
+    def _publish(self) -> None:
+        metrics.set_gauge("sessions_resident", len(self._resident))
+        metrics.set_gauge("sessions_resident_bytes", self._resident_bytes)
+
+    async def _ensure_resident(self, key: SessionKey) -> bool:
+        """Rehidrata la sesion desde SQLite si no esta en memoria. Retorna False si no existe."""
+        if key in self._resident:
+            return True
+        payload = await asyncio.to_thread(self.store.load, key)
+        if key in self._resident:
+            # Otra corrutina la rehidrato mientras se leia SQLite
+            return True
+        if payload is None:
+            return False
+        session = Session.model_validate_json(payload)
+        self.sessions.setdefault(key[0], {}).setdefault(key[1], {})[key[2]] = session
+        self._track(key, len(payload))
+        metrics.increment("sessions_rehydrated_total")
+        return True
+
+    async def _spill(self, key: SessionKey, reason: str) -> None:
+        entry = self._resident.get(key)
+        session = self._stored(key)
+        if entry is None or session is None:
+            return
+        version = entry.version
+        payload = session.model_dump_json()
+        await asyncio.to_thread(self.store.save, session, payload)
+        # Si la sesion recibio eventos mientras se escribia, se queda en memoria
+        if self._resident.get(key) is entry and entry.version == version:
+            self._forget(key)
+            metrics.increment("sessions_spilled_total", reason=reason)
+
+    async def _enforce(self, keep: SessionKey | None = None) -> None:
+        """Baja a SQLite las sesiones inactivas y las menos usadas hasta cumplir los limites."""
+        async with self._evict_lock:
+            now = time.monotonic()
+            while self._resident:
+                key, entry = next(iter(self._resident.items()))
+                if key == keep:
+                    if len(self._resident) == 1:
+                        break
+                    self._resident.move_to_end(key)
+                    continue
+                if now - entry.last_access > self.idle_ttl:
+                    reason = "idle"
+                elif len(self._resident) > self.max_resident:
+                    reason = "lru"
+                elif self._resident_bytes > self.max_bytes:
+                    reason = "memory"
+                else:
+                    break
+                await self._spill(key, reason)
+                if key in self._resident:
+                    # Se modifico durante la escritura: deja de ser la menos usada
+                    self._touch(key)
+        self._publish()
+
+    # ── API de BaseSessionService ───────────
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id else None
+        if session_id:
+            key = (app_name, user_id, session_id)
+            if key not in self._resident and await asyncio.to_thread(self.store.exists, key):
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        key = (app_name, user_id, session.id)
+        self._track(key, len(self._stored(key).model_dump_json()))
+        await self._enforce(keep=key)
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id.strip() if session_id else session_id)
+        if not await self._ensure_resident(key):
+            return None
+        self._touch(key)
+        session = await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        await self._enforce(keep=key)
+        return session
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        await self._ensure_resident(key)
+        event = await super().append_event(session=session, event=event)
+        entry = self._resident.get(key)
+        if entry is not None:
+            self._track(key, entry.size + len(event.model_dump_json()))
+        await self._enforce(keep=key)
+        return event
+
+    async def list_sessions(
+        self, *, app_name: str, user_id: Optional[str] = None
+    ) -> ListSessionsResponse:
+        response = await super().list_sessions(app_name=app_name, user_id=user_id)
+        resident = {(s.user_id, s.id) for s in response.sessions}
+        for uid, sid, last_update_time, state in await asyncio.to_thread(self.store.list, app_name, user_id):
+            if (uid, sid) in resident:
+                continue
+            session = Session(app_name=app_name, user_id=uid, id=sid, state=state,
+                              last_update_time=last_update_time)
+            response.sessions.append(self._merge_state(app_name, uid, session))
+        response.sessions.sort(key=lambda s: (s.last_update_time, s.user_id, s.id))
+        return response
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id.strip() if session_id else session_id)
+        self._forget(key)
+        await asyncio.to_thread(self.store.delete, key)
+        self._publish()
+
+    async def flush(self) -> None:
+        """Escribe en SQLite todas las sesiones residentes (sin liberarlas)."""
+        for key in list(self._resident):
+            session = self._stored(key)
+            if session is not None:
+                await asyncio.to_thread(self.store.save, session, session.model_dump_json())
+
+    async def close(self) -> None:
+        await self.flush()
+        self.store.close()
+
+    def stats(self) -> dict:
+        return {
+            "resident_sessions": len(self._resident),
+            "resident_bytes": self._resident_bytes,
+            "max_resident": self.max_resident,
+            "max_bytes": self.max_bytes,
+            "idle_ttl": self.idle_ttl,
+            "stored_sessions": self.store.count(),
+        }
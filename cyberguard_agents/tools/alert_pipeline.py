@@ -0,0 +1,379 @@
+"""
+Clasificacion masiva de alertas exportadas de un SIEM (JSONL o CSV).
+
+Lee el archivo en streaming, clasifica las alertas en lotes con un pool de
+procesos usando el mismo clasificador que classify_incident, y emite cada
+registro clasificado junto con conteos por tipo y severidad que se actualizan
+conforme avanza. Al agente solo le llega el resumen, nunca las alertas crudas:
+los ejemplos de alertas criticas van recortados y con las credenciales
+enmascaradas, y summarize_alert_export solo lee exports de CYBERGUARD_EXPORT_DIR.
+
+En el servidor (POST /incidents/alerts/classify y summarize_alert_export) los
+lotes van a un unico pool de procesos compartido que se crea con la primera
+consulta grande y se cierra al apagar la API; un export de un solo lote se
+clasifica en el mismo hilo sin tocar el pool. match_iocs reparte sus bloques de
+logs en el mismo pool.
+
+Configuracion por variables de entorno:
+    CYBERGUARD_ALERT_WORKERS      Procesos del pool compartido del servidor (default: min(4, CPUs))
+    CYBERGUARD_ALERT_MP_CONTEXT   Contexto de multiprocessing del pool (default 'spawn')
+
+Uso desde la linea de comandos:
+
+    python -m cyberguard_agents.tools.alert_pipeline alertas.jsonl -o clasificadas.jsonl
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from cyberguard_agents.tools.file_access import EXPORT_DIR_ENV, allowed_file, outside_message
+
+# Campos de texto que se concatenan para clasificar una alerta
+TEXT_FIELDS = (
+    "description", "message", "msg", "title", "summary", "rule", "rule_name",
+    "rule.name", "signature", "alert", "event", "name", "category",
+)
+
+DEFAULT_CHUNK_SIZE = 1000
+# Ejemplos de alertas criticas que se incluyen en el resumen para el agente
+MAX_EXAMPLES = 5
+MAX_EXAMPLE_CHARS = 200
+# 'spawn' evita heredar hilos del servidor en los procesos hijos
+MP_CONTEXT = os.getenv("CYBERGUARD_ALERT_MP_CONTEXT", "spawn")
+# Valores de credenciales que aparecen en mensajes de alerta y no deben llegar al modelo
+_SECRET = re.compile(
+    r"(?i)\b(password|passwd|pwd|passphrase|secret|token|api[_-]?key|authorization|cookie|session)"
+    r"(\s*[=:]\s*)(?:(?:basic|bearer)\s+)?[^\s|,;&]+"
+)
+# Tope de procesos del pool compartido del servidor
+DEFAULT_SERVER_WORKERS = 4
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+# ── Lectura ─────────────────────────────────
+
+def _open_text(source, name: str) -> io.TextIOBase:
+    """Abre una ruta o un archivo binario como texto, descomprimiendo si es .gz."""
+    if name.endswith(".gz"):
+        return gzip.open(source, "rt", encoding="utf-8", errors="replace", newline="")
+    if isinstance(source, (str, Path)):
+        return open(source, encoding="utf-8", errors="replace", newline="")
+    return io.TextIOWrapper(source, encoding="utf-8", errors="replace", newline="")
+
+
+def _format_for(name: str) -> str:
+    suffixes = [s for s in Path(name).suffixes if s != ".gz"]
+    return "csv" if suffixes and suffixes[-1].lower() == ".csv" else "jsonl"
+
+
+def iter_alert_records(source: str | Path | Iterable[str], fmt: str | None = None) -> Iterator[dict]:
+    """
+    Genera alertas como dicts desde un archivo JSONL/CSV (opcionalmente .gz)
+    o desde un iterable de lineas. `fmt` ('jsonl' o 'csv') se deduce de la extension.
+    """
+    if isinstance(source, (str, Path)):
+        with _open_text(source, str(source)) as f:
+            yield from iter_alert_records(f, fmt or _format_for(str(source)))
+        return
+
+    if fmt == "csv":
+        yield from csv.DictReader(source)
+        return
+
+    for line in source:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = {"message": line}
+        if isinstance(record, dict):
+            yield record
+
+
+def iter_uploaded_alerts(fileobj, filename: str) -> Iterator[dict]:
+    """Como iter_alert_records, para un archivo binario subido (formato segun `filename`)."""
+    with _open_text(fileobj, filename) as f:
+        yield from iter_alert_records(f, _format_for(filename))
+
+
+def alert_text(record: dict) -> str:
+    """Texto clasificable de una alerta (soporta campos anidados tipo 'rule.name')."""
+    parts = []
+    for field in TEXT_FIELDS:
+        value = record
+        for key in field.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        if isinstance(value, str) and value:
+            parts.append(value)
+    return " | ".join(parts)
+
+
+def redact_sample(text: str, limit: int) -> str:
+    """Muestra corta de una alerta para el agente: credenciales enmascaradas y a lo sumo `limit` caracteres."""
+    text = " ".join(_SECRET.sub(r"\1\2[redactado]", text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+# ── Clasificacion ───────────────────────────
+
+def _classify_texts(texts: list[str]) -> list[tuple[str | None, str | None, float]]:
+    """Clasifica un lote. Corre dentro de los procesos del pool."""
+    from cyberguard_agents.tools.incident_tools import INCIDENT_PLAYBOOKS, get_classifier
+
+    classifier = get_classifier()
+    results = []
+    for text in texts:
+        ranked = classifier.score(text)
+        if ranked:
+            incident_type = ranked[0]["incident_type"]
+            results.append((incident_type, INCIDENT_PLAYBOOKS[incident_type]["severity"],
+                            ranked[0]["confidence"]))
+        else:
+            results.append((None, None, 0.0))
+    return results
+
+
+def _chunks(records: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def alert_workers() -> int:
+    """Procesos del pool compartido del servidor."""
+    default = min(DEFAULT_SERVER_WORKERS, os.cpu_count() or 1)
+    return max(1, int(os.getenv("CYBERGUARD_ALERT_WORKERS", default)))
+
+
+def get_alert_pool() -> ProcessPoolExecutor:
+    """Pool de procesos compartido por las consultas del servidor; los procesos arrancan con el primer lote."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=alert_workers(),
+                                        mp_context=multiprocessing.get_context(MP_CONTEXT))
+        return _pool
+
+
+def shutdown_alert_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def iter_classified(
+    records: Iterable[dict],
+    workers: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    pool: ProcessPoolExecutor | None = None,
+) -> Iterator[dict]:
+    """
+    Clasifica alertas en orden de entrada y agrega a cada registro la clave
+    `classification` (incident_type, severity, confidence). Con workers > 1 los lotes se
+    reparten en un pool de procesos, con como maximo 2 lotes por proceso en
+    vuelo para mantener la memoria acotada. `pool` reutiliza un pool existente (no se
+    cierra al terminar); sin el se crea uno propio. Si todo cabe en un lote no se usa pool.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    def annotate(chunk, results):
+        for record, (incident_type, severity, confidence) in zip(chunk, results):
+            record["classification"] = {
+                "incident_type": incident_type,
+                "severity": severity,
+                "confidence": confidence,
+            }
+            yield record
+
+    chunks = _chunks(records, chunk_size)
+    head = list(itertools.islice(chunks, 2)) if workers > 1 else []
+    if workers <= 1 or len(head) < 2:
+        for chunk in itertools.chain(head, chunks):
+            yield from annotate(chunk, _classify_texts([alert_text(r) for r in chunk]))
+        return
+
+    def classify_in(executor):
+        pending = deque()
+        try:
+            for chunk in itertools.chain(head, chunks):
+                pending.append((chunk, executor.submit(_classify_texts, [alert_text(r) for r in chunk])))
+                if len(pending) >= workers * 2:
+                    chunk_done, future = pending.popleft()
+                    yield from annotate(chunk_done, future.result())
+            while pending:
+                chunk_done, future = pending.popleft()
+                yield from annotate(chunk_done, future.result())
+        finally:
+            # Si el cliente corta el stream, los lotes en cola no ocupan el pool compartido
+            for _, future in pending:
+                future.cancel()
+
+    if pool is not None:
+        yield from classify_in(pool)
+        return
+    context = multiprocessing.get_context(MP_CONTEXT)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as own_pool:
+        yield from classify_in(own_pool)
+
+
+class AlertSummary:
+    """Conteos incrementales de una clasificacion masiva."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0
+        self.by_type = Counter()
+        self.by_severity = Counter()
+        self.examples: dict[str, list] = {}
+
+    def add(self, record: dict) -> None:
+        self.total += 1
+        classification = record["classification"]
+        incident_type = classification["incident_type"] or "unclassified"
+        self.by_type[incident_type] += 1
+        self.by_severity[classification["severity"] or "unknown"] += 1
+        if classification["severity"] == "critical":
+            examples = self.examples.setdefault(incident_type, [])
+            if len(examples) < MAX_EXAMPLES:
+                examples.append(redact_sample(alert_text(record), MAX_EXAMPLE_CHARS))
+
+    def snapshot(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "alerts_processed": self.total,
+            "by_type": dict(self.by_type.most_common()),
+            "by_severity": dict(self.by_severity.most_common()),
+            "elapsed_seconds": round(elapsed, 3),
+            "alerts_per_second": round(self.total / elapsed, 1) if elapsed else None,
+        }
+
+
+def iter_classified_ndjson(
+    records: Iterable[dict],
+    workers: int | None = None,
+    summary_every: int = 1000,
+    pool: ProcessPoolExecutor | None = None,
+) -> Iterator[str]:
+    """
+    Lineas NDJSON con cada alerta clasificada ({"type": "alert", "alert": {...}}),
+    conteos parciales cada `summary_every` alertas y un resumen final
+    ({"type": "summary", ...}).
+    """
+    summary = AlertSummary()
+    for record in iter_classified(records, workers=workers, pool=pool):
+        summary.add(record)
+        yield json.dumps({"type": "alert", "alert": record}, ensure_ascii=False, default=str) + "\n"
+        if summary_every and summary.total % summary_every == 0:
+            yield json.dumps({"type": "summary", "final": False, **summary.snapshot()}) + "\n"
+    yield json.dumps({"type": "summary", "final": True, **summary.snapshot()}) + "\n"
+
+
+def classify_alert_file(
+    path: str | Path,
+    output: str | Path | None = None,
+    workers: int | None = None,
+    progress_every: int = 0,
+    progress=None,
+    pool: ProcessPoolExecutor | None = None,
+) -> dict:
+    """
+    Clasifica un export completo. Si se indica `output`, escribe las alertas
+    clasificadas en JSONL. `progress(snapshot)` se llama cada `progress_every` alertas.
+    """
+    summary = AlertSummary()
+    out = open(output, "w", encoding="utf-8") if output else None
+    try:
+        for record in iter_classified(iter_alert_records(path), workers=workers, pool=pool):
+            summary.add(record)
+            if out:
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            if progress and progress_every and summary.total % progress_every == 0:
+                progress(summary.snapshot())
+    finally:
+        if out:
+            out.close()
+    result = summary.snapshot()
+    result["critical_examples"] = summary.examples
+    return result
+
+
+# ── Herramienta del agente ──────────────────
+
+async def summarize_alert_export(path: str) -> dict:
+    """
+    Clasifica un export de alertas del SIEM (JSONL o CSV) y retorna solo el resumen.
+
+    Usa esta herramienta cuando el usuario tenga un archivo con muchas alertas
+    (cientos o miles) y quiera saber que tipos de incidente contiene y con que
+    severidad. Las alertas individuales no se devuelven.
+
+    Args:
+        path: Archivo exportado dentro del directorio de exports del servidor
+              (ejemplo: '/var/exports/alertas.jsonl', 'siem.csv').
+
+    Returns:
+        dict: Conteos por tipo de incidente y severidad, throughput y ejemplos de alertas criticas.
+    """
+    export = allowed_file(path, EXPORT_DIR_ENV)
+    if export is None:
+        return {"status": "error", "message": outside_message("exports de alertas", EXPORT_DIR_ENV)}
+    try:
+        summary = await asyncio.to_thread(
+            classify_alert_file, export, workers=alert_workers(), pool=get_alert_pool(),
+        )
+    except Exception as e:
+        return {"status": "error", "message": f"Error procesando '{path}': {e}"}
+    return {"status": "success", "path": path, **summary}
+
+
+# ── CLI ─────────────────────────────────────
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Clasifica alertas exportadas de un SIEM (JSONL/CSV) con el clasificador de CyberGuard.",
+    )
+    parser.add_argument("input", help="Archivo de alertas (.jsonl, .csv, opcionalmente .gz)")
+    parser.add_argument("-o", "--output", help="Archivo JSONL de salida con las alertas clasificadas")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos (default: CPUs)")
+    parser.add_argument("--progress-every", type=int, default=10_000,
+                        help="Imprime conteos parciales cada N alertas (0 = nunca)")
+    args = parser.parse_args(argv)
+
+    def progress(snapshot):
+        print(json.dumps(snapshot), file=sys.stderr, flush=True)
+
+    summary = classify_alert_file(
+        args.input, args.output, workers=args.workers,
+        progress_every=args.progress_every, progress=progress,
+    )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Reconocimiento masivo de dominios: DNS, WHOIS, headers HTTP y TLS en lote.
+
+Ejecuta las herramientas de recon_tools sobre listas grandes de dominios con
+limites de concurrencia independientes por tipo de consulta (WHOIS es mucho
+mas sensible a throttling que DNS) y entrega un resultado por dominio en
+cuanto termina, para poder emitirlo como NDJSON sin acumular el portafolio
+completo en memoria.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable
+
+from cyberguard_agents.tools.recon_tools import (
+    check_http_headers,
+    dns_lookup,
+    whois_lookup,
+)
+from cyberguard_agents.tools.tls_tools import check_tls
+
+CHECKS = ("dns", "whois", "headers", "tls")
+# Checks que se ejecutan cuando no se especifican
+DEFAULT_CHECKS = ("dns", "whois", "headers")
+
+# Concurrencia maxima por tipo de consulta
+DEFAULT_LIMITS = {
+    "dns": 50,
+    "whois": 4,
+    "headers": 20,
+    "tls": 20,
+}
+
+# Limite de dominios para la herramienta del agente (la API no tiene limite)
+MAX_TOOL_DOMAINS = 100
+
+
+def normalize_domain(raw: str) -> str | None:
+    """Limpia una entrada de la lista: quita esquema, ruta, puerto y comentarios."""
+    value = raw.split("#", 1)[0].strip().strip(",;").strip()
+    if not value:
+        return None
+    # Formato CSV: el dominio es la primera columna
+    value = value.split(",", 1)[0].strip().strip('"').lower()
+    if "://" in value:
+        value = value.split("://", 1)[1]
+    value = value.split("/", 1)[0].split(":", 1)[0].rstrip(".")
+    if value.startswith("*."):
+        value = value[2:]
+    if not value or "." not in value or " " in value:
+        return None
+    return value
+
+
+def iter_domains(lines: Iterable[str]) -> Iterable[str]:
+    """Genera dominios normalizados y sin duplicados a partir de lineas de texto."""
+    seen = set()
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="ignore")
+        domain = normalize_domain(line)
+        if domain and domain not in seen:
+            seen.add(domain)
+            yield domain
+
+
+def parse_checks(checks: Iterable[str] | str | None) -> tuple[str, ...]:
+    """Valida la seleccion de consultas ('dns', 'whois', 'headers', 'tls')."""
+    if checks is None:
+        return DEFAULT_CHECKS
+    if isinstance(checks, str):
+        checks = checks.split(",")
+    selected = tuple(c.strip().lower() for c in checks if c.strip())
+    invalid = [c for c in selected if c not in CHECKS]
+    if invalid:
+        raise ValueError(
+            f"Checks no validos: {', '.join(invalid)}. Opciones: {', '.join(CHECKS)}"
+        )
+    return selected or DEFAULT_CHECKS
+
+
+async def _run_check(kind: str, domain: str, semaphore: asyncio.Semaphore, executor) -> dict:
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        try:
+            if kind == "dns":
+                return await loop.run_in_executor(executor, dns_lookup, domain)
+            if kind == "whois":
+                return await whois_lookup(domain)
+            if kind == "tls":
+                return await check_tls(domain)
+            return await check_http_headers(f"https://{domain}")
+        except Exception as e:
+            return {"status": "error", "message": f"Error en {kind} para '{domain}': {e}"}
+
+
+async def _recon_domain(domain: str, checks, semaphores, executor) -> dict:
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        _run_check(kind, domain, semaphores[kind], executor) for kind in checks
+    ))
+    record = {"domain": domain}
+    record.update(dict(zip(checks, results)))
+    record["status"] = (
+        "success" if all(r.get("status") == "success" for r in results) else "partial"
+    )
+    record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return record
+
+
+async def iter_bulk_recon(
+    domains: Iterable[str],
+    checks: Iterable[str] | str | None = None,
+    limits: dict | None = None,
+    max_in_flight: int | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Ejecuta reconocimiento sobre muchos dominios y produce un resultado por dominio
+    en orden de finalizacion.
+
+    La lista de dominios se consume de forma perezosa: nunca hay mas de
+    `max_in_flight` dominios en proceso, asi que la memoria se mantiene plana
+    aunque la entrada tenga miles de dominios.
+    """
+    checks = parse_checks(checks)
+    limits = {**DEFAULT_LIMITS, **(limits or {})}
+    semaphores = {kind: asyncio.Semaphore(limits[kind]) for kind in checks}
+    if max_in_flight is None:
+        max_in_flight = max(limits[kind] for kind in checks) * 2
+
+    # whois, headers y tls son asincronos y no ocupan hilos de este pool
+    workers = limits["dns"] if "dns" in checks else 1
+    domain_iter = iter(domains)
+    pending = set()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-recon") as executor:
+        try:
+            while True:
+                while len(pending) < max_in_flight:
+                    domain = next(domain_iter, None)
+                    if domain is None:
+                        break
+                    pending.add(asyncio.ensure_future(
+                        _recon_domain(domain, checks, semaphores, executor)
+                    ))
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+async def iter_bulk_recon_ndjson(domains: Iterable[str], **kwargs) -> AsyncIterator[str]:
+    """Igual que iter_bulk_recon pero serializa cada resultado como una linea NDJSON."""
+    async for record in iter_bulk_recon(domains, **kwargs):
+        yield json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+def _summarize(record: dict) -> dict:
+    """Reduce el resultado de un dominio a los campos relevantes para el agente."""
+    summary = {"domain": record["domain"], "status": record["status"]}
+
+    dns = record.get("dns")
+    if dns:
+        if dns.get("status") == "success":
+            records = dns["records"]
+            summary["dns"] = {
+                "A": records["A"],
+                "MX": [mx["host"] for mx in records["MX"]],
+                "NS": records["NS"],
+            }
+        else:
+            summary["dns"] = {"error": dns.get("message")}
+
+    whois = record.get("whois")
+    if whois:
+        if whois.get("status") == "success":
+            summary["whois"] = {
+                "registrar": whois["whois"]["registrar"],
+                "expiration_date": whois["whois"]["expiration_date"],
+            }
+        else:
+            summary["whois"] = {"error": whois.get("message")}
+
+    headers = record.get("headers")
+    if headers:
+        if headers.get("status") == "success":
+            summary["headers"] = {
+                "grade": headers["grade"],
+                "worst_grade_in_chain": headers["worst_grade_in_chain"],
+                "security_score": headers["security_score"],
+                "missing": [
+                    h["header"] for h in headers["headers_analysis"] if h["status"] == "missing"
+                ],
+            }
+        else:
+            summary["headers"] = {"error": headers.get("message")}
+
+    tls = record.get("tls")
+    if tls:
+        if tls.get("status") == "success":
+            summary["tls"] = {
+                "grade": tls["grade"],
+                "days_to_expiry": tls["certificate"]["days_to_expiry"],
+                "issues": tls["issues"],
+            }
+        else:
+            summary["tls"] = {"error": tls.get("message")}
+
+    return summary
+
+
+async def bulk_recon(domains: list[str], checks: str = "dns,whois,headers") -> dict:
+    """
+    Realiza reconocimiento (DNS, WHOIS, headers HTTP y TLS) sobre varios dominios a la vez.
+
+    Usa esta herramienta cuando el usuario quiera auditar una lista de dominios
+    en lugar de uno solo. Para portafolios grandes (mas de 100 dominios) indica
+    al usuario que use el endpoint POST /recon/bulk de la API, que transmite los
+    resultados en NDJSON.
+
+    Args:
+        domains: Lista de dominios a analizar (ejemplo: ['example.com', 'example.org']).
+        checks: Consultas a ejecutar separadas por coma. Opciones: 'dns', 'whois', 'headers', 'tls'.
+
+    Returns:
+        dict: Resumen por dominio y conteo de grados de headers de seguridad.
+    """
+    try:
+        selected = parse_checks(checks)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    targets = list(iter_domains(domains))
+    if not targets:
+        return {"status": "error", "message": "No se recibio ningun dominio valido."}
+    if len(targets) > MAX_TOOL_DOMAINS:
+        return {
+            "status": "error",
+            "message": (
+                f"Se recibieron {len(targets)} dominios; el limite de la herramienta es "
+                f"{MAX_TOOL_DOMAINS}. Usa el endpoint POST /recon/bulk para portafolios grandes."
+            ),
+        }
+
+    results = []
+    grades = {}
+    async for record in iter_bulk_recon(targets, checks=selected):
+        summary = _summarize(record)
+        results.append(summary)
+        grade = summary.get("headers", {}).get("grade")
+        if grade:
+            grades[grade] = grades.get(grade, 0) + 1
+
+    order = {domain: i for i, domain in enumerate(targets)}
+    results.sort(key=lambda r: order[r["domain"]])
+
+    return {
+        "status": "success",
+        "domains_count": len(targets),
+        "checks": list(selected),
+        "header_grades": grades,
+        "results": results,
+    }
@@ -0,0 +1,290 @@
+"""
+Correlacion de alertas en incidentes por indicadores compartidos.
+
+Cada alerta aporta sus indicadores (IP de origen, usuario, dominio, hash, host).
+Un indice invertido indicador -> alertas y una estructura union-find agrupan en
+el mismo incidente las alertas que comparten un indicador y estan cerca en el
+tiempo: dentro de cada indicador las alertas se ordenan por hora y se unen las
+consecutivas separadas por menos de la ventana. El costo es casi lineal en el
+numero de alertas.
+
+Los indicadores que aparecen en demasiadas alertas (gateway, proxy, cuentas de
+servicio) se ignoran para no fusionar todo en un solo incidente.
+
+Cada incidente recibe una sola clasificacion (suma de los puntajes del
+clasificador de sus alertas) y un solo playbook. La alerta de muestra de cada
+incidente va recortada y con las credenciales enmascaradas, y la herramienta del
+agente solo lee exports de CYBERGUARD_EXPORT_DIR (ver file_access.py).
+"""
+import asyncio
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable
+
+from cyberguard_agents.tools.alert_pipeline import alert_text, iter_alert_records, redact_sample
+from cyberguard_agents.tools.file_access import EXPORT_DIR_ENV, allowed_file, outside_message
+from cyberguard_agents.tools.incident_tools import INCIDENT_PLAYBOOKS, get_classifier, get_incident_playbook
+from cyberguard_agents.tools.log_tools import parse_timestamp, record_field
+
+DEFAULT_WINDOW = 3600
+# Un indicador presente en mas alertas que esto se considera comun y no correlaciona
+MAX_INDICATOR_FANOUT = 5000
+MAX_SAMPLE_CHARS = 160
+# Incidentes devueltos al agente
+MAX_TOOL_INCIDENTS = 20
+
+SEVERITY_ORDER = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+
+INDICATOR_FIELDS = {
+    "ip": ("src_ip", "source_ip", "source.ip", "src", "client_ip", "srcaddr", "ip"),
+    "user": ("user", "username", "user.name", "account", "recipient", "email", "destination.user.name"),
+    "domain": ("domain", "sender_domain", "url.domain", "dns.question.name", "query"),
+    "url": ("url", "url.full", "link"),
+    "sender": ("sender", "from", "email.from.address"),
+    "hash": ("hash", "md5", "sha1", "sha256", "file_hash", "file.hash.md5", "file.hash.sha1",
+             "file.hash.sha256"),
+    "host": ("host", "hostname", "host.name", "device", "computer", "agent.hostname"),
+}
+TIMESTAMP_FIELDS = ("@timestamp", "timestamp", "time", "ts", "date", "event.created")
+
+_TEXT_IPV4 = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b(?![.-]\w)")
+_TEXT_HASH = re.compile(r"\b(?:[0-9a-fA-F]{64}|[0-9a-fA-F]{40}|[0-9a-fA-F]{32})\b")
+_TEXT_URL_HOST = re.compile(r"\bhttps?://(?:[^/\s@]+@)?([A-Za-z0-9.-]+\.[A-Za-z]{2,63})", re.IGNORECASE)
+
+
+def _iso(ts: float | None) -> str | None:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts is not None else None
+
+
+def _url_host(value: str) -> str | None:
+    m = _TEXT_URL_HOST.search(value)
+    return m.group(1).lower() if m else None
+
+
+def extract_indicators(record: dict, text: str | None = None) -> set[str]:
+    """
+    Indicadores de una alerta como 'tipo:valor'. Combina campos estructurados
+    con IPs, hashes y hosts de URLs encontrados en el texto.
+    """
+    indicators = set()
+    for kind, fields in INDICATOR_FIELDS.items():
+        value = record_field(record, fields)
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        value = str(value).strip().lower()
+        if not value or value in ("-", "?", "n/a", "unknown"):
+            continue
+        if kind == "url":
+            host = _url_host(value)
+            if host:
+                indicators.add(f"domain:{host}")
+        elif kind == "sender":
+            indicators.add(f"user:{value}")
+            if "@" in value:
+                indicators.add(f"domain:{value.rsplit('@', 1)[1].strip('>')}")
+        else:
+            indicators.add(f"{kind}:{value}")
+
+    text = text if text is not None else alert_text(record)
+    for ip in _TEXT_IPV4.findall(text):
+        indicators.add(f"ip:{ip}")
+    for digest in _TEXT_HASH.findall(text):
+        indicators.add(f"hash:{digest.lower()}")
+    for host in _TEXT_URL_HOST.findall(text):
+        indicators.add(f"domain:{host.lower()}")
+    return indicators
+
+
+class UnionFind:
+    """Union-find con compresion de caminos (halving) y union por tamanio."""
+
+    def __init__(self):
+        self.parent: list[int] = []
+        self.size: list[int] = []
+
+    def add(self) -> int:
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        return len(self.parent) - 1
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> int:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+
+class AlertCorrelator:
+    """
+    Acumula alertas con add() y las agrupa en incidentes con incidents().
+    Por alerta solo se guarda el timestamp, los puntajes del clasificador y una muestra de texto.
+    """
+
+    def __init__(self, window: float = DEFAULT_WINDOW, max_fanout: int = MAX_INDICATOR_FANOUT,
+                 ignore: Iterable[str] = ()):
+        self.window = window
+        self.max_fanout = max_fanout
+        self.ignore = {i.lower() for i in ignore}
+        self.classifier = get_classifier()
+        self.timestamps: list[float | None] = []
+        self.scores: list[tuple] = []
+        self.samples: list[str] = []
+        self.index: dict[str, list[int]] = {}
+
+    def add(self, record: dict) -> int:
+        alert_id = len(self.timestamps)
+        text = alert_text(record)
+        self.timestamps.append(parse_timestamp(record_field(record, TIMESTAMP_FIELDS)))
+        self.scores.append(tuple((s["incident_type"], s["score"]) for s in self.classifier.score(text)))
+        self.samples.append(text[:MAX_SAMPLE_CHARS])
+        for indicator in extract_indicators(record, text):
+            if indicator.split(":", 1)[1] not in self.ignore:
+                self.index.setdefault(indicator, []).append(alert_id)
+        return alert_id
+
+    def _cluster(self) -> tuple[UnionFind, list[tuple[str, int]]]:
+        uf = UnionFind()
+        for _ in self.timestamps:
+            uf.add()
+        ts = self.timestamps
+        common = []
+        for indicator, ids in self.index.items():
+            if len(ids) < 2:
+                continue
+            if len(ids) > self.max_fanout:
+                common.append((indicator, len(ids)))
+                continue
+            ordered = sorted(ids, key=lambda i: ts[i] if ts[i] is not None else float("-inf"))
+            for prev, cur in zip(ordered, ordered[1:]):
+                if ts[prev] is None or ts[cur] is None or ts[cur] - ts[prev] <= self.window:
+                    uf.union(prev, cur)
+        common.sort(key=lambda c: -c[1])
+        return uf, common
+
+    def incidents(self) -> dict:
+        """Agrupa las alertas y retorna los incidentes ordenados por severidad y tamanio."""
+        uf, common = self._cluster()
+        clusters: dict[int, dict] = {}
+        for alert_id, ts in enumerate(self.timestamps):
+            root = uf.find(alert_id)
+            cluster = clusters.get(root)
+            if cluster is None:
+                cluster = clusters[root] = {
+                    "alerts": 0, "first": ts, "last": ts, "scores": Counter(), "sample": self.samples[alert_id],
+                }
+            cluster["alerts"] += 1
+            if ts is not None:
+                cluster["first"] = ts if cluster["first"] is None else min(cluster["first"], ts)
+                cluster["last"] = ts if cluster["last"] is None else max(cluster["last"], ts)
+            for incident_type, score in self.scores[alert_id]:
+                cluster["scores"][incident_type] += score
+
+        # Indicadores compartidos por cada incidente (los que correlacionaron)
+        shared: dict[int, Counter] = {}
+        for indicator, ids in self.index.items():
+            if 2 <= len(ids) <= self.max_fanout:
+                for root, count in Counter(uf.find(i) for i in ids).items():
+                    if count >= 2:
+                        shared.setdefault(root, Counter())[indicator] = count
+
+        incidents = []
+        for root, cluster in clusters.items():
+            total = sum(cluster["scores"].values())
+            if total:
+                incident_type, score = cluster["scores"].most_common(1)[0]
+                severity = INCIDENT_PLAYBOOKS[incident_type]["severity"]
+            else:
+                incident_type, score, severity = None, 0.0, None
+            incidents.append({
+                "incident_type": incident_type,
+                "severity": severity,
+                "confidence": round(score / total, 2) if total else 0.0,
+                "related_types": [t for t, _ in cluster["scores"].most_common(4)[1:]],
+                "alerts": cluster["alerts"],
+                "first_seen": _iso(cluster["first"]),
+                "last_seen": _iso(cluster["last"]),
+                "shared_indicators": [i for i, _ in shared.get(root, Counter()).most_common(10)],
+                "sample_alert": redact_sample(cluster["sample"], MAX_SAMPLE_CHARS),
+            })
+        incidents.sort(key=lambda i: (SEVERITY_ORDER.get(i["severity"], 9), -i["alerts"]))
+        for number, incident in enumerate(incidents, 1):
+            incident["incident_id"] = f"INC-{number:05d}"
+
+        return {
+            "alerts": len(self.timestamps),
+            "incidents": incidents,
+            "incident_count": len(incidents),
+            "common_indicators_ignored": [{"indicator": i, "alerts": n} for i, n in common[:20]],
+        }
+
+
+def correlate(records: Iterable[dict], window: float = DEFAULT_WINDOW,
+              max_fanout: int = MAX_INDICATOR_FANOUT, ignore: Iterable[str] = ()) -> dict:
+    correlator = AlertCorrelator(window, max_fanout, ignore)
+    for record in records:
+        correlator.add(record)
+    return correlator.incidents()
+
+
+def attach_playbooks(result: dict, max_incidents: int | None = None) -> dict:
+    """
+    Recorta la lista de incidentes y agrega un playbook por tipo de incidente
+    (compartido entre incidentes del mismo tipo, sin repetirlo).
+    """
+    incidents = result["incidents"][:max_incidents] if max_incidents else result["incidents"]
+    playbooks = {}
+    for incident in incidents:
+        incident_type = incident["incident_type"]
+        if incident_type and incident_type not in playbooks:
+            playbooks[incident_type] = get_incident_playbook(incident_type)
+    return {
+        **result,
+        "incidents": incidents,
+        "incidents_truncated": len(incidents) < result["incident_count"],
+        "unclassified_incidents": sum(1 for i in result["incidents"] if i["incident_type"] is None),
+        "playbooks": playbooks,
+    }
+
+
+# ── Herramienta del agente ──────────────────
+
+async def correlate_alerts(path: str, window_minutes: int = 60) -> dict:
+    """
+    Agrupa un export de alertas del SIEM (JSONL o CSV) en incidentes por indicadores compartidos.
+
+    Usa esta herramienta cuando el usuario tenga muchas alertas y quiera saber
+    cuantos incidentes reales hay: alertas que comparten IP de origen, usuario,
+    dominio, hash o host, cercanas en el tiempo, se agrupan en un solo incidente
+    con una clasificacion y un playbook.
+
+    Args:
+        path: Archivo exportado dentro del directorio de exports del servidor
+              (ejemplo: 'alertas.jsonl', '/var/exports/alertas.jsonl').
+        window_minutes: Separacion maxima entre alertas relacionadas (ejemplo: 60).
+
+    Returns:
+        dict: Incidentes ordenados por severidad y tamanio, con indicadores compartidos,
+              y un playbook por tipo de incidente.
+    """
+    export = allowed_file(path, EXPORT_DIR_ENV)
+    if export is None:
+        return {"status": "error", "message": outside_message("exports de alertas", EXPORT_DIR_ENV)}
+    if window_minutes <= 0:
+        return {"status": "error", "message": "window_minutes debe ser mayor que 0."}
+    try:
+        result = await asyncio.to_thread(correlate, iter_alert_records(export), window_minutes * 60)
+    except Exception as e:
+        return {"status": "error", "message": f"Error correlacionando '{path}': {e}"}
+    return {"status": "success", "path": path, **attach_playbooks(result, MAX_TOOL_INCIDENTS)}
@@ -0,0 +1,416 @@
+"""
+Analisis de seguridad de correo: SPF, DMARC, DKIM, MTA-STS y TLS-RPT.
+
+Resuelve todos los registros en paralelo, expande el arbol SPF completo
+(include/redirect) contando las consultas DNS contra el limite de 10 del
+RFC 7208, y entrega un veredicto compacto con grado, en lugar de registros
+TXT crudos que el LLM tendria que interpretar.
+
+Los registros ya interpretados se guardan en cache respetando su TTL DNS. Solo
+las respuestas negativas definitivas (NXDOMAIN, sin registros del tipo) se
+guardan como ausencia; un timeout o un servidor que no responde no se cachea y
+el analisis termina con status "error" en lugar de calificar el dominio como si
+no tuviera SPF o DMARC.
+"""
+import asyncio
+import base64
+import time
+
+from cyberguard_agents.tools.recon_tools import new_async_resolver
+
+SPF_LOOKUP_LIMIT = 10
+SPF_MAX_DEPTH = 10
+# Mecanismos y modificadores SPF que cuestan una consulta DNS (RFC 7208 4.6.4)
+SPF_LOOKUP_TERMS = ("include", "a", "mx", "ptr", "exists", "redirect")
+
+DKIM_SELECTORS = (
+    "default", "dkim", "mail", "email", "selector1", "selector2", "google",
+    "k1", "k2", "s1", "s2", "smtp", "mx", "mandrill", "everlytickey1",
+    "sendgrid", "s1024", "s2048", "zoho", "protonmail", "mailjet", "amazonses",
+)
+
+# TTL minimo/maximo en cache (segundos) y TTL para respuestas negativas
+CACHE_MIN_TTL = 30
+CACHE_MAX_TTL = 3600
+CACHE_NEGATIVE_TTL = 300
+CACHE_MAX_ENTRIES = 10_000
+
+# (nombre, tipo) -> (expira, valores)
+_record_cache: dict[tuple[str, str], tuple[float, list]] = {}
+
+
+def _cache_get(key):
+    entry = _record_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        del _record_cache[key]
+        return None
+    return entry[1]
+
+
+def _cache_set(key, ttl: float, values: list) -> None:
+    if len(_record_cache) >= CACHE_MAX_ENTRIES:
+        # Descarta la entrada mas antigua (los dicts conservan el orden de insercion)
+        del _record_cache[next(iter(_record_cache))]
+    _record_cache[key] = (time.monotonic() + ttl, values)
+
+
+class DnsLookupError(Exception):
+    """Fallo transitorio de DNS (timeout, servidores sin respuesta): no equivale a 'sin registro'."""
+
+    def __init__(self, name: str, rdtype: str, error: Exception):
+        self.name, self.rdtype = name, rdtype
+        super().__init__(f"{rdtype} {name}: {type(error).__name__}")
+
+
+class _DnsSession:
+    """Consultas de un analisis: cache compartida, coalescencia y contadores."""
+
+    def __init__(self, resolver=None):
+        self.resolver = resolver or new_async_resolver()
+        self.queries = 0
+        self.cache_hits = 0
+        self._inflight: dict[tuple[str, str], asyncio.Task] = {}
+
+    async def query(self, name: str, rdtype: str) -> list:
+        key = (name.lower().rstrip("."), rdtype)
+        cached = _cache_get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._resolve(*key))
+        return await task
+
+    async def _resolve(self, name: str, rdtype: str) -> list:
+        import dns.exception
+        import dns.resolver
+
+        self.queries += 1
+        try:
+            answer = await self.resolver.resolve(name, rdtype, raise_on_no_answer=False)
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            _cache_set((name, rdtype), CACHE_NEGATIVE_TTL, [])
+            return []
+        except dns.exception.DNSException as e:
+            raise DnsLookupError(name, rdtype, e) from e
+        if answer.rrset is None:
+            values, ttl = [], CACHE_NEGATIVE_TTL
+        else:
+            ttl = min(max(answer.rrset.ttl, CACHE_MIN_TTL), CACHE_MAX_TTL)
+            if rdtype == "TXT":
+                values = [b"".join(r.strings).decode("utf-8", "replace") for r in answer.rrset]
+            elif rdtype == "MX":
+                values = [str(r.exchange).rstrip(".") for r in answer.rrset]
+            else:
+                values = [r.to_text() for r in answer.rrset]
+        _cache_set((name, rdtype), ttl, values)
+        return values
+
+    async def txt_starting(self, name: str, prefix: str) -> list[str]:
+        prefix = prefix.lower()
+        return [t for t in await self.query(name, "TXT") if t.lower().startswith(prefix)]
+
+
+def _parse_tags(record: str) -> dict:
+    """Interpreta registros tipo 'v=DMARC1; p=reject; rua=...'."""
+    tags = {}
+    for part in record.split(";"):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            tags[key.strip().lower()] = value.strip()
+    return tags
+
+
+# ── SPF ─────────────────────────────────────
+
+async def _expand_spf(session: _DnsSession, domain: str, state: dict, depth: int = 0) -> dict:
+    """Expande el SPF de `domain` recursivamente. `state` acumula consultas y errores."""
+    node = {"domain": domain}
+    records = await session.txt_starting(domain, "v=spf1")
+    if not records:
+        node["error"] = "sin registro SPF"
+        if depth:
+            state["void_lookups"] += 1
+        return node
+    if len(records) > 1:
+        state["errors"].append(f"{domain}: multiples registros SPF (permerror)")
+    record = records[0]
+    node["record"] = record
+
+    children = []
+    redirect = None
+    for term in record.split()[1:]:
+        qualifier = term[0] if term[0] in "+-~?" else "+"
+        body = term[1:] if term[0] in "+-~?" else term
+        if "=" in body.split(":", 1)[0]:
+            # Modificador (redirect=, exp=)
+            name, _, value = body.partition("=")
+        else:
+            name, _, value = body.partition(":")
+        name = name.lower().split("/", 1)[0]
+
+        if name in SPF_LOOKUP_TERMS:
+            state["lookups"] += 1
+        if name == "all":
+            node["all"] = qualifier + "all"
+        elif name in ("ip4", "ip6"):
+            state["ip_ranges"] += 1
+        elif name == "ptr":
+            state["errors"].append(f"{domain}: usa el mecanismo 'ptr' (desaconsejado)")
+        elif name == "include" and value:
+            children.append(value)
+        elif name == "redirect" and value:
+            redirect = value
+
+    if depth >= SPF_MAX_DEPTH:
+        state["errors"].append(f"{domain}: profundidad de include excesiva")
+        return node
+
+    targets = [t for t in children + ([redirect] if redirect else []) if t not in state["seen"]]
+    state["seen"].update(targets)
+    if targets and state["lookups"] <= SPF_LOOKUP_LIMIT * 2:
+        expanded = await asyncio.gather(*(
+            _expand_spf(session, t, state, depth + 1) for t in targets
+        ))
+        node["includes"] = [n for n in expanded if n["domain"] in children]
+        if redirect:
+            node["redirect"] = next(n for n in expanded if n["domain"] == redirect)
+            node.setdefault("all", node["redirect"].get("all"))
+    return node
+
+
+def _flatten_includes(node: dict) -> list[str]:
+    names = []
+    for child in node.get("includes", []) + ([node["redirect"]] if "redirect" in node else []):
+        names.append(child["domain"])
+        names.extend(_flatten_includes(child))
+    return names
+
+
+async def _analyze_spf(session: _DnsSession, domain: str) -> dict:
+    state = {"lookups": 0, "void_lookups": 0, "ip_ranges": 0, "errors": [], "seen": {domain}}
+    tree = await _expand_spf(session, domain, state)
+    if "record" not in tree:
+        return {"present": False}
+    return {
+        "present": True,
+        "record": tree["record"],
+        "all": tree.get("all"),
+        "dns_lookups": state["lookups"],
+        "lookup_limit_exceeded": state["lookups"] > SPF_LOOKUP_LIMIT,
+        "void_lookups": state["void_lookups"],
+        "includes": _flatten_includes(tree),
+        "ip_ranges": state["ip_ranges"],
+        "errors": state["errors"],
+    }
+
+
+# ── DMARC, DKIM, MTA-STS ────────────────────
+
+async def _analyze_dmarc(session: _DnsSession, domain: str) -> dict:
+    records = await session.txt_starting(f"_dmarc.{domain}", "v=dmarc1")
+    source = domain
+    if not records:
+        from cyberguard_agents.tools.whois_cache import registrable_domain
+
+        org = registrable_domain(domain)
+        if org != domain:
+            records = await session.txt_starting(f"_dmarc.{org}", "v=dmarc1")
+            source = org
+    if not records:
+        return {"present": False}
+
+    tags = _parse_tags(records[0])
+    return {
+        "present": True,
+        "record": records[0],
+        "inherited_from": source if source != domain else None,
+        "policy": tags.get("p", "none").lower(),
+        "subdomain_policy": tags.get("sp", tags.get("p", "none")).lower(),
+        "pct": int(tags["pct"]) if tags.get("pct", "").isdigit() else 100,
+        "rua": tags.get("rua"),
+        "ruf": tags.get("ruf"),
+        "adkim": tags.get("adkim", "r"),
+        "aspf": tags.get("aspf", "r"),
+    }
+
+
+async def _check_dkim_selector(session: _DnsSession, domain: str, selector: str) -> dict | None:
+    records = await session.query(f"{selector}._domainkey.{domain}", "TXT")
+    record = next((r for r in records if "p=" in r), None)
+    if record is None:
+        return None
+    tags = _parse_tags(record)
+    key = tags.get("p", "").replace(" ", "")
+    info = {"selector": selector, "key_type": tags.get("k", "rsa"), "revoked": not key}
+    if key and info["key_type"] == "rsa":
+        try:
+            # Tamano aproximado: el modulo domina el largo de la llave publica DER
+            info["key_bits"] = _rsa_bits(base64.b64decode(key + "=" * (-len(key) % 4)))
+        except ValueError:
+            info["key_bits"] = None
+    return info
+
+
+def _rsa_bits(der: bytes) -> int:
+    try:
+        from cryptography.hazmat.primitives.serialization import load_der_public_key
+
+        return load_der_public_key(der).key_size
+    except Exception:
+        return round(len(der) * 8 / 1024) * 1024
+
+
+async def _analyze_dkim(session: _DnsSession, domain: str, selectors) -> dict:
+    results = await asyncio.gather(*(_check_dkim_selector(session, domain, s) for s in selectors))
+    found = [r for r in results if r is not None]
+    return {"selectors_checked": len(selectors), "selectors_found": found}
+
+
+async def _analyze_mta_sts(session: _DnsSession, domain: str) -> dict:
+    records = await session.txt_starting(f"_mta-sts.{domain}", "v=stsv1")
+    if not records:
+        return {"present": False}
+    result = {"present": True, "id": _parse_tags(records[0]).get("id")}
+
+    try:
+        from cyberguard_agents.tools.http_client import get_http_client, host_slot
+
+        url = f"https://mta-sts.{domain}/.well-known/mta-sts.txt"
+        # RFC 8461: la politica solo vale si el certificado de mta-sts.<dominio> es valido
+        async with host_slot(url):
+            response = await get_http_client(verify=True).get(url, follow_redirects=False)
+        if response.status_code != 200:
+            result["policy_error"] = f"HTTP {response.status_code}"
+            return result
+        policy = {}
+        for line in response.text.splitlines()[:50]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                policy.setdefault(key.strip().lower(), []).append(value.strip())
+        result["mode"] = policy.get("mode", ["none"])[0]
+        result["max_age"] = policy.get("max_age", [None])[0]
+        result["mx"] = policy.get("mx", [])
+    except Exception as e:
+        result["policy_error"] = str(e)
+    return result
+
+
+def _grade(result: dict) -> tuple[str, list[str]]:
+    """Grado A-F: cada problema resta puntos segun su severidad."""
+    issues, penalty = [], 0
+    spf, dmarc, dkim, sts = result["spf"], result["dmarc"], result["dkim"], result["mta_sts"]
+
+    if not spf["present"]:
+        issues.append("Sin registro SPF: cualquiera puede enviar correo como este dominio.")
+        penalty += 3
+    else:
+        if spf["all"] in ("+all", "?all", None):
+            issues.append(f"SPF termina en '{spf['all'] or 'sin all'}': no rechaza remitentes no autorizados.")
+            penalty += 2
+        elif spf["all"] == "~all":
+            issues.append("SPF usa ~all (softfail). Considerar -all cuando DMARC este en enforcement.")
+        if spf["lookup_limit_exceeded"]:
+            issues.append(
+                f"SPF requiere {spf['dns_lookups']} consultas DNS (limite 10): los receptores lo tratan como permerror."
+            )
+            penalty += 2
+        issues.extend(spf["errors"])
+
+    if not dmarc["present"]:
+        issues.append("Sin registro DMARC.")
+        penalty += 3
+    elif dmarc["policy"] == "none":
+        issues.append("DMARC en p=none (solo monitoreo): no protege contra suplantacion.")
+        penalty += 2
+    else:
+        if dmarc["pct"] < 100:
+            issues.append(f"DMARC aplica solo al {dmarc['pct']}% de los mensajes.")
+            penalty += 1
+        if dmarc["policy"] == "quarantine":
+            issues.append("DMARC en p=quarantine. Objetivo recomendado: p=reject.")
+    if dmarc["present"] and not dmarc["rua"]:
+        issues.append("DMARC sin rua: no se reciben reportes agregados.")
+
+    if not dkim["selectors_found"]:
+        issues.append("No se encontro DKIM en los selectores comunes (puede usar un selector propio).")
+        penalty += 1
+    for sel in dkim["selectors_found"]:
+        if sel.get("key_bits") and sel["key_bits"] < 2048:
+            issues.append(f"DKIM '{sel['selector']}' usa llave RSA de {sel['key_bits']} bits.")
+
+    if not sts["present"]:
+        issues.append("Sin MTA-STS: el transporte SMTP entre servidores puede degradarse a texto plano.")
+    elif sts.get("mode") != "enforce":
+        issues.append(f"MTA-STS en modo '{sts.get('mode', 'desconocido')}'.")
+
+    grade = "ABCDF"[min(penalty // 2, 4)]
+    return grade, issues
+
+
+async def analyze_email_security(domain: str) -> dict:
+    """
+    Evalua la seguridad de correo de un dominio: SPF, DMARC, DKIM y MTA-STS.
+
+    Expande el arbol SPF completo (include/redirect) y verifica el limite de 10
+    consultas DNS, interpreta la politica DMARC, busca llaves DKIM en selectores
+    comunes y revisa la politica MTA-STS. Usa esta herramienta cuando el usuario
+    pregunte por SPF, DKIM, DMARC, suplantacion de correo o seguridad del email
+    de un dominio.
+
+    Args:
+        domain: Dominio a evaluar (ejemplo: 'example.com').
+
+    Returns:
+        dict: Veredicto con grado (A-F), problemas encontrados y el resumen de cada mecanismo.
+    """
+    try:
+        import dns.asyncresolver  # noqa: F401
+    except ImportError:
+        return {
+            "status": "error",
+            "message": (
+                "dnspython no esta instalado. "
+                "Instala con: pip install dnspython"
+            ),
+        }
+
+    domain = domain.strip().lower().rstrip(".")
+    session = _DnsSession()
+    results = await asyncio.gather(
+        _analyze_spf(session, domain),
+        _analyze_dmarc(session, domain),
+        _analyze_dkim(session, domain, DKIM_SELECTORS),
+        _analyze_mta_sts(session, domain),
+        session.txt_starting(f"_smtp._tls.{domain}", "v=tlsrptv1"),
+        session.query(domain, "MX"),
+        return_exceptions=True,
+    )
+    failed = next((r for r in results if isinstance(r, BaseException)), None)
+    if isinstance(failed, DnsLookupError):
+        return {
+            "status": "error",
+            "domain": domain,
+            "message": f"Fallo DNS transitorio ({failed}); no se puede evaluar el dominio. Intenta de nuevo.",
+        }
+    if failed is not None:
+        raise failed
+    spf, dmarc, dkim, mta_sts, tls_rpt, mx = results
+
+    result = {
+        "status": "success",
+        "domain": domain,
+        "mx": mx,
+        "spf": spf,
+        "dmarc": dmarc,
+        "dkim": dkim,
+        "mta_sts": mta_sts,
+        "tls_rpt": bool(tls_rpt),
+    }
+    result["grade"], result["issues"] = _grade(result)
+    result["dns_queries"] = session.queries
+    result["cache_hits"] = session.cache_hits
+    return result
@@ -0,0 +1,133 @@
+"""
+Ejecucion de herramientas sincronas fuera del event loop.
+
+ADK llama a las herramientas sincronas (nmap, subprocess, dnspython) directamente
+desde la corrutina de /chat, asi que un escaneo de varios minutos congela el
+event loop y con el el chat de todos los usuarios. offload() envuelve una
+herramienta sincrona en una corrutina que:
+
+- la ejecuta en un pool de hilos compartido (los escaneos son subprocesos y E/S:
+  liberan el GIL mientras esperan),
+- limita cuantas llamadas simultaneas de esa herramienta corren a la vez (por
+  ejemplo, como maximo 2 escaneos de vulnerabilidades) y encola el resto,
+- registra en metrics el tiempo en cola y el tiempo de ejecucion por herramienta.
+
+La envoltura conserva nombre, docstring y firma (functools.wraps), que es lo que
+ADK usa para describir la herramienta al LLM.
+
+Configuracion por variables de entorno:
+    CYBERGUARD_TOOL_THREADS      Hilos del pool de herramientas (default 32)
+    CYBERGUARD_TOOL_CONCURRENCY  Llamadas simultaneas por herramienta sin limite propio (default 8)
+    CYBERGUARD_TOOL_LIMITS       Limites por herramienta, ej. 'scan_vulnerabilities=2,scan_ports=4'
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from cyberguard_agents import metrics, profiling
+
+DEFAULT_THREADS = 32
+DEFAULT_CONCURRENCY = 8
+# Limites por defecto para las herramientas que mas cargan el host o la red
+DEFAULT_TOOL_LIMITS = {
+    "scan_vulnerabilities": 2,
+    "scan_ports": 4,
+    "run_cis_check": 4,
+}
+
+_pool: ThreadPoolExecutor | None = None
+_limits_loop = None
+# herramienta -> [semaforo, llamadas en curso o en cola]
+_slots: dict[str, list] = {}
+
+
+def parse_limits(value: str | None) -> dict[str, int]:
+    """'scan_ports=4,dns_lookup=16' -> {'scan_ports': 4, 'dns_lookup': 16}."""
+    limits = {}
+    for item in (value or "").split(","):
+        name, _, limit = item.partition("=")
+        if name.strip() and limit.strip():
+            limits[name.strip()] = max(1, int(limit))
+    return limits
+
+
+def tool_limit(name: str) -> int:
+    limits = {**DEFAULT_TOOL_LIMITS, **parse_limits(os.getenv("CYBERGUARD_TOOL_LIMITS"))}
+    return limits.get(name, int(os.getenv("CYBERGUARD_TOOL_CONCURRENCY", DEFAULT_CONCURRENCY)))
+
+
+def get_tool_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("CYBERGUARD_TOOL_THREADS", DEFAULT_THREADS)),
+            thread_name_prefix="cyberguard-tool",
+        )
+    return _pool
+
+
+def _slot(name: str) -> list:
+    """Semaforo de la herramienta en el event loop actual."""
+    global _limits_loop
+    loop = asyncio.get_running_loop()
+    if _limits_loop is not loop:
+        _slots.clear()
+        _limits_loop = loop
+    slot = _slots.get(name)
+    if slot is None:
+        slot = _slots[name] = [asyncio.Semaphore(tool_limit(name)), 0]
+    return slot
+
+
+def _run_in_thread(name: str, func: Callable, args: tuple, kwargs: dict):
+    # Si la consulta se esta perfilando, el hilo del pool entra en el perfil mientras corre la herramienta
+    with profiling.thread_scope(f"tool:{name}"):
+        return func(*args, **kwargs)
+
+
+def offload(func: Callable, name: str | None = None) -> Callable:
+    """Envuelve una herramienta sincrona para ejecutarla en el pool con limite de concurrencia."""
+    if inspect.iscoroutinefunction(func):
+        return func
+    name = name or func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        slot = _slot(name)
+        slot[1] += 1
+        metrics.set_gauge("tool_pending", slot[1], tool=name)
+        queued = time.perf_counter()
+        try:
+            async with slot[0]:
+                started = time.perf_counter()
+                metrics.increment("tool_queue_wait_seconds_total", started - queued, tool=name)
+                context = contextvars.copy_context()
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(
+                        get_tool_pool(), functools.partial(context.run, _run_in_thread, name, func, args, kwargs)
+                    )
+                finally:
+                    metrics.increment("tool_run_seconds_total", time.perf_counter() - started, tool=name)
+                    metrics.increment("tool_calls_total", tool=name)
+        finally:
+            slot[1] -= 1
+            metrics.set_gauge("tool_pending", slot[1], tool=name)
+
+    return wrapper
+
+
+def offload_tools(tools: Iterable[Callable]) -> list[Callable]:
+    """Aplica offload() a las herramientas sincronas de una lista; las asincronas quedan igual."""
+    return [offload(tool) for tool in tools]
+
+
+def shutdown_tool_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
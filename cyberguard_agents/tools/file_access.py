@@ -0,0 +1,77 @@
+"""
+Archivos que las herramientas pueden leer cuando el agente les pasa una ruta.
+
+Las rutas las elige el modelo, asi que las herramientas que abren archivos del
+servidor solo aceptan los que estan dentro de su directorio configurado:
+
+    CYBERGUARD_LOG_DIR        Logs para match_iocs y analyze_auth_logs (default /var/log)
+    CYBERGUARD_IOC_DIR        Listas de indicadores (un indicador por linea) para match_iocs
+    CYBERGUARD_EXPORT_DIR     Exports de alertas del SIEM para summarize_alert_export y correlate_alerts
+    CYBERGUARD_PCAP_DIR       Capturas para analyze_pcap
+    CYBERGUARD_WORDLIST_DIR   Listas de etiquetas para enumerate_subdomains
+
+Sin directorio configurado la herramienta no lee ningun archivo. Las rutas
+relativas se buscan dentro del directorio y las absolutas deben caer dentro de el;
+resolve() sigue '..' y symlinks, asi que lo que sale del directorio no se lee.
+"""
+import glob
+import os
+from pathlib import Path
+from typing import Iterable
+
+LOG_DIR_ENV = "CYBERGUARD_LOG_DIR"
+DEFAULT_LOG_DIR = "/var/log"
+IOC_DIR_ENV = "CYBERGUARD_IOC_DIR"
+EXPORT_DIR_ENV = "CYBERGUARD_EXPORT_DIR"
+PCAP_DIR_ENV = "CYBERGUARD_PCAP_DIR"
+WORDLIST_DIR_ENV = "CYBERGUARD_WORDLIST_DIR"
+
+
+def allowed_dir(env: str, default: str | None = None) -> Path | None:
+    """Directorio configurado en la variable `env` (resuelto), o None si no hay."""
+    base = os.getenv(env, default)
+    if not base:
+        return None
+    return Path(base).expanduser().resolve()
+
+
+def _inside(path: Path, root: Path) -> bool:
+    return path.is_file() and path.resolve().is_relative_to(root)
+
+
+def allowed_file(name: str, env: str, default: str | None = None) -> Path | None:
+    """Archivo `name` dentro del directorio de `env`, o None si no existe ahi."""
+    root = allowed_dir(env, default)
+    if root is None or not name:
+        return None
+    path = root / Path(name).expanduser()
+    return path if _inside(path, root) else None
+
+
+def allowed_files(entries: Iterable[str] | str, env: str, default: str | None = None) -> list[str]:
+    """
+    Expande rutas, patrones glob y directorios (no recursivo) a los archivos
+    que estan dentro del directorio de `env`, sin repetidos y en orden.
+    """
+    root = allowed_dir(env, default)
+    if root is None:
+        return []
+    if isinstance(entries, str):
+        entries = [entries]
+    files = []
+    for entry in entries:
+        if not entry:
+            continue
+        for match in sorted(glob.glob(str(root / Path(entry).expanduser()))):
+            path = Path(match)
+            candidates = sorted(p for p in path.iterdir()) if path.is_dir() else [path]
+            files.extend(str(p) for p in candidates if _inside(p, root))
+    return list(dict.fromkeys(files))
+
+
+def outside_message(what: str, env: str, default: str | None = None) -> str:
+    """Mensaje de error para el agente cuando la ruta no esta en el directorio permitido."""
+    root = allowed_dir(env, default)
+    if root is None:
+        return f"No hay directorio de {what} configurado ({env}); no se leen archivos del servidor."
+    return f"Ningun archivo de {what} encontrado dentro de {root} ({env})."
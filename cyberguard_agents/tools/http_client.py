@@ -0,0 +1,109 @@
+"""
+Cliente HTTP asincrono compartido por las herramientas de reconocimiento.
+
+Un solo httpx.AsyncClient por proceso mantiene las conexiones vivas (keep-alive)
+y negocia HTTP/2 cuando el servidor lo soporta, asi que auditorias repetidas
+contra el mismo host no pagan de nuevo el handshake TCP+TLS. Ademas limita
+cuantas peticiones simultaneas se envian a cada host.
+
+El cliente se crea en el primer uso y se cierra en el lifespan de FastAPI
+(ver main.py) con close_http_client(). Cada event loop tiene sus propios
+clientes: un loop nunca reemplaza el cliente que otro loop vivo esta usando.
+Quien corre su propio loop (un script con asyncio.run) debe llamar a
+close_http_client() antes de que termine; las conexiones de un loop ya cerrado
+no se pueden cerrar ordenadamente y solo se sueltan para el recolector.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+MAX_CONNECTIONS = int(os.getenv("CYBERGUARD_HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("CYBERGUARD_HTTP_MAX_KEEPALIVE", "50"))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("CYBERGUARD_HTTP_MAX_PER_HOST", "6"))
+KEEPALIVE_EXPIRY = float(os.getenv("CYBERGUARD_HTTP_KEEPALIVE_EXPIRY", "30"))
+TIMEOUT = float(os.getenv("CYBERGUARD_HTTP_TIMEOUT", "10"))
+
+# event loop -> {verify: cliente}; el de auditoria no valida certificados, el verificado es para
+# politicas (MTA-STS)
+_clients: dict = {}
+# event loop -> {host: [semaforo, peticiones activas o en espera]}
+_host_slots: dict = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_http_client(verify: bool = False):
+    """
+    Retorna el httpx.AsyncClient compartido, creandolo si no existe.
+
+    Por defecto no valida certificados: las auditorias deben llegar tambien a
+    hosts con certificados invalidos. verify=True retorna un segundo cliente que
+    si los valida, para lo que el estandar exige (politicas MTA-STS).
+
+    El cliente queda ligado al event loop en el que se creo; desde otro loop
+    (por ejemplo, asyncio.run en un script) se usa otro cliente.
+    Lanza ImportError si httpx no esta instalado.
+    """
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    clients = _clients.get(loop)
+    if clients is None:
+        _forget_closed_loops()
+        clients = _clients[loop] = {}
+    client = clients.get(verify)
+    if client is None or client.is_closed:
+        client = clients[verify] = httpx.AsyncClient(
+            http2=_http2_available(),
+            verify=verify,
+            timeout=TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+    return client
+
+
+def _forget_closed_loops() -> None:
+    """Suelta los clientes y semaforos de loops que ya terminaron."""
+    for registry in (_clients, _host_slots):
+        for loop in [loop for loop in list(registry) if loop.is_closed()]:
+            registry.pop(loop, None)
+
+
+@asynccontextmanager
+async def host_slot(url: str):
+    """Limita las peticiones concurrentes hacia un mismo host."""
+    host = (urlsplit(url).hostname or "").lower()
+    slots = _host_slots.setdefault(asyncio.get_running_loop(), {})
+    slot = slots.get(host)
+    if slot is None:
+        slot = slots[host] = [asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST), 0]
+    slot[1] += 1
+    try:
+        async with slot[0]:
+            yield
+    finally:
+        slot[1] -= 1
+        # Liberar la entrada cuando nadie la usa para no crecer con cada host auditado
+        if slot[1] == 0 and slots.get(host) is slot:
+            del slots[host]
+
+
+async def close_http_client() -> None:
+    """Cierra los clientes del event loop actual y sus conexiones abiertas."""
+    loop = asyncio.get_running_loop()
+    for client in list(_clients.pop(loop, {}).values()):
+        if not client.is_closed:
+            await client.aclose()
+    _host_slots.pop(loop, None)
+    _forget_closed_loops()
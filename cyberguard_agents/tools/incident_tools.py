@@ -1,6 +1,8 @@
 """
 Herramientas para respuesta a incidentes de ciberseguridad.
 """
+import re
+import unicodedata
 
 INCIDENT_PLAYBOOKS = {
     "ransomware": {
@@ -124,13 +126,143 @@ INCIDENT_PLAYBOOKS = {
 }
 
 
+# Fases de un playbook, en orden de ejecucion
+PLAYBOOK_PHASES = ("immediate_actions", "containment", "recovery", "post_incident")
+
+
+# Indicadores por tipo de incidente y su peso. Las frases especificas pesan mas
+# que las palabras ambiguas. Se comparan sin mayusculas ni acentos.
+INCIDENT_INDICATORS = {
+    "ransomware": {
+        "ransomware": 3.0, "ransom": 2.5, "rescate": 2.0, "nota de rescate": 3.0,
+        "cifrado": 1.0, "encrypted": 1.0, "archivos bloqueados": 2.0,
+        "extension extraña": 1.5, ".locked": 2.0, ".encrypted": 2.0,
+        "bitcoin": 1.0, "lockbit": 3.0, "shadow copies": 1.5, "vssadmin": 1.5,
+    },
+    "phishing": {
+        "phishing": 3.0, "email sospechoso": 2.0, "correo sospechoso": 2.0,
+        "enlace malicioso": 2.0, "enlace sospechoso": 2.0, "correo falso": 2.0,
+        "suplantacion": 1.5, "credenciales robadas": 1.5, "dio sus credenciales": 2.0,
+        "ingreso sus credenciales": 2.0, "spear": 1.0, "adjunto malicioso": 2.0,
+        "pagina falsa": 1.5, "clic en un enlace": 1.5,
+    },
+    "data_breach": {
+        "breach": 3.0, "fuga de datos": 3.0, "datos expuestos": 2.5, "leak": 2.0,
+        "exfiltracion": 2.5, "datos robados": 2.5, "acceso no autorizado a datos": 2.5,
+        "base de datos expuesta": 2.5, "bucket publico": 2.0, "dump": 1.0,
+        "informacion confidencial": 1.0,
+    },
+    "ddos": {
+        "ddos": 3.0, "denegacion de servicio": 3.0, "sitio caido": 1.5,
+        "trafico anormal": 1.5, "flood": 2.0, "saturacion": 1.5, "syn flood": 2.5,
+        "amplificacion": 2.0, "botnet": 1.0, "no responde": 0.5,
+    },
+}
+
+# Un tipo secundario se reporta si su puntaje es al menos esta fraccion del principal
+RELATED_TYPE_THRESHOLD = 0.5
+
+
+def normalize_text(text: str) -> str:
+    """Minusculas sin acentos (la ñ se conserva)."""
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn" or c == "\u0303")
+    return unicodedata.normalize("NFC", text)
+
+
+def _trie_regex(words) -> str:
+    """
+    Construye una alternancia factorizada por prefijos (ran(?:som(?:ware)?)...)
+    para que el motor de regex no pruebe cada palabra en cada posicion.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class IncidentClassifier:
+    """
+    Clasificador multi-etiqueta: todos los indicadores de todos los tipos se
+    compilan en una sola expresion regular y el texto se recorre una vez.
+    """
+
+    def __init__(self, indicators: dict[str, dict[str, float]]):
+        self.keyword_types: dict[str, list[tuple[str, float]]] = {}
+        for incident_type, keywords in indicators.items():
+            for keyword, weight in keywords.items():
+                self.keyword_types.setdefault(normalize_text(keyword), []).append(
+                    (incident_type, weight)
+                )
+        # Solo se inicia una coincidencia al comienzo de una palabra (o en un indicador
+        # que empieza con simbolo, como '.locked'); el sufijo queda libre para que
+        # 'cifrado' tambien detecte 'cifrados'
+        self.pattern = re.compile(r"(?:(?<!\w)|(?=\W))" + _trie_regex(self.keyword_types))
+
+    def score(self, text: str) -> list[dict]:
+        """Retorna los tipos con coincidencias, ordenados de mayor a menor puntaje."""
+        matched = {m.group(0) for m in self.pattern.finditer(normalize_text(text))}
+        scores: dict[str, dict] = {}
+        for keyword in matched:
+            for incident_type, weight in self.keyword_types[keyword]:
+                entry = scores.setdefault(incident_type, {"score": 0.0, "matched": []})
+                entry["score"] += weight
+                entry["matched"].append(keyword)
+
+        total = sum(e["score"] for e in scores.values())
+        ranked = [
+            {
+                "incident_type": incident_type,
+                "score": round(entry["score"], 2),
+                "confidence": round(entry["score"] / total, 2),
+                "matched_indicators": sorted(entry["matched"]),
+            }
+            for incident_type, entry in scores.items()
+        ]
+        ranked.sort(key=lambda r: (-r["score"], r["incident_type"]))
+        return ranked
+
+
+_classifier: IncidentClassifier | None = None
+
+
+def get_classifier() -> IncidentClassifier:
+    """Clasificador compilado a partir de INCIDENT_INDICATORS (se construye una vez)."""
+    global _classifier
+    if _classifier is None:
+        _classifier = IncidentClassifier(INCIDENT_INDICATORS)
+    return _classifier
+
+
+def reset_classifier() -> None:
+    """Descarta el clasificador compilado (llamar tras modificar INCIDENT_INDICATORS)."""
+    global _classifier
+    _classifier = None
+
+
 def classify_incident(description: str) -> dict:
     """
     Clasifica un incidente de seguridad basandose en su descripcion
     y retorna el tipo, severidad y categoria.
 
     Usa esta herramienta cuando el usuario describa un incidente de seguridad
-    y necesite saber que tipo de incidente es y su severidad.
+    y necesite saber que tipo de incidente es y su severidad. Si el incidente
+    mezcla varios tipos (por ejemplo, phishing que termino en ransomware), el
+    tipo principal es el de mayor puntaje y los demas aparecen en related_types.
 
     Args:
         description: Descripcion del incidente en lenguaje natural
@@ -138,45 +270,34 @@ def classify_incident(description: str) -> dict:
                       'usuario reporta email sospechoso con enlace').
 
     Returns:
-        dict: Clasificacion del incidente con tipo y severidad.
+        dict: Clasificacion del incidente con tipo, severidad y puntajes por tipo.
     """
-    description_lower = description.lower()
-
-    if any(kw in description_lower for kw in [
-        "ransomware", "cifrado", "encrypted", "rescate", "ransom",
-        "archivos bloqueados", "extension extraña"
-    ]):
-        incident_type = "ransomware"
-    elif any(kw in description_lower for kw in [
-        "phishing", "email sospechoso", "enlace malicioso", "correo falso",
-        "suplantacion", "credenciales robadas"
-    ]):
-        incident_type = "phishing"
-    elif any(kw in description_lower for kw in [
-        "breach", "fuga de datos", "datos expuestos", "leak",
-        "exfiltracion", "datos robados", "acceso no autorizado a datos"
-    ]):
-        incident_type = "data_breach"
-    elif any(kw in description_lower for kw in [
-        "ddos", "denegacion de servicio", "sitio caido", "trafico anormal",
-        "flood", "saturacion"
-    ]):
-        incident_type = "ddos"
-    else:
+    ranked = get_classifier().score(description)
+
+    if not ranked:
         return {
             "status": "unclassified",
             "message": "No se pudo clasificar automaticamente. "
-                       "Tipos conocidos: ransomware, phishing, data_breach, ddos. "
+                       f"Tipos conocidos: {', '.join(INCIDENT_PLAYBOOKS)}. "
                        "Proporciona mas detalles del incidente.",
             "known_types": list(INCIDENT_PLAYBOOKS.keys())
         }
 
+    top = ranked[0]
+    incident_type = top["incident_type"]
     playbook = INCIDENT_PLAYBOOKS[incident_type]
+    related = [
+        r["incident_type"] for r in ranked[1:]
+        if r["score"] >= top["score"] * RELATED_TYPE_THRESHOLD
+    ]
     return {
         "status": "classified",
         "incident_type": incident_type,
         "severity": playbook["severity"],
         "category": playbook["category"],
+        "confidence": top["confidence"],
+        "related_types": related,
+        "scores": ranked,
         "description_analyzed": description
     }
 
@@ -190,7 +311,7 @@ def get_incident_playbook(incident_type: str, phase: str = "all") -> dict:
 
     Args:
         incident_type: Tipo de incidente. Opciones: 'ransomware', 'phishing',
-                       'data_breach', 'ddos'.
+                       'data_breach', 'ddos', o un playbook_id retornado por find_playbooks.
         phase: Fase del playbook a consultar. Opciones: 'all', 'immediate_actions',
                'containment', 'recovery', 'post_incident'.
 
@@ -199,40 +320,43 @@ def get_incident_playbook(incident_type: str, phase: str = "all") -> dict:
     """
     incident_type = incident_type.lower().strip()
 
-    if incident_type not in INCIDENT_PLAYBOOKS:
+    playbook = INCIDENT_PLAYBOOKS.get(incident_type)
+    if playbook is None:
+        # Runbooks cargados del directorio de playbooks (ids retornados por find_playbooks)
+        from cyberguard_agents.tools.playbook_index import lookup_playbook
+        try:
+            playbook = lookup_playbook(incident_type)
+        except ImportError:
+            playbook = None
+    if playbook is None:
         return {
             "status": "error",
             "message": f"Tipo '{incident_type}' no encontrado. "
-                       f"Disponibles: {', '.join(INCIDENT_PLAYBOOKS.keys())}"
+                       f"Disponibles: {', '.join(INCIDENT_PLAYBOOKS.keys())}. "
+                       f"Para otros escenarios usa find_playbooks."
         }
 
-    playbook = INCIDENT_PLAYBOOKS[incident_type]
-
     if phase == "all":
         return {
             "status": "success",
             "incident_type": incident_type,
-            "severity": playbook["severity"],
-            "category": playbook["category"],
-            "phases": {
-                "immediate_actions": playbook["immediate_actions"],
-                "containment": playbook["containment"],
-                "recovery": playbook["recovery"],
-                "post_incident": playbook["post_incident"]
-            }
+            "severity": playbook.get("severity"),
+            "category": playbook.get("category"),
+            "phases": {phase: playbook.get(phase, []) for phase in PLAYBOOK_PHASES}
         }
 
-    if phase not in playbook:
+    # Solo fases: un runbook tambien tiene claves como 'source', 'keywords' o 'id'
+    if phase not in PLAYBOOK_PHASES:
         return {
             "status": "error",
             "message": f"Fase '{phase}' no valida. "
-                       f"Opciones: all, immediate_actions, containment, recovery, post_incident"
+                       f"Opciones: all, {', '.join(PLAYBOOK_PHASES)}"
         }
 
     return {
         "status": "success",
         "incident_type": incident_type,
-        "severity": playbook["severity"],
+        "severity": playbook.get("severity"),
         "phase": phase,
-        "steps": playbook[phase]
+        "steps": playbook.get(phase, [])
     }
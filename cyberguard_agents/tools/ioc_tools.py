@@ -0,0 +1,498 @@
+"""
+Busqueda de indicadores de compromiso (IOCs) en archivos de log grandes.
+
+Los indicadores (IPs, rangos CIDR, dominios y hashes MD5/SHA1/SHA256) se
+compilan una vez en conjuntos hash y en un arbol de prefijos binario para los
+rangos CIDR. Los logs se recorren con mmap en bloques alineados a lineas, en
+paralelo en un pool de procesos, con una sola expresion regular que extrae los
+candidatos (IPs, hashes y dominios) directamente sobre el mapa de memoria. En el
+servidor, match_iocs usa el pool de procesos compartido de alert_pipeline en
+lugar de levantar uno nuevo por consulta.
+
+Cada hit incluye el archivo y el offset en bytes, para ir directo a la linea.
+
+La herramienta del agente solo lee logs de CYBERGUARD_LOG_DIR y listas de
+indicadores de CYBERGUARD_IOC_DIR (ver file_access.py); de los indicadores
+que no se reconocen solo se informa cuantos fueron, nunca su texto.
+"""
+import asyncio
+import glob
+import gzip
+import ipaddress
+import mmap
+import multiprocessing
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+from cyberguard_agents.tools.alert_pipeline import alert_workers, get_alert_pool
+from cyberguard_agents.tools.file_access import (
+    DEFAULT_LOG_DIR, IOC_DIR_ENV, LOG_DIR_ENV, allowed_file, allowed_files, outside_message,
+)
+
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+# Bloques de contenido descomprimido que se leen de un .gz por vez
+GZIP_BLOCK_BYTES = 4 * 1024 * 1024
+# Hits guardados por bloque; el resto solo se cuenta
+MAX_HITS_PER_CHUNK = 1000
+# Hits devueltos al agente
+MAX_TOOL_HITS = 200
+MAX_LINE_CHARS = 300
+MP_CONTEXT = os.getenv("CYBERGUARD_IOC_MP_CONTEXT", "spawn")
+
+HASH_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256"}
+
+# Candidatos delimitados por \b; se descartan si continuan con ".x" o "-x" (1.2.3.4.5, evil.com-cdn)
+_IPV4 = rb"(?P<ip4>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})"
+_HASH = rb"(?P<hash>[0-9A-Fa-f]{32}(?:[0-9A-Fa-f]{8}(?:[0-9A-Fa-f]{24})?)?)"
+_DOMAIN = rb"(?P<domain>(?:[A-Za-z0-9][A-Za-z0-9-]*\.)+[A-Za-z]{2,63})"
+_IPV6 = rb"(?<![0-9A-Fa-f:])(?P<ip6>(?:[0-9A-Fa-f]{0,4}:){2,7}[0-9A-Fa-f]{0,4})(?![0-9A-Fa-f:])"
+
+
+# ── Compilacion de indicadores ──────────────
+
+class CidrTrie:
+    """Arbol de prefijos binario: una ruta de bits por red, una marca al final del prefijo."""
+
+    __slots__ = ("bits", "root", "size")
+
+    def __init__(self, bits: int):
+        self.bits = bits
+        # Nodo: [hijo_0, hijo_1, red_si_termina_aqui]
+        self.root = [None, None, None]
+        self.size = 0
+
+    def add(self, network: ipaddress.IPv4Network | ipaddress.IPv6Network) -> None:
+        node = self.root
+        value = int(network.network_address)
+        for i in range(network.prefixlen):
+            bit = (value >> (self.bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            self.size += 1
+        node[2] = str(network)
+
+    def lookup(self, value: int) -> str | None:
+        """Retorna la red mas especifica que contiene `value`, o None."""
+        node = self.root
+        found = node[2]
+        shift = self.bits - 1
+        while node is not None and shift >= 0:
+            node = node[(value >> shift) & 1]
+            if node is not None and node[2] is not None:
+                found = node[2]
+            shift -= 1
+        return found
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def refang(indicator: str) -> str:
+    """Deshace la notacion 'defanged' habitual en feeds (hxxp, [.], (.), [:])."""
+    value = indicator.strip()
+    for old, new in (("[.]", "."), ("(.)", "."), ("{.}", "."), ("[:]", ":"), ("[://]", "://")):
+        value = value.replace(old, new)
+    return re.sub(r"^hxxp", "http", value, flags=re.IGNORECASE)
+
+
+class IocSet:
+    """Indicadores compilados para busqueda rapida. Se serializa tal cual a los procesos del pool."""
+
+    def __init__(self, indicators: Iterable[str] = ()):
+        self.ips: set[str] = set()
+        self.cidrs = {4: CidrTrie(32), 6: CidrTrie(128)}
+        self.domains: set[str] = set()
+        # TLDs de los dominios: descarte rapido de candidatos que no pueden coincidir
+        self.tlds: set[str] = set()
+        self.hashes: dict[str, str] = {}
+        self.has_ipv6 = False
+        # Solo se cuentan: el texto rechazado puede venir de cualquier archivo
+        self.rejected = 0
+        for indicator in indicators:
+            self.add(indicator)
+
+    def add(self, indicator: str) -> None:
+        value = refang(indicator.split("#", 1)[0]).lower()
+        if not value:
+            return
+        if "://" in value:
+            # URL: se conserva solo el host
+            host = value.split("://", 1)[1].split("/", 1)[0].rsplit("@", 1)[-1]
+            if host.startswith("["):
+                host = host[1:].split("]", 1)[0]
+            elif host.count(":") == 1:
+                host = host.split(":", 1)[0]
+            value = host
+
+        if "/" in value:
+            try:
+                network = ipaddress.ip_network(value, strict=False)
+            except ValueError:
+                self.rejected += 1
+                return
+            self.cidrs[network.version].add(network)
+            self.has_ipv6 |= network.version == 6
+            return
+
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            pass
+        else:
+            self.ips.add(str(address))
+            self.has_ipv6 |= address.version == 6
+            return
+
+        if len(value) in HASH_LENGTHS and re.fullmatch(r"[0-9a-f]+", value):
+            self.hashes[value] = HASH_LENGTHS[len(value)]
+        elif re.fullmatch(r"(?:\*\.)?(?:[a-z0-9-]+\.)+[a-z]{2,63}", value):
+            self.domains.add(value.removeprefix("*."))
+            self.tlds.add(value.rsplit(".", 1)[1])
+        else:
+            self.rejected += 1
+
+    def __len__(self) -> int:
+        return len(self.ips) + len(self.cidrs[4]) + len(self.cidrs[6]) + len(self.domains) + len(self.hashes)
+
+    def counts(self) -> dict:
+        return {
+            "ips": len(self.ips),
+            "cidrs": len(self.cidrs[4]) + len(self.cidrs[6]),
+            "domains": len(self.domains),
+            "hashes": len(self.hashes),
+            "rejected": self.rejected,
+        }
+
+    def pattern(self) -> re.Pattern:
+        """
+        Regex de candidatos, solo con las alternativas que pueden coincidir.
+        Un \b al inicio de la alternancia es mucho mas rapido que lookbehinds por alternativa.
+        """
+        parts = []
+        if self.ips or self.cidrs[4]:
+            parts.append(_IPV4)
+        if self.hashes:
+            parts.append(_HASH)
+        if self.domains:
+            parts.append(_DOMAIN)
+        alternatives = [rb"\b(?:" + b"|".join(parts) + rb")\b(?![.-]\w)"] if parts else []
+        if self.has_ipv6:
+            alternatives.append(_IPV6)
+        return re.compile(b"|".join(alternatives) or b"(?!)")
+
+    def match_ip(self, text: str) -> tuple[str, str] | None:
+        """Retorna (indicador, tipo) si la IP esta en la lista o dentro de un rango."""
+        if text in self.ips:
+            return text, "ip"
+        if ":" not in text and not self.cidrs[4]:
+            return None
+        try:
+            address = ipaddress.ip_address(text)
+        except ValueError:
+            return None
+        if address.version == 6 and str(address) in self.ips:
+            return str(address), "ip"
+        network = self.cidrs[address.version].lookup(int(address))
+        if network is not None:
+            return network, "cidr"
+        return None
+
+    def match_domain(self, text: str) -> str | None:
+        """Coincide con el dominio o con cualquiera de sus dominios padre."""
+        name = text.lower()
+        if name.rsplit(".", 1)[-1] not in self.tlds:
+            return None
+        while True:
+            if name in self.domains:
+                return name
+            dot = name.find(".")
+            if dot < 0:
+                return None
+            name = name[dot + 1:]
+
+
+def load_iocs(ioc_set: Iterable[str] | str) -> IocSet:
+    """
+    Compila indicadores desde una lista. Cada elemento puede ser un indicador o
+    el nombre de un archivo de CYBERGUARD_IOC_DIR con un indicador por linea
+    (admite comentarios con #). Las rutas fuera de ese directorio no se abren.
+    """
+    if isinstance(ioc_set, IocSet):
+        return ioc_set
+    if isinstance(ioc_set, str):
+        ioc_set = [ioc_set]
+    iocs = IocSet()
+    for item in ioc_set:
+        path = allowed_file(item, IOC_DIR_ENV)
+        if path is not None:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    iocs.add(line)
+        else:
+            for part in item.split(","):
+                iocs.add(part)
+    return iocs
+
+
+# ── Escaneo ─────────────────────────────────
+
+def _line_at(buf, offset: int, start: int, end: int) -> str:
+    line_start = buf.rfind(b"\n", start, offset) + 1 or start
+    line_end = buf.find(b"\n", offset, end)
+    if line_end < 0:
+        line_end = end
+    return bytes(buf[max(line_start, start):line_end])[:MAX_LINE_CHARS].decode("utf-8", "replace")
+
+
+def _scan_buffer(iocs: IocSet, pattern: re.Pattern, buf, start: int, end: int,
+                 path: str, base_offset: int, max_hits: int) -> tuple[list[dict], Counter, int]:
+    hits = []
+    counts = Counter()
+    total = 0
+    for m in pattern.finditer(buf, start, end):
+        kind = m.lastgroup
+        token = m.group().decode("ascii", "ignore")
+        if kind == "ip4" or kind == "ip6":
+            found = iocs.match_ip(token)
+            if found is None:
+                continue
+            indicator, ioc_type = found
+        elif kind == "hash":
+            indicator = token.lower()
+            ioc_type = iocs.hashes.get(indicator)
+            if ioc_type is None:
+                continue
+        else:
+            indicator = iocs.match_domain(token)
+            if indicator is None:
+                continue
+            ioc_type = "domain"
+        total += 1
+        counts[indicator] += 1
+        if len(hits) < max_hits:
+            hits.append({
+                "file": path,
+                "offset": base_offset + m.start(),
+                "indicator": indicator,
+                "type": ioc_type,
+                "matched": token,
+                "line": _line_at(buf, m.start(), start, end),
+            })
+    return hits, counts, total
+
+
+_worker_iocs: IocSet | None = None
+_worker_pattern: re.Pattern | None = None
+
+
+def _init_worker(iocs: IocSet) -> None:
+    """Inicializador del pool: los indicadores se envian una vez por proceso, no por bloque."""
+    global _worker_iocs, _worker_pattern
+    _worker_iocs = iocs
+    _worker_pattern = iocs.pattern()
+
+
+def _scan_gzip(path: str, max_hits: int, block_bytes: int = GZIP_BLOCK_BYTES):
+    """
+    Escanea un .gz descomprimiendo bloques de tamano fijo, con memoria acotada.
+    La ultima linea incompleta de cada bloque se arrastra al siguiente; los offsets
+    son del contenido descomprimido.
+    """
+    hits = []
+    counts = Counter()
+    total = 0
+    carry = b""
+    base_offset = 0
+    with gzip.open(path, "rb") as f:
+        while True:
+            block = f.read(block_bytes)
+            buf = carry + block
+            if not buf:
+                break
+            if not block:
+                # Fin del archivo: se escanea lo que queda
+                cut = len(buf)
+            else:
+                cut = buf.rfind(b"\n") + 1
+                if not cut and len(buf) > block_bytes:
+                    # Una linea sin fin mas larga que un bloque se escanea igual para no acumularla
+                    cut = len(buf)
+            if cut:
+                chunk_hits, chunk_counts, chunk_total = _scan_buffer(
+                    _worker_iocs, _worker_pattern, buf, 0, cut, path, base_offset, max_hits - len(hits)
+                )
+                hits.extend(chunk_hits)
+                counts.update(chunk_counts)
+                total += chunk_total
+            carry = buf[cut:]
+            base_offset += cut
+            if not block:
+                break
+    return hits, counts, total
+
+
+def _scan_chunk(path: str, start: int, end: int, max_hits: int = MAX_HITS_PER_CHUNK):
+    """
+    Escanea [start, end) de un archivo. Corre en los procesos del pool.
+    Los .gz se escanean completos en streaming (ver _scan_gzip).
+    """
+    if path.endswith(".gz"):
+        return _scan_gzip(path, max_hits)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _scan_buffer(_worker_iocs, _worker_pattern, mm, start, end, path, 0, max_hits)
+
+
+def _scan_chunk_with(iocs: IocSet, path: str, start: int, end: int, max_hits: int):
+    """Como _scan_chunk, para un pool compartido sin inicializador: los indicadores viajan con el bloque."""
+    _init_worker(iocs)
+    return _scan_chunk(path, start, end, max_hits)
+
+
+def plan_chunks(path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> list[tuple[str, int, int]]:
+    """Divide un archivo en bloques de ~chunk_bytes cortados en fin de linea."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    if path.endswith(".gz") or size <= chunk_bytes:
+        return [(path, 0, size)]
+    chunks = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                newline = mm.find(b"\n", end)
+                end = size if newline < 0 else newline + 1
+            chunks.append((path, start, end))
+            start = end
+    return chunks
+
+
+def expand_log_paths(log_paths: Iterable[str] | str) -> list[str]:
+    """Expande patrones glob y directorios (no recursivo) a archivos existentes."""
+    if isinstance(log_paths, str):
+        log_paths = [log_paths]
+    files = []
+    for entry in log_paths:
+        matches = sorted(glob.glob(entry)) or [entry]
+        for match in matches:
+            if os.path.isdir(match):
+                files.extend(sorted(str(p) for p in Path(match).iterdir() if p.is_file()))
+            elif os.path.isfile(match):
+                files.append(match)
+    return list(dict.fromkeys(files))
+
+
+def scan_logs(
+    log_paths: Iterable[str] | str,
+    iocs: IocSet,
+    workers: int | None = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    max_hits: int = MAX_HITS_PER_CHUNK,
+    pool: ProcessPoolExecutor | None = None,
+) -> dict:
+    """
+    Busca los indicadores en los logs y retorna hits (ordenados por archivo y
+    offset), conteos por indicador y por archivo, y estadisticas del escaneo.
+    `pool` reutiliza un pool existente (no se cierra al terminar); sin el se
+    crea uno propio. Si hay un solo bloque se escanea en el mismo hilo.
+    """
+    started = time.perf_counter()
+    files = expand_log_paths(log_paths)
+    chunks = [c for path in files for c in plan_chunks(path, chunk_bytes)]
+    workers = min(workers or os.cpu_count() or 1, max(len(chunks), 1))
+
+    if workers <= 1:
+        _init_worker(iocs)
+        results = [_scan_chunk(*chunk, max_hits) for chunk in chunks]
+    elif pool is not None:
+        futures = [pool.submit(_scan_chunk_with, iocs, *chunk, max_hits) for chunk in chunks]
+        try:
+            results = [future.result() for future in futures]
+        finally:
+            # Si un bloque falla, los que siguen en cola no ocupan el pool compartido
+            for future in futures:
+                future.cancel()
+    else:
+        context = multiprocessing.get_context(MP_CONTEXT)
+        with ProcessPoolExecutor(workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(iocs,)) as pool:
+            results = list(pool.map(_scan_chunk, *zip(*chunks), [max_hits] * len(chunks)))
+
+    hits = []
+    by_indicator = Counter()
+    by_file = Counter()
+    for (path, _, _), (chunk_hits, counts, total) in zip(chunks, results):
+        hits.extend(chunk_hits)
+        by_indicator.update(counts)
+        by_file[path] += total
+    elapsed = time.perf_counter() - started
+    scanned = sum(end - start for _, start, end in chunks)
+    return {
+        "files_scanned": len(files),
+        "bytes_scanned": scanned,
+        "chunks": len(chunks),
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "mb_per_second": round(scanned / 1e6 / elapsed, 1) if elapsed else None,
+        "total_hits": sum(by_file.values()),
+        "hits_by_indicator": dict(by_indicator.most_common()),
+        "hits_by_file": {path: count for path, count in by_file.items() if count},
+        "hits": hits,
+    }
+
+
+# ── Herramienta del agente ──────────────────
+
+async def match_iocs(log_paths: list[str], ioc_set: list[str]) -> dict:
+    """
+    Busca indicadores de compromiso (IPs, rangos CIDR, dominios, hashes) en archivos de log.
+
+    Usa esta herramienta durante la contencion o investigacion de un incidente,
+    cuando el usuario quiera saber si IPs, dominios o hashes maliciosos aparecen
+    en sus logs (firewall, proxy, DNS, web, EDR). Los dominios tambien coinciden
+    con sus subdominios y las IPs con los rangos CIDR indicados.
+
+    Args:
+        log_paths: Rutas a archivos de log, directorios o patrones glob dentro del directorio
+                   de logs del servidor (ejemplo: ['/var/log/nginx/access.log', 'squid/*.log']).
+        ioc_set: Indicadores o nombres de listas de indicadores del directorio de IOCs
+                 (ejemplo: ['185.220.101.0/24', 'evil-domain.xyz', '44d88612fea8a8f36de82e1278abb02f']).
+                 Acepta notacion defanged (evil[.]com, hxxp://).
+
+    Returns:
+        dict: Hits con archivo, offset en bytes y linea, y conteos por indicador y por archivo.
+    """
+    iocs = await asyncio.to_thread(load_iocs, ioc_set)
+    if not len(iocs):
+        return {
+            "status": "error",
+            "message": "No se reconocio ningun indicador valido (IP, CIDR, dominio o hash MD5/SHA1/SHA256).",
+            "rejected": iocs.rejected,
+        }
+    paths = [log_paths] if isinstance(log_paths, str) else log_paths
+    files = allowed_files(paths, LOG_DIR_ENV, DEFAULT_LOG_DIR)
+    if not files:
+        return {"status": "error", "message": outside_message("log", LOG_DIR_ENV, DEFAULT_LOG_DIR)}
+
+    try:
+        result = await asyncio.to_thread(scan_logs, files, iocs, workers=alert_workers(), pool=get_alert_pool())
+    except Exception as e:
+        return {"status": "error", "message": f"Error escaneando logs: {e}"}
+
+    hits = result.pop("hits")
+    return {
+        "status": "success",
+        "missing_paths": [p for p in paths if not allowed_files(p, LOG_DIR_ENV, DEFAULT_LOG_DIR)],
+        "indicators": iocs.counts(),
+        **result,
+        "hits": hits[:MAX_TOOL_HITS],
+        "truncated": len(hits) > MAX_TOOL_HITS or result["total_hits"] > len(hits),
+    }
@@ -0,0 +1,552 @@
+"""
+Analisis de logs de autenticacion (auth.log, syslog y logs JSON).
+
+Los logs se leen en streaming, linea a linea y en orden de rotacion (auth.log.3.gz,
+auth.log.2.gz, auth.log.1, auth.log), con memoria constante: solo se parsean las
+lineas que pasan un filtro rapido por subcadenas y cada detector guarda ventanas
+deslizantes acotadas por IP de origen y por usuario.
+
+Detectores:
+- brute_force: muchos fallos de la misma IP contra el mismo usuario.
+- password_spraying: una IP falla contra muchos usuarios distintos.
+- compromise_suspected: login exitoso desde una IP ya marcada por los anteriores.
+- impossible_travel: dos logins del mismo usuario desde ubicaciones imposibles de
+  recorrer en el tiempo transcurrido. Usa lat/lon de los logs JSON o, si existe,
+  la base GeoIP indicada en CYBERGUARD_GEOIP_DB (requiere geoip2).
+
+Al agente solo se devuelven los hallazgos y una linea de tiempo, nunca las lineas crudas,
+y la herramienta solo lee logs de CYBERGUARD_LOG_DIR (ver file_access.py).
+"""
+import asyncio
+import calendar
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
+from functools import lru_cache
+from operator import itemgetter
+from typing import Iterable, Iterator
+
+from cyberguard_agents.tools.file_access import DEFAULT_LOG_DIR, LOG_DIR_ENV, allowed_files, outside_message
+from cyberguard_agents.tools.ioc_tools import expand_log_paths
+
+BRUTE_FORCE_THRESHOLD = 10
+BRUTE_FORCE_WINDOW = 300
+SPRAY_USER_THRESHOLD = 5
+SPRAY_WINDOW = 600
+# Velocidad maxima creible entre dos logins (avion comercial) y distancia minima para considerarla
+MAX_TRAVEL_KMH = 900
+MIN_TRAVEL_KM = 300
+# Margen en segundos sobre la fecha de modificacion al inferir el anio de syslog (zonas horarias)
+MTIME_SLACK = 86400
+
+# Limites de memoria: claves vigiladas por detector, hallazgos y entradas de la linea de tiempo
+MAX_TRACKED_KEYS = 100_000
+MAX_FINDINGS = 10_000
+MAX_TIMELINE = 500
+# Hallazgos devueltos al agente
+MAX_TOOL_FINDINGS = 50
+
+SEVERITY_ORDER = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+_ATTACK_EVENTS = ("brute_force", "password_spraying")
+
+# Filtro rapido antes de cualquier regex
+_INTERESTING = (b"Failed ", b"Accepted ", b"authentication failure", b"sudo:", b"new user", b"{")
+
+_SYSLOG_TS = re.compile(r"^(?P<mon>[A-Z][a-z]{2}) +(?P<day>\d{1,2}) (?P<time>\d{2}:\d{2}:\d{2}) (?P<host>\S+) ")
+_ISO_TS = re.compile(r"^(?P<ts>\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?) (?P<host>\S+) ")
+_FAILED = re.compile(
+    r"Failed (?:password|publickey|keyboard-interactive/pam|none) for (?:invalid user )?"
+    r"(?P<user>\S*) from (?P<ip>[0-9A-Fa-f.:]+)"
+)
+_ACCEPTED = re.compile(r"Accepted (?P<method>\S+) for (?P<user>\S+) from (?P<ip>[0-9A-Fa-f.:]+)")
+_PAM_FAILURE = re.compile(r"authentication failure;.*?rhost=(?P<ip>\S*)(?:\s+user=(?P<user>\S+))?")
+_SUDO = re.compile(r"sudo(?:\[\d+\])?:\s+(?P<user>\S+) : .*?COMMAND=(?P<command>.*)")
+_NEW_USER = re.compile(r"new user: name=(?P<user>[^,\s]+)")
+_MONTHS = {m: i for i, m in enumerate(calendar.month_abbr) if m}
+
+_JSON_FIELDS = {
+    "ts": ("@timestamp", "timestamp", "time", "ts", "date"),
+    "user": ("user", "username", "user.name", "user_name", "account"),
+    "ip": ("src_ip", "source.ip", "client_ip", "remote_addr", "ip", "rhost"),
+    "outcome": ("outcome", "event.outcome", "result", "status", "action"),
+    "lat": ("lat", "latitude", "geo.lat", "source.geo.location.lat"),
+    "lon": ("lon", "longitude", "geo.lon", "source.geo.location.lon"),
+    "message": ("message", "msg"),
+}
+_SUCCESS_WORDS = {"success", "succeeded", "ok", "accepted", "allow", "allowed", "login_success"}
+_FAILURE_WORDS = {"failure", "failed", "fail", "denied", "rejected", "login_failure", "invalid"}
+
+
+# ── Lectura ─────────────────────────────────
+
+def _rotation_key(path: str) -> tuple:
+    """auth.log.3.gz < auth.log.2.gz < auth.log.1 < auth.log (de mas viejo a mas nuevo)."""
+    name = os.path.basename(path).removesuffix(".gz")
+    base, _, suffix = name.rpartition(".")
+    if base and suffix.isdigit():
+        return base, -int(suffix)
+    return name, 0
+
+
+def group_rotated(paths: Iterable[str]) -> list[list[str]]:
+    """Agrupa los archivos por log base, cada grupo de mas viejo a mas nuevo."""
+    groups: dict[str, list[str]] = {}
+    for path in sorted(paths, key=_rotation_key):
+        groups.setdefault(os.path.join(os.path.dirname(path), _rotation_key(path)[0]), []).append(path)
+    return list(groups.values())
+
+
+def iter_log_lines(paths: Iterable[str], stats: dict | None = None) -> Iterator[tuple[str, bytes]]:
+    """Genera (ruta, linea) de los archivos interesantes, descomprimiendo .gz al vuelo."""
+    stats = stats if stats is not None else {}
+    stats.setdefault("lines", 0)
+    stats.setdefault("bytes", 0)
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as f:
+            for line in f:
+                stats["lines"] += 1
+                stats["bytes"] += len(line)
+                for marker in _INTERESTING:
+                    if marker in line:
+                        yield path, line
+                        break
+
+
+# ── Parseo ──────────────────────────────────
+
+def parse_timestamp(value) -> float | None:
+    """Epoch en segundos desde un epoch (s o ms) o una fecha ISO 8601 (sin zona se asume UTC)."""
+    if isinstance(value, (int, float)):
+        return float(value) / (1000 if value > 1e11 else 1)
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.replace(".", "", 1).isdigit():
+        return parse_timestamp(float(value))
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class _SyslogClock:
+    """
+    Convierte timestamps syslog sin anio ("Mar  3 10:15:01", se asume UTC).
+
+    El anio se infiere hacia atras desde la fecha de modificacion del archivo: cada
+    linea toma el ultimo anio en que no queda despues de esa fecha (con un dia de
+    margen por la zona horaria). Un archivo que cruza diciembre-enero y se modifico
+    en enero deja las lineas de diciembre en el anio anterior, y los archivos
+    rotados quedan en orden.
+    """
+
+    def __init__(self, mtime: float):
+        self.mtime = mtime
+        self.year = datetime.fromtimestamp(mtime, timezone.utc).year
+
+    def timestamp(self, mon: str, day: str, hms: str) -> float | None:
+        month = _MONTHS.get(mon)
+        if month is None:
+            return None
+        hour, minute, second = (int(part) for part in hms.split(":"))
+        ts = calendar.timegm((self.year, month, int(day), hour, minute, second))
+        if ts > self.mtime + MTIME_SLACK:
+            ts = calendar.timegm((self.year - 1, month, int(day), hour, minute, second))
+        return ts
+
+
+def record_field(record: dict, names: tuple) -> object:
+    """Primer valor no vacio entre `names`; admite rutas anidadas como 'source.ip'."""
+    for name in names:
+        value = record
+        for key in name.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _parse_message(message: str) -> dict | None:
+    """Extrae el evento de autenticacion de un mensaje sshd/PAM/sudo."""
+    m = _FAILED.search(message)
+    if m:
+        return {"kind": "failure", "user": m["user"] or "?", "ip": m["ip"]}
+    m = _ACCEPTED.search(message)
+    if m:
+        return {"kind": "success", "user": m["user"], "ip": m["ip"], "method": m["method"]}
+    if "authentication failure" in message and "(sshd:auth)" not in message:
+        # sshd ya registra su propio "Failed password"; se evitan fallos duplicados
+        m = _PAM_FAILURE.search(message)
+        if m and m["ip"]:
+            return {"kind": "failure", "user": m["user"] or "?", "ip": m["ip"]}
+        return None
+    m = _SUDO.search(message)
+    if m:
+        return {"kind": "sudo", "user": m["user"], "command": m["command"].strip()[:200]}
+    m = _NEW_USER.search(message)
+    if m:
+        return {"kind": "new_user", "user": m["user"]}
+    return None
+
+
+class _MalformedLine(ValueError):
+    """Linea JSON que no se puede usar (JSON invalido o un numero mal formado)."""
+
+
+def _parse_json(line: str) -> dict | None:
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        raise _MalformedLine(line[:80]) from None
+    if not isinstance(record, dict):
+        return None
+    ts = parse_timestamp(record_field(record, _JSON_FIELDS["ts"]))
+    if ts is None:
+        return None
+
+    message = record_field(record, _JSON_FIELDS["message"])
+    event = _parse_message(message) if isinstance(message, str) else None
+    if event is None:
+        outcome = str(record_field(record, _JSON_FIELDS["outcome"]) or "").lower()
+        ip = record_field(record, _JSON_FIELDS["ip"])
+        if not ip or (outcome not in _SUCCESS_WORDS and outcome not in _FAILURE_WORDS):
+            return None
+        event = {
+            "kind": "success" if outcome in _SUCCESS_WORDS else "failure",
+            "user": str(record_field(record, _JSON_FIELDS["user"]) or "?"),
+            "ip": str(ip),
+        }
+    lat, lon = record_field(record, _JSON_FIELDS["lat"]), record_field(record, _JSON_FIELDS["lon"])
+    if lat is not None and lon is not None:
+        try:
+            geo = (float(lat), float(lon))
+        except (TypeError, ValueError):
+            raise _MalformedLine(line[:80]) from None
+        if not (math.isfinite(geo[0]) and math.isfinite(geo[1])):
+            raise _MalformedLine(line[:80])
+        event["geo"] = geo
+    event["ts"] = ts
+    return event
+
+
+def iter_auth_events(paths: Iterable[str], stats: dict | None = None) -> Iterator[dict]:
+    """
+    Genera eventos {ts, kind, user, ip, ...} de logs syslog (RFC 3164 o ISO 8601)
+    y JSON por linea. `kind` es failure, success, sudo o new_user.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("events", 0)
+    stats.setdefault("malformed", 0)
+    clocks: dict[str, _SyslogClock] = {}
+    for path, raw in iter_log_lines(paths, stats):
+        line = raw.decode("utf-8", "replace").strip()
+        if line.startswith("{"):
+            try:
+                event = _parse_json(line)
+            except _MalformedLine:
+                # Una linea corrupta no debe abortar el analisis de todo el archivo
+                stats["malformed"] += 1
+                continue
+        else:
+            m = _SYSLOG_TS.match(line)
+            if m:
+                clock = clocks.get(path)
+                if clock is None:
+                    clock = clocks[path] = _SyslogClock(os.path.getmtime(path))
+                ts = clock.timestamp(m["mon"], m["day"], m["time"])
+            else:
+                m = _ISO_TS.match(line)
+                ts = parse_timestamp(m["ts"]) if m else None
+            if ts is None:
+                continue
+            event = _parse_message(line[m.end():])
+            if event is not None:
+                event["ts"] = ts
+                event["host"] = m["host"]
+        if event is not None:
+            event["file"] = path
+            stats["events"] += 1
+            yield event
+
+
+# ── Geolocalizacion ─────────────────────────
+
+@lru_cache(maxsize=1)
+def _geoip_reader():
+    path = os.getenv("CYBERGUARD_GEOIP_DB")
+    if not path:
+        return None
+    try:
+        import geoip2.database
+    except ImportError:
+        return None
+    return geoip2.database.Reader(path)
+
+
+@lru_cache(maxsize=65536)
+def geolocate(ip: str) -> tuple[float, float] | None:
+    """(lat, lon) de una IP con la base GeoIP configurada, o None."""
+    reader = _geoip_reader()
+    if reader is None:
+        return None
+    try:
+        location = reader.city(ip).location
+    except Exception:
+        return None
+    if location.latitude is None or location.longitude is None:
+        return None
+    return location.latitude, location.longitude
+
+
+def haversine_km(a: tuple[float, float], b: tuple[float, float]) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+# ── Deteccion ───────────────────────────────
+
+class _BoundedMap(OrderedDict):
+    """Dict LRU: al superar `limit` claves descarta las menos recientes."""
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+
+    def touch(self, key, default_factory):
+        """Retorna el valor de `key` (creandolo si falta) y lo marca como reciente."""
+        value = self.get(key)
+        if value is None:
+            value = default_factory()
+            self.put(key, value)
+        else:
+            self.move_to_end(key)
+        return value
+
+    def put(self, key, value) -> None:
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.limit:
+            self.popitem(last=False)
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class AuthLogAnalyzer:
+    """Detectores de ventana deslizante con memoria acotada. Se alimenta evento a evento con feed()."""
+
+    def __init__(self):
+        # (ip, user) -> ultimos BRUTE_FORCE_THRESHOLD timestamps de fallo
+        self._failures = _BoundedMap(MAX_TRACKED_KEYS)
+        # ip -> {user: ultimo fallo}, ordenado por tiempo
+        self._spray = _BoundedMap(MAX_TRACKED_KEYS)
+        # user -> (ts, ip, geo) del ultimo login exitoso con ubicacion
+        self._last_login = _BoundedMap(MAX_TRACKED_KEYS)
+        self._flagged_ips: dict[str, str] = {}
+        self._suspicious_users: set[str] = set()
+        self.findings: dict[tuple, dict] = {}
+        self.timeline: list[dict] = []
+        self.timeline_dropped = 0
+        self.counts = Counter()
+        self.failures_by_hour = Counter()
+        self.first_ts: float | None = None
+        self.last_ts: float | None = None
+
+    def feed(self, event: dict) -> None:
+        ts = event["ts"]
+        self.counts[event["kind"]] += 1
+        self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+        self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+        if event["kind"] == "failure":
+            self.failures_by_hour[int(ts // 3600)] += 1
+            self._on_failure(ts, event["ip"], event["user"])
+        elif event["kind"] == "success":
+            self._on_success(ts, event)
+        elif event["kind"] == "new_user":
+            self._add_timeline(ts, "new_user", f"Cuenta creada: {event['user']}", user=event["user"])
+        elif event["kind"] == "sudo" and event["user"] in self._suspicious_users:
+            self._add_timeline(ts, "sudo_after_suspicious_login",
+                               f"{event['user']} ejecuto sudo: {event['command']}", user=event["user"])
+
+    def _on_failure(self, ts: float, ip: str, user: str) -> None:
+        window = self._failures.touch((ip, user), lambda: deque(maxlen=BRUTE_FORCE_THRESHOLD))
+        window.append(ts)
+        if len(window) == BRUTE_FORCE_THRESHOLD and ts - window[0] <= BRUTE_FORCE_WINDOW:
+            self._flag(ts, "brute_force", "high", ip, users=[user], window_count=len(window))
+        elif ("brute_force", ip) in self.findings:
+            self.findings[("brute_force", ip)]["failures"] += 1
+            self.findings[("brute_force", ip)]["last_seen"] = _iso(ts)
+
+        users = self._spray.touch(ip, dict)
+        users.pop(user, None)
+        users[user] = ts
+        while users:
+            oldest_user, oldest_ts = next(iter(users.items()))
+            if ts - oldest_ts <= SPRAY_WINDOW and len(users) <= SPRAY_USER_THRESHOLD * 20:
+                break
+            del users[oldest_user]
+        if len(users) >= SPRAY_USER_THRESHOLD:
+            self._flag(ts, "password_spraying", "high", ip, users=list(users), window_count=len(users))
+
+    def _flag(self, ts: float, kind: str, severity: str, ip: str, users: list[str], window_count: int) -> None:
+        key = (kind, ip)
+        finding = self.findings.get(key)
+        if finding is None:
+            if len(self.findings) >= MAX_FINDINGS:
+                return
+            finding = self.findings[key] = {
+                "type": kind, "severity": severity, "source_ip": ip, "users": [],
+                "first_seen": _iso(ts), "last_seen": _iso(ts), "failures": 0, "peak_window_count": 0,
+            }
+            self._flagged_ips.setdefault(ip, kind)
+            label = "Fuerza bruta" if kind == "brute_force" else "Password spraying"
+            self._add_timeline(ts, kind, f"{label} desde {ip} contra {', '.join(users[:5])}", source_ip=ip)
+        finding["failures"] += 1
+        finding["last_seen"] = _iso(ts)
+        finding["peak_window_count"] = max(finding["peak_window_count"], window_count)
+        for user in users:
+            if user not in finding["users"] and len(finding["users"]) < 20:
+                finding["users"].append(user)
+
+    def _on_success(self, ts: float, event: dict) -> None:
+        ip, user = event["ip"], event["user"]
+        if ip in self._flagged_ips:
+            key = ("compromise_suspected", ip, user)
+            if key not in self.findings and len(self.findings) < MAX_FINDINGS:
+                self.findings[key] = {
+                    "type": "compromise_suspected", "severity": "critical", "source_ip": ip,
+                    "users": [user], "first_seen": _iso(ts), "last_seen": _iso(ts),
+                    "after": self._flagged_ips[ip],
+                }
+                self._suspicious_users.add(user)
+                self._add_timeline(ts, "compromise_suspected",
+                                   f"Login exitoso de {user} desde {ip} tras {self._flagged_ips[ip]}",
+                                   source_ip=ip, user=user)
+
+        geo = event.get("geo") or geolocate(ip)
+        if geo is None:
+            return
+        self.counts["geolocated_logins"] += 1
+        previous = self._last_login.get(user)
+        self._last_login.put(user, (ts, ip, geo))
+        if previous is None or previous[1] == ip:
+            return
+        distance = haversine_km(previous[2], geo)
+        hours = max(ts - previous[0], 1) / 3600
+        if distance >= MIN_TRAVEL_KM and distance / hours > MAX_TRAVEL_KMH:
+            key = ("impossible_travel", user, previous[1], ip)
+            if key not in self.findings and len(self.findings) < MAX_FINDINGS:
+                self.findings[key] = {
+                    "type": "impossible_travel", "severity": "high", "source_ip": ip,
+                    "previous_ip": previous[1], "users": [user],
+                    "first_seen": _iso(previous[0]), "last_seen": _iso(ts),
+                    "distance_km": round(distance), "speed_kmh": round(distance / hours),
+                }
+                self._suspicious_users.add(user)
+                self._add_timeline(ts, "impossible_travel",
+                                   f"{user}: login desde {ip} a {round(distance)} km de {previous[1]} "
+                                   f"en {round(hours * 60)} min", source_ip=ip, user=user)
+
+    def _add_timeline(self, ts: float, kind: str, summary: str, **extra) -> None:
+        if len(self.timeline) >= MAX_TIMELINE:
+            self.timeline_dropped += 1
+            # Con la linea de tiempo llena, un evento de compromiso reemplaza al ultimo aviso de ataque
+            if kind in _ATTACK_EVENTS:
+                return
+            for i in range(len(self.timeline) - 1, -1, -1):
+                if self.timeline[i]["event"] in _ATTACK_EVENTS:
+                    del self.timeline[i]
+                    break
+            else:
+                return
+        self.timeline.append({"ts": ts, "time": _iso(ts), "event": kind, "summary": summary, **extra})
+
+    def report(self, max_findings: int | None = None) -> dict:
+        findings = sorted(
+            self.findings.values(),
+            key=lambda f: (SEVERITY_ORDER[f["severity"]], -f.get("failures", 0)),
+        )
+        timeline = sorted(self.timeline, key=lambda e: e["ts"])
+        for entry in timeline:
+            entry.pop("ts", None)
+        peak_hours = [
+            {"hour": _iso(hour * 3600), "failures": count}
+            for hour, count in self.failures_by_hour.most_common(10)
+        ]
+        return {
+            "time_range": {
+                "start": _iso(self.first_ts) if self.first_ts is not None else None,
+                "end": _iso(self.last_ts) if self.last_ts is not None else None,
+            },
+            "event_counts": dict(self.counts),
+            "findings_by_type": dict(Counter(f["type"] for f in findings)),
+            "findings": findings[:max_findings] if max_findings else findings,
+            "findings_truncated": bool(max_findings) and len(findings) > max_findings,
+            "timeline": timeline,
+            "timeline_dropped": self.timeline_dropped,
+            "peak_failure_hours": peak_hours,
+        }
+
+
+def analyze_logs(log_paths: Iterable[str] | str, max_findings: int | None = None) -> dict:
+    """Analiza los logs (patrones glob, directorios, rotados y .gz) y retorna hallazgos y linea de tiempo."""
+    started = time.perf_counter()
+    groups = group_rotated(expand_log_paths(log_paths))
+    files = [path for group in groups for path in group]
+    stats: dict = {}
+    analyzer = AuthLogAnalyzer()
+    # Cada log base ya esta en orden temporal; se mezclan por timestamp sin cargarlos en memoria
+    events = heapq.merge(*(iter_auth_events(group, stats) for group in groups), key=itemgetter("ts"))
+    for event in events:
+        analyzer.feed(event)
+    elapsed = time.perf_counter() - started
+    return {
+        "files": files,
+        "lines_read": stats.get("lines", 0),
+        "bytes_read": stats.get("bytes", 0),
+        "auth_events": stats.get("events", 0),
+        "malformed_lines": stats.get("malformed", 0),
+        "elapsed_seconds": round(elapsed, 3),
+        "mb_per_second": round(stats.get("bytes", 0) / 1e6 / elapsed, 1) if elapsed else None,
+        **analyzer.report(max_findings),
+    }
+
+
+# ── Herramienta del agente ──────────────────
+
+async def analyze_auth_logs(log_paths: list[str]) -> dict:
+    """
+    Analiza logs de autenticacion (auth.log, secure, syslog o JSON) en busca de ataques.
+
+    Usa esta herramienta cuando el usuario quiera revisar logs de acceso durante un
+    incidente (phishing, fuga de datos, accesos sospechosos). Detecta fuerza bruta,
+    password spraying, logins exitosos desde IPs atacantes y viajes imposibles, y
+    arma una linea de tiempo. Acepta logs rotados y comprimidos (.gz).
+
+    Args:
+        log_paths: Rutas a archivos, directorios o patrones glob dentro del directorio de logs
+                   del servidor (ejemplo: ['/var/log/auth.log*'], ['secure', 'vpn/logins.jsonl']).
+
+    Returns:
+        dict: Hallazgos ordenados por severidad, linea de tiempo del incidente y estadisticas.
+    """
+    files = allowed_files(log_paths, LOG_DIR_ENV, DEFAULT_LOG_DIR)
+    if not files:
+        return {"status": "error", "message": outside_message("log", LOG_DIR_ENV, DEFAULT_LOG_DIR)}
+    try:
+        result = await asyncio.to_thread(analyze_logs, files, MAX_TOOL_FINDINGS)
+    except Exception as e:
+        return {"status": "error", "message": f"Error analizando logs: {e}"}
+    return {"status": "success", **result}
@@ -0,0 +1,498 @@
+"""
+Analisis offline de capturas pcap/pcapng para el triage de DDoS.
+
+La captura se mapea en memoria (mmap) y se recorre una sola vez para indexar
+los paquetes. Ese recorrido es un bucle de Python registro a registro (cada
+registro dice donde empieza el siguiente, asi que no se puede vectorizar), pero
+solo guarda offset, longitud capturada, longitud original y timestamp en arrays
+compactos en lugar de conservar un objeto por paquete. Los encabezados
+Ethernet/VLAN/SLL, IPv4/IPv6, TCP y UDP se leen despues de forma vectorizada
+con numpy sobre el mismo buffer, y las agregaciones (top talkers, mezcla de
+protocolos, SYN/SYN-ACK, firmas de amplificacion) son operaciones de arrays.
+
+La herramienta del agente solo abre capturas de CYBERGUARD_PCAP_DIR (ver file_access.py).
+"""
+import asyncio
+import ipaddress
+import mmap
+import struct
+import time
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+
+from cyberguard_agents.tools.file_access import PCAP_DIR_ENV, allowed_file, outside_message
+
+# Puertos de origen de servicios UDP usados como reflectores en ataques de amplificacion
+AMPLIFICATION_PORTS = {
+    19: "chargen",
+    53: "dns",
+    123: "ntp",
+    161: "snmp",
+    389: "cldap",
+    1900: "ssdp",
+    3702: "ws-discovery",
+    11211: "memcached",
+}
+MIN_AMPLIFICATION_PACKETS = 100
+MIN_AMPLIFICATION_FACTOR = 10
+MIN_SYN_FLOOD_PACKETS = 1000
+SYN_FLOOD_RATIO = 3.0
+TOP_N = 10
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 101, 228, 229)
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+_PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+_PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+
+
+class PcapFormatError(ValueError):
+    """El archivo no es un pcap/pcapng valido o usa un tipo de enlace no soportado."""
+
+
+# ── Indexado ────────────────────────────────
+
+class PacketIndex:
+    """Offsets y metadatos de cada paquete dentro del buffer mapeado."""
+
+    def __init__(self):
+        self.offsets = array("q")
+        self.caplens = array("q")
+        self.lengths = array("q")
+        self.timestamps = array("d")
+        self.linktypes = array("H")
+
+
+def _index_pcap(buf, index: PacketIndex) -> None:
+    endian, resolution = _PCAP_MAGIC[bytes(buf[:4])]
+    linktype = struct.unpack_from(endian + "I", buf, 20)[0] & 0x0FFFFFFF
+    record = struct.Struct(endian + "IIII")
+    unpack = record.unpack_from
+    size = len(buf)
+    pos = 24
+    offsets, caplens, lengths, stamps = index.offsets, index.caplens, index.lengths, index.timestamps
+    while pos + 16 <= size:
+        sec, frac, caplen, length = unpack(buf, pos)
+        pos += 16
+        if pos + caplen > size:
+            break
+        offsets.append(pos)
+        caplens.append(caplen)
+        lengths.append(length)
+        stamps.append(sec + frac * resolution)
+        pos += caplen
+    index.linktypes = array("H", [linktype]) * len(offsets)
+
+
+def _if_tsresol(buf, start: int, end: int, endian: str) -> float:
+    """Resolucion de timestamps de una Interface Description Block (opcion if_tsresol)."""
+    pos = start
+    while pos + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", buf, pos)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = buf[pos + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        pos += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+
+def _index_pcapng(buf, index: PacketIndex) -> None:
+    size = len(buf)
+    pos = 0
+    endian = "<"
+    interfaces: list[tuple[int, float]] = []
+    offsets, caplens, lengths, stamps, links = (
+        index.offsets, index.caplens, index.lengths, index.timestamps, index.linktypes,
+    )
+    while pos + 12 <= size:
+        if buf[pos:pos + 4] == _PCAPNG_SHB:
+            endian = "<" if buf[pos + 8:pos + 12] == b"\x4d\x3c\x2b\x1a" else ">"
+            interfaces = []
+        block_type, block_len = struct.unpack_from(endian + "II", buf, pos)
+        if block_len < 12 or pos + block_len > size:
+            break
+        if block_type == 6:
+            iface, ts_high, ts_low, caplen, length = struct.unpack_from(endian + "IIIII", buf, pos + 8)
+            linktype, resolution = interfaces[iface] if iface < len(interfaces) else (LINKTYPE_ETHERNET, 1e-6)
+            offsets.append(pos + 28)
+            caplens.append(caplen)
+            lengths.append(length)
+            stamps.append(((ts_high << 32) | ts_low) * resolution)
+            links.append(linktype)
+        elif block_type == 3:
+            # Simple Packet Block: sin timestamp, interfaz 0
+            length = struct.unpack_from(endian + "I", buf, pos + 8)[0]
+            offsets.append(pos + 12)
+            caplens.append(min(length, block_len - 16))
+            lengths.append(length)
+            stamps.append(stamps[-1] if stamps else 0.0)
+            links.append(interfaces[0][0] if interfaces else LINKTYPE_ETHERNET)
+        elif block_type == 1:
+            linktype = struct.unpack_from(endian + "H", buf, pos + 8)[0]
+            interfaces.append((linktype, _if_tsresol(buf, pos + 16, pos + block_len - 4, endian)))
+        pos += block_len
+
+
+def index_packets(buf) -> PacketIndex:
+    """Recorre la captura una vez y retorna el indice de paquetes."""
+    index = PacketIndex()
+    magic = bytes(buf[:4])
+    if magic in _PCAP_MAGIC:
+        _index_pcap(buf, index)
+    elif magic == _PCAPNG_SHB:
+        _index_pcapng(buf, index)
+    else:
+        raise PcapFormatError("No es un archivo pcap ni pcapng (magic desconocido).")
+    return index
+
+
+# ── Parseo vectorizado ──────────────────────
+
+def _headers(buf, index: PacketIndex) -> dict:
+    """Extrae los campos de encabezado de todos los paquetes como arrays numpy."""
+    import numpy as np
+
+    data = np.frombuffer(buf, dtype=np.uint8)
+    last = len(data) - 1
+    off = np.frombuffer(index.offsets, dtype=np.int64)
+    end = off + np.frombuffer(index.caplens, dtype=np.int64)
+    links = np.frombuffer(index.linktypes, dtype=np.uint16)
+
+    def u8(pos):
+        return data[np.minimum(pos, last)]
+
+    def be16(pos):
+        return (u8(pos).astype(np.uint16) << 8) | u8(pos + 1)
+
+    def be32(pos):
+        return (be16(pos).astype(np.uint32) << 16) | be16(pos + 2)
+
+    # Capa de enlace -> (ethertype, offset de capa 3)
+    ethertype = np.zeros(len(off), dtype=np.uint16)
+    l3 = off.copy()
+
+    eth = links == LINKTYPE_ETHERNET
+    ethertype[eth] = be16(off[eth] + 12)
+    l3[eth] = off[eth] + 14
+    for _ in range(2):
+        # Hasta dos etiquetas VLAN (802.1Q / QinQ)
+        tagged = eth & ((ethertype == 0x8100) | (ethertype == 0x88A8))
+        ethertype[tagged] = be16(l3[tagged] + 2)
+        l3[tagged] += 4
+
+    sll = links == LINKTYPE_LINUX_SLL
+    ethertype[sll] = be16(off[sll] + 14)
+    l3[sll] = off[sll] + 16
+
+    sll2 = links == LINKTYPE_LINUX_SLL2
+    ethertype[sll2] = be16(off[sll2])
+    l3[sll2] = off[sll2] + 20
+
+    raw = np.isin(links, LINKTYPE_RAW)
+    version = u8(off[raw]) >> 4
+    ethertype[raw] = np.where(version == 4, 0x0800, np.where(version == 6, 0x86DD, 0))
+
+    null = (links == LINKTYPE_NULL) | (links == LINKTYPE_LOOP)
+    family = np.maximum(u8(off[null]), u8(off[null] + 3))
+    ethertype[null] = np.where(family == 2, 0x0800, np.where(np.isin(family, (24, 28, 30)), 0x86DD, 0))
+    l3[null] = off[null] + 4
+
+    # Capa de red
+    is_v4 = (ethertype == 0x0800) & (l3 + 20 <= end) & ((u8(l3) >> 4) == 4)
+    is_v6 = (ethertype == 0x86DD) & (l3 + 40 <= end) & ((u8(l3) >> 4) == 6)
+    proto = np.zeros(len(off), dtype=np.uint8)
+    proto[is_v4] = u8(l3[is_v4] + 9)
+    proto[is_v6] = u8(l3[is_v6] + 6)
+    l4 = l3.copy()
+    l4[is_v4] += (u8(l3[is_v4]) & 0x0F).astype(np.int64) * 4
+    l4[is_v6] += 40
+    frag_field = np.zeros(len(off), dtype=np.uint16)
+    frag_field[is_v4] = be16(l3[is_v4] + 6)
+    fragment = is_v4 & ((frag_field & 0x3FFF) != 0)
+    # Solo el primer fragmento lleva el encabezado de capa 4
+    has_l4 = (is_v4 & ((frag_field & 0x1FFF) == 0)) | is_v6
+
+    src4 = np.zeros(len(off), dtype=np.uint32)
+    dst4 = np.zeros(len(off), dtype=np.uint32)
+    src4[is_v4] = be32(l3[is_v4] + 12)
+    dst4[is_v4] = be32(l3[is_v4] + 16)
+
+    # Capa de transporte
+    is_tcp = has_l4 & (proto == 6) & (l4 + 14 <= end)
+    is_udp = has_l4 & (proto == 17) & (l4 + 8 <= end)
+    ported = is_tcp | is_udp
+    sport = np.zeros(len(off), dtype=np.uint16)
+    dport = np.zeros(len(off), dtype=np.uint16)
+    sport[ported] = be16(l4[ported])
+    dport[ported] = be16(l4[ported] + 2)
+    flags = np.zeros(len(off), dtype=np.uint8)
+    flags[is_tcp] = u8(l4[is_tcp] + 13)
+
+    return {
+        "data": data, "l3": l3, "length": np.frombuffer(index.lengths, dtype=np.int64),
+        "ts": np.frombuffer(index.timestamps, dtype=np.float64),
+        "ethertype": ethertype, "is_v4": is_v4, "is_v6": is_v6, "proto": proto,
+        "fragment": fragment, "src4": src4, "dst4": dst4,
+        "is_tcp": is_tcp, "is_udp": is_udp, "sport": sport, "dport": dport, "flags": flags,
+    }
+
+
+def _addresses(h: dict, mask, which: str):
+    """
+    Claves de direccion para agregar: uint32 en IPv4 y bytes de 16 en IPv6.
+    Retorna lista de (array_claves, mascara_original, version).
+    """
+    import numpy as np
+
+    keys = []
+    v4 = mask & h["is_v4"]
+    keys.append((h["src4" if which == "src" else "dst4"][v4], v4, 4))
+    v6 = mask & h["is_v6"]
+    if v6.any():
+        start = h["l3"][v6] + (8 if which == "src" else 24)
+        raw = h["data"][np.minimum(start[:, None] + np.arange(16), len(h["data"]) - 1)]
+        keys.append((np.ascontiguousarray(raw).view("V16").ravel(), v6, 6))
+    return keys
+
+
+def _address_text(key, version: int) -> str:
+    if version == 4:
+        return str(ipaddress.IPv4Address(int(key)))
+    return str(ipaddress.IPv6Address(bytes(key)))
+
+
+def _top_addresses(h: dict, mask, which: str, n: int = TOP_N) -> list[dict]:
+    """Top direcciones por bytes, con paquetes y bytes."""
+    import numpy as np
+
+    rows = []
+    for keys, submask, version in _addresses(h, mask, which):
+        if not len(keys):
+            continue
+        unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        weights = np.bincount(inverse.ravel(), weights=h["length"][submask], minlength=len(unique))
+        order = np.argsort(weights)[::-1][:n]
+        rows.extend(
+            {"ip": _address_text(unique[i], version), "packets": int(counts[i]), "bytes": int(weights[i])}
+            for i in order
+        )
+    rows.sort(key=lambda r: -r["bytes"])
+    return rows[:n]
+
+
+def _distinct(h: dict, mask, which: str) -> int:
+    import numpy as np
+
+    return sum(len(np.unique(keys)) for keys, _, _ in _addresses(h, mask, which))
+
+
+# ── Agregacion ──────────────────────────────
+
+def _protocol_mix(h: dict) -> dict:
+    import numpy as np
+
+    length = h["length"]
+    masks = {
+        "tcp": h["is_tcp"],
+        "udp": h["is_udp"],
+        "icmp": h["is_v4"] & (h["proto"] == 1),
+        "icmpv6": h["is_v6"] & (h["proto"] == 58),
+        "ip_fragment": h["fragment"] & ~h["is_tcp"] & ~h["is_udp"],
+        "arp": h["ethertype"] == 0x0806,
+    }
+    accounted = np.zeros(len(length), dtype=bool)
+    for mask in masks.values():
+        accounted |= mask
+    masks["other_ip"] = (h["is_v4"] | h["is_v6"]) & ~accounted
+    masks["non_ip"] = ~(h["is_v4"] | h["is_v6"]) & ~masks["arp"]
+    total = max(int(length.sum()), 1)
+    mix = {}
+    for name, mask in masks.items():
+        packets = int(mask.sum())
+        if packets:
+            size = int(length[mask].sum())
+            mix[name] = {"packets": packets, "bytes": size, "byte_share": round(size / total, 4)}
+    return mix
+
+
+def _tcp_analysis(h: dict) -> dict:
+    flags = h["flags"]
+    tcp = h["is_tcp"]
+    syn = tcp & ((flags & 0x12) == 0x02)
+    synack = tcp & ((flags & 0x12) == 0x12)
+    rst = tcp & ((flags & 0x04) != 0)
+    syn_count, synack_count = int(syn.sum()), int(synack.sum())
+    ratio = round(syn_count / synack_count, 2) if synack_count else None
+    result = {
+        "syn": syn_count,
+        "syn_ack": synack_count,
+        "rst": int(rst.sum()),
+        "syn_to_synack_ratio": ratio,
+        "syn_sources": _distinct(h, syn, "src") if syn_count else 0,
+        "syn_targets": _top_addresses(h, syn, "dst", 5) if syn_count else [],
+    }
+    result["syn_flood_suspected"] = bool(
+        syn_count >= MIN_SYN_FLOOD_PACKETS and (ratio is None or ratio >= SYN_FLOOD_RATIO)
+    )
+    return result
+
+
+def _amplification(h: dict) -> list[dict]:
+    """Firmas de amplificacion: muchas respuestas grandes desde puertos de reflectores, pocas peticiones."""
+    udp, sport, dport, length = h["is_udp"], h["sport"], h["dport"], h["length"]
+    signatures = []
+    for port, service in AMPLIFICATION_PORTS.items():
+        responses = udp & (sport == port)
+        packets = int(responses.sum())
+        if packets < MIN_AMPLIFICATION_PACKETS:
+            continue
+        response_bytes = int(length[responses].sum())
+        requests = udp & (dport == port)
+        request_bytes = int(length[requests].sum())
+        factor = round(response_bytes / request_bytes, 1) if request_bytes else None
+        signatures.append({
+            "service": service,
+            "source_port": port,
+            "response_packets": packets,
+            "response_bytes": response_bytes,
+            "avg_response_size": round(response_bytes / packets),
+            "request_packets": int(requests.sum()),
+            "amplification_factor": factor,
+            "reflectors": _distinct(h, responses, "src"),
+            "targets": _top_addresses(h, responses, "dst", 3),
+            "suspected": factor is None or factor >= MIN_AMPLIFICATION_FACTOR,
+        })
+    signatures.sort(key=lambda s: -s["response_bytes"])
+    return signatures
+
+
+def _top_ports(h: dict, n: int = TOP_N) -> list[dict]:
+    import numpy as np
+
+    rows = []
+    for name, mask in (("tcp", h["is_tcp"]), ("udp", h["is_udp"])):
+        ports = h["dport"][mask]
+        if not len(ports):
+            continue
+        counts = np.bincount(ports, minlength=65536)
+        for port in np.argsort(counts)[::-1][:n]:
+            if counts[port]:
+                rows.append({"protocol": name, "port": int(port), "packets": int(counts[port])})
+    rows.sort(key=lambda r: -r["packets"])
+    return rows[:n]
+
+
+def summarize_capture(path: str | Path) -> dict:
+    """Indexa y resume una captura pcap/pcapng completa."""
+    import numpy as np
+
+    started = time.perf_counter()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        index = index_packets(mm)
+        indexed = time.perf_counter()
+        packets = len(index.offsets)
+        if not packets:
+            return {"packets": 0, "bytes": 0}
+        h = _headers(mm, index)
+        ts, length = h["ts"], h["length"]
+        duration = float(ts.max() - ts.min())
+        # Conteo por segundo sobre los segundos presentes: un timestamp corrupto no dispara la memoria
+        _, per_second = np.unique(np.floor(ts - ts.min()), return_counts=True)
+        total_bytes = int(length.sum())
+        linktypes = sorted(set(index.linktypes))
+        summary = {
+            "packets": packets,
+            "bytes": total_bytes,
+            "link_types": linktypes,
+            "start": datetime.fromtimestamp(float(ts.min()), timezone.utc).isoformat(),
+            "duration_seconds": round(duration, 3),
+            "avg_pps": round(packets / duration, 1) if duration else None,
+            "avg_mbps": round(total_bytes * 8 / duration / 1e6, 2) if duration else None,
+            "peak_pps": int(per_second.max()),
+            "protocol_mix": _protocol_mix(h),
+            "top_sources": _top_addresses(h, h["is_v4"] | h["is_v6"], "src"),
+            "top_destinations": _top_addresses(h, h["is_v4"] | h["is_v6"], "dst"),
+            "top_destination_ports": _top_ports(h),
+            "tcp": _tcp_analysis(h),
+            "amplification": _amplification(h),
+        }
+        # Se liberan las vistas numpy antes de cerrar el mmap
+        del h
+    summary["parse_seconds"] = {
+        "index": round(indexed - started, 3),
+        "total": round(time.perf_counter() - started, 3),
+    }
+    return summary
+
+
+def _attack_vectors(summary: dict) -> list[str]:
+    vectors = []
+    tcp = summary.get("tcp", {})
+    if tcp.get("syn_flood_suspected"):
+        vectors.append(
+            f"SYN flood: {tcp['syn']} SYN desde {tcp['syn_sources']} origenes, "
+            f"ratio SYN/SYN-ACK {tcp['syn_to_synack_ratio'] or 'sin SYN-ACK'}"
+        )
+    for sig in summary.get("amplification", []):
+        if sig["suspected"]:
+            vectors.append(
+                f"Amplificacion {sig['service'].upper()}: {sig['response_packets']} respuestas "
+                f"(promedio {sig['avg_response_size']} bytes) desde {sig['reflectors']} reflectores"
+            )
+    fragments = summary.get("protocol_mix", {}).get("ip_fragment")
+    if fragments and fragments["byte_share"] > 0.3:
+        vectors.append(f"Flood de fragmentos IP: {fragments['byte_share']:.0%} del trafico")
+    return vectors
+
+
+# ── Herramienta del agente ──────────────────
+
+async def analyze_pcap(path: str) -> dict:
+    """
+    Analiza una captura de trafico (pcap o pcapng) para el triage de un ataque DDoS.
+
+    Usa esta herramienta cuando el usuario tenga una captura de red (tcpdump,
+    Wireshark) de un posible ataque de denegacion de servicio y quiera conocer
+    las IPs de origen, los objetivos y el vector (SYN flood, amplificacion DNS/NTP/
+    memcached/SSDP, flood de fragmentos). Soporta capturas de varios GB.
+
+    Args:
+        path: Captura dentro del directorio de capturas del servidor
+              (ejemplo: 'ataque.pcap', '/var/captures/captura.pcapng').
+
+    Returns:
+        dict: Resumen con top talkers, mezcla de protocolos, ratio SYN/SYN-ACK,
+              firmas de amplificacion y vectores de ataque detectados.
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return {
+            "status": "error",
+            "message": "numpy no esta instalado. Instala con: pip install numpy",
+        }
+    capture = allowed_file(path, PCAP_DIR_ENV)
+    if capture is None:
+        return {"status": "error", "message": outside_message("capturas", PCAP_DIR_ENV)}
+    if capture.name.endswith(".gz"):
+        return {"status": "error", "message": "Descomprime la captura antes de analizarla (no se puede mapear un .gz)."}
+
+    try:
+        summary = await asyncio.to_thread(summarize_capture, capture)
+    except PcapFormatError as e:
+        return {"status": "error", "message": str(e)}
+    except Exception as e:
+        return {"status": "error", "message": f"Error analizando '{path}': {e}"}
+    return {"status": "success", "path": path, "attack_vectors": _attack_vectors(summary), **summary}
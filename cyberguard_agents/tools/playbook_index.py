@@ -0,0 +1,349 @@
+"""
+Busqueda rankeada de playbooks (runbooks) de respuesta a incidentes.
+
+Los playbooks se cargan de un directorio de archivos JSON (o YAML si PyYAML esta
+instalado; los runbooks incluidos son JSON para no depender de el) y se suman a los playbooks integrados de INCIDENT_PLAYBOOKS. Cada
+playbook completo y cada paso individual se indexan en dos matrices dispersas
+BM25 guardadas por termino (indice invertido en arrays numpy: punteros, ids de
+documento y pesos precalculados). Una consulta suma los pesos de sus terminos
+con un solo np.bincount, asi que el costo depende de las postings de los
+terminos consultados y no del tamanio del corpus.
+
+Formato de un archivo (un objeto o una lista de objetos):
+
+    {
+      "id": "account_compromise",
+      "title": "Cuenta comprometida",
+      "severity": "high",
+      "category": "Identity",
+      "keywords": ["credenciales", "mfa", "login sospechoso"],
+      "immediate_actions": ["..."],
+      "containment": ["..."],
+      "recovery": ["..."],
+      "post_incident": ["..."]
+    }
+
+Configuracion por variables de entorno:
+    CYBERGUARD_PLAYBOOK_DIR  Directorio de playbooks (default: cyberguard_agents/playbooks)
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+from cyberguard_agents.tools.incident_tools import (
+    INCIDENT_INDICATORS,
+    INCIDENT_PLAYBOOKS,
+    PLAYBOOK_PHASES as PHASES,
+    normalize_text,
+)
+
+DEFAULT_PLAYBOOK_DIR = Path(__file__).resolve().parent.parent / "playbooks"
+PLAYBOOK_SUFFIXES = (".json", ".yaml", ".yml")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Peso extra de titulo y palabras clave frente al texto de los pasos
+TITLE_BOOST = 3
+MAX_STEPS_PER_PLAYBOOK = 6
+
+_TOKEN = re.compile(r"[a-z0-9ñ]+")
+STOPWORDS = frozenset(
+    "a al ante con contra de del desde el en entre es esta este hay la las lo los mas me mi no o "
+    "para pero por que se si sin sobre su sus un una uno unos y ya the and or of to in on for is "
+    "are be with from by at as it this that an".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Terminos normalizados: sin acentos, sin stopwords y sin plural simple."""
+    tokens = []
+    for token in _TOKEN.findall(normalize_text(text)):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("es") and token[-3] not in "aeiou":
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith("s"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Matriz dispersa termino -> documentos con pesos BM25 precalculados (formato CSC)."""
+
+    def __init__(self, documents: list[list[str]]):
+        import numpy as np
+
+        lengths = np.array([len(doc) for doc in documents], dtype=np.float64)
+        avg = lengths.mean() if len(documents) else 0.0
+        postings: dict[str, list[tuple[int, int]]] = {}
+        for doc_id, doc in enumerate(documents):
+            for term, tf in Counter(doc).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        n_docs = len(documents)
+        self.n_docs = n_docs
+        self.vocabulary: dict[str, int] = {}
+        indptr = [0]
+        doc_ids: list[int] = []
+        tfs: list[int] = []
+        for term, entries in postings.items():
+            self.vocabulary[term] = len(self.vocabulary)
+            doc_ids.extend(d for d, _ in entries)
+            tfs.extend(tf for _, tf in entries)
+            indptr.append(len(doc_ids))
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(doc_ids, dtype=np.int64)
+        tf = np.array(tfs, dtype=np.float64)
+        df = np.diff(self.indptr).astype(np.float64)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[self.indices] / (avg or 1.0))
+        self.weights = np.repeat(idf, np.diff(self.indptr)) * tf * (BM25_K1 + 1) / (tf + norm)
+
+    def scores(self, terms: list[str]):
+        """Puntaje BM25 de cada documento para los terminos de la consulta."""
+        import numpy as np
+
+        columns = [self.vocabulary[t] for t in terms if t in self.vocabulary]
+        if not columns:
+            return np.zeros(self.n_docs)
+        slices = [slice(self.indptr[c], self.indptr[c + 1]) for c in columns]
+        docs = np.concatenate([self.indices[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        return np.bincount(docs, weights=weights, minlength=self.n_docs)
+
+
+def _is_text_list(value) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def _load_file(path: Path) -> list[dict]:
+    """Playbooks de un archivo. Lanza ValueError si el archivo o algun playbook es invalido."""
+    with path.open(encoding="utf-8") as f:
+        if path.suffix == ".json":
+            data = json.load(f)
+        else:
+            import yaml
+
+            try:
+                data = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                # str(e) incluye la ruta del archivo; solo se informa el problema y la linea
+                mark = getattr(e, "problem_mark", None)
+                where = f" (linea {mark.line + 1})" if mark is not None else ""
+                raise ValueError(f"YAML invalido{where}: {getattr(e, 'problem', None) or type(e).__name__}") from None
+    items = data if isinstance(data, list) else [data]
+    playbooks = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("cada playbook debe ser un objeto")
+        item = dict(item)
+        item.setdefault("id", path.stem)
+        if not any(item.get(phase) is not None for phase in PHASES):
+            raise ValueError(f"el playbook '{item['id']}' no tiene ninguna fase ({', '.join(PHASES)})")
+        for key in (*PHASES, "keywords"):
+            if item.get(key) is not None and not _is_text_list(item[key]):
+                raise ValueError(f"'{key}' del playbook '{item['id']}' debe ser una lista de textos")
+        playbooks.append(item)
+    return playbooks
+
+
+def load_playbooks(directory: str | Path | None) -> tuple[dict[str, dict], list[dict]]:
+    """
+    Playbooks integrados mas los del directorio. Retorna (playbooks_por_id, errores).
+    Un archivo invalido se reporta en errores (por nombre, sin la ruta del servidor)
+    y no impide cargar los demas.
+    """
+    # Los integrados usan como palabras clave los indicadores del clasificador
+    playbooks = {
+        incident_type: {
+            "id": incident_type, "title": incident_type.replace("_", " "), "source": "builtin",
+            "keywords": list(INCIDENT_INDICATORS.get(incident_type, {})), **pb,
+        }
+        for incident_type, pb in INCIDENT_PLAYBOOKS.items()
+    }
+    errors = []
+    if directory is None or not Path(directory).is_dir():
+        return playbooks, errors
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix.lower() not in PLAYBOOK_SUFFIXES:
+            continue
+        try:
+            loaded = _load_file(path)
+        except ImportError:
+            errors.append({"file": path.name, "error": "PyYAML no esta instalado (pip install pyyaml)"})
+            continue
+        except OSError as e:
+            errors.append({"file": path.name, "error": e.strerror or type(e).__name__})
+            continue
+        except ValueError as e:
+            errors.append({"file": path.name, "error": str(e)})
+            continue
+        for playbook in loaded:
+            playbook_id = str(playbook["id"]).lower().strip()
+            playbooks[playbook_id] = {**playbook, "id": playbook_id, "source": path.name}
+    return playbooks, errors
+
+
+class PlaybookIndex:
+    """Indices BM25 de playbooks completos y de pasos individuales."""
+
+    def __init__(self, playbooks: dict[str, dict], errors: list[dict] | None = None):
+        self.playbooks = playbooks
+        self.errors = errors or []
+        self.ids = list(playbooks)
+        self.steps: list[tuple[str, str]] = []
+        documents = []
+        step_documents = []
+        step_ptr = [0]
+        for number, playbook_id in enumerate(self.ids):
+            playbook = playbooks[playbook_id]
+            header = " ".join([
+                playbook_id.replace("_", " "), str(playbook.get("title", "")),
+                str(playbook.get("category", "")), " ".join(playbook.get("keywords", [])),
+            ])
+            header_terms = tokenize(header)
+            body_terms = []
+            for phase in PHASES:
+                for step in playbook.get(phase) or []:
+                    terms = tokenize(step)
+                    body_terms.extend(terms)
+                    self.steps.append((phase, step))
+                    step_documents.append(terms)
+            documents.append(header_terms * TITLE_BOOST + body_terms)
+            step_ptr.append(len(self.steps))
+        self.playbook_index = BM25Index(documents)
+        self.step_index = BM25Index(step_documents)
+        # Los pasos del playbook i ocupan step_ptr[i]:step_ptr[i + 1] en el indice de pasos
+        self.step_ptr = step_ptr
+
+    def search(self, description: str, top_k: int = 3, steps_per_playbook: int = MAX_STEPS_PER_PLAYBOOK) -> list[dict]:
+        import numpy as np
+
+        terms = tokenize(description)
+        scores = self.playbook_index.scores(terms)
+        if not scores.any():
+            return []
+        top_k = min(top_k, int((scores > 0).sum()))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+
+        step_scores = self.step_index.scores(terms)
+        results = []
+        for number in best:
+            playbook = self.playbooks[self.ids[number]]
+            start, end = self.step_ptr[number], self.step_ptr[number + 1]
+            owned = start + np.flatnonzero(step_scores[start:end] > 0)
+            owned = owned[np.argsort(-step_scores[owned], kind="stable")][:steps_per_playbook]
+            if not len(owned):
+                # Coincidio por titulo o palabras clave: se devuelven las acciones inmediatas
+                owned = [i for i in range(start, end) if self.steps[i][0] == "immediate_actions"]
+            relevant: dict[str, list[str]] = {}
+            # Los pasos se devuelven agrupados por fase y en el orden original del playbook
+            for step_id in sorted(owned):
+                phase, step = self.steps[step_id]
+                relevant.setdefault(phase, []).append(step)
+            results.append({
+                "playbook_id": self.ids[number],
+                "title": playbook.get("title"),
+                "severity": playbook.get("severity"),
+                "category": playbook.get("category"),
+                "score": round(float(scores[number]), 3),
+                "relevant_steps": {phase: relevant[phase] for phase in PHASES if phase in relevant},
+            })
+        return results
+
+
+_index: PlaybookIndex | None = None
+_index_signature = None
+_index_lock = threading.Lock()
+
+
+def playbook_dir() -> Path:
+    return Path(os.getenv("CYBERGUARD_PLAYBOOK_DIR") or DEFAULT_PLAYBOOK_DIR)
+
+
+def playbook_signature(directory: Path) -> tuple:
+    """Cambia si se agrega, borra o modifica algun archivo del directorio."""
+    if not directory.is_dir():
+        return (str(directory),)
+    with os.scandir(directory) as entries:
+        return (str(directory), tuple(sorted(
+            (e.name, e.stat().st_mtime_ns) for e in entries if e.name.endswith(PLAYBOOK_SUFFIXES)
+        )))
+
+
+def get_playbook_index() -> PlaybookIndex:
+    """Indice del proceso; se reconstruye si cambian los archivos del directorio."""
+    global _index, _index_signature
+    directory = playbook_dir()
+    signature = playbook_signature(directory)
+    with _index_lock:
+        if _index is None or signature != _index_signature:
+            _index = PlaybookIndex(*load_playbooks(directory))
+            _index_signature = signature
+        return _index
+
+
+def reset_playbook_index() -> None:
+    global _index, _index_signature
+    with _index_lock:
+        _index = None
+        _index_signature = None
+
+
+# ── Herramienta del agente ──────────────────
+
+def find_playbooks(description: str, top_k: int = 3) -> dict:
+    """
+    Busca los playbooks (runbooks) de respuesta mas relevantes para un incidente descrito en texto libre.
+
+    Usa esta herramienta cuando el incidente no encaje claramente en un tipo conocido,
+    cuando mezcle varios escenarios o cuando el usuario pregunte que runbook aplicar.
+    Retorna los playbooks rankeados y, de cada uno, solo los pasos relevantes para la
+    descripcion, agrupados por fase. Para ver un playbook completo usa
+    get_incident_playbook con su playbook_id.
+
+    Args:
+        description: Descripcion del incidente en lenguaje natural
+                     (ejemplo: 'un usuario aprobo un push de MFA que no solicito').
+        top_k: Cantidad de playbooks a retornar (ejemplo: 3).
+
+    Returns:
+        dict: Playbooks rankeados con su puntaje y pasos relevantes por fase.
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return {
+            "status": "error",
+            "message": "numpy no esta instalado. Instala con: pip install numpy",
+        }
+    top_k = max(1, min(int(top_k), 10))
+    index = get_playbook_index()
+    results = index.search(description, top_k)
+    if not results:
+        result = {
+            "status": "no_match",
+            "message": "Ningun playbook coincide con la descripcion. Proporciona mas detalles.",
+            "playbooks_indexed": len(index.ids),
+        }
+    else:
+        result = {
+            "status": "success",
+            "playbooks_indexed": len(index.ids),
+            "results": results,
+        }
+    if index.errors:
+        # Runbooks que no se pudieron cargar: la busqueda no los incluye
+        result["load_errors"] = index.errors
+    return result
+
+
+def lookup_playbook(playbook_id: str) -> dict | None:
+    """Playbook cargado del directorio por id exacto (None si no existe)."""
+    return get_playbook_index().playbooks.get(playbook_id.lower().strip())
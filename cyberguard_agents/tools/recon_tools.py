@@ -3,8 +3,71 @@ Herramientas de reconocimiento: DNS, WHOIS y analisis de headers HTTP.
 
 Usa librerias reales (dnspython, python-whois, httpx).
 Si una libreria no esta instalada, retorna error descriptivo.
+Las peticiones HTTP usan el cliente compartido de http_client.py.
 """
+import os
 import socket
+from urllib.parse import urljoin
+
+DNS_TIMEOUT = float(os.getenv("CYBERGUARD_DNS_TIMEOUT", "5"))
+
+
+def _parse_nameservers(value: str) -> tuple[list[str], int]:
+    """Interpreta CYBERGUARD_DNS_NAMESERVERS: '1.1.1.1,8.8.8.8' o '127.0.0.1:5353'."""
+    servers, port = [], 53
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if item.count(":") == 1:
+            item, port_str = item.split(":")
+            port = int(port_str)
+        servers.append(item)
+    return servers, port
+
+
+def configure_resolver(resolver, nameservers: list[str] | None = None, port: int | None = None):
+    """
+    Aplica la configuracion DNS comun a un Resolver de dnspython (sincrono o asincrono).
+
+    Por defecto usa los nameservers del sistema; CYBERGUARD_DNS_NAMESERVERS los
+    reemplaza (util para apuntar a un resolver interno o a un servidor de pruebas).
+    """
+    if nameservers is None and os.getenv("CYBERGUARD_DNS_NAMESERVERS"):
+        nameservers, env_port = _parse_nameservers(os.getenv("CYBERGUARD_DNS_NAMESERVERS"))
+        port = port or env_port
+    if nameservers:
+        resolver.nameservers = nameservers
+    if port:
+        resolver.port = port
+    resolver.timeout = DNS_TIMEOUT
+    resolver.lifetime = DNS_TIMEOUT
+    return resolver
+
+
+def _new_resolver(resolver_cls):
+    configure = not os.getenv("CYBERGUARD_DNS_NAMESERVERS")
+    return configure_resolver(resolver_cls(configure=configure))
+
+
+_resolver = None
+
+
+def get_resolver():
+    """Resolver sincrono compartido por dns_lookup. Lanza ImportError sin dnspython."""
+    global _resolver
+    import dns.resolver
+
+    if _resolver is None:
+        _resolver = _new_resolver(dns.resolver.Resolver)
+    return _resolver
+
+
+def new_async_resolver():
+    """Resolver asincrono con la misma configuracion que get_resolver()."""
+    import dns.asyncresolver
+
+    return _new_resolver(dns.asyncresolver.Resolver)
 
 
 def dns_lookup(domain: str) -> dict:
@@ -21,7 +84,7 @@ def dns_lookup(domain: str) -> dict:
         dict: Registros DNS encontrados organizados por tipo.
     """
     try:
-        import dns.resolver
+        resolver = get_resolver()
     except ImportError:
         return {
             "status": "error",
@@ -42,7 +105,7 @@ def dns_lookup(domain: str) -> dict:
 
     # Registros MX
     try:
-        mx_records = dns.resolver.resolve(domain, "MX")
+        mx_records = resolver.resolve(domain, "MX")
         results["MX"] = [
             {"priority": r.preference, "host": str(r.exchange).rstrip(".")}
             for r in mx_records
@@ -52,14 +115,14 @@ def dns_lookup(domain: str) -> dict:
 
     # Registros NS
     try:
-        ns_records = dns.resolver.resolve(domain, "NS")
+        ns_records = resolver.resolve(domain, "NS")
         results["NS"] = [str(r.target).rstrip(".") for r in ns_records]
     except Exception:
         results["NS"] = []
 
     # Registros TXT
     try:
-        txt_records = dns.resolver.resolve(domain, "TXT")
+        txt_records = resolver.resolve(domain, "TXT")
         results["TXT"] = [str(r).strip('"') for r in txt_records]
     except Exception:
         results["TXT"] = []
@@ -71,37 +134,11 @@ def dns_lookup(domain: str) -> dict:
     }
 
 
-def whois_lookup(target: str) -> dict:
-    """
-    Realiza una consulta WHOIS para un dominio o IP, obteniendo informacion de registro.
-
-    Usa esta herramienta cuando el usuario quiera saber quien registro un dominio,
-    cuando expira, o informacion del registrante.
+def _fetch_whois(domain: str) -> dict:
+    """Consulta WHOIS bloqueante; retorna los campos normalizados y serializables."""
+    import whois
 
-    Args:
-        target: Dominio o IP a consultar (ejemplo: 'example.com', '8.8.8.8').
-
-    Returns:
-        dict: Informacion WHOIS del dominio/IP.
-    """
-    try:
-        import whois
-    except ImportError:
-        return {
-            "status": "error",
-            "message": (
-                "python-whois no esta instalado. "
-                "Instala con: pip install python-whois"
-            ),
-        }
-
-    try:
-        w = whois.whois(target)
-    except Exception as e:
-        return {
-            "status": "error",
-            "message": f"Error en consulta WHOIS para '{target}': {e}",
-        }
+    w = whois.whois(domain)
 
     # Normalizar campos que pueden ser listas o valores unicos
     def _first(val):
@@ -115,94 +152,110 @@ def whois_lookup(target: str) -> dict:
         return str(val) if val else None
 
     return {
-        "status": "success",
-        "target": target,
-        "whois": {
-            "domain_name": _first(w.domain_name),
-            "registrar": _first(w.registrar),
-            "creation_date": _str_date(w.creation_date),
-            "expiration_date": _str_date(w.expiration_date),
-            "updated_date": _str_date(w.updated_date),
-            "name_servers": w.name_servers if isinstance(w.name_servers, list) else [],
-            "registrant": _first(getattr(w, "org", None) or getattr(w, "name", None)),
-            "country": _first(getattr(w, "country", None)),
-        },
+        "domain_name": _first(w.domain_name),
+        "registrar": _first(w.registrar),
+        "creation_date": _str_date(w.creation_date),
+        "expiration_date": _str_date(w.expiration_date),
+        "updated_date": _str_date(w.updated_date),
+        "name_servers": [str(ns) for ns in w.name_servers] if isinstance(w.name_servers, list) else [],
+        "registrant": _first(getattr(w, "org", None) or getattr(w, "name", None)),
+        "country": _first(getattr(w, "country", None)),
     }
 
 
-def check_http_headers(url: str) -> dict:
+async def whois_lookup(target: str) -> dict:
     """
-    Analiza los headers de seguridad HTTP de una URL.
+    Realiza una consulta WHOIS para un dominio o IP, obteniendo informacion de registro.
 
-    Verifica la presencia y configuracion de headers de seguridad criticos como
-    HSTS, CSP, X-Frame-Options, etc. Usa esta herramienta cuando el usuario quiera
-    evaluar la seguridad de los headers HTTP de un sitio web.
+    Usa esta herramienta cuando el usuario quiera saber quien registro un dominio,
+    cuando expira, o informacion del registrante. Los resultados se guardan en
+    cache por dominio registrable, asi que repetir la consulta es inmediato.
 
     Args:
-        url: La URL a analizar (ejemplo: 'https://example.com', 'https://google.com').
+        target: Dominio o IP a consultar (ejemplo: 'example.com', '8.8.8.8').
 
     Returns:
-        dict: Analisis de headers de seguridad con recomendaciones.
+        dict: Informacion WHOIS del dominio/IP.
     """
     try:
-        import httpx
+        import whois  # noqa: F401
     except ImportError:
         return {
             "status": "error",
             "message": (
-                "httpx no esta instalado. "
-                "Instala con: pip install httpx"
+                "python-whois no esta instalado. "
+                "Instala con: pip install python-whois"
             ),
         }
 
-    SECURITY_HEADERS = {
-        "strict-transport-security": {
-            "name": "Strict-Transport-Security (HSTS)",
-            "description": "Fuerza conexiones HTTPS. Previene ataques de downgrade.",
-            "recommendation": "Agregar header: Strict-Transport-Security: max-age=31536000; includeSubDomains; preload",
-        },
-        "content-security-policy": {
-            "name": "Content-Security-Policy (CSP)",
-            "description": "Controla origenes de contenido permitidos. Previene XSS.",
-            "recommendation": "Configurar CSP segun los recursos del sitio. Minimo: default-src 'self'",
-        },
-        "x-frame-options": {
-            "name": "X-Frame-Options",
-            "description": "Previene clickjacking al controlar el embedding en iframes.",
-            "recommendation": "Agregar header: X-Frame-Options: DENY o SAMEORIGIN",
-        },
-        "x-content-type-options": {
-            "name": "X-Content-Type-Options",
-            "description": "Previene MIME-type sniffing.",
-            "recommendation": "Agregar header: X-Content-Type-Options: nosniff",
-        },
-        "x-xss-protection": {
-            "name": "X-XSS-Protection",
-            "description": "Activa el filtro XSS del navegador (legacy, CSP es preferido).",
-            "recommendation": "Agregar header: X-XSS-Protection: 1; mode=block",
-        },
-        "referrer-policy": {
-            "name": "Referrer-Policy",
-            "description": "Controla informacion del referrer enviada en requests.",
-            "recommendation": "Agregar header: Referrer-Policy: strict-origin-when-cross-origin",
-        },
-        "permissions-policy": {
-            "name": "Permissions-Policy",
-            "description": "Controla APIs del navegador (camara, microfono, geolocalizacion).",
-            "recommendation": "Configurar segun necesidades. Ejemplo: Permissions-Policy: camera=(), microphone=()",
-        },
-    }
+    from cyberguard_agents.tools.whois_cache import get_whois_service, registrable_domain
 
+    domain = registrable_domain(target)
     try:
-        with httpx.Client(follow_redirects=True, timeout=10.0, verify=False) as client:
-            response = client.get(url)
+        payload, cached = await get_whois_service().lookup(domain, _fetch_whois)
     except Exception as e:
         return {
             "status": "error",
-            "message": f"Error al conectar con '{url}': {e}",
+            "message": f"Error en consulta WHOIS para '{target}': {e}",
         }
 
-    headers_lower = {k.lower(): v for k, v in response.headers.items()}
+    return {
+        "status": "success",
+        "target": target,
+        "queried_domain": domain,
+        "cached": cached,
+        "whois": payload,
+    }
+
+
+SECURITY_HEADERS = {
+    "strict-transport-security": {
+        "name": "Strict-Transport-Security (HSTS)",
+        "description": "Fuerza conexiones HTTPS. Previene ataques de downgrade.",
+        "recommendation": "Agregar header: Strict-Transport-Security: max-age=31536000; includeSubDomains; preload",
+    },
+    "content-security-policy": {
+        "name": "Content-Security-Policy (CSP)",
+        "description": "Controla origenes de contenido permitidos. Previene XSS.",
+        "recommendation": "Configurar CSP segun los recursos del sitio. Minimo: default-src 'self'",
+    },
+    "x-frame-options": {
+        "name": "X-Frame-Options",
+        "description": "Previene clickjacking al controlar el embedding en iframes.",
+        "recommendation": "Agregar header: X-Frame-Options: DENY o SAMEORIGIN",
+    },
+    "x-content-type-options": {
+        "name": "X-Content-Type-Options",
+        "description": "Previene MIME-type sniffing.",
+        "recommendation": "Agregar header: X-Content-Type-Options: nosniff",
+    },
+    "x-xss-protection": {
+        "name": "X-XSS-Protection",
+        "description": "Activa el filtro XSS del navegador (legacy, CSP es preferido).",
+        "recommendation": "Agregar header: X-XSS-Protection: 1; mode=block",
+    },
+    "referrer-policy": {
+        "name": "Referrer-Policy",
+        "description": "Controla informacion del referrer enviada en requests.",
+        "recommendation": "Agregar header: Referrer-Policy: strict-origin-when-cross-origin",
+    },
+    "permissions-policy": {
+        "name": "Permissions-Policy",
+        "description": "Controla APIs del navegador (camara, microfono, geolocalizacion).",
+        "recommendation": "Configurar segun necesidades. Ejemplo: Permissions-Policy: camera=(), microphone=()",
+    },
+}
+
+FETCH_MODES = ("head", "stream", "full")
+MAX_REDIRECTS = 10
+# Bytes de cuerpo que se leen como maximo por salto en modo 'full'
+MAX_BODY_BYTES = 64 * 1024
+# Cuerpos hasta este tamano se terminan de leer en un GET para devolver la conexion keep-alive al pool
+MAX_DRAIN_BYTES = 16 * 1024
+
+
+def _grade_headers(headers_lower: dict) -> tuple[list, int, str]:
+    """Evalua los headers de seguridad de una respuesta. Retorna (analisis, presentes, grado)."""
     analysis = []
     present_count = 0
 
@@ -224,10 +277,7 @@ def check_http_headers(url: str) -> dict:
                 "recommendation": info["recommendation"],
             })
 
-    total = len(SECURITY_HEADERS)
-    score = f"{present_count}/{total}"
-
-    if present_count == total:
+    if present_count == len(SECURITY_HEADERS):
         grade = "A"
     elif present_count >= 5:
         grade = "B"
@@ -238,12 +288,128 @@ def check_http_headers(url: str) -> dict:
     else:
         grade = "F"
 
+    return analysis, present_count, grade
+
+
+async def _fetch_hop(client, url: str, mode: str) -> tuple[int, dict, int]:
+    """
+    Obtiene los headers de un solo salto, sin seguir redirecciones.
+
+    - head: HEAD, con GET como respaldo si el servidor lo rechaza (405/501).
+    - stream: GET que termina de leer cuerpos de hasta MAX_DRAIN_BYTES; uno mas
+      grande se corta tras los headers (en HTTP/1.1 eso cierra la conexion).
+    - full: GET leyendo el cuerpo hasta MAX_BODY_BYTES.
+
+    Retorna (status_code, headers en minusculas, bytes de cuerpo descargados).
+    """
+    if mode == "head":
+        response = await client.head(url, follow_redirects=False)
+        if response.status_code not in (405, 501):
+            return response.status_code, {k.lower(): v for k, v in response.headers.items()}, 0
+
+    async with client.stream("GET", url, follow_redirects=False) as response:
+        headers_lower = {k.lower(): v for k, v in response.headers.items()}
+        limit = MAX_BODY_BYTES if mode == "full" else MAX_DRAIN_BYTES
+        length = headers_lower.get("content-length", "")
+        body_bytes = 0
+        if not (length.isdigit() and int(length) > limit):
+            async for chunk in response.aiter_raw():
+                body_bytes += len(chunk)
+                if body_bytes >= limit:
+                    break
+        return response.status_code, headers_lower, body_bytes
+
+
+async def check_http_headers(url: str, mode: str = "head") -> dict:
+    """
+    Analiza los headers de seguridad HTTP de una URL y de cada salto de sus redirecciones.
+
+    Verifica la presencia y configuracion de headers de seguridad criticos como
+    HSTS, CSP, X-Frame-Options, etc. Usa esta herramienta cuando el usuario quiera
+    evaluar la seguridad de los headers HTTP de un sitio web.
+
+    En el modo por defecto solo se descargan los headers (HEAD); si el servidor no
+    acepta HEAD, o en los otros modos, se leen a lo sumo 16 KB ('stream') o 64 KB
+    ('full') del cuerpo de cada salto.
+
+    Args:
+        url: La URL a analizar (ejemplo: 'https://example.com', 'https://google.com').
+        mode: Forma de obtener los headers. 'head' (HEAD con GET de respaldo),
+              'stream' (GET que lee cuerpos chicos para reutilizar la conexion) o
+              'full' (GET con cuerpo limitado a 64 KB).
+
+    Returns:
+        dict: Analisis de headers de seguridad con recomendaciones y la cadena de redirecciones.
+    """
+    try:
+        from cyberguard_agents.tools.http_client import get_http_client, host_slot
+        client = get_http_client()
+    except ImportError:
+        return {
+            "status": "error",
+            "message": (
+                "httpx no esta instalado. "
+                "Instala con: pip install httpx"
+            ),
+        }
+
+    mode = mode.lower().strip()
+    if mode not in FETCH_MODES:
+        return {
+            "status": "error",
+            "message": f"Modo '{mode}' no valido. Opciones: {', '.join(FETCH_MODES)}",
+        }
+
+    chain = []
+    body_total = 0
+    current = url
+
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            async with host_slot(current):
+                status_code, headers_lower, body_bytes = await _fetch_hop(client, current, mode)
+            body_total += body_bytes
+
+            analysis, present_count, grade = _grade_headers(headers_lower)
+            location = headers_lower.get("location")
+            chain.append({
+                "url": current,
+                "http_status": status_code,
+                "grade": grade,
+                "security_score": f"{present_count}/{len(SECURITY_HEADERS)}",
+                "missing": [h["header"] for h in analysis if h["status"] == "missing"],
+            })
+
+            if not (300 <= status_code < 400 and location):
+                break
+            current = urljoin(current, location)
+        else:
+            return {
+                "status": "error",
+                "message": f"Demasiadas redirecciones (mas de {MAX_REDIRECTS}) desde '{url}'.",
+                "redirect_chain": chain,
+            }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Error al conectar con '{current}': {e}",
+            "redirect_chain": chain,
+        }
+
+    # Peor grado de la cadena: una redireccion sin HSTS sigue siendo explotable
+    worst_grade = max(hop["grade"] for hop in chain)
+
     return {
         "status": "success",
         "url": url,
-        "http_status": response.status_code,
+        "final_url": current,
+        "http_status": status_code,
         "server": headers_lower.get("server", "no reportado"),
-        "security_score": score,
+        "security_score": f"{present_count}/{len(SECURITY_HEADERS)}",
         "grade": grade,
         "headers_analysis": analysis,
+        "redirect_chain": chain,
+        "worst_grade_in_chain": worst_grade,
+        "fetch_mode": mode,
+        "body_bytes_downloaded": body_total,
     }
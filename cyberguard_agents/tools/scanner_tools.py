@@ -1,10 +1,32 @@
 """
 Herramientas de escaneo de puertos y vulnerabilidades con nmap real.
 
-Usa python-nmap como wrapper del CLI de nmap.
-Si nmap no esta instalado, retorna error descriptivo.
+Usa python-nmap como wrapper del CLI de nmap. python-nmap se importa al crear
+el escaner y no al cargar el modulo, asi que importar las herramientas no
+requiere nmap. Si nmap no esta instalado, retorna error descriptivo.
 """
-import nmap
+
+
+def _port_scanner():
+    """Retorna (nmap.PortScanner, None) o (None, dict de error) si falta python-nmap o nmap."""
+    try:
+        import nmap
+    except ImportError:
+        return None, {
+            "status": "error",
+            "message": "python-nmap no esta instalado. Instala con: pip install python-nmap",
+        }
+    try:
+        return nmap.PortScanner(), None
+    except nmap.PortScannerError:
+        return None, {
+            "status": "error",
+            "message": (
+                "nmap no esta instalado o no se encuentra en el PATH. "
+                "Instala nmap: https://nmap.org/download.html — "
+                "En Linux: sudo apt install nmap | En Windows: descarga el instalador desde nmap.org"
+            ),
+        }
 
 
 def scan_ports(target: str, port_range: str = "1-1024") -> dict:
@@ -21,17 +43,9 @@ def scan_ports(target: str, port_range: str = "1-1024") -> dict:
     Returns:
         dict: Resultado del escaneo con puertos abiertos y servicios detectados.
     """
-    try:
-        scanner = nmap.PortScanner()
-    except nmap.PortScannerError:
-        return {
-            "status": "error",
-            "message": (
-                "nmap no esta instalado o no se encuentra en el PATH. "
-                "Instala nmap: https://nmap.org/download.html — "
-                "En Linux: sudo apt install nmap | En Windows: descarga el instalador desde nmap.org"
-            ),
-        }
+    scanner, error = _port_scanner()
+    if error:
+        return error
 
     try:
         scanner.scan(hosts=target, ports=port_range, arguments="-sV")
@@ -139,17 +153,9 @@ def scan_vulnerabilities(target: str, port_range: str = "1-1024") -> dict:
     Returns:
         dict: Vulnerabilidades detectadas organizadas por puerto y servicio.
     """
-    try:
-        scanner = nmap.PortScanner()
-    except nmap.PortScannerError:
-        return {
-            "status": "error",
-            "message": (
-                "nmap no esta instalado o no se encuentra en el PATH. "
-                "Instala nmap: https://nmap.org/download.html — "
-                "En Linux: sudo apt install nmap | En Windows: descarga el instalador desde nmap.org"
-            ),
-        }
+    scanner, error = _port_scanner()
+    if error:
+        return error
 
     try:
         scanner.scan(hosts=target, ports=port_range, arguments="-sV --script vuln")
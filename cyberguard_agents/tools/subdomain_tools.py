@@ -0,0 +1,263 @@
+"""
+Enumeracion de subdominios por diccionario.
+
+Resuelve listas de etiquetas (de decenas a cientos de miles) contra el dominio
+objetivo con asyncio y dnspython, a una tasa maxima de consultas por segundo.
+Antes de empezar detecta DNS comodin (*.dominio) para descartar los falsos
+positivos, y agrupa los hallazgos por conjunto de IPs resueltas.
+
+Usa el mismo resolver configurado que dns_lookup (ver recon_tools.configure_resolver).
+
+Las listas en archivo solo se leen de CYBERGUARD_WORDLIST_DIR y se nombran
+relativas a ese directorio: el nombre llega del LLM, y una ruta libre permitiria
+leer cualquier archivo del servidor y sacarlo en las consultas DNS.
+"""
+import asyncio
+import os
+import secrets
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Iterator
+
+from cyberguard_agents.tools.file_access import WORDLIST_DIR_ENV, allowed_file
+
+from cyberguard_agents.tools.recon_tools import new_async_resolver
+from cyberguard_agents.tools.throttle import AsyncTokenBucket
+
+DEFAULT_WORDLIST = (
+    "www", "mail", "webmail", "smtp", "pop", "imap", "mx", "ns1", "ns2", "ns3",
+    "dns", "vpn", "remote", "gw", "gateway", "firewall", "proxy", "api", "dev",
+    "test", "testing", "qa", "stage", "staging", "uat", "prod", "beta", "demo",
+    "admin", "portal", "intranet", "extranet", "internal", "corp", "sso", "auth",
+    "login", "id", "accounts", "secure", "app", "apps", "m", "mobile", "static",
+    "cdn", "assets", "img", "images", "media", "files", "download", "downloads",
+    "docs", "wiki", "blog", "news", "shop", "store", "pay", "payments", "billing",
+    "crm", "erp", "hr", "support", "help", "helpdesk", "status", "monitor",
+    "grafana", "kibana", "jenkins", "ci", "git", "gitlab", "jira", "confluence",
+    "db", "mysql", "sql", "redis", "mongo", "backup", "ftp", "sftp", "owa",
+    "exchange", "autodiscover", "lyncdiscover", "sip", "cpanel", "whm", "ns",
+    "old", "new", "legacy", "v1", "v2", "cloud", "k8s", "s3", "storage",
+)
+
+DEFAULT_QPS = 500
+# Tope de qps que acepta el servidor (API y agente): un pedido no lo convierte en un flood de DNS
+DEFAULT_MAX_QPS = 1000
+DEFAULT_CONCURRENCY = 200
+WILDCARD_PROBES = 3
+# Limite de grupos devueltos al agente
+MAX_TOOL_RESULTS = 200
+
+
+def max_qps() -> float:
+    """Tope de consultas por segundo de una enumeracion pedida al servidor (CYBERGUARD_SUBDOMAIN_MAX_QPS)."""
+    return float(os.getenv("CYBERGUARD_SUBDOMAIN_MAX_QPS", DEFAULT_MAX_QPS))
+
+
+def wordlist_path(name: str) -> Path | None:
+    """Archivo `name` dentro de CYBERGUARD_WORDLIST_DIR, o None si no hay directorio o no existe ahi."""
+    return allowed_file(name, WORDLIST_DIR_ENV)
+
+
+def iter_labels(wordlist: str | Iterable[str] | None) -> Iterator[str]:
+    """
+    Genera etiquetas desde la lista integrada ('default'), el nombre de un archivo
+    de CYBERGUARD_WORDLIST_DIR (una etiqueta por linea, leida en streaming), una
+    cadena separada por comas o cualquier iterable. Omite vacios, comentarios y
+    duplicados consecutivos. Lanza ValueError de inmediato si la cadena parece una
+    ruta fuera del directorio de listas.
+    """
+    if wordlist is None or wordlist == "default":
+        source: Iterable[str] = DEFAULT_WORDLIST
+    elif isinstance(wordlist, str) and (path := wordlist_path(wordlist)) is not None:
+        source = _read_lines(path)
+    elif isinstance(wordlist, str) and ("/" in wordlist or "\\" in wordlist):
+        raise ValueError(
+            f"'{wordlist}' no es una lista de CYBERGUARD_WORDLIST_DIR; "
+            "usa 'default', el nombre de una lista de ese directorio o etiquetas separadas por coma."
+        )
+    elif isinstance(wordlist, str):
+        source = wordlist.split(",")
+    else:
+        source = wordlist
+    return _dedupe(source)
+
+
+def _dedupe(source: Iterable[str]) -> Iterator[str]:
+    previous = None
+    for raw in source:
+        label = raw.split("#", 1)[0].strip().strip(".").lower()
+        if label and label != previous:
+            previous = label
+            yield label
+
+
+def _read_lines(path: Path) -> Iterator[str]:
+    with path.open(encoding="utf-8", errors="ignore") as f:
+        yield from f
+
+
+async def _resolve_a(resolver, name: str) -> list[str]:
+    """Retorna las IPs A de `name` ([] si no existe o no responde)."""
+    import dns.exception
+
+    try:
+        answer = await resolver.resolve(name, "A", raise_on_no_answer=False)
+    except dns.exception.DNSException:
+        return []
+    if answer.rrset is None:
+        return []
+    return sorted(r.address for r in answer.rrset)
+
+
+async def detect_wildcard(resolver, domain: str, probes: int = WILDCARD_PROBES) -> set[str]:
+    """Resuelve etiquetas aleatorias; si responden, el dominio tiene DNS comodin."""
+    names = [f"{secrets.token_hex(8)}.{domain}" for _ in range(probes)]
+    results = await asyncio.gather(*(_resolve_a(resolver, n) for n in names))
+    wildcard_ips = set()
+    for ips in results:
+        wildcard_ips.update(ips)
+    return wildcard_ips
+
+
+async def iter_subdomains(
+    domain: str,
+    wordlist: str | Iterable[str] | None = None,
+    qps: float = DEFAULT_QPS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    resolver=None,
+    stats: dict | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Resuelve `etiqueta.domain` para cada etiqueta y produce los subdominios
+    encontrados conforme se resuelven.
+
+    Cada resultado incluye `ips` y, si ese mismo conjunto de IPs ya aparecio,
+    `same_ips_as` con el primer subdominio que lo resolvio. Los hallazgos que
+    solo apuntan a las IPs del comodin se descartan. Si se pasa `stats`, se
+    actualiza con los contadores de la ejecucion.
+    """
+    domain = domain.strip().lower().rstrip(".")
+    resolver = resolver or new_async_resolver()
+    stats = stats if stats is not None else {}
+    stats.update({"queried": 0, "found": 0, "wildcard_filtered": 0})
+    labels = iter_labels(wordlist)
+
+    wildcard_ips = await detect_wildcard(resolver, domain)
+    stats["wildcard_ips"] = sorted(wildcard_ips)
+
+    bucket = AsyncTokenBucket(qps, burst=max(1.0, qps / 10))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    first_by_ips: dict[tuple, str] = {}
+    done = object()
+
+    async def worker():
+        try:
+            for label in labels:
+                name = f"{label}.{domain}"
+                await bucket.acquire()
+                ips = await _resolve_a(resolver, name)
+                stats["queried"] += 1
+                if not ips:
+                    continue
+                if wildcard_ips and set(ips) <= wildcard_ips:
+                    stats["wildcard_filtered"] += 1
+                    continue
+                await queue.put({"subdomain": name, "ips": ips})
+        finally:
+            await queue.put(done)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    remaining = len(workers)
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is done:
+                remaining -= 1
+                continue
+            key = tuple(item["ips"])
+            if key in first_by_ips:
+                item["same_ips_as"] = first_by_ips[key]
+            else:
+                first_by_ips[key] = item["subdomain"]
+            stats["found"] += 1
+            yield item
+        for w in workers:
+            # Propaga excepciones inesperadas de los workers
+            w.result()
+    finally:
+        for w in workers:
+            w.cancel()
+
+
+async def enumerate_subdomains(
+    domain: str,
+    wordlist: str = "default",
+    qps: int = DEFAULT_QPS,
+) -> dict:
+    """
+    Descubre subdominios de un dominio resolviendo una lista de palabras por DNS.
+
+    Usa esta herramienta cuando el usuario quiera descubrir subdominios o la
+    superficie expuesta de un dominio (no solo los que ya conoce). Detecta DNS
+    comodin y descarta sus falsos positivos, y agrupa los subdominios que
+    resuelven a las mismas IPs.
+
+    Args:
+        domain: Dominio base (ejemplo: 'example.com').
+        wordlist: 'default' para la lista integrada (~100 etiquetas comunes), el
+                  nombre de una lista del directorio de listas del servidor
+                  (ejemplo: 'top-20000.txt'), o etiquetas separadas por coma
+                  (ejemplo: 'www,vpn,mail').
+        qps: Consultas DNS por segundo como maximo (ejemplo: 500); el servidor
+             aplica su propio tope (default 1000).
+
+    Returns:
+        dict: Subdominios encontrados agrupados por IPs y estadisticas de la enumeracion.
+    """
+    try:
+        import dns.asyncresolver  # noqa: F401
+    except ImportError:
+        return {
+            "status": "error",
+            "message": (
+                "dnspython no esta instalado. "
+                "Instala con: pip install dnspython"
+            ),
+        }
+
+    if qps <= 0:
+        return {"status": "error", "message": "qps debe ser mayor que 0."}
+    qps = min(qps, max_qps())
+    try:
+        iter_labels(wordlist)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    stats: dict = {}
+    groups: dict[tuple, list[str]] = {}
+    try:
+        async for item in iter_subdomains(domain, wordlist, qps=qps, stats=stats):
+            groups.setdefault(tuple(item["ips"]), []).append(item["subdomain"])
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Error enumerando subdominios de '{domain}': {e}",
+        }
+
+    grouped = [
+        {"ips": list(ips), "subdomains": sorted(names)}
+        for ips, names in sorted(groups.items(), key=lambda g: -len(g[1]))
+    ]
+
+    return {
+        "status": "success",
+        "domain": domain,
+        "qps": qps,
+        "wildcard_dns": bool(stats["wildcard_ips"]),
+        "wildcard_ips": stats["wildcard_ips"],
+        "labels_queried": stats["queried"],
+        "subdomains_found": stats["found"],
+        "wildcard_filtered": stats["wildcard_filtered"],
+        "unique_ip_sets": len(grouped),
+        "groups": grouped[:MAX_TOOL_RESULTS],
+        "truncated": len(grouped) > MAX_TOOL_RESULTS,
+    }
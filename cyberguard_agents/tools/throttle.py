@@ -0,0 +1,42 @@
+"""
+Limitadores de tasa asincronos compartidos por las herramientas.
+
+Los servidores WHOIS y DNS bloquean a los clientes que consultan demasiado
+rapido; AsyncTokenBucket reparte las consultas a una tasa fija con una
+rafaga maxima permitida.
+"""
+import asyncio
+import time
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket para corrutinas: `rate` tokens por segundo, hasta `burst` acumulados.
+
+    Los que esperan se atienden en orden de llegada.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate debe ser mayor que 0")
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Espera hasta disponer de `tokens`. Retorna los segundos esperados."""
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return time.monotonic() - started
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
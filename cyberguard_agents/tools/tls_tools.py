@@ -0,0 +1,404 @@
+"""
+Inspeccion TLS: versiones de protocolo, cadena de certificados, expiracion,
+cobertura SAN y cifrados debiles.
+
+Cada host requiere varios handshakes cortos (uno por version y por categoria
+de cifrado debil). Se ejecutan en hilos con paralelismo acotado entre hosts, y
+el handshake principal reutiliza la sesion TLS anterior del mismo host cuando
+el servidor lo permite.
+
+El analisis de certificados requiere `cryptography`. La cadena intermedia enviada
+por el servidor solo se puede leer desde Python 3.13 (SSLSocket.get_unverified_chain);
+en versiones anteriores se reporta solo el certificado hoja y el resultado lo indica
+en `chain_note`.
+"""
+import asyncio
+import socket
+import ssl
+import threading
+import warnings
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterable
+
+HANDSHAKE_TIMEOUT = 5.0
+DEFAULT_PARALLEL = 20
+EXPIRY_WARNING_DAYS = 30
+# Sesiones TLS guardadas para reanudar (las de los hosts menos recientes se descartan)
+MAX_SESSIONS = 1024
+LEAF_ONLY_NOTE = (
+    "Python anterior a 3.13 no expone la cadena enviada por el servidor: solo se analizo "
+    "el certificado hoja y no se pueden revisar los intermedios."
+)
+
+PROTOCOLS = {
+    "TLSv1": ssl.TLSVersion.TLSv1,
+    "TLSv1.1": ssl.TLSVersion.TLSv1_1,
+    "TLSv1.2": ssl.TLSVersion.TLSv1_2,
+    "TLSv1.3": ssl.TLSVersion.TLSv1_3,
+}
+DEPRECATED_PROTOCOLS = ("TLSv1", "TLSv1.1")
+
+# Categoria -> cadena de cifrados OpenSSL (se prueban con TLS 1.2 como maximo)
+WEAK_CIPHER_CATEGORIES = {
+    "NULL (sin cifrado)": "eNULL",
+    "Anonimos (sin autenticacion)": "aNULL",
+    "EXPORT": "EXP",
+    "RC4": "RC4",
+    "3DES": "3DES",
+    "RSA estatico (sin forward secrecy)": "kRSA",
+    "CBC con SHA1": "SHA1:!kRSA",
+}
+
+# Contexto compartido para el handshake principal: las sesiones solo se
+# reanudan con el mismo SSLContext.
+_main_context: ssl.SSLContext | None = None
+_verify_context: ssl.SSLContext | None = None
+_sessions: OrderedDict[tuple[str, int], ssl.SSLSession] = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def _insecure_context() -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _get_main_context() -> ssl.SSLContext:
+    global _main_context
+    if _main_context is None:
+        _main_context = _insecure_context()
+    return _main_context
+
+
+def _handshake(host: str, port: int, context: ssl.SSLContext, session=None, server_name=None):
+    """Conecta y completa un handshake TLS. El llamador debe cerrar el socket."""
+    raw = socket.create_connection((host, port), timeout=HANDSHAKE_TIMEOUT)
+    try:
+        return context.wrap_socket(raw, server_hostname=server_name or host, session=session)
+    except BaseException:
+        raw.close()
+        raise
+
+
+def _probe(host: str, port: int, context: ssl.SSLContext, server_name: str) -> tuple | None:
+    """Retorna el cifrado negociado, o None si el servidor rechaza el handshake."""
+    try:
+        with _handshake(host, port, context, server_name=server_name) as tls:
+            return tls.cipher()
+    except (ssl.SSLError, ConnectionError, socket.timeout):
+        return None
+
+
+def _probe_protocol(host: str, port: int, name: str, server_name: str) -> bool | None:
+    """True/False si el servidor acepta la version; None si este cliente no puede probarla."""
+    version = PROTOCOLS[name]
+    if not _client_supports(version):
+        return None
+    context = _insecure_context()
+    try:
+        with warnings.catch_warnings():
+            # Python marca TLSv1/TLSv1_1 como obsoletos; aqui se usan a proposito
+            warnings.simplefilter("ignore", DeprecationWarning)
+            if name in DEPRECATED_PROTOCOLS:
+                # OpenSSL 3 deshabilita TLS 1.0/1.1 en los niveles de seguridad por defecto
+                context.set_ciphers("ALL:@SECLEVEL=0")
+            context.minimum_version = version
+            context.maximum_version = version
+    except (ssl.SSLError, ValueError):
+        return None
+    return _probe(host, port, context, server_name) is not None
+
+
+def _client_supports(version: ssl.TLSVersion) -> bool:
+    attr = {
+        ssl.TLSVersion.TLSv1: "HAS_TLSv1",
+        ssl.TLSVersion.TLSv1_1: "HAS_TLSv1_1",
+        ssl.TLSVersion.TLSv1_2: "HAS_TLSv1_2",
+        ssl.TLSVersion.TLSv1_3: "HAS_TLSv1_3",
+    }[version]
+    return getattr(ssl, attr, False)
+
+
+def _probe_weak_ciphers(host: str, port: int, server_name: str) -> tuple[list, list]:
+    """Retorna (aceptados, categorias que este cliente no puede ofrecer)."""
+    accepted, untested = [], []
+    for category, cipher_string in WEAK_CIPHER_CATEGORIES.items():
+        context = _insecure_context()
+        try:
+            context.set_ciphers(cipher_string + ":@SECLEVEL=0")
+            context.maximum_version = ssl.TLSVersion.TLSv1_2
+            context.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+        except (ssl.SSLError, ValueError):
+            untested.append(category)
+            continue
+        cipher = _probe(host, port, context, server_name)
+        if cipher is not None:
+            accepted.append({"category": category, "cipher": cipher[0], "protocol": cipher[1]})
+    return accepted, untested
+
+
+def _get_session(key: tuple[str, int]) -> ssl.SSLSession | None:
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is not None:
+            _sessions.move_to_end(key)
+        return session
+
+
+def _store_session(key: tuple[str, int], session: ssl.SSLSession) -> None:
+    with _sessions_lock:
+        _sessions[key] = session
+        _sessions.move_to_end(key)
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+
+
+def _peer_chain(tls: ssl.SSLSocket) -> tuple[list[bytes], bool]:
+    """
+    Cadena enviada por el servidor en DER (hoja primero) y si esta completa.
+    SSLSocket.get_unverified_chain() es publica desde Python 3.13; antes solo se
+    obtiene el certificado hoja.
+    """
+    getter = getattr(tls, "get_unverified_chain", None)
+    if getter is not None:
+        return list(getter() or []), True
+    leaf = tls.getpeercert(binary_form=True)
+    return ([leaf] if leaf else []), False
+
+
+def _hostname_matches(hostname: str, pattern: str) -> bool:
+    hostname, pattern = hostname.lower().rstrip("."), pattern.lower().rstrip(".")
+    if pattern.startswith("*."):
+        head, _, rest = hostname.partition(".")
+        return bool(head) and rest == pattern[2:]
+    return hostname == pattern
+
+
+def _describe_certificate(der: bytes, hostname: str | None = None) -> dict:
+    from cryptography import x509
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    cert = x509.load_der_x509_certificate(der)
+    now = datetime.now(timezone.utc)
+    not_after = cert.not_valid_after_utc
+
+    info = {
+        "subject": cert.subject.rfc4514_string(),
+        "issuer": cert.issuer.rfc4514_string(),
+        "not_before": cert.not_valid_before_utc.isoformat(),
+        "not_after": not_after.isoformat(),
+        "days_to_expiry": (not_after - now).days,
+        "expired": not_after < now,
+        "self_signed": cert.issuer == cert.subject,
+        "signature_algorithm": cert.signature_hash_algorithm.name if cert.signature_hash_algorithm else None,
+    }
+
+    key = cert.public_key()
+    if isinstance(key, rsa.RSAPublicKey):
+        info["key"] = f"RSA {key.key_size}"
+    elif isinstance(key, ec.EllipticCurvePublicKey):
+        info["key"] = f"EC {key.curve.name}"
+    else:
+        info["key"] = type(key).__name__
+
+    if hostname is not None:
+        try:
+            san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+            names = san.value.get_values_for_type(x509.DNSName)
+        except x509.ExtensionNotFound:
+            names = []
+        info["san"] = names
+        info["hostname_covered"] = any(_hostname_matches(hostname, n) for n in names)
+
+    return info
+
+
+def _verify(host: str, port: int, server_name: str) -> tuple[bool, str | None]:
+    """Handshake con validacion completa (CAs del sistema + nombre del host)."""
+    global _verify_context
+    if _verify_context is None:
+        _verify_context = ssl.create_default_context()
+    try:
+        with _handshake(host, port, _verify_context, server_name=server_name):
+            return True, None
+    except ssl.SSLCertVerificationError as e:
+        return False, e.verify_message or str(e)
+    except (ssl.SSLError, OSError) as e:
+        return False, str(e)
+
+
+def _grade(result: dict) -> tuple[str, list[str]]:
+    issues = []
+    cert = result["certificate"]
+    protocols = result["protocols"]
+
+    if cert["expired"]:
+        issues.append("Certificado expirado.")
+    elif cert["days_to_expiry"] < EXPIRY_WARNING_DAYS:
+        issues.append(f"Certificado expira en {cert['days_to_expiry']} dias.")
+    if not cert.get("hostname_covered", True):
+        issues.append("El nombre del host no esta cubierto por el SAN del certificado.")
+    if not result["trusted"]:
+        issues.append(f"Certificado no confiable: {result['verify_error']}")
+    for name in DEPRECATED_PROTOCOLS:
+        if protocols.get(name):
+            issues.append(f"{name} habilitado (obsoleto). Deshabilitar.")
+    if protocols.get("TLSv1.3") is False:
+        issues.append("TLSv1.3 no soportado.")
+    for weak in result["weak_ciphers"]:
+        issues.append(f"Acepta cifrado debil {weak['cipher']} ({weak['category']}).")
+    if cert.get("signature_algorithm") in ("md5", "sha1"):
+        issues.append(f"Firma del certificado con {cert['signature_algorithm']}.")
+    if cert.get("key", "").startswith("RSA ") and int(cert["key"].split()[1]) < 2048:
+        issues.append(f"Llave {cert['key']} menor a 2048 bits.")
+
+    if cert["expired"] or any(w["category"].startswith(("NULL", "Anonimos", "EXPORT", "RC4"))
+                              for w in result["weak_ciphers"]):
+        grade = "F"
+    elif not result["trusted"] or not cert.get("hostname_covered", True):
+        grade = "T"
+    elif any(protocols.get(n) for n in DEPRECATED_PROTOCOLS) or result["weak_ciphers"]:
+        grade = "C"
+    elif issues:
+        grade = "B"
+    else:
+        grade = "A"
+    return grade, issues
+
+
+def inspect_tls(host: str, port: int = 443, server_name: str | None = None) -> dict:
+    """Inspeccion TLS completa y bloqueante de un host. Ver check_tls."""
+    try:
+        import cryptography  # noqa: F401
+    except ImportError:
+        return {
+            "status": "error",
+            "message": (
+                "cryptography no esta instalado. "
+                "Instala con: pip install cryptography"
+            ),
+        }
+
+    server_name = server_name or host
+    key = (host, port)
+    session = _get_session(key)
+
+    try:
+        with _handshake(host, port, _get_main_context(), session=session, server_name=server_name) as tls:
+            negotiated = tls.cipher()
+            session_reused = tls.session_reused
+            chain_der, chain_available = _peer_chain(tls)
+            if tls.session is not None:
+                _store_session(key, tls.session)
+    except (ssl.SSLError, OSError) as e:
+        return {
+            "status": "error",
+            "message": f"No se pudo establecer TLS con {host}:{port}: {e}",
+        }
+
+    if not chain_der:
+        return {"status": "error", "message": f"{host}:{port} no envio certificado."}
+
+    leaf = _describe_certificate(chain_der[0], hostname=server_name)
+    chain = []
+    for der in chain_der[1:]:
+        info = _describe_certificate(der)
+        chain.append({k: info[k] for k in ("subject", "issuer", "not_after", "expired")})
+
+    trusted, verify_error = _verify(host, port, server_name)
+    protocols = {name: _probe_protocol(host, port, name, server_name) for name in PROTOCOLS}
+    weak, untested = _probe_weak_ciphers(host, port, server_name)
+
+    result = {
+        "status": "success",
+        "host": host,
+        "port": port,
+        "negotiated": {"cipher": negotiated[0], "protocol": negotiated[1], "bits": negotiated[2]},
+        "protocols": protocols,
+        "certificate": leaf,
+        "chain": chain,
+        "chain_available": chain_available,
+        **({} if chain_available else {"chain_note": LEAF_ONLY_NOTE}),
+        "trusted": trusted,
+        "verify_error": verify_error,
+        "weak_ciphers": weak,
+        "untested_cipher_categories": untested,
+        "session_reused": session_reused,
+    }
+    result["grade"], result["issues"] = _grade(result)
+    return result
+
+
+async def iter_tls_inspections(
+    targets: Iterable[tuple[str, int]],
+    max_parallel: int = DEFAULT_PARALLEL,
+) -> AsyncIterator[dict]:
+    """Inspecciona muchos (host, puerto) en paralelo acotado; produce resultados al terminar."""
+    semaphore = asyncio.Semaphore(max_parallel)
+
+    async def run(host, port):
+        async with semaphore:
+            return await asyncio.to_thread(inspect_tls, host, port)
+
+    tasks = [asyncio.ensure_future(run(h, p)) for h, p in targets]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def parse_target(target: str, port: int = 443) -> tuple[str, int]:
+    """
+    (host, puerto) de 'host', 'host:puerto', '[ipv6]:puerto', una IPv6 sin corchetes
+    o una URL. El puerto del objetivo tiene prioridad sobre `port`. Lanza ValueError
+    si el puerto no es valido.
+    """
+    host = target.strip().lower()
+    if "://" in host:
+        host = host.split("://", 1)[1]
+    host = host.split("/", 1)[0].rsplit("@", 1)[-1]
+    if host.startswith("["):
+        host, _, rest = host[1:].partition("]")
+        port_text = rest[1:] if rest.startswith(":") else ""
+    elif host.count(":") == 1:
+        host, port_text = host.split(":")
+    else:
+        # Sin puerto, o una IPv6 sin corchetes
+        port_text = ""
+    if port_text:
+        if not port_text.isdigit() or not 0 < int(port_text) < 65536:
+            raise ValueError(f"Puerto invalido: '{port_text}'")
+        port = int(port_text)
+    return host.rstrip("."), port
+
+
+async def check_tls(host: str, port: int = 443) -> dict:
+    """
+    Inspecciona la configuracion TLS de un servidor.
+
+    Reporta versiones de protocolo aceptadas (TLS 1.0 a 1.3), la cadena de
+    certificados (antes de Python 3.13 solo el certificado hoja; ver chain_note),
+    fecha de expiracion, si el SAN cubre el nombre del host, si el
+    certificado es confiable y que cifrados debiles acepta. Usa esta herramienta
+    cuando el usuario quiera verificar el certificado o la configuracion TLS de
+    un sitio o servicio (por ejemplo, el puerto 443 encontrado en un escaneo).
+
+    Args:
+        host: Hostname o IP del servidor, opcionalmente con puerto
+              (ejemplo: 'example.com', 'mail.example.com:993', '[2001:db8::1]:8443').
+        port: Puerto TLS si el host no lo incluye (ejemplo: 443, 8443, 993).
+
+    Returns:
+        dict: Protocolos, certificado, cifrados debiles, problemas encontrados y grado (A-F, T = no confiable).
+    """
+    try:
+        host, port = parse_target(host, port)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    if not host:
+        return {"status": "error", "message": "Indica un host."}
+    return await asyncio.to_thread(inspect_tls, host, port)
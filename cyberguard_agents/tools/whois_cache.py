@@ -0,0 +1,204 @@
+"""
+Cache persistente y cola con limite de tasa para consultas WHOIS.
+
+Los datos de registro casi no cambian y los servidores WHOIS bloquean a quien
+consulta demasiado rapido, asi que:
+
+- Las respuestas se guardan en SQLite por dominio registrable (www.example.co.uk
+  y mail.example.co.uk comparten la entrada example.co.uk) con un TTL configurable.
+- Las consultas en vivo pasan por un token bucket por servidor WHOIS (uno por TLD).
+- Las consultas concurrentes del mismo dominio se agrupan en una sola.
+- whois.whois y SQLite corren en hilos, nunca en el event loop.
+
+Configuracion por variables de entorno:
+    CYBERGUARD_WHOIS_CACHE  Ruta del archivo SQLite (default ~/.cache/cyberguard/whois.sqlite3)
+    CYBERGUARD_WHOIS_TTL    Segundos de validez de una entrada (default 7 dias)
+    CYBERGUARD_WHOIS_RATE   Consultas por segundo por servidor WHOIS (default 1)
+"""
+import asyncio
+import ipaddress
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from cyberguard_agents.tools.throttle import AsyncTokenBucket
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "cyberguard" / "whois.sqlite3"
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 3
+
+
+def registrable_domain(target: str) -> str:
+    """
+    Normaliza un dominio, URL o IP a la clave de cache.
+
+    Los dominios se reducen al dominio registrable segun la Public Suffix List
+    incluida en python-whois; las IPs (incluidas las IPv6 entre corchetes de una
+    URL y las IPv4 con puerto) se conservan en su forma canonica.
+    """
+    value = target.strip().lower()
+    if "://" in value:
+        value = value.split("://", 1)[1]
+    value = value.split("/", 1)[0].rstrip(".")
+    if value.startswith("["):
+        # IPv6 literal de URL: [2001:db8::1] o [2001:db8::1]:443
+        value = value[1:].split("]", 1)[0]
+
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        pass
+
+    value = value.split(":", 1)[0]
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        pass
+    try:
+        from whois import extract_domain
+        return extract_domain(value) or value
+    except Exception:
+        return value
+
+
+def whois_server_key(domain: str) -> str:
+    """Clave del servidor WHOIS responsable: el TLD, o el RIR generico para IPs."""
+    try:
+        ipaddress.ip_address(domain)
+        return "ip"
+    except ValueError:
+        return domain.rsplit(".", 1)[-1]
+
+
+class WhoisCache:
+    """Cache WHOIS en SQLite. Seguro para usar desde varios hilos."""
+
+    def __init__(self, path: str | Path | None = None, ttl: float | None = None):
+        self.path = Path(path or os.getenv("CYBERGUARD_WHOIS_CACHE") or DEFAULT_CACHE_PATH).expanduser()
+        self.ttl = float(ttl if ttl is not None else os.getenv("CYBERGUARD_WHOIS_TTL", DEFAULT_TTL))
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS whois ("
+                " domain TEXT PRIMARY KEY,"
+                " fetched_at REAL NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+
+    def get(self, domain: str) -> tuple[dict, float] | None:
+        """Retorna (payload, fetched_at) si hay una entrada vigente."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, fetched_at FROM whois WHERE domain = ?", (domain,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, domain: str, payload: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO whois (domain, fetched_at, payload) VALUES (?, ?, ?)",
+                (domain, time.time(), json.dumps(payload, default=str)),
+            )
+
+    def purge_expired(self) -> int:
+        """Elimina las entradas vencidas. Retorna cuantas se borraron."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM whois WHERE fetched_at < ?", (time.time() - self.ttl,)
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _LeaderCancelled(Exception):
+    """La consulta que las demas esperaban se cancelo; otra debe tomar su lugar."""
+
+
+class WhoisService:
+    """Cache + cola de consultas WHOIS con limite de tasa por servidor y coalescencia."""
+
+    def __init__(self, cache: WhoisCache, rate: float | None = None, burst: float = DEFAULT_BURST):
+        self.cache = cache
+        self.rate = float(rate if rate is not None else os.getenv("CYBERGUARD_WHOIS_RATE", DEFAULT_RATE))
+        self.burst = burst
+        self._buckets: dict[str, AsyncTokenBucket] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _bucket(self, server: str) -> AsyncTokenBucket:
+        bucket = self._buckets.get(server)
+        if bucket is None:
+            bucket = self._buckets[server] = AsyncTokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def lookup(self, domain: str, fetch) -> tuple[dict, bool]:
+        """
+        Obtiene el WHOIS de `domain` (ya normalizado). `fetch` es la funcion
+        bloqueante que hace la consulta real y retorna un dict serializable.
+
+        Retorna (payload, desde_cache).
+        """
+        while True:
+            hit = await asyncio.to_thread(self.cache.get, domain)
+            if hit is not None:
+                return hit[0], True
+
+            pending = self._inflight.get(domain)
+            if pending is None:
+                return await self._fetch(domain, fetch), False
+            try:
+                return await asyncio.shield(pending), False
+            except _LeaderCancelled:
+                # Se cancelo la consulta que encabezaba el grupo, no esta espera: se reintenta
+                continue
+
+    async def _fetch(self, domain: str, fetch) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[domain] = future
+        try:
+            await self._bucket(whois_server_key(domain)).acquire()
+            payload = await asyncio.to_thread(fetch, domain)
+            await asyncio.to_thread(self.cache.set, domain, payload)
+            future.set_result(payload)
+            return payload
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita el warning de "exception never retrieved" si nadie mas esperaba
+            future.exception()
+            raise
+        finally:
+            del self._inflight[domain]
+
+
+_cache: WhoisCache | None = None
+_service: WhoisService | None = None
+_service_loop = None
+
+
+def get_whois_service() -> WhoisService:
+    """
+    Retorna el servicio WHOIS del proceso. La cache en disco es unica; la cola
+    (futures y token buckets) se recrea si cambia el event loop.
+    """
+    global _cache, _service, _service_loop
+    loop = asyncio.get_running_loop()
+    if _cache is None:
+        _cache = WhoisCache()
+    if _service is None or _service_loop is not loop:
+        _service = WhoisService(_cache)
+        _service_loop = loop
+    return _service
@@ -0,0 +1,261 @@
+"""
+Trazas por consulta y metricas de los caminos calientes: agentes, LLM y herramientas.
+
+TracingPlugin se registra en los Runner de main.py y, con los callbacks de ADK,
+mide cada consulta de punta a punta:
+
+- agentes: duracion de cada agente y transferencias coordinador -> especialista,
+- LLM: latencia y tokens (prompt y respuesta) de cada llamada, por agente y modelo,
+  como contador acumulado y como histograma por llamada,
+- herramientas: latencia, estado, tamano del resultado y acierto de cache (las
+  herramientas que retornan "cached", como whois_lookup).
+
+Todo se registra en metrics como histogramas y contadores (GET /metrics en
+formato Prometheus) y cada consulta terminada queda como traza en un buffer
+circular (GET /traces) con sus spans y el total de tiempo en LLM y en
+herramientas, para saber si una consulta lenta fue el modelo, nmap o WHOIS.
+
+ADK ya crea spans de OpenTelemetry (invoke_agent, call_llm, execute_tool);
+setup_otel() los exporta por OTLP si hay endpoint configurado, y el plugin les
+agrega atributos propios (tamano del resultado, acierto de cache).
+
+Configuracion por variables de entorno:
+    CYBERGUARD_TRACE_BUFFER        Trazas recientes que se conservan (default 100)
+    CYBERGUARD_OTEL_ENDPOINT       Endpoint OTLP/HTTP, ej. http://localhost:4318/v1/traces
+                                   (tambien se acepta OTEL_EXPORTER_OTLP_ENDPOINT)
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+from opentelemetry import trace
+
+from cyberguard_agents import metrics
+
+DEFAULT_BUFFER = 100
+# Consultas en curso que se conservan; una consulta cancelada nunca llega a after_run
+MAX_ACTIVE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _result_size(result: Any) -> int:
+    try:
+        return len(json.dumps(result, ensure_ascii=False, default=str))
+    except (TypeError, ValueError):
+        return len(str(result))
+
+
+class TracingPlugin(BasePlugin):
+    """Plugin de ADK que arma una traza por invocacion y alimenta los histogramas de metrics."""
+
+    def __init__(self, buffer_size: int | None = None):
+        super().__init__(name="cyberguard_tracing")
+        size = buffer_size if buffer_size is not None else int(os.getenv("CYBERGUARD_TRACE_BUFFER", DEFAULT_BUFFER))
+        self.recent: deque[dict] = deque(maxlen=max(1, size))
+        self._active: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    # ── registro de spans ──────────────────────────────────────────────
+
+    def _trace(self, invocation_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._active.get(invocation_id)
+
+    def _open(self, invocation_id: str, key: tuple, kind: str, name: str, **attributes) -> None:
+        current = self._trace(invocation_id)
+        if current is None:
+            return
+        span = {"kind": kind, "name": name, "start_ms": round((time.perf_counter() - current["_t0"]) * 1000, 1),
+                **attributes}
+        current["spans"].append(span)
+        current["_open"][key] = (time.perf_counter(), span)
+
+    def _close(self, invocation_id: str, key: tuple, **attributes) -> Optional[float]:
+        """Cierra el span y retorna su duracion en segundos (None si no estaba abierto)."""
+        current = self._trace(invocation_id)
+        opened = current["_open"].pop(key, None) if current else None
+        if opened is None:
+            return None
+        started, span = opened
+        elapsed = time.perf_counter() - started
+        span["duration_ms"] = round(elapsed * 1000, 1)
+        span.update(attributes)
+        return elapsed
+
+    def _finish(self, invocation_context, error: Exception | None = None) -> None:
+        with self._lock:
+            current = self._active.pop(invocation_context.invocation_id, None)
+        if current is None:
+            return
+        elapsed = time.perf_counter() - current.pop("_t0")
+        current.pop("_open")
+        current["duration_ms"] = round(elapsed * 1000, 1)
+        current["status"] = "error" if error else "ok"
+        if error:
+            current["error"] = f"{type(error).__name__}: {str(error)[:200]}"
+        totals: dict[str, float] = {}
+        for span in current["spans"]:
+            if span["kind"] in ("llm", "tool"):
+                totals[span["kind"]] = round(totals.get(span["kind"], 0) + span.get("duration_ms", 0), 1)
+        current["totals_ms"] = totals
+        metrics.observe("chat_run_seconds", elapsed, agent=current["agent"], status=current["status"])
+        self.recent.append(current)
+        logger.debug("traza %s", current)
+
+    # ── callbacks de ADK ───────────────────────────────────────────────
+
+    async def before_run_callback(self, *, invocation_context):
+        with self._lock:
+            if len(self._active) >= MAX_ACTIVE:
+                self._active.pop(next(iter(self._active)))
+            self._active[invocation_context.invocation_id] = {
+                "invocation_id": invocation_context.invocation_id,
+                "session_id": invocation_context.session.id,
+                "agent": invocation_context.agent.name,
+                "started_at": time.time(),
+                "spans": [],
+                "_t0": time.perf_counter(),
+                "_open": {},
+            }
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        self._finish(invocation_context)
+
+    async def on_run_error_callback(self, *, invocation_context, error):
+        self._finish(invocation_context, error)
+
+    async def on_event_callback(self, *, invocation_context, event):
+        target = event.actions.transfer_to_agent if event.actions else None
+        if target:
+            metrics.increment("agent_transfers_total", source=event.author, target=target)
+            self._open(invocation_context.invocation_id, ("transfer", event.id), "transfer", target,
+                       source=event.author)
+            self._close(invocation_context.invocation_id, ("transfer", event.id))
+        return None
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        self._open(callback_context.invocation_id, ("agent", agent.name), "agent", agent.name)
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        elapsed = self._close(callback_context.invocation_id, ("agent", agent.name))
+        if elapsed is not None:
+            metrics.observe("agent_run_seconds", elapsed, agent=agent.name)
+        return None
+
+    async def on_agent_error_callback(self, *, agent, callback_context, error):
+        self._close(callback_context.invocation_id, ("agent", agent.name), error=type(error).__name__)
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        self._open(callback_context.invocation_id, ("llm", callback_context.agent_name), "llm",
+                   llm_request.model or "", agent=callback_context.agent_name)
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        # En streaming llegan respuestas parciales; la llamada termina con la respuesta completa
+        if llm_response.partial:
+            return None
+        usage = llm_response.usage_metadata
+        prompt_tokens = (usage.prompt_token_count or 0) if usage else 0
+        completion_tokens = (usage.candidates_token_count or 0) if usage else 0
+        key = ("llm", callback_context.agent_name)
+        current = self._trace(callback_context.invocation_id)
+        span = current["_open"].get(key, (None, {}))[1] if current else {}
+        model = span.get("name") or llm_response.model_version or ""
+        elapsed = self._close(callback_context.invocation_id, key,
+                              prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        if elapsed is None:
+            return None
+        agent = callback_context.agent_name
+        metrics.observe("llm_call_seconds", elapsed, agent=agent, model=model)
+        metrics.increment("llm_tokens_total", prompt_tokens, agent=agent, model=model, kind="prompt")
+        metrics.increment("llm_tokens_total", completion_tokens, agent=agent, model=model, kind="completion")
+        # Distribucion por llamada: distingue pocas consultas enormes de muchas chicas
+        for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+            metrics.observe("llm_call_tokens", tokens, buckets=metrics.TOKEN_BUCKETS, agent=agent, model=model, kind=kind)
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        self._close(callback_context.invocation_id, ("llm", callback_context.agent_name), error=type(error).__name__)
+        metrics.increment("llm_errors_total", agent=callback_context.agent_name, model=llm_request.model or "",
+                          error=type(error).__name__)
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        self._open(tool_context.invocation_id, ("tool", tool_context.function_call_id or tool.name), "tool",
+                   tool.name, agent=tool_context.agent_name)
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        status = result.get("status", "ok") if isinstance(result, dict) else "ok"
+        size = _result_size(result)
+        attributes = {"status": status, "result_bytes": size}
+        cached = result.get("cached") if isinstance(result, dict) else None
+        if cached is not None:
+            attributes["cache_hit"] = bool(cached)
+            metrics.increment("tool_cache_total", tool=tool.name, result="hit" if cached else "miss")
+        elapsed = self._close(tool_context.invocation_id, ("tool", tool_context.function_call_id or tool.name),
+                              **attributes)
+        if elapsed is not None:
+            metrics.observe("tool_call_seconds", elapsed, tool=tool.name, status=status)
+        metrics.observe("tool_result_bytes", size, buckets=metrics.SIZE_BUCKETS, tool=tool.name)
+        # El span execute_tool de ADK esta activo durante el callback
+        otel_span = trace.get_current_span()
+        otel_span.set_attribute("cyberguard.tool.result_bytes", size)
+        if cached is not None:
+            otel_span.set_attribute("cyberguard.tool.cache_hit", bool(cached))
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        elapsed = self._close(tool_context.invocation_id, ("tool", tool_context.function_call_id or tool.name),
+                              status="exception", error=type(error).__name__)
+        if elapsed is not None:
+            metrics.observe("tool_call_seconds", elapsed, tool=tool.name, status="exception")
+        return None
+
+    def recent_traces(self, limit: int = 20) -> list[dict]:
+        """Las ultimas trazas terminadas, la mas reciente primero."""
+        return list(self.recent)[::-1][:max(0, limit)]
+
+
+def setup_otel(service_name: str = "cyberguard") -> bool:
+    """
+    Exporta por OTLP/HTTP los spans de ADK y de la API si hay endpoint configurado.
+
+    Retorna True si se configuro el exportador. Requiere opentelemetry-sdk y
+    opentelemetry-exporter-otlp-proto-http; si faltan, lo registra y sigue sin exportar.
+    """
+    endpoint = os.getenv("CYBERGUARD_OTEL_ENDPOINT") or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if not endpoint:
+        return False
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning(
+            "Exportacion OpenTelemetry desactivada: instala con "
+            "pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http"
+        )
+        return False
+    if not endpoint.rstrip("/").endswith("/v1/traces"):
+        endpoint = endpoint.rstrip("/") + "/v1/traces"
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    trace.set_tracer_provider(provider)
+    return True
+
+
+def shutdown_otel() -> None:
+    """Envia los spans pendientes antes de apagar."""
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
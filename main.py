@@ -4,34 +4,71 @@ CyberGuard — FastAPI Server.
 Integra el sistema de agentes ADK con FastAPI.
 Expone endpoints custom para chat, listado de agentes y gestion de sesiones.
 """
+import asyncio
+import json
 import os
+import time
 import uuid
 from contextlib import asynccontextmanager
+from dataclasses import dataclass
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from fastapi import FastAPI
+from fastapi import FastAPI, File, Form, Header, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.apps import App
+from google.adk.events import Event
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+from google.adk.sessions import Session
 from google.genai import types
 
-from cyberguard_agents import root_agent
+from cyberguard_agents import admission, metrics, profiling, root_agent
+from cyberguard_agents.answer_cache import AnswerCache, catalog_version
+from cyberguard_agents.chat_stream import NO_RESPONSE, agent_error, iter_chat_events, retry_seconds, sse
+from cyberguard_agents.models import close_llm_client, model_health, warmup_models
+from cyberguard_agents.router import RouteDecision, route_message
+from cyberguard_agents.session_store import BoundedSessionService
+from cyberguard_agents.tracing import TracingPlugin, setup_otel, shutdown_otel
+from cyberguard_agents.tools.alert_pipeline import (
+    alert_workers,
+    get_alert_pool,
+    iter_classified_ndjson,
+    iter_uploaded_alerts,
+    shutdown_alert_pool,
+)
+from cyberguard_agents.tools.correlation import DEFAULT_WINDOW, attach_playbooks, correlate
+from cyberguard_agents.tools.executor import shutdown_tool_pool
+from cyberguard_agents.tools.http_client import close_http_client
+from cyberguard_agents.tools.bulk_recon import iter_bulk_recon_ndjson, iter_domains, parse_checks
+from cyberguard_agents.tools.subdomain_tools import DEFAULT_QPS, iter_subdomains, max_qps
 
 APP_NAME = "cyberguard"
-session_service = InMemorySessionService()
+# Sesiones acotadas en memoria (LRU + TTL + presupuesto); las frias se bajan a SQLite
+session_service = BoundedSessionService()
+# Trazas por consulta y metricas de agentes, LLM y herramientas (GET /metrics, GET /traces)
+tracing = TracingPlugin()
 
 runner = Runner(
-    agent=root_agent,
-    app_name=APP_NAME,
+    app=App(name=APP_NAME, root_agent=root_agent, plugins=[tracing]),
     session_service=session_service,
 )
 
+# Un runner por especialista sobre el mismo session_service: el pre-router envia
+# directo a ellos los mensajes sin ambiguedad y se ahorra la llamada del coordinador.
+agent_runners = {
+    sub.name: Runner(app=App(name=APP_NAME, root_agent=sub, plugins=[tracing]), session_service=session_service)
+    for sub in root_agent.sub_agents
+}
+
+# Respuestas de consultas que no usaron herramientas en vivo (playbooks, controles CIS, conceptos)
+answer_cache = AnswerCache()
+
 
 class ChatRequest(BaseModel):
     message: str
@@ -45,6 +82,17 @@ class ChatResponse(BaseModel):
     agent_name: str
 
 
+class BulkReconRequest(BaseModel):
+    domains: list[str]
+    checks: list[str] | None = None
+
+
+class SubdomainRequest(BaseModel):
+    domain: str
+    labels: list[str] | None = None
+    qps: float = DEFAULT_QPS
+
+
 BANNER = """
 ╔══════════════════════════════════════════════════════════════╗
 ║                                                              ║
@@ -65,12 +113,23 @@ BANNER = """
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print(BANNER)
+    if setup_otel():
+        print("  Tracing     : OpenTelemetry OTLP")
     print(f"  Coordinator : {root_agent.name}")
     for sub in root_agent.sub_agents:
         print(f"  Agent       : {sub.name}")
+    # Abre la conexion con el proveedor del modelo antes de la primera consulta
+    for api_base, status in (await warmup_models()).items():
+        print(f"  Model API   : {api_base} ({status})")
     print(f"\n  API docs    : http://localhost:8080/docs")
     print(f"  Status      : http://localhost:8080/\n")
     yield
+    await session_service.close()
+    await close_http_client()
+    await close_llm_client()
+    shutdown_tool_pool()
+    shutdown_alert_pool()
+    shutdown_otel()
     print("\n  CyberGuard shutting down... | </Qu@ntum>\n")
 
 
@@ -90,6 +149,26 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Latencia de cada endpoint por ruta (no por URL, para acotar las series)."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.observe(
+            "http_request_seconds",
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+
 @app.get("/")
 async def root():
     return {
@@ -101,12 +180,24 @@ async def root():
     }
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """
-    Endpoint principal de chat.
-    Envia un mensaje al sistema multi-agente CyberGuard.
-    """
+@dataclass
+class ChatTurn:
+    session: Session
+    user_message: types.Content
+    decision: RouteDecision
+    cache_key: tuple | None
+
+    @property
+    def runner(self) -> Runner:
+        return agent_runners.get(self.decision.agent, runner)
+
+    @property
+    def agent_name(self) -> str:
+        return self.decision.agent or root_agent.name
+
+
+async def _prepare_chat(request: ChatRequest) -> ChatTurn:
+    """Crea la sesion si no existe, elige el runner con el pre-router y calcula la clave de cache."""
     session_id = request.session_id or str(uuid.uuid4())
 
     session = await session_service.get_session(
@@ -127,42 +218,224 @@ async def chat(request: ChatRequest):
         parts=[types.Part(text=request.message)]
     )
 
+    decision = route_message(request.message)
+    metrics.increment(
+        "router_decisions_total",
+        route=decision.agent or root_agent.name,
+        reason=decision.reason,
+    )
+    # El cache solo aplica a sesiones nuevas: en una conversacion la respuesta depende del historial
+    cache_key = None if session.events else answer_cache.key(request.message, catalog_version(root_agent))
+    return ChatTurn(session, user_message, decision, cache_key)
+
+
+async def _cached_answer(turn: ChatTurn) -> dict | None:
+    """Respuesta cacheada; si existe se registra el turno en la sesion como si lo hubiera corrido el agente."""
+    if turn.cache_key is None:
+        return None
+    answer = answer_cache.get(turn.cache_key)
+    if answer is None:
+        return None
+    await session_service.append_event(turn.session, Event(author="user", content=turn.user_message))
+    await session_service.append_event(turn.session, Event(
+        author=answer["agent_name"],
+        content=types.Content(role="model", parts=[types.Part(text=answer["response"])]),
+    ))
+    return answer
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    response: Response,
+    profile: str | None = None,
+):
+    """
+    Endpoint principal de chat.
+    Envia un mensaje al sistema multi-agente CyberGuard.
+
+    Con CYBERGUARD_PROFILING=1, `?profile=sampling|cprofile` (o la cabecera
+    X-CyberGuard-Profile) perfila la consulta; el id del perfil vuelve en la
+    cabecera X-Profile-Id.
+    """
+    mode = profiling.requested_mode(
+        http_request.headers.get("X-CyberGuard-Profile"),
+        profile,
+        http_request.headers.get("X-CyberGuard-Profile-Token"),
+    )
+    if mode is None:
+        return await _run_chat(request)
+    async with profiling.profile_request(mode, "/chat") as recorded:
+        result = await _run_chat(request)
+    (result if isinstance(result, JSONResponse) else response).headers["X-Profile-Id"] = recorded.id
+    return result
+
+
+async def _run_chat(request: ChatRequest):
+    turn = await _prepare_chat(request)
+    session_id = turn.session.id
+    cached = await _cached_answer(turn)
+    if cached:
+        return ChatResponse(session_id=session_id, **cached)
+
     final_response = ""
-    agent_name = root_agent.name
+    agent_name = turn.agent_name
+    tools_used = []
 
     try:
-        async for event in runner.run_async(
-            user_id=request.user_id,
-            session_id=session_id,
-            new_message=user_message,
-        ):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if part.text:
-                        final_response = part.text
-                        agent_name = event.author or root_agent.name
+        with admission.request_budget():
+            async for event in turn.runner.run_async(
+                user_id=request.user_id,
+                session_id=session_id,
+                new_message=turn.user_message,
+            ):
+                tools_used.extend(call.name for call in event.get_function_calls())
+                if event.content and event.content.parts:
+                    for part in event.content.parts:
+                        if part.text:
+                            final_response = part.text
+                            agent_name = event.author or agent_name
     except Exception as e:
-        error_msg = str(e)
-        if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-            return JSONResponse(
-                status_code=429,
-                content={"error": "Rate limit exceeded. Espera 30 segundos e intenta de nuevo."},
-            )
-        return JSONResponse(
-            status_code=500,
-            content={"error": f"Error del agente: {error_msg[:200]}"},
-        )
+        status_code, error = agent_error(e)
+        headers = {"Retry-After": str(retry_seconds(e))} if status_code in (429, 503) else None
+        return JSONResponse(status_code=status_code, content={"error": error}, headers=headers)
 
-    if not final_response:
-        final_response = "No se pudo generar una respuesta. Intenta reformular tu consulta."
+    if turn.cache_key and final_response:
+        answer_cache.put(turn.cache_key, {"response": final_response, "agent_name": agent_name}, tools_used)
 
     return ChatResponse(
-        response=final_response,
+        response=final_response or NO_RESPONSE,
         session_id=session_id,
         agent_name=agent_name,
     )
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Igual que /chat pero transmite Server-Sent Events mientras el agente trabaja:
+    delegacion a un especialista, inicio y fin de cada herramienta (con duracion),
+    texto parcial del modelo y la respuesta final.
+    """
+    turn = await _prepare_chat(request)
+    session_id = turn.session.id
+    cached = await _cached_answer(turn)
+
+    async def events():
+        yield sse("start", {"session_id": session_id, "agent_name": turn.agent_name, "route": turn.decision.reason})
+        if cached:
+            yield sse("final", {**cached, "session_id": session_id, "cached": True})
+            return
+        tools_used = []
+        with admission.request_budget():
+            async for event, data in iter_chat_events(
+                turn.runner,
+                request.user_id,
+                session_id,
+                turn.user_message,
+                turn.agent_name,
+                run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+            ):
+                if event == "tool_start":
+                    tools_used.append(data["tool"])
+                elif event == "final" and turn.cache_key and data["response"] != NO_RESPONSE:
+                    answer_cache.put(
+                        turn.cache_key, {"response": data["response"], "agent_name": data["agent_name"]}, tools_used
+                    )
+                yield sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _bulk_recon_response(lines, checks) -> StreamingResponse | JSONResponse:
+    try:
+        selected = parse_checks(checks)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return StreamingResponse(
+        iter_bulk_recon_ndjson(iter_domains(lines), checks=selected),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/recon/bulk")
+async def bulk_recon(request: BulkReconRequest):
+    """
+    Reconocimiento masivo de dominios.
+    Transmite una linea NDJSON por dominio conforme se completa.
+    """
+    return _bulk_recon_response(request.domains, request.checks)
+
+
+@app.post("/recon/bulk/upload")
+async def bulk_recon_upload(
+    file: UploadFile = File(...),
+    checks: str | None = Form(None),
+):
+    """
+    Igual que /recon/bulk pero recibe un archivo (un dominio por linea o CSV).
+    El archivo se lee linea a linea, sin cargarlo completo en memoria.
+    """
+    return _bulk_recon_response(file.file, checks)
+
+
+@app.post("/recon/subdomains")
+async def recon_subdomains(request: SubdomainRequest):
+    """
+    Enumeracion de subdominios por diccionario.
+    Transmite una linea NDJSON por subdominio encontrado; sin `labels` usa la lista integrada.
+    `qps` se recorta al tope del servidor (CYBERGUARD_SUBDOMAIN_MAX_QPS).
+    """
+    if request.qps <= 0:
+        return JSONResponse(status_code=400, content={"error": "qps debe ser mayor que 0."})
+    qps = min(request.qps, max_qps())
+
+    async def lines():
+        async for item in iter_subdomains(request.domain, request.labels, qps=qps):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/incidents/alerts/classify")
+async def classify_alerts(
+    file: UploadFile = File(...),
+    summary_every: int = Form(1000),
+):
+    """
+    Clasificacion masiva de un export de alertas del SIEM (JSONL o CSV, opcionalmente .gz).
+    Transmite una linea NDJSON por alerta clasificada, conteos parciales cada
+    `summary_every` alertas y un resumen final.
+    """
+    records = iter_uploaded_alerts(file.file, file.filename or "alerts.jsonl")
+    return StreamingResponse(
+        iter_classified_ndjson(records, workers=alert_workers(), summary_every=summary_every,
+                               pool=get_alert_pool()),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/incidents/alerts/correlate")
+async def correlate_alert_upload(
+    file: UploadFile = File(...),
+    window_minutes: int = Form(DEFAULT_WINDOW // 60),
+):
+    """
+    Agrupa un export de alertas (JSONL o CSV) en incidentes por indicadores compartidos
+    y cercania en el tiempo. Retorna todos los incidentes y un playbook por tipo.
+    """
+    if window_minutes <= 0:
+        return JSONResponse(status_code=400, content={"error": "window_minutes debe ser mayor que 0."})
+    records = iter_uploaded_alerts(file.file, file.filename or "alerts.jsonl")
+    result = await asyncio.to_thread(correlate, records, window_minutes * 60)
+    return attach_playbooks(result)
+
+
 @app.get("/agents")
 async def list_agents():
     agents = [
@@ -184,6 +457,63 @@ async def list_agents():
     return {"agents": agents}
 
 
+@app.get("/stats")
+async def stats():
+    """Contadores del proceso (pre-router, sesiones, cache de respuestas, herramientas, modelos, admision)."""
+    return {
+        **metrics.snapshot(),
+        "sessions": await asyncio.to_thread(session_service.stats),
+        "answer_cache": answer_cache.stats(),
+        "models": model_health(),
+        "llm_admission": admission.admission_stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Metricas en formato Prometheus: histogramas de latencia de HTTP, agentes, LLM y herramientas."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/traces")
+async def recent_traces(limit: int = 20):
+    """Ultimas consultas con sus spans: agentes, transferencias, llamadas al LLM y herramientas."""
+    return {"traces": tracing.recent_traces(limit)}
+
+
+def _check_profiling_access(token: str | None) -> None:
+    if not profiling.profiling_enabled():
+        raise HTTPException(status_code=404, detail="Perfilado desactivado (CYBERGUARD_PROFILING=0)")
+    if not profiling.authorized(token):
+        raise HTTPException(status_code=403, detail="Token de perfilado invalido")
+
+
+@app.get("/admin/profiles")
+async def list_profiles(x_cyberguard_profile_token: str | None = Header(default=None)):
+    """Perfiles guardados en el buffer, el mas reciente primero."""
+    _check_profiling_access(x_cyberguard_profile_token)
+    return {"profiles": profiling.store.list()}
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    format: str | None = None,
+    x_cyberguard_profile_token: str | None = Header(default=None),
+):
+    """Descarga un perfil: collapsed (sampling) o pstats/text (cprofile)."""
+    _check_profiling_access(x_cyberguard_profile_token)
+    recorded = profiling.store.get(profile_id)
+    if recorded is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado (puede haber salido del buffer)")
+    try:
+        content, media_type, filename = recorded.render(format or recorded.summary()["formats"][0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content, media_type=media_type,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
 @app.delete("/sessions/{user_id}/{session_id}")
 async def delete_session(user_id: str, session_id: str):
     await session_service.delete_session(
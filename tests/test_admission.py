@@ -0,0 +1,204 @@
+"""Tests del control de admision y de los reintentos con backoff de las llamadas al LLM."""
+import asyncio
+import time
+
+import pytest
+
+from cyberguard_agents import admission, metrics, models
+from cyberguard_agents.chat_stream import agent_error
+from test_models import ask, endpoint, start_stub
+
+
+@pytest.fixture
+def rate_limited_api(monkeypatch):
+    server = start_stub("sin puertos abiertos")
+    monkeypatch.setenv("CYBERGUARD_MODEL_RECON", f"hosted_vllm/cuota@{endpoint(server)}")
+    monkeypatch.setenv("CYBERGUARD_MODEL_FALLBACKS", "")
+    monkeypatch.setenv("CYBERGUARD_LLM_BACKOFF_BASE", "0.05")
+    metrics.reset()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_retries_429_with_backoff_and_retry_after(rate_limited_api):
+    rate_limited_api.statuses = [429, 429]
+    rate_limited_api.retry_after = 0.2
+    model = models.get_model("recon")
+
+    async def scenario():
+        started = time.monotonic()
+        with admission.request_budget(5) as budget:
+            replies = await ask(model, 1)
+        await models.close_llm_client()
+        return replies, time.monotonic() - started, budget
+
+    replies, elapsed, budget = asyncio.run(scenario())
+    assert replies == ["sin puertos abiertos"]
+    assert len(rate_limited_api.requests) == 3
+    # Se respeta Retry-After en los dos reintentos y esa espera sale del presupuesto
+    assert elapsed >= 0.4 and budget.spent >= 0.4
+    assert metrics.value("llm_retries_total", model="hosted_vllm/cuota", reason="429") == 2
+
+
+def test_gives_up_when_backoff_exceeds_budget(rate_limited_api):
+    rate_limited_api.statuses = [429] * 10
+    rate_limited_api.retry_after = 3
+    model = models.get_model("recon")
+
+    async def scenario():
+        try:
+            with admission.request_budget(1):
+                await ask(model, 1)
+        finally:
+            await models.close_llm_client()
+
+    with pytest.raises(Exception) as raised:
+        asyncio.run(scenario())
+    assert len(rate_limited_api.requests) == 1
+    assert agent_error(raised.value) == (429, "Rate limit exceeded. Espera 3 segundos e intenta de nuevo.")
+
+
+def test_gate_limits_concurrency_and_queues_in_order():
+    gate = admission.AdmissionGate(concurrency=2, max_queue=10, queue_timeout=5)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        await gate.acquire()
+        peak = max(peak, gate.in_flight)
+        await asyncio.sleep(0.02)
+        gate.release()
+
+    async def scenario():
+        await asyncio.gather(*(call() for _ in range(8)))
+
+    asyncio.run(scenario())
+    assert peak == 2 and gate.in_flight == 0 and gate.waiting == 0
+
+
+def test_gate_rejects_when_queue_full_or_deadline_passes():
+    metrics.reset()
+
+    async def scenario():
+        gate = admission.AdmissionGate(concurrency=1, max_queue=1, queue_timeout=0.1)
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(admission.AdmissionRejected) as full:
+            await gate.acquire()
+        with pytest.raises(admission.AdmissionRejected) as late:
+            await waiter
+        gate.release()
+        return full.value, late.value, gate
+
+    full, late, gate = asyncio.run(scenario())
+    assert (full.reason, late.reason) == ("queue_full", "deadline")
+    assert gate.in_flight == 0 and gate.waiting == 0
+    assert metrics.value("llm_admission_rejected_total", reason="queue_full") == 1
+    assert agent_error(full)[0] == 503
+
+
+def test_gate_token_bucket_spaces_calls():
+    gate = admission.AdmissionGate(concurrency=10, rate=20, burst=1)
+
+    async def scenario():
+        started = time.monotonic()
+        for _ in range(4):
+            await gate.acquire()
+            gate.release()
+        return time.monotonic() - started
+
+    # La primera sale con la rafaga y las otras tres esperan 1/20 s cada una
+    assert asyncio.run(scenario()) >= 0.14
+
+
+def test_backoff_grows_and_skips_non_transient_errors(monkeypatch):
+    monkeypatch.setenv("CYBERGUARD_LLM_BACKOFF_BASE", "1")
+    monkeypatch.setenv("CYBERGUARD_LLM_MAX_RETRIES", "3")
+
+    class ProviderError(Exception):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    assert admission.backoff_delay(ProviderError(400), 0) is None
+    assert admission.backoff_delay(ProviderError(503), 3) is None
+    assert all(0 <= admission.backoff_delay(ProviderError(429), 2) <= 4 for _ in range(50))
+
+
+async def slow_scan(target: str) -> dict:
+    """Escaneo falso que tarda mas que el plazo de la cola de admision."""
+    await asyncio.sleep(0.8)
+    return {"status": "success", "target": target, "open_ports": []}
+
+
+def test_tools_and_transfers_do_not_hold_llm_slots(monkeypatch):
+    from google.adk.agents import LlmAgent
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+    from test_tracing import ScriptedLlm, _call, whois_lookup
+
+    # Un solo lugar y 0.4 s de plazo: si una consulta retuviera el lugar mientras corre su
+    # herramienta o su especialista, la otra esperaria hasta el plazo y terminaria en 503
+    monkeypatch.setenv("CYBERGUARD_LLM_CONCURRENCY", "1")
+    monkeypatch.setenv("CYBERGUARD_LLM_QUEUE_TIMEOUT", "0.4")
+    metrics.reset()
+
+    def failover(name: str, script: list) -> models.FailoverLlm:
+        return models.FailoverLlm(model=name, candidates=[ScriptedLlm(model=name, script=script)])
+
+    def chat_runner(tool, call: types.Part) -> Runner:
+        recon = LlmAgent(
+            name="recon",
+            model=failover("fake-strong", [call, types.Part(text=f"{tool.__name__} listo")]),
+            tools=[tool],
+        )
+        coordinator = LlmAgent(
+            name="cyberguard_coordinator",
+            model=failover("fake-fast", [_call("transfer_to_agent", agent_name="recon")]),
+            sub_agents=[recon],
+        )
+        return Runner(app_name="test", agent=coordinator, session_service=InMemorySessionService())
+
+    async def chat(runner: Runner, text: str, delay: float) -> list[str]:
+        await asyncio.sleep(delay)
+        await runner.session_service.create_session(app_name="test", user_id="u", session_id="s")
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        return [part.text async for event in runner.run_async(user_id="u", session_id="s", new_message=message)
+                if event.content for part in event.content.parts if part.text]
+
+    async def scenario():
+        replies = await asyncio.gather(
+            chat(chat_runner(slow_scan, _call("slow_scan", target="10.0.0.5")), "escanea 10.0.0.5", 0),
+            chat(chat_runner(whois_lookup, _call("whois_lookup", domain="example.com")), "whois example.com", 0.1),
+        )
+        return replies, admission.get_gate().in_flight
+
+    (scan, whois), in_flight = asyncio.run(scenario())
+    assert scan[-1] == "slow_scan listo" and whois[-1] == "whois_lookup listo"
+    assert in_flight == 0
+    assert metrics.value("llm_admission_rejected_total", reason="deadline") == 0
+    assert metrics.histogram("llm_admission_wait_seconds")["count"] == 6
+
+
+def test_gate_failure_surfaces_the_original_error(monkeypatch):
+    from contextlib import asynccontextmanager
+
+    from google.adk.models.llm_request import LlmRequest
+    from test_tracing import ScriptedLlm
+
+    @asynccontextmanager
+    async def broken_slot():
+        raise RuntimeError("compuerta rota")
+        yield
+
+    monkeypatch.setattr(admission, "llm_slot", broken_slot)
+    model = models.FailoverLlm(model="fake", candidates=[ScriptedLlm(model="fake", script=[])])
+
+    async def scenario():
+        async for _ in model.generate_content_async(LlmRequest(model="fake")):
+            pass
+
+    with pytest.raises(RuntimeError, match="compuerta rota"):
+        asyncio.run(scenario())
@@ -0,0 +1,58 @@
+"""Tests del cache de respuestas de conocimiento estatico."""
+import time
+
+from cyberguard_agents import metrics
+from cyberguard_agents.answer_cache import AnswerCache, catalog_version, normalize_query
+
+ANSWER = {"response": "1. Aislar el equipo...", "agent_name": "incident_responder"}
+
+
+def test_normalized_messages_share_an_entry():
+    assert normalize_query("¿Cuál es el Playbook de Ransomware?") == normalize_query("playbooks ransomware")
+
+    metrics.reset()
+    cache = AnswerCache(max_entries=10, ttl=60)
+    version = catalog_version()
+    assert cache.put(cache.key("Playbook de ransomware", version), ANSWER, ["get_incident_playbook"])
+
+    started = time.perf_counter()
+    assert cache.get(cache.key("¿playbooks  RANSOMWARE?", version)) == ANSWER
+    assert time.perf_counter() - started < 0.01
+    assert cache.get(cache.key("playbook de phishing", version)) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    # Un cambio en los catalogos o en los agentes invalida las respuestas anteriores
+    assert cache.get(cache.key("playbook ransomware", "otra-version")) is None
+
+
+def test_identifiers_and_negations_change_the_key():
+    cache = AnswerCache(max_entries=10, ttl=60)
+    first = cache.key("control CIS 5.2.1 de linux", "v1")
+    assert first != cache.key("control CIS 5.2.2 de linux", "v1")
+    assert first == cache.key("¿Control CIS 5.2.1 de Linux?", "v1")
+    assert cache.key("que es HSTS", "v1") != cache.key("que no es HSTS", "v1")
+    assert normalize_query("nivel 1 de CIS") != normalize_query("nivel 2 de CIS")
+
+
+def test_live_tool_answers_are_not_stored():
+    metrics.reset()
+    cache = AnswerCache(max_entries=10, ttl=60)
+    key = cache.key("escanea 192.168.1.10", "v1")
+    assert not cache.put(key, {"response": "22/tcp open", "agent_name": "port_scanner"}, ["transfer_to_agent", "scan_ports"])
+    assert cache.get(key) is None
+    assert metrics.value("answer_cache_skipped_total", reason="live_tools") == 1
+
+
+def test_lru_and_ttl_bounds(monkeypatch):
+    cache = AnswerCache(max_entries=2, ttl=60)
+    for topic in ("ransomware", "phishing", "ddos"):
+        cache.put(cache.key(f"playbook {topic}", "v1"), ANSWER)
+    assert cache.get(cache.key("playbook ransomware", "v1")) is None
+    assert cache.get(cache.key("playbook ddos", "v1")) == ANSWER
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get(cache.key("playbook ddos", "v1")) is None
+
+    monkeypatch.setenv("CYBERGUARD_ANSWER_CACHE", "0")
+    assert cache.key("playbook ddos", "v1") is None
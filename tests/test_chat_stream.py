@@ -0,0 +1,54 @@
+"""Tests de la traduccion de eventos del runner a Server-Sent Events."""
+import asyncio
+import json
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from cyberguard_agents.chat_stream import iter_chat_events, sse
+
+
+class ScriptedRunner:
+    """Runner falso que reproduce una corrida del coordinador con delegacion y una herramienta."""
+
+    def __init__(self, error: Exception | None = None):
+        self.error = error
+
+    async def run_async(self, user_id, session_id, new_message, run_config=None):
+        yield Event(author="cyberguard_coordinator", actions=EventActions(transfer_to_agent="port_scanner"))
+        call = types.FunctionCall(id="call-1", name="scan_ports", args={"target": "10.0.0.5"})
+        yield Event(author="port_scanner", content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+        await asyncio.sleep(0.02)
+        if self.error:
+            raise self.error
+        response = types.FunctionResponse(id="call-1", name="scan_ports", response={"status": "success"})
+        yield Event(author="port_scanner", content=types.Content(role="user", parts=[types.Part(function_response=response)]))
+        for chunk in ("Puerto 22 ", "abierto"):
+            yield Event(author="port_scanner", partial=True,
+                        content=types.Content(role="model", parts=[types.Part(text=chunk)]))
+        yield Event(author="port_scanner", content=types.Content(role="model", parts=[types.Part(text="Puerto 22 abierto")]))
+
+
+async def _collect(runner):
+    return [item async for item in iter_chat_events(runner, "u", "s-1", None, "cyberguard_coordinator")]
+
+
+def test_stream_reports_delegation_tools_and_text():
+    events = asyncio.run(_collect(ScriptedRunner()))
+    kinds = [kind for kind, _ in events]
+    assert kinds == ["delegation", "tool_start", "tool_end", "delta", "delta", "message", "final"]
+    tool_end = events[2][1]
+    assert tool_end["tool"] == "scan_ports" and tool_end["status"] == "success"
+    assert tool_end["duration_ms"] >= 15
+    final = events[-1][1]
+    assert final["response"] == "Puerto 22 abierto"
+    assert final["agent_name"] == "port_scanner"
+
+
+def test_stream_reports_rate_limit_as_error_event():
+    events = asyncio.run(_collect(ScriptedRunner(RuntimeError("429 Too Many Requests"))))
+    assert events[-1] == ("error", {"status": 429, "error": "Rate limit exceeded. Espera 30 segundos e intenta de nuevo.",
+                                    "retry_after": 30})
+    frame = sse(*events[-1])
+    assert frame.startswith("event: error\ndata: ") and frame.endswith("\n\n")
+    assert json.loads(frame.split("data: ", 1)[1])["status"] == 429
@@ -0,0 +1,76 @@
+"""Tests de la ejecucion de herramientas sincronas fuera del event loop."""
+import asyncio
+import threading
+import time
+
+from google.adk.tools.function_tool import FunctionTool
+
+from cyberguard_agents import metrics
+from cyberguard_agents.tools.executor import offload
+
+
+def slow_scan(target: str, port_range: str = "1-1024") -> dict:
+    """
+    Escaneo falso que bloquea como nmap.
+
+    Args:
+        target: Host a escanear.
+        port_range: Rango de puertos.
+    """
+    time.sleep(0.2)
+    return {"status": "success", "target": target}
+
+
+def test_offloaded_tool_keeps_event_loop_responsive():
+    async def scenario():
+        tool = offload(slow_scan)
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                ticks.append(time.perf_counter() - started)
+
+        beat = asyncio.create_task(heartbeat())
+        result = await FunctionTool(tool).run_async(args={"target": "10.0.0.5"}, tool_context=None)
+        beat.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(scenario())
+    assert result == {"status": "success", "target": "10.0.0.5"}
+    assert len(ticks) >= 10
+    assert max(ticks) < 0.1
+
+
+def test_per_tool_concurrency_cap_and_queue_metrics(monkeypatch):
+    monkeypatch.setenv("CYBERGUARD_TOOL_LIMITS", "capped_scan=2")
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def capped_scan(target: str) -> dict:
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return {"status": "success", "target": target}
+
+    tool = offload(capped_scan)
+    assert tool.__name__ == "capped_scan" and tool.__doc__ == capped_scan.__doc__
+
+    async def scenario():
+        return await asyncio.gather(*(tool(f"10.0.0.{i}") for i in range(6)))
+
+    metrics.reset()
+    results = asyncio.run(scenario())
+    assert [r["target"] for r in results] == [f"10.0.0.{i}" for i in range(6)]
+    assert peak == 2
+    assert metrics.value("tool_calls_total", tool="capped_scan") == 6
+    # Las ultimas dos llamadas esperan dos turnos completos en la cola
+    assert metrics.value("tool_queue_wait_seconds_total", tool="capped_scan") > 0.2
+    assert metrics.value("tool_pending", tool="capped_scan") == 0
+    metrics.reset()
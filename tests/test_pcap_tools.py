@@ -0,0 +1,156 @@
+"""Tests del analisis de capturas pcap/pcapng."""
+import asyncio
+import random
+import struct
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from cyberguard_agents.tools.pcap_tools import PcapFormatError, analyze_pcap, summarize_capture  # noqa: E402
+
+VICTIM = "192.0.2.80"
+
+
+def _ip(addr: str) -> bytes:
+    return bytes(int(part) for part in addr.split("."))
+
+
+def _ipv4(src: str, dst: str, proto: int, payload: bytes) -> bytes:
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), 0, 0, 64, proto, 0, _ip(src), _ip(dst))
+    return header + payload
+
+
+def _tcp(sport: int, dport: int, flags: int) -> bytes:
+    return struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 0x50, flags, 1024, 0, 0)
+
+
+def _udp(sport: int, dport: int, size: int) -> bytes:
+    return struct.pack("!HHHH", sport, dport, 8 + size, 0) + bytes(size)
+
+
+def _ethernet(packet: bytes, vlan: bool = False) -> bytes:
+    header = b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb"
+    if vlan:
+        header += b"\x81\x00\x00\x64"
+    return header + b"\x08\x00" + packet
+
+
+def _ddos_frames(rng: random.Random, count: int):
+    """SYN flood con origenes falsificados, amplificacion DNS y algo de trafico normal."""
+    for i in range(count):
+        kind = i % 10
+        if kind < 5:
+            src = f"198.51.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+            packet = _ipv4(src, VICTIM, 6, _tcp(rng.randint(1024, 65535), 80, 0x02))
+        elif kind < 8:
+            resolver = f"203.0.113.{rng.randint(1, 40)}"
+            packet = _ipv4(resolver, VICTIM, 17, _udp(53, rng.randint(1024, 65535), 1400))
+        elif kind == 8:
+            packet = _ipv4(VICTIM, "10.0.0.7", 6, _tcp(443, 51000, 0x12))
+        else:
+            packet = _ipv4("10.0.0.7", VICTIM, 6, _tcp(51000, 443, 0x10))
+        yield 1_714_557_600 + i / 1000, _ethernet(packet, vlan=i % 3 == 0)
+
+
+def _write_pcap(path, frames):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for ts, frame in frames:
+            f.write(struct.pack("<IIII", int(ts), int(ts % 1 * 1e6), len(frame), len(frame)))
+            f.write(frame)
+
+
+def _write_pcapng(path, frames):
+    def block(block_type, body):
+        pad = b"\x00" * (-len(body) % 4)
+        length = 12 + len(body) + len(pad)
+        return struct.pack("<II", block_type, length) + body + pad + struct.pack("<I", length)
+
+    with open(path, "wb") as f:
+        f.write(block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1)))
+        # if_tsresol = 9 (nanosegundos)
+        f.write(block(1, struct.pack("<HHI", 1, 0, 65535) + struct.pack("<HHB3x", 9, 1, 9) + b"\x00" * 4))
+        for ts, frame in frames:
+            stamp = int(round(ts * 1e9))
+            body = struct.pack("<IIIII", 0, stamp >> 32, stamp & 0xFFFFFFFF, len(frame), len(frame)) + frame
+            f.write(block(6, body))
+
+
+def test_pcap_ddos_summary(tmp_path):
+    frames = list(_ddos_frames(random.Random(3), 20_000))
+    _write_pcap(tmp_path / "ataque.pcap", frames)
+    _write_pcapng(tmp_path / "ataque.pcapng", frames)
+
+    classic = summarize_capture(tmp_path / "ataque.pcap")
+    ng = summarize_capture(tmp_path / "ataque.pcapng")
+
+    for summary in (classic, ng):
+        assert summary["packets"] == 20_000
+        assert summary["protocol_mix"]["tcp"]["packets"] == 14_000
+        assert summary["protocol_mix"]["udp"]["packets"] == 6_000
+        assert summary["top_destinations"][0]["ip"] == VICTIM
+        assert summary["tcp"]["syn"] == 10_000
+        assert summary["tcp"]["syn_ack"] == 2_000
+        assert summary["tcp"]["syn_to_synack_ratio"] == 5.0
+        assert summary["tcp"]["syn_flood_suspected"]
+        assert summary["tcp"]["syn_sources"] > 9_000
+        [dns] = summary["amplification"]
+        assert dns["service"] == "dns"
+        assert dns["reflectors"] == 40
+        assert dns["suspected"] and dns["amplification_factor"] is None
+        assert dns["targets"][0]["ip"] == VICTIM
+        assert summary["duration_seconds"] == pytest.approx(19.999, abs=1e-3)
+    assert classic["top_sources"] == ng["top_sources"]
+
+
+def test_pcap_rejects_unknown_format(tmp_path):
+    path = tmp_path / "nota.txt"
+    path.write_bytes(b"esto no es una captura")
+    with pytest.raises(PcapFormatError):
+        summarize_capture(path)
+
+
+def test_pcap_tolerates_bogus_timestamps(tmp_path):
+    frames = list(_ddos_frames(random.Random(6), 300))
+    # Un paquete con la fecha corrupta a ~136 anos del resto
+    frames.append((4_294_000_000, frames[0][1]))
+    path = tmp_path / "corrupta.pcap"
+    _write_pcap(path, frames)
+
+    summary = summarize_capture(path)
+    assert summary["packets"] == 301
+    assert summary["peak_pps"] == 300
+
+
+def test_analyze_pcap_only_opens_captures_dir(tmp_path, monkeypatch):
+    captures = tmp_path / "captures"
+    captures.mkdir()
+    _write_pcap(captures / "ataque.pcap", _ddos_frames(random.Random(7), 200))
+    _write_pcap(tmp_path / "fuera.pcap", _ddos_frames(random.Random(7), 200))
+
+    monkeypatch.delenv("CYBERGUARD_PCAP_DIR", raising=False)
+    assert asyncio.run(analyze_pcap("ataque.pcap"))["status"] == "error"
+
+    monkeypatch.setenv("CYBERGUARD_PCAP_DIR", str(captures))
+    result = asyncio.run(analyze_pcap("ataque.pcap"))
+    assert result["status"] == "success" and result["packets"] == 200
+    assert asyncio.run(analyze_pcap(str(captures / "ataque.pcap")))["status"] == "success"
+    for path in (str(tmp_path / "fuera.pcap"), "../fuera.pcap", "/etc/passwd"):
+        assert asyncio.run(analyze_pcap(path))["status"] == "error"
+
+
+def test_pcap_throughput(tmp_path):
+    rng = random.Random(5)
+    frames = list(_ddos_frames(rng, 5_000))
+    path = tmp_path / "grande.pcap"
+    # ~200k paquetes (~60 MB) repitiendo el mismo bloque
+    block_frames = frames * 40
+    _write_pcap(path, block_frames)
+
+    started = time.perf_counter()
+    summary = summarize_capture(path)
+    elapsed = time.perf_counter() - started
+    assert summary["packets"] == 200_000
+    assert summary["packets"] / elapsed > 100_000
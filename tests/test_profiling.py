@@ -0,0 +1,116 @@
+"""Tests del perfilado opcional por consulta."""
+import asyncio
+import cProfile
+import marshal
+import pstats
+import sys
+import time
+
+import pytest
+
+from cyberguard_agents import profiling
+from cyberguard_agents.tools.executor import offload
+
+
+def busy_checksum(rounds: int) -> int:
+    """Trabajo de CPU que debe aparecer en el perfil."""
+    total = 0
+    deadline = time.perf_counter() + rounds / 1000
+    while time.perf_counter() < deadline:
+        total = (total * 31 + 7) % 1_000_003
+    return total
+
+
+def test_sampling_profile_includes_offloaded_tool(monkeypatch):
+    monkeypatch.setenv("CYBERGUARD_PROFILE_INTERVAL_MS", "1")
+    tool = offload(busy_checksum)
+
+    async def handle():
+        async with profiling.profile_request("sampling", "/chat") as profile:
+            await tool(200)
+        return profile
+
+    profile = asyncio.run(handle())
+    assert profiling.store.get(profile.id) is profile
+    assert profile.samples > 0 and profile.duration_ms >= 200
+    content, media_type, filename = profile.render("collapsed")
+    lines = content.decode().splitlines()
+    assert media_type.startswith("text/plain") and filename.endswith(".collapsed")
+    assert any(line.startswith("tool:busy_checksum;") and "busy_checksum" in line.split(";", 1)[1] for line in lines)
+    # Formato de pilas colapsadas: "marco;marco;... cuenta"
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_cprofile_profile_downloads_as_pstats():
+    tool = offload(busy_checksum)
+
+    async def handle():
+        async with profiling.profile_request("cprofile", "/chat") as profile:
+            await tool(20)
+        return profile
+
+    profile = asyncio.run(handle())
+    assert profile.summary()["formats"] == ["pstats", "text"]
+    content, _, filename = profile.render("pstats")
+    assert filename.endswith(".pstats")
+    functions = {func[2] for func in marshal.loads(content)}
+    assert "busy_checksum" in functions
+    assert "busy_checksum" in profile.render("text")[0].decode()
+    # Se libera el perfilador determinista para la siguiente consulta
+    assert profiling._cprofile_lock.acquire(blocking=False)
+    profiling._cprofile_lock.release()
+
+
+def test_pstats_file_loads_with_stdlib(tmp_path):
+    async def handle():
+        async with profiling.profile_request("cprofile", "/chat") as profile:
+            busy_checksum(5)
+        return profile
+
+    path = tmp_path / "profile.pstats"
+    path.write_bytes(asyncio.run(handle()).render("pstats")[0])
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="sys.monitoring admite un solo perfilador desde 3.12")
+def test_cprofile_falls_back_to_sampling_when_another_profiler_is_active():
+    other = cProfile.Profile()
+
+    async def handle():
+        async with profiling.profile_request("cprofile", "/chat") as profile:
+            await offload(busy_checksum)(5)
+        return profile
+
+    other.enable()
+    try:
+        profile = asyncio.run(handle())
+    finally:
+        other.disable()
+    assert profile.mode == "sampling"
+    assert profiling._cprofile_lock.acquire(blocking=False)
+    profiling._cprofile_lock.release()
+
+
+def test_store_keeps_only_recent_profiles():
+    store = profiling.ProfileStore(size=2)
+    profiles = [profiling.Profile("sampling", "/chat") for _ in range(3)]
+    for profile in profiles:
+        store.add(profile)
+    assert store.get(profiles[0].id) is None
+    assert [item["id"] for item in store.list()] == [profiles[2].id, profiles[1].id]
+
+
+def test_profiling_requires_flag_and_token(monkeypatch):
+    monkeypatch.delenv("CYBERGUARD_PROFILING", raising=False)
+    monkeypatch.delenv("CYBERGUARD_PROFILING_TOKEN", raising=False)
+    assert profiling.requested_mode("sampling", None, None) is None
+
+    monkeypatch.setenv("CYBERGUARD_PROFILING", "1")
+    assert profiling.requested_mode(None, "cprofile", None) == "cprofile"
+    assert profiling.requested_mode("1", None, None) == "sampling"
+    assert profiling.requested_mode("flamegraph", None, None) is None
+
+    monkeypatch.setenv("CYBERGUARD_PROFILING_TOKEN", "s3cret")
+    assert profiling.requested_mode("sampling", None, None) is None
+    assert profiling.requested_mode("sampling", None, "wrong") is None
+    assert profiling.requested_mode("sampling", None, "s3cret") == "sampling"
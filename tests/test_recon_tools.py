@@ -0,0 +1,786 @@
+"""Tests de las herramientas de reconocimiento contra servidores locales."""
+import asyncio
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+import pytest
+
+from cyberguard_agents.tools.recon_tools import configure_resolver
+from cyberguard_agents.tools.subdomain_tools import enumerate_subdomains, iter_subdomains
+
+
+class StubDNSServer:
+    """
+    Servidor DNS UDP minimo. `records` responde A; `txt` responde TXT;
+    `wildcard` responde A para cualquier nombre bajo la zona; `servfail` responde
+    SERVFAIL. El resto es NXDOMAIN.
+    """
+
+    def __init__(
+        self,
+        records: dict[str, list[str]],
+        wildcard: dict[str, list[str]] | None = None,
+        txt: dict[str, list[str]] | None = None,
+        servfail: set[str] | None = None,
+    ):
+        self.servfail = {_fqdn(name) for name in servfail or ()}
+        self.zones = {
+            "A": {_fqdn(k): v for k, v in records.items()},
+            "TXT": {_fqdn(k): [f'"{t}"' for t in v] for k, v in (txt or {}).items()},
+        }
+        self.wildcard = {_fqdn(k): v for k, v in (wildcard or {}).items()}
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.queries = 0
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.sock.close()
+
+    def _lookup(self, name: str, rdtype: str) -> list[str] | None:
+        zone = self.zones.get(rdtype, {})
+        if name in zone:
+            return zone[name]
+        if rdtype == "A":
+            for suffix, ips in self.wildcard.items():
+                if name.endswith("." + suffix):
+                    return ips
+        if any(name in z for z in self.zones.values()):
+            return []
+        return None
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            self.queries += 1
+            query = dns.message.from_wire(data)
+            response = dns.message.make_response(query)
+            question = query.question[0]
+            rdtype = dns.rdatatype.to_text(question.rdtype)
+            values = self._lookup(question.name.to_text(), rdtype)
+            if question.name.to_text() in self.servfail:
+                response.set_rcode(dns.rcode.SERVFAIL)
+            elif values is None:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            elif values:
+                response.answer.append(
+                    dns.rrset.from_text_list(question.name, 60, "IN", rdtype, values)
+                )
+            self.sock.sendto(response.to_wire(), addr)
+
+
+def _fqdn(name: str) -> str:
+    return name.rstrip(".") + "."
+
+
+def _resolver(server: StubDNSServer):
+    import dns.asyncresolver
+
+    return configure_resolver(
+        dns.asyncresolver.Resolver(configure=False), ["127.0.0.1"], server.port
+    )
+
+
+async def _collect(domain, wordlist, server, **kwargs):
+    stats = {}
+    found = [
+        item async for item in iter_subdomains(
+            domain, wordlist, resolver=_resolver(server), stats=stats, **kwargs
+        )
+    ]
+    return found, stats
+
+
+def test_enumerate_finds_subdomains_and_groups_by_ip():
+    records = {
+        "www.example.test": ["10.0.0.1"],
+        "api.example.test": ["10.0.0.2"],
+        "cdn.example.test": ["10.0.0.1"],
+    }
+    labels = ["www", "api", "cdn", "missing", "other"]
+    with StubDNSServer(records) as server:
+        found, stats = asyncio.run(_collect("example.test", labels, server))
+
+    assert {f["subdomain"] for f in found} == set(records)
+    assert stats["queried"] == len(labels)
+    assert stats["wildcard_ips"] == []
+    duplicated = [f for f in found if "same_ips_as" in f]
+    assert len(duplicated) == 1
+    assert duplicated[0]["ips"] == ["10.0.0.1"]
+
+
+def test_enumerate_filters_wildcard_dns():
+    records = {"vpn.example.test": ["10.0.0.9"]}
+    wildcard = {"example.test": ["10.9.9.9"]}
+    with StubDNSServer(records, wildcard) as server:
+        found, stats = asyncio.run(
+            _collect("example.test", ["www", "vpn", "mail", "dev"], server)
+        )
+
+    assert [f["subdomain"] for f in found] == ["vpn.example.test"]
+    assert stats["wildcard_ips"] == ["10.9.9.9"]
+    assert stats["wildcard_filtered"] == 3
+
+
+def test_enumerate_large_wordlist_respects_qps(tmp_path, monkeypatch):
+    (tmp_path / "labels.txt").write_text("\n".join(f"host{i}" for i in range(2000)))
+    records = {f"host{i}.example.test": [f"10.1.{i // 256}.{i % 256}"] for i in range(0, 2000, 100)}
+    monkeypatch.setenv("CYBERGUARD_WORDLIST_DIR", str(tmp_path))
+    monkeypatch.setenv("CYBERGUARD_SUBDOMAIN_MAX_QPS", "5000")
+
+    with StubDNSServer(records) as server:
+        monkeypatch.setenv("CYBERGUARD_DNS_NAMESERVERS", f"127.0.0.1:{server.port}")
+        started = time.monotonic()
+        result = asyncio.run(enumerate_subdomains("example.test", "labels.txt", qps=2000))
+        elapsed = time.monotonic() - started
+        # Un qps enorme se recorta al tope del servidor
+        monkeypatch.setenv("CYBERGUARD_SUBDOMAIN_MAX_QPS", "300")
+        capped = asyncio.run(enumerate_subdomains("example.test", "host0,host100", qps=10 ** 9))
+
+    assert result["status"] == "success"
+    assert result["labels_queried"] == 2000
+    assert result["subdomains_found"] == 20
+    assert result["unique_ip_sets"] == 20
+    # Rafaga de qps/10 y el resto a 2000/s: al menos (2000 - 200) / 2000 s
+    assert elapsed >= 0.85
+    assert capped["qps"] == 300 and capped["subdomains_found"] == 2
+
+
+def test_enumerate_only_reads_wordlists_from_configured_dir(tmp_path, monkeypatch):
+    wordlists = tmp_path / "wordlists"
+    wordlists.mkdir()
+    secret = tmp_path / "secret.txt"
+    secret.write_text("password123\n")
+    monkeypatch.setenv("CYBERGUARD_WORDLIST_DIR", str(wordlists))
+
+    with StubDNSServer({}) as server:
+        monkeypatch.setenv("CYBERGUARD_DNS_NAMESERVERS", f"127.0.0.1:{server.port}")
+        results = [
+            asyncio.run(enumerate_subdomains("example.test", wordlist))
+            for wordlist in (str(secret), "../secret.txt")
+        ]
+        monkeypatch.delenv("CYBERGUARD_WORDLIST_DIR")
+        results.append(asyncio.run(enumerate_subdomains("example.test", str(secret))))
+        queries = server.queries
+
+    assert [r["status"] for r in results] == ["error"] * 3
+    assert "CYBERGUARD_WORDLIST_DIR" in results[0]["message"]
+    # Se rechaza antes de la primera consulta DNS
+    assert queries == 0
+
+
+def test_bulk_recon_normalizes_domain_lists():
+    from cyberguard_agents.tools.bulk_recon import iter_domains, parse_checks
+
+    lines = [
+        "https://WWW.Example.com/login", "example.com:443", "*.example.org", "# comentario",
+        "example.com,registrar", b"example.net\n", "sin-punto", "www.example.com",
+    ]
+    assert list(iter_domains(lines)) == ["www.example.com", "example.com", "example.org", "example.net"]
+    assert parse_checks("dns, TLS") == ("dns", "tls")
+    assert parse_checks(None) == ("dns", "whois", "headers")
+    with pytest.raises(ValueError):
+        parse_checks("dns,ping")
+
+
+def test_bulk_recon_limits_each_check_and_reads_domains_lazily(monkeypatch):
+    from cyberguard_agents.tools import bulk_recon
+
+    lock = threading.Lock()
+    active = {"dns": 0, "whois": 0}
+    peak = {"dns": 0, "whois": 0}
+    consumed = []
+
+    def enter(kind):
+        with lock:
+            active[kind] += 1
+            peak[kind] = max(peak[kind], active[kind])
+
+    def leave(kind):
+        with lock:
+            active[kind] -= 1
+
+    def fake_dns(domain):
+        enter("dns")
+        time.sleep(0.02)
+        leave("dns")
+        return {"status": "success", "records": {"A": [], "MX": [], "NS": [], "TXT": []}}
+
+    async def fake_whois(domain):
+        enter("whois")
+        await asyncio.sleep(0.03)
+        leave("whois")
+        if domain == "d7.example":
+            raise RuntimeError("servidor WHOIS caido")
+        return {"status": "success"}
+
+    def domains():
+        for i in range(20):
+            consumed.append(i)
+            yield f"d{i}.example"
+
+    monkeypatch.setattr(bulk_recon, "dns_lookup", fake_dns)
+    monkeypatch.setattr(bulk_recon, "whois_lookup", fake_whois)
+
+    async def run():
+        records, consumed_at_first = [], None
+        async for record in bulk_recon.iter_bulk_recon(
+            domains(), checks="dns,whois", limits={"dns": 3, "whois": 2}, max_in_flight=4,
+        ):
+            consumed_at_first = consumed_at_first or len(consumed)
+            records.append(record)
+        return records, consumed_at_first
+
+    records, consumed_at_first = asyncio.run(run())
+    assert len(records) == 20
+    assert peak == {"dns": 3, "whois": 2}
+    # No se lee la lista entera antes de emitir el primer resultado
+    assert consumed_at_first <= 5
+    failed = next(r for r in records if r["domain"] == "d7.example")
+    assert failed["status"] == "partial" and "servidor WHOIS caido" in failed["whois"]["message"]
+    assert sum(r["status"] == "success" for r in records) == 19
+
+
+def test_bulk_recon_tool_summarizes_in_input_order(monkeypatch):
+    from cyberguard_agents.tools import bulk_recon
+
+    grades = {"b.example": "F", "a.example": "A", "c.example": "F"}
+
+    async def fake_headers(url):
+        domain = url.split("://", 1)[1]
+        # Termina en orden inverso al de entrada
+        await asyncio.sleep({"b.example": 0.06, "a.example": 0.03, "c.example": 0}[domain])
+        return {
+            "status": "success", "grade": grades[domain], "worst_grade_in_chain": grades[domain],
+            "security_score": 10, "headers_analysis": [{"header": "Content-Security-Policy", "status": "missing"}],
+        }
+
+    monkeypatch.setattr(bulk_recon, "check_http_headers", fake_headers)
+    result = asyncio.run(bulk_recon.bulk_recon(list(grades), checks="headers"))
+
+    assert result["status"] == "success"
+    assert [r["domain"] for r in result["results"]] == ["b.example", "a.example", "c.example"]
+    assert result["header_grades"] == {"F": 2, "A": 1}
+    assert result["results"][0]["headers"]["missing"] == ["Content-Security-Policy"]
+
+    too_many = [f"d{i}.example" for i in range(bulk_recon.MAX_TOOL_DOMAINS + 1)]
+    assert asyncio.run(bulk_recon.bulk_recon(too_many))["status"] == "error"
+    assert asyncio.run(bulk_recon.bulk_recon(["a.example"], checks="ping"))["status"] == "error"
+
+
+def test_bulk_recon_ndjson_streams_dns_records(monkeypatch):
+    import json
+
+    from cyberguard_agents.tools import recon_tools
+    from cyberguard_agents.tools.bulk_recon import iter_bulk_recon_ndjson
+
+    with StubDNSServer({}, txt={"example.test": ["v=spf1 -all"]}) as server:
+        monkeypatch.setenv("CYBERGUARD_DNS_NAMESERVERS", f"127.0.0.1:{server.port}")
+        monkeypatch.setattr(recon_tools, "_resolver", None)
+
+        async def run():
+            return [line async for line in iter_bulk_recon_ndjson(["example.test"], checks="dns")]
+
+        lines = asyncio.run(run())
+
+    [record] = [json.loads(line) for line in lines]
+    assert lines[0].endswith("\n")
+    assert record["domain"] == "example.test" and record["status"] == "success"
+    assert record["dns"]["records"]["TXT"] == ["v=spf1 -all"]
+
+
+def _self_signed_cert(tmp_path, hostname: str, days: int = 90):
+    import datetime as dt
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = dt.datetime.now(dt.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - dt.timedelta(days=1))
+        .not_valid_after(now + dt.timedelta(days=days))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(hostname)]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = tmp_path / "cert.pem", tmp_path / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    return cert_path, key_path
+
+
+class StubTLSServer:
+    """Servidor TLS local que solo completa handshakes."""
+
+    def __init__(self, cert_path, key_path, minimum_version=None):
+        import ssl
+
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(cert_path, key_path)
+        if minimum_version is not None:
+            self.context.minimum_version = minimum_version
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            with self.context.wrap_socket(conn, server_side=True):
+                pass
+        except Exception:
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+def test_check_tls_reports_self_signed_certificate(tmp_path):
+    import ssl
+
+    from cyberguard_agents.tools.tls_tools import inspect_tls
+
+    cert, key = _self_signed_cert(tmp_path, "secure.example.test", days=10)
+    server = StubTLSServer(cert, key, minimum_version=ssl.TLSVersion.TLSv1_2)
+    try:
+        result = inspect_tls("127.0.0.1", server.port, server_name="secure.example.test")
+        other_name = inspect_tls("127.0.0.1", server.port, server_name="other.example.test")
+    finally:
+        server.close()
+
+    assert result["status"] == "success"
+    assert result["certificate"]["self_signed"] is True
+    assert result["certificate"]["hostname_covered"] is True
+    assert result["certificate"]["days_to_expiry"] in (9, 10)
+    assert result["trusted"] is False
+    assert result["protocols"]["TLSv1.3"] is True
+    assert result["protocols"]["TLSv1"] in (False, None)
+    assert result["grade"] == "T"
+    assert any("expira" in issue for issue in result["issues"])
+    assert other_name["certificate"]["hostname_covered"] is False
+
+
+def test_tls_chain_degrades_to_leaf_and_sessions_are_bounded(tmp_path, monkeypatch):
+    import sys
+
+    from cyberguard_agents.tools import tls_tools
+
+    class LegacySocket:
+        """SSLSocket de Python < 3.13: sin get_unverified_chain publico."""
+
+        def getpeercert(self, binary_form=False):
+            return b"hoja-der"
+
+    assert tls_tools._peer_chain(LegacySocket()) == ([b"hoja-der"], False)
+
+    cert, key = _self_signed_cert(tmp_path, "localhost")
+    server = StubTLSServer(cert, key)
+    try:
+        result = tls_tools.inspect_tls("127.0.0.1", server.port, server_name="localhost")
+        by_target = asyncio.run(tls_tools.check_tls(f"https://127.0.0.1:{server.port}/login"))
+    finally:
+        server.close()
+    assert result["certificate"]["self_signed"] is True
+    assert result["chain_available"] is (sys.version_info >= (3, 13))
+    # En 3.11/3.12 el resultado avisa que solo se vio la hoja
+    assert ("chain_note" in result) is (sys.version_info < (3, 13))
+    assert by_target["status"] == "success" and by_target["port"] == server.port
+
+    assert tls_tools.parse_target("Mail.Example.com:993") == ("mail.example.com", 993)
+    assert tls_tools.parse_target("[2001:db8::1]:8443") == ("2001:db8::1", 8443)
+    assert tls_tools.parse_target("2001:db8::1", 8443) == ("2001:db8::1", 8443)
+    assert tls_tools.parse_target("https://example.com/", 443) == ("example.com", 443)
+    assert asyncio.run(tls_tools.check_tls("example.com:99999"))["status"] == "error"
+
+    monkeypatch.setattr(tls_tools, "MAX_SESSIONS", 2)
+    monkeypatch.setattr(tls_tools, "_sessions", tls_tools.OrderedDict())
+    for port in (1, 2, 3):
+        tls_tools._store_session(("host", port), f"sesion-{port}")
+        if port == 2:
+            # Usar la sesion del puerto 1 la vuelve reciente: se descarta la del puerto 2
+            assert tls_tools._get_session(("host", 1)) == "sesion-1"
+    assert list(tls_tools._sessions) == [("host", 1), ("host", 3)]
+
+
+def test_tls_inspections_run_concurrently(tmp_path):
+    from cyberguard_agents.tools.tls_tools import iter_tls_inspections
+
+    cert, key = _self_signed_cert(tmp_path, "localhost")
+    servers = [StubTLSServer(cert, key) for _ in range(4)]
+
+    async def collect():
+        targets = [("127.0.0.1", s.port) for s in servers]
+        return [r async for r in iter_tls_inspections(targets, max_parallel=2)]
+
+    try:
+        results = asyncio.run(collect())
+    finally:
+        for server in servers:
+            server.close()
+
+    assert sorted(r["port"] for r in results) == sorted(s.port for s in servers)
+    assert all(r["status"] == "success" for r in results)
+
+
+def test_email_security_expands_spf_tree_and_caches(monkeypatch):
+    from cyberguard_agents.tools import email_tools
+
+    txt = {
+        "corp.test": ["v=spf1 include:a.corp.test include:b.corp.test ~all", "otro registro"],
+        "_dmarc.corp.test": ["v=DMARC1; p=reject; rua=mailto:dmarc@corp.test"],
+        "selector1._domainkey.corp.test": ["v=DKIM1; k=rsa; p="],
+    }
+    # a.corp.test y b.corp.test incluyen 5 dominios cada uno: 2 + 10 = 12 consultas
+    for branch in ("a", "b"):
+        leaves = " ".join(f"include:{branch}{i}.corp.test" for i in range(5))
+        txt[f"{branch}.corp.test"] = [f"v=spf1 {leaves} -all"]
+        for i in range(5):
+            txt[f"{branch}{i}.corp.test"] = [f"v=spf1 ip4:10.{i}.0.0/16 -all"]
+
+    monkeypatch.setattr(email_tools, "_record_cache", {})
+    with StubDNSServer({}, txt=txt) as server:
+        monkeypatch.setenv("CYBERGUARD_DNS_NAMESERVERS", f"127.0.0.1:{server.port}")
+        first = asyncio.run(email_tools.analyze_email_security("corp.test"))
+        queries_after_first = server.queries
+        second = asyncio.run(email_tools.analyze_email_security("corp.test"))
+
+    spf = first["spf"]
+    assert spf["all"] == "~all"
+    assert spf["dns_lookups"] == 12
+    assert spf["lookup_limit_exceeded"] is True
+    assert len(spf["includes"]) == 12
+    assert spf["ip_ranges"] == 10
+    assert first["dmarc"]["policy"] == "reject"
+    assert first["dkim"]["selectors_found"][0]["revoked"] is True
+    assert first["mta_sts"] == {"present": False}
+    assert any("limite 10" in issue for issue in first["issues"])
+
+    assert server.queries == queries_after_first
+    assert second["dns_queries"] == 0
+    assert second["grade"] == first["grade"]
+
+
+def test_email_security_reports_transient_dns_failures(monkeypatch):
+    from cyberguard_agents.tools import email_tools
+
+    txt = {"corp.test": ["v=spf1 -all"]}
+    monkeypatch.setattr(email_tools, "_record_cache", {})
+    with StubDNSServer({}, txt=txt, servfail={"_dmarc.corp.test"}) as server:
+        monkeypatch.setenv("CYBERGUARD_DNS_NAMESERVERS", f"127.0.0.1:{server.port}")
+        failed = asyncio.run(email_tools.analyze_email_security("corp.test"))
+        server.servfail.clear()
+        recovered = asyncio.run(email_tools.analyze_email_security("corp.test"))
+
+    # Un SERVFAIL no se califica como "sin DMARC" ni queda en cache como ausencia
+    assert failed["status"] == "error"
+    assert "_dmarc.corp.test" in failed["message"]
+    assert recovered["status"] == "success"
+    assert recovered["dmarc"] == {"present": False}
+    assert ("_dmarc.corp.test", "TXT") in email_tools._record_cache
+
+
+SECURE_HEADERS = {
+    "Strict-Transport-Security": "max-age=31536000",
+    "Content-Security-Policy": "default-src 'self'",
+    "X-Frame-Options": "DENY",
+    "X-Content-Type-Options": "nosniff",
+    "X-XSS-Protection": "1; mode=block",
+    "Referrer-Policy": "no-referrer",
+    "Permissions-Policy": "camera=()",
+}
+
+
+class HeaderSite(BaseHTTPRequestHandler):
+    """Sitio HTTP/1.1 keep-alive: '/' redirige sin headers de seguridad a '/secure', que los tiene todos."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, send_body: bool):
+        self.server.requests.append((self.command, self.path))
+        if self.command == "HEAD" and not self.server.allow_head:
+            self.send_response(405)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(self.server.delay)
+        body = b"x" * self.server.body_size
+        if self.path == "/":
+            self.send_response(301)
+            self.send_header("Location", "/secure")
+            body = b""
+        else:
+            self.send_response(200)
+            for name, value in SECURE_HEADERS.items():
+                self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+
+def start_site(allow_head: bool = True, body_size: int = 2048, delay: float = 0.0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HeaderSite)
+    server.connections, server.requests = 0, []
+    server.allow_head, server.body_size, server.delay = allow_head, body_size, delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _check_headers(url: str, **kwargs) -> dict:
+    from cyberguard_agents.tools.http_client import close_http_client
+    from cyberguard_agents.tools.recon_tools import check_http_headers
+
+    async def run():
+        try:
+            return await check_http_headers(url, **kwargs)
+        finally:
+            await close_http_client()
+
+    return asyncio.run(run())
+
+
+def test_check_http_headers_grades_every_redirect_hop_with_head():
+    site = start_site()
+    try:
+        result = _check_headers(f"http://127.0.0.1:{site.server_port}/")
+    finally:
+        site.shutdown()
+        site.server_close()
+
+    assert result["status"] == "success"
+    assert result["fetch_mode"] == "head"
+    assert [(hop["http_status"], hop["grade"]) for hop in result["redirect_chain"]] == [(301, "F"), (200, "A")]
+    assert result["grade"] == "A" and result["worst_grade_in_chain"] == "F"
+    assert result["final_url"].endswith("/secure")
+    # Solo headers, y los dos saltos por la misma conexion keep-alive
+    assert site.requests == [("HEAD", "/"), ("HEAD", "/secure")]
+    assert result["body_bytes_downloaded"] == 0
+    assert site.connections == 1
+
+
+def test_check_http_headers_falls_back_to_get_and_keeps_the_connection():
+    site = start_site(allow_head=False)
+    try:
+        result = _check_headers(f"http://127.0.0.1:{site.server_port}/")
+        full = _check_headers(f"http://127.0.0.1:{site.server_port}/secure", mode="full")
+    finally:
+        site.shutdown()
+        site.server_close()
+
+    assert [hop["grade"] for hop in result["redirect_chain"]] == ["F", "A"]
+    assert site.requests[:4] == [("HEAD", "/"), ("GET", "/"), ("HEAD", "/secure"), ("GET", "/secure")]
+    # El cuerpo chico se drena, asi la conexion vuelve al pool en vez de cerrarse
+    assert result["body_bytes_downloaded"] == 2048
+    assert site.connections == 2
+    assert full["body_bytes_downloaded"] == 2048
+    assert _check_headers("http://127.0.0.1:1/", mode="raro")["status"] == "error"
+
+
+def test_http_client_pools_connections_and_limits_each_host(monkeypatch):
+    from cyberguard_agents.tools import http_client
+
+    monkeypatch.setattr(http_client, "MAX_CONNECTIONS_PER_HOST", 2)
+    site = start_site(delay=0.1)
+    url = f"http://127.0.0.1:{site.server_port}/secure"
+
+    async def fetch():
+        async with http_client.host_slot(url):
+            return (await http_client.get_http_client().get(url)).status_code
+
+    async def run():
+        try:
+            started = time.monotonic()
+            statuses = await asyncio.gather(*(fetch() for _ in range(6)))
+            elapsed = time.monotonic() - started
+            return statuses, elapsed, http_client._host_slots[asyncio.get_running_loop()]
+        finally:
+            await http_client.close_http_client()
+
+    try:
+        statuses, elapsed, slots = asyncio.run(run())
+    finally:
+        site.shutdown()
+        site.server_close()
+
+    assert statuses == [200] * 6
+    # De a 2 por host: tres tandas de 0.1 s sobre dos conexiones keep-alive
+    assert elapsed >= 0.3
+    assert site.connections == 2
+    assert slots == {}
+
+
+def test_http_client_is_kept_per_event_loop():
+    from cyberguard_agents.tools import http_client
+
+    background = asyncio.new_event_loop()
+    thread = threading.Thread(target=background.run_forever, daemon=True)
+    thread.start()
+
+    async def get():
+        return http_client.get_http_client()
+
+    def in_background(coro):
+        return asyncio.run_coroutine_threadsafe(coro, background)
+
+    async def main():
+        mine = http_client.get_http_client()
+        theirs = await asyncio.wrap_future(in_background(get()))
+        await http_client.close_http_client()
+        return mine, theirs
+
+    try:
+        other = in_background(get()).result()
+        mine, theirs = asyncio.run(main())
+        # El loop del hilo conserva su cliente abierto aunque otro loop pida el suyo
+        assert theirs is other and mine is not other
+        assert mine.is_closed and not other.is_closed
+    finally:
+        in_background(http_client.close_http_client()).result()
+        background.call_soon_threadsafe(background.stop)
+        thread.join()
+        background.close()
+    assert other.is_closed
+
+    # Un loop que termino sin cerrar su cliente se olvida cuando otro loop pide el suyo
+    async def get_and_close():
+        http_client.get_http_client()
+        await http_client.close_http_client()
+
+    asyncio.run(get())
+    assert len(http_client._clients) == 1
+    asyncio.run(get_and_close())
+    assert http_client._clients == {}
+
+
+def test_whois_keys_by_registrable_domain_and_ip_literal():
+    from cyberguard_agents.tools.whois_cache import registrable_domain, whois_server_key
+
+    assert registrable_domain("https://mail.Example.co.uk/login") == "example.co.uk"
+    assert registrable_domain("[2001:db8::1]") == "2001:db8::1"
+    assert registrable_domain("http://[2001:DB8:0::1]:8443/x") == "2001:db8::1"
+    assert registrable_domain("192.0.2.1:43") == "192.0.2.1"
+    assert whois_server_key("2001:db8::1") == "ip" and whois_server_key("example.co.uk") == "uk"
+
+
+def test_whois_cache_expands_home_and_expires(tmp_path, monkeypatch):
+    from cyberguard_agents.tools.whois_cache import WhoisCache
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("CYBERGUARD_WHOIS_CACHE", "~/cache/whois.sqlite3")
+    cache = WhoisCache(ttl=60)
+    cache.set("example.com", {"registrar": "Ejemplo"})
+    assert cache.path == tmp_path / "cache" / "whois.sqlite3" and cache.path.is_file()
+    assert cache.get("example.com")[0] == {"registrar": "Ejemplo"}
+    cache.close()
+
+    expired = WhoisCache(tmp_path / "cache" / "whois.sqlite3", ttl=-1)
+    assert expired.get("example.com") is None
+    assert expired.purge_expired() == 1
+    expired.close()
+
+
+def test_whois_service_coalesces_caches_and_throttles_per_server(tmp_path):
+    from cyberguard_agents.tools.whois_cache import WhoisCache, WhoisService
+
+    calls = []
+
+    def fetch(domain):
+        calls.append(domain)
+        time.sleep(0.05)
+        return {"domain": domain}
+
+    async def scenario():
+        service = WhoisService(WhoisCache(tmp_path / "whois.sqlite3"), rate=10, burst=1)
+        same = await asyncio.gather(*(service.lookup("example.com", fetch) for _ in range(5)))
+        again = await service.lookup("example.com", fetch)
+        started = time.monotonic()
+        # Mismo servidor (.org): la segunda y tercera esperan 1/10 s cada una
+        await asyncio.gather(*(service.lookup(f"site{i}.org", fetch) for i in range(3)))
+        throttled = time.monotonic() - started
+        started = time.monotonic()
+        # Servidores distintos: cada TLD tiene su propio bucket
+        await asyncio.gather(service.lookup("example.net", fetch), service.lookup("example.io", fetch))
+        parallel = time.monotonic() - started
+        service.cache.close()
+        return same, again, throttled, parallel
+
+    same, again, throttled, parallel = asyncio.run(scenario())
+    assert same == [({"domain": "example.com"}, False)] * 5
+    assert again == ({"domain": "example.com"}, True)
+    assert calls.count("example.com") == 1
+    assert throttled >= 0.2
+    assert parallel < 0.2
+
+
+def test_whois_waiter_takes_over_when_leader_is_cancelled(tmp_path):
+    from cyberguard_agents.tools.whois_cache import WhoisCache, WhoisService
+
+    calls = []
+
+    def fetch(domain):
+        calls.append(domain)
+        time.sleep(0.2 if len(calls) == 1 else 0)
+        return {"domain": domain}
+
+    async def scenario():
+        service = WhoisService(WhoisCache(tmp_path / "whois.sqlite3"), rate=100)
+        leader = asyncio.create_task(service.lookup("example.com", fetch))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(service.lookup("example.com", fetch))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        result = await waiter
+        service.cache.close()
+        return result, leader.cancelled()
+
+    result, leader_cancelled = asyncio.run(scenario())
+    # Cancelar al cliente que lideraba no cancela a quien esperaba el mismo dominio
+    assert leader_cancelled
+    assert result == ({"domain": "example.com"}, False)
+    assert calls == ["example.com", "example.com"]
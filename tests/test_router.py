@@ -0,0 +1,57 @@
+"""Tests del pre-router de /chat."""
+import time
+
+from cyberguard_agents import metrics
+from cyberguard_agents.router import extract_entities, route_message
+
+FAST_PATH = {
+    "escanea 10.0.0.5": "port_scanner",
+    "nmap -sV scanme.nmap.org": "port_scanner",
+    "DNS de example.com": "recon_specialist",
+    "revisa los headers de seguridad de https://example.com/login": "recon_specialist",
+    "verifica SPF y DMARC de empresa.com.ar": "recon_specialist",
+    "control CIS 5.2.1": "cis_benchmark_advisor",
+    "checklist de hardening para ubuntu": "cis_benchmark_advisor",
+    "Varios archivos del servidor aparecieron cifrados con extensión .locked y hay una nota pidiendo Bitcoin":
+        "incident_responder",
+    "Busca estos IOCs 1.2.3.4 en /var/log/auth.log": "incident_responder",
+}
+
+COORDINATOR = [
+    "hola, que es un firewall?",
+    "que es un escaneo de puertos?",
+    "y el puerto 22?",
+    "escanea los puertos de example.com y dame su whois",
+]
+
+
+def test_unambiguous_messages_skip_the_coordinator():
+    for message, agent in FAST_PATH.items():
+        decision = route_message(message, threshold=0.75)
+        assert (decision.agent, decision.reason) == (agent, "fast_path"), message
+
+
+def test_ambiguous_or_general_messages_use_the_coordinator(monkeypatch):
+    for message in COORDINATOR:
+        assert route_message(message, threshold=0.75).agent is None, message
+    monkeypatch.setenv("CYBERGUARD_FAST_ROUTER", "0")
+    assert route_message("escanea 10.0.0.5").reason == "disabled"
+
+
+def test_entities_ignore_file_names_and_versions():
+    entities = extract_entities("revisa /var/log/auth.log y ataque.pcap desde 10.0.0.0/24, control 1.1.2")
+    assert entities == {"ips": ["10.0.0.0/24"], "cis_ids": ["1.1.2"]}
+
+
+def test_router_is_cheap_and_counts_decisions():
+    metrics.reset()
+    started = time.perf_counter()
+    for _ in range(200):
+        for message in FAST_PATH:
+            decision = route_message(message)
+            metrics.increment("router_decisions_total", route=decision.agent, reason=decision.reason)
+    per_message = (time.perf_counter() - started) / (200 * len(FAST_PATH))
+    assert per_message < 0.001
+    assert metrics.value("router_decisions_total", route="port_scanner", reason="fast_path") == 400
+    assert metrics.snapshot()["router_decisions_total"]["reason=fast_path,route=recon_specialist"] == 600
+    metrics.reset()
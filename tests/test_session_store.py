@@ -0,0 +1,80 @@
+"""Tests del servicio de sesiones acotado con desborde a SQLite."""
+import asyncio
+
+import pytest
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from cyberguard_agents import metrics
+from cyberguard_agents.session_store import BoundedSessionService, SessionSpillStore
+
+APP = "cyberguard_test"
+
+
+def _event(text: str, **state) -> Event:
+    return Event(
+        author="port_scanner",
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        actions=EventActions(state_delta=state),
+    )
+
+
+def _service(tmp_path, **kwargs) -> BoundedSessionService:
+    return BoundedSessionService(SessionSpillStore(tmp_path / "sessions.sqlite3"), **kwargs)
+
+
+def test_lru_spills_and_rehydrates_sessions(tmp_path):
+    async def scenario():
+        service = _service(tmp_path, max_resident=2, max_bytes=10 ** 9, idle_ttl=3600)
+        copies = {}
+        for i in range(5):
+            copies[i] = await service.create_session(app_name=APP, user_id="u", session_id=f"s{i}")
+            await service.append_event(copies[i], _event(f"resultado {i}", last_target=f"10.0.0.{i}"))
+        assert service.stats()["resident_sessions"] == 2
+        assert service.stats()["stored_sessions"] == 3
+
+        # El runner puede tener una copia de una sesion que ya se bajo a SQLite
+        await service.append_event(copies[0], _event("segundo turno"))
+        session = await service.get_session(app_name=APP, user_id="u", session_id="s0")
+        assert [e.content.parts[0].text for e in session.events] == ["resultado 0", "segundo turno"]
+        assert session.state["last_target"] == "10.0.0.0"
+
+        listed = await service.list_sessions(app_name=APP, user_id="u")
+        assert sorted(s.id for s in listed.sessions) == [f"s{i}" for i in range(5)]
+        with pytest.raises(AlreadyExistsError):
+            await service.create_session(app_name=APP, user_id="u", session_id="s3")
+
+        await service.delete_session(app_name=APP, user_id="u", session_id="s1")
+        assert await service.get_session(app_name=APP, user_id="u", session_id="s1") is None
+        await service.close()
+
+    metrics.reset()
+    asyncio.run(scenario())
+    assert metrics.value("sessions_spilled_total", reason="lru") >= 3
+    assert metrics.value("sessions_rehydrated_total") >= 1
+    assert metrics.value("sessions_resident") <= 2
+
+
+def test_memory_budget_and_idle_ttl(tmp_path):
+    async def scenario():
+        service = _service(tmp_path, max_resident=100, max_bytes=50_000, idle_ttl=3600)
+        for i in range(4):
+            session = await service.create_session(app_name=APP, user_id="u", session_id=f"big{i}")
+            await service.append_event(session, _event("PORT STATE SERVICE\n" * 1000))
+        stats = service.stats()
+        assert stats["resident_bytes"] <= 50_000 or stats["resident_sessions"] == 1
+        assert stats["stored_sessions"] >= 2
+
+        service.idle_ttl = 0
+        await service.create_session(app_name=APP, user_id="u", session_id="nueva")
+        assert service.stats()["resident_sessions"] == 1
+        await service.close()
+
+        # Las sesiones sobreviven a un reinicio del proceso
+        restarted = _service(tmp_path)
+        session = await restarted.get_session(app_name=APP, user_id="u", session_id="big0")
+        assert session.events[0].content.parts[0].text.startswith("PORT STATE SERVICE")
+        await restarted.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,98 @@
+"""Tests de las trazas por consulta y del endpoint de metricas Prometheus."""
+import asyncio
+
+from google.adk.agents import LlmAgent
+from google.adk.apps import App
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from cyberguard_agents import metrics
+from cyberguard_agents.tracing import TracingPlugin
+
+
+class ScriptedLlm(BaseLlm):
+    """Modelo falso que responde un guion fijo, con uso de tokens."""
+
+    script: list
+
+    async def generate_content_async(self, llm_request, stream=False):
+        await asyncio.sleep(0.01)
+        part = self.script.pop(0)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(prompt_token_count=120, candidates_token_count=8),
+        )
+
+
+def whois_lookup(domain: str) -> dict:
+    """WHOIS falso servido desde cache."""
+    return {"status": "success", "domain": domain, "registrar": "Example Registrar", "cached": True}
+
+
+def _call(name: str, **args) -> types.Part:
+    return types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+
+def test_trace_covers_transfer_llm_calls_and_tools():
+    recon = LlmAgent(
+        name="recon",
+        model=ScriptedLlm(model="fake-strong", script=[_call("whois_lookup", domain="example.com"),
+                                                       types.Part(text="Registrar: Example Registrar")]),
+        tools=[whois_lookup],
+    )
+    coordinator = LlmAgent(
+        name="cyberguard_coordinator",
+        model=ScriptedLlm(model="fake-fast", script=[_call("transfer_to_agent", agent_name="recon")]),
+        sub_agents=[recon],
+    )
+    plugin = TracingPlugin(buffer_size=5)
+    runner = Runner(app=App(name="test", root_agent=coordinator, plugins=[plugin]),
+                    session_service=InMemorySessionService())
+
+    async def scenario():
+        await runner.session_service.create_session(app_name="test", user_id="u", session_id="s")
+        message = types.Content(role="user", parts=[types.Part(text="whois de example.com")])
+        return [event async for event in runner.run_async(user_id="u", session_id="s", new_message=message)]
+
+    metrics.reset()
+    asyncio.run(scenario())
+
+    [trace] = plugin.recent_traces()
+    assert trace["status"] == "ok"
+    kinds = [(span["kind"], span["name"]) for span in trace["spans"]]
+    assert ("transfer", "recon") in kinds
+    assert [name for kind, name in kinds if kind == "llm"] == ["fake-fast", "fake-strong", "fake-strong"]
+    tool = next(span for span in trace["spans"] if span["name"] == "whois_lookup")
+    assert tool["cache_hit"] is True and tool["result_bytes"] > 50 and tool["duration_ms"] >= 0
+    assert trace["totals_ms"]["llm"] >= 30
+
+    assert metrics.value("agent_transfers_total", source="cyberguard_coordinator", target="recon") == 1
+    assert metrics.value("llm_tokens_total", agent="recon", model="fake-strong", kind="prompt") == 240
+    assert metrics.value("tool_cache_total", tool="whois_lookup", result="hit") == 1
+    assert metrics.histogram("llm_call_seconds", agent="recon", model="fake-strong")["count"] == 2
+    tokens = metrics.histogram("llm_call_tokens", agent="recon", model="fake-strong", kind="prompt")
+    assert tokens["count"] == 2 and tokens["sum"] == 240
+    assert metrics.histogram("tool_call_seconds", tool="whois_lookup", status="success")["count"] == 1
+
+
+def test_prometheus_exposition_format():
+    metrics.reset()
+    metrics.increment("tool_calls_total", tool="scan_ports")
+    metrics.set_gauge("tool_pending", 1, tool='raro"\n')
+    for seconds in (0.2, 3, 900):
+        metrics.observe("tool_call_seconds", seconds, tool="scan_ports")
+    lines = metrics.render_prometheus().splitlines()
+
+    assert "# TYPE cyberguard_tool_calls_total counter" in lines
+    assert 'cyberguard_tool_calls_total{tool="scan_ports"} 1' in lines
+    assert 'cyberguard_tool_pending{tool="raro\\"\\n"} 1' in lines
+    assert "# TYPE cyberguard_tool_call_seconds histogram" in lines
+    # Los buckets son acumulativos y +Inf cuenta todas las observaciones
+    assert 'cyberguard_tool_call_seconds_bucket{tool="scan_ports",le="0.25"} 1' in lines
+    assert 'cyberguard_tool_call_seconds_bucket{tool="scan_ports",le="5"} 2' in lines
+    assert 'cyberguard_tool_call_seconds_bucket{tool="scan_ports",le="+Inf"} 3' in lines
+    assert 'cyberguard_tool_call_seconds_count{tool="scan_ports"} 3' in lines
+    assert metrics.snapshot()["tool_call_seconds"]["tool=scan_ports"] == {"count": 3, "sum": 903.2}